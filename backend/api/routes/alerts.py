@@ -2,15 +2,35 @@ from flask import Blueprint, jsonify, request
 from datetime import datetime
 from models.alert import Alert
 from app import db
-from services.auth_service import token_required
+from services.auth_service import token_required, admin_required
+from services import alert_stats_service, alert_coalescing_service, alert_broker, response_cache
+from services.response_cache import cached_response
+from services.database import replica_reads
+from services.pagination import keyset_paginate, estimate_count
 
 # Create blueprint
 alerts_bp = Blueprint('alerts', __name__)
 
+def _alert_summary(alert):
+    """Format an alert for the listing endpoint"""
+    return {
+        'id': alert.id,
+        'title': alert.title,
+        'description': alert.description,
+        'severity': alert.severity,
+        'source': alert.source,
+        'is_resolved': alert.is_resolved,
+        'created_at': alert.created_at.isoformat(),
+        'updated_at': alert.updated_at.isoformat() if alert.updated_at else None,
+        'occurrences': alert.occurrences,
+        'last_seen': alert.last_seen.isoformat() if alert.last_seen else None
+    }
+
 @alerts_bp.route('/', methods=['GET'])
 @token_required
+@replica_reads
 def get_alerts(current_user):
-    """Get all alerts with pagination and filtering"""
+    """Get alerts newest first with cursor pagination and filtering"""
     try:
         # Get query parameters
         page = int(request.args.get('page', 1))
@@ -33,31 +53,52 @@ def get_alerts(current_user):
         if end_date:
             query = query.filter(Alert.created_at <= datetime.fromisoformat(end_date))
         
-        # Get paginated results
-        alerts_pagination = query.order_by(Alert.created_at.desc()).paginate(page=page, per_page=per_page)
+        # Offset pagination is kept for clients that still send page numbers
+        if 'page' in request.args and 'cursor' not in request.args:
+            alerts_pagination = query.order_by(Alert.created_at.desc(), Alert.id.desc()).paginate(page=page, per_page=per_page)
+            
+            return jsonify({
+                'alerts': [_alert_summary(alert) for alert in alerts_pagination.items],
+                'pagination': {
+                    'total': alerts_pagination.total,
+                    'pages': alerts_pagination.pages,
+                    'page': page,
+                    'per_page': per_page,
+                    'has_next': alerts_pagination.has_next,
+                    'has_prev': alerts_pagination.has_prev
+                }
+            }), 200
         
-        # Format response
-        alerts_data = [{
-            'id': alert.id,
-            'title': alert.title,
-            'description': alert.description,
-            'severity': alert.severity,
-            'source': alert.source,
-            'is_resolved': alert.is_resolved,
-            'created_at': alert.created_at.isoformat(),
-            'updated_at': alert.updated_at.isoformat() if alert.updated_at else None
-        } for alert in alerts_pagination.items]
+        # Keyset pagination: each page seeks from the cursor on (created_at, id)
+        result = keyset_paginate(query, Alert.created_at, Alert.id, per_page, request.args.get('cursor'))
+        
+        pagination = {
+            'per_page': per_page,
+            'has_next': result['has_next'],
+            'has_prev': result['has_prev'],
+            'next_cursor': result['next_cursor'],
+            'prev_cursor': result['prev_cursor']
+        }
+        
+        # Totals are opt-in: include_total=exact runs COUNT(*), include_total=estimate avoids it where possible
+        include_total = request.args.get('include_total', 'false').lower()
+        if include_total == 'exact':
+            pagination['total'] = query.count()
+            pagination['total_is_estimate'] = False
+        elif include_total == 'estimate':
+            total = None
+            if not start_date and not end_date:
+                total = alert_stats_service.cached_count(severity or None, source or None)
+            if total is None:
+                total = estimate_count(query)
+            pagination['total'] = total if total is not None else query.count()
+            pagination['total_is_estimate'] = total is not None
+        elif include_total not in ('false', '0', 'no'):
+            raise ValueError('include_total must be exact, estimate or false')
         
         return jsonify({
-            'alerts': alerts_data,
-            'pagination': {
-                'total': alerts_pagination.total,
-                'pages': alerts_pagination.pages,
-                'page': page,
-                'per_page': per_page,
-                'has_next': alerts_pagination.has_next,
-                'has_prev': alerts_pagination.has_prev
-            }
+            'alerts': [_alert_summary(alert) for alert in result['items']],
+            'pagination': pagination
         }), 200
     
     except ValueError as e:
@@ -101,6 +142,9 @@ def resolve_alert(current_user, alert_id):
             return jsonify({'error': 'Alert not found'}), 404
         
         # Update alert status
+        alert_stats_service.record_alert_resolved(alert)
+        alert_broker.queue_alert_resolved(alert)
+        response_cache.mark_changed('alerts')
         alert.is_resolved = True
         alert.updated_at = datetime.utcnow()
         alert.resolved_by = current_user.id
@@ -119,40 +163,40 @@ def resolve_alert(current_user, alert_id):
 
 @alerts_bp.route('/statistics', methods=['GET'])
 @token_required
+@cached_response('alert-statistics', ('alerts',))
 def get_alert_statistics(current_user):
     """Get alert statistics"""
     try:
-        # Count alerts by severity
-        high_count = Alert.query.filter_by(severity='high').count()
-        medium_count = Alert.query.filter_by(severity='medium').count()
-        low_count = Alert.query.filter_by(severity='low').count()
-        
-        # Count alerts by source
-        network_count = Alert.query.filter_by(source='network').count()
-        system_count = Alert.query.filter_by(source='system').count()
-        application_count = Alert.query.filter_by(source='application').count()
-        
-        # Count resolved vs unresolved
-        resolved_count = Alert.query.filter_by(is_resolved=True).count()
-        unresolved_count = Alert.query.filter_by(is_resolved=False).count()
+        # Served from the in-process counters, or one grouped query when they are disabled
+        return jsonify(alert_stats_service.get_alert_statistics()), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@alerts_bp.route('/statistics/consistency', methods=['GET'])
+@admin_required
+def check_statistics_consistency(current_user):
+    """Rebuild the alert counters from the table and report any drift"""
+    try:
+        drift = alert_stats_service.check_alert_statistics()
         
         return jsonify({
-            'total_alerts': high_count + medium_count + low_count,
-            'by_severity': {
-                'high': high_count,
-                'medium': medium_count,
-                'low': low_count
-            },
-            'by_source': {
-                'network': network_count,
-                'system': system_count,
-                'application': application_count
-            },
-            'by_status': {
-                'resolved': resolved_count,
-                'unresolved': unresolved_count
+            'consistent': not drift,
+            'drift': {
+                group: {'cached': cached, 'actual': actual}
+                for group, (cached, actual) in drift.items()
             }
         }), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@alerts_bp.route('/coalescing', methods=['GET'])
+@token_required
+def get_coalescing_stats(current_user):
+    """Get how many alert occurrences were folded into existing alerts instead of inserted"""
+    try:
+        return jsonify(alert_coalescing_service.get_coalescing_stats()), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
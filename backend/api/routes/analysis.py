@@ -1,94 +1,80 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context, url_for
 import json
-from datetime import datetime, timedelta
-from models.traffic_data import TrafficData
-from models.system_log import SystemLog
-from models.alert import Alert
 from app import db
-from services.auth_service import token_required
-from services.ml_service import analyze_network_traffic, analyze_system_logs, predict_threats
+from services.auth_service import token_required, admin_required
+from services import ml_service
+from services.ml_service import predict_threats
+from services.ingest_service import ingest_traffic, ingest_logs, stream_ingest, count_alerts
+from services.response_cache import cached_response
+from services.metrics import stage
+from services.database import replica_reads
+from services.stream_detector import get_stream_detector
+from services.traffic_buffer import get_traffic_buffer, recent_window
+from services.job_queue import get_job_queue, get_max_records, QueueFull, JobQueueUnavailable
 
 # Create blueprint
 analysis_bp = Blueprint('analysis', __name__)
 
+def _wants_async():
+    """Check whether the client asked for the batch to be queued instead of analyzed in the request"""
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+def _queue_job(kind, records, current_user):
+    """Validate and queue a batch for the analysis workers, answering 202 with the job id"""
+    if len(records) > get_max_records():
+        return jsonify({'error': f'Batch too large. At most {get_max_records()} records per job'}), 413
+    
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            return jsonify({'error': f'Record {index} is not a JSON object'}), 400
+    
+    try:
+        job = get_job_queue().submit(kind, records, current_user.id)
+    except QueueFull as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+    except JobQueueUnavailable as e:
+        return jsonify({'error': f'Job queue unavailable: {e}'}), 503
+    
+    response = jsonify({
+        "job_id": job['id'],
+        "status": job['status'],
+        "records": job['records']
+    })
+    response.headers['Location'] = url_for('analysis.get_job', job_id=job['id'])
+    return response, 202
+
 @analysis_bp.route('/network-traffic', methods=['POST'])
 @token_required
 def analyze_traffic(current_user):
     """Analyze network traffic data for anomalies"""
     try:
-        data = request.get_json()
+        with stage('parse'):
+            data = request.get_json()
         
         if not data or not isinstance(data, list):
             return jsonify({'error': 'Invalid data format. Expected a list of traffic records'}), 400
         
-        # Process and analyze each traffic record
-        results = []
-        alerts = []
-        
-        for record in data:
-            # Save traffic data to database
-            traffic_data = TrafficData(
-                source_ip=record.get('source_ip'),
-                destination_ip=record.get('destination_ip'),
-                source_port=record.get('source_port'),
-                destination_port=record.get('destination_port'),
-                protocol=record.get('protocol'),
-                packet_size=record.get('packet_size'),
-                timestamp=datetime.fromisoformat(record.get('timestamp')) if record.get('timestamp') else datetime.utcnow(),
-                raw_data=json.dumps(record)
-            )
-            
-            # Analyze traffic data
-            is_anomalous, anomaly_score, anomaly_type = analyze_network_traffic(record)
-            
-            # Update traffic data with analysis results
-            traffic_data.is_anomalous = is_anomalous
-            traffic_data.anomaly_score = anomaly_score
-            traffic_data.anomaly_type = anomaly_type
-            
-            # Save to database
-            db.session.add(traffic_data)
-            
-            # Create alert for anomalous traffic
-            if is_anomalous and anomaly_score > 0.7:  # High confidence anomaly
-                alert = Alert(
-                    title=f"Network Anomaly Detected: {anomaly_type}",
-                    description=f"Suspicious traffic detected from {record.get('source_ip')} to {record.get('destination_ip')}",
-                    severity="high" if anomaly_score > 0.9 else "medium",
-                    source="network",
-                    details=json.dumps({
-                        "traffic_id": traffic_data.id,
-                        "anomaly_score": anomaly_score,
-                        "anomaly_type": anomaly_type,
-                        "source_ip": record.get('source_ip'),
-                        "destination_ip": record.get('destination_ip'),
-                        "protocol": record.get('protocol'),
-                        "timestamp": record.get('timestamp')
-                    })
-                )
-                db.session.add(alert)
-                alerts.append({
-                    "title": alert.title,
-                    "severity": alert.severity,
-                    "anomaly_score": anomaly_score
-                })
-            
-            results.append({
-                "id": traffic_data.id,
-                "is_anomalous": is_anomalous,
-                "anomaly_score": anomaly_score,
-                "anomaly_type": anomaly_type if is_anomalous else None
-            })
+        # Queue the batch for the workers instead of holding this request for the analysis
+        if _wants_async():
+            return _queue_job('traffic', data, current_user)
+        
+        # Analyze and store the batch, creating alerts for high confidence anomalies
+        results, alerts = ingest_traffic(data)
         
         # Commit all changes to database
-        db.session.commit()
+        with stage('commit'):
+            db.session.commit()
         
-        return jsonify({
-            "message": f"Analyzed {len(data)} traffic records",
-            "anomalies_detected": sum(1 for r in results if r["is_anomalous"]),
-            "alerts_generated": len(alerts),
-            "results": results
-        }), 200
+        with stage('serialize'):
+            return jsonify({
+                "message": f"Analyzed {len(data)} traffic records",
+                "anomalies_detected": sum(1 for r in results if r["is_anomalous"]),
+                "alerts_generated": count_alerts(alerts),
+                "alert_occurrences": len(alerts),
+                "results": results
+            }), 200
     
     except KeyError as e:
         db.session.rollback()
@@ -102,77 +88,31 @@ def analyze_traffic(current_user):
 def analyze_logs(current_user):
     """Analyze system logs for anomalies"""
     try:
-        data = request.get_json()
+        with stage('parse'):
+            data = request.get_json()
         
         if not data or not isinstance(data, list):
             return jsonify({'error': 'Invalid data format. Expected a list of log entries'}), 400
         
-        # Process and analyze each log entry
-        results = []
-        alerts = []
-        
-        for log_entry in data:
-            # Save log entry to database
-            system_log = SystemLog(
-                log_level=log_entry.get('log_level'),
-                source=log_entry.get('source'),
-                message=log_entry.get('message'),
-                timestamp=datetime.fromisoformat(log_entry.get('timestamp')) if log_entry.get('timestamp') else datetime.utcnow(),
-                host=log_entry.get('host'),
-                raw_data=json.dumps(log_entry)
-            )
-            
-            # Analyze log entry
-            is_anomalous, anomaly_score, anomaly_type = analyze_system_logs(log_entry)
-            
-            # Update log entry with analysis results
-            system_log.is_anomalous = is_anomalous
-            system_log.anomaly_score = anomaly_score
-            system_log.anomaly_type = anomaly_type
-            
-            # Save to database
-            db.session.add(system_log)
-            
-            # Create alert for anomalous log
-            if is_anomalous and anomaly_score > 0.7:  # High confidence anomaly
-                alert = Alert(
-                    title=f"System Log Anomaly: {anomaly_type}",
-                    description=f"Suspicious log entry detected from {log_entry.get('source')} on {log_entry.get('host')}",
-                    severity="high" if anomaly_score > 0.9 else "medium",
-                    source="system",
-                    details=json.dumps({
-                        "log_id": system_log.id,
-                        "anomaly_score": anomaly_score,
-                        "anomaly_type": anomaly_type,
-                        "message": log_entry.get('message'),
-                        "source": log_entry.get('source'),
-                        "host": log_entry.get('host'),
-                        "timestamp": log_entry.get('timestamp')
-                    })
-                )
-                db.session.add(alert)
-                alerts.append({
-                    "title": alert.title,
-                    "severity": alert.severity,
-                    "anomaly_score": anomaly_score
-                })
-            
-            results.append({
-                "id": system_log.id,
-                "is_anomalous": is_anomalous,
-                "anomaly_score": anomaly_score,
-                "anomaly_type": anomaly_type if is_anomalous else None
-            })
+        # Queue the batch for the workers instead of holding this request for the analysis
+        if _wants_async():
+            return _queue_job('logs', data, current_user)
+        
+        # Analyze and store the batch, creating alerts for high confidence anomalies
+        results, alerts = ingest_logs(data)
         
         # Commit all changes to database
-        db.session.commit()
+        with stage('commit'):
+            db.session.commit()
         
-        return jsonify({
-            "message": f"Analyzed {len(data)} log entries",
-            "anomalies_detected": sum(1 for r in results if r["is_anomalous"]),
-            "alerts_generated": len(alerts),
-            "results": results
-        }), 200
+        with stage('serialize'):
+            return jsonify({
+                "message": f"Analyzed {len(data)} log entries",
+                "anomalies_detected": sum(1 for r in results if r["is_anomalous"]),
+                "alerts_generated": count_alerts(alerts),
+                "alert_occurrences": len(alerts),
+                "results": results
+            }), 200
     
     except KeyError as e:
         db.session.rollback()
@@ -181,19 +121,58 @@ def analyze_logs(current_user):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def _ndjson_response(ingest):
+    """Stream NDJSON records from the request body through an ingest function"""
+    chunk_size = request.args.get('chunk_size')
+    chunk_size = min(int(chunk_size), 10000) if chunk_size else None
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError('chunk_size must be positive')
+    
+    def generate():
+        for chunk in stream_ingest(request.stream, ingest, chunk_size):
+            yield json.dumps(chunk) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@analysis_bp.route('/network-traffic/stream', methods=['POST'])
+@token_required
+def analyze_traffic_stream(current_user):
+    """Analyze newline-delimited traffic records, committing and reporting results per chunk"""
+    try:
+        return _ndjson_response(ingest_traffic)
+    
+    except ValueError as e:
+        return jsonify({'error': 'Invalid parameter format'}), 400
+
+@analysis_bp.route('/system-logs/stream', methods=['POST'])
+@token_required
+def analyze_logs_stream(current_user):
+    """Analyze newline-delimited log entries, committing and reporting results per chunk"""
+    try:
+        return _ndjson_response(ingest_logs)
+    
+    except ValueError as e:
+        return jsonify({'error': 'Invalid parameter format'}), 400
+
 @analysis_bp.route('/predict-threats', methods=['GET'])
 @token_required
+@cached_response('predict-threats', ('traffic', 'logs'))
+@replica_reads
 def get_threat_predictions(current_user):
     """Get threat predictions based on historical data"""
     try:
         # Get time range from query parameters (default to next 24 hours)
         hours = min(int(request.args.get('hours', 24)), 168)  # Max 7 days
         
+        # Days of history to analyze; older days are read from the archive
+        history_days = min(max(int(request.args.get('history_days', 7)), 1), 365)
+        
         # Get predictions
-        predictions = predict_threats(hours)
+        predictions = predict_threats(hours, history_days)
         
         return jsonify({
             "prediction_period": f"Next {hours} hours",
+            "history_days": history_days,
             "predictions": predictions
         }), 200
     
@@ -201,3 +180,123 @@ def get_threat_predictions(current_user):
         return jsonify({'error': 'Invalid parameter format'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@analysis_bp.route('/recent-traffic', methods=['GET'])
+@token_required
+def get_recent_traffic(current_user):
+    """Get anomaly rates, top talkers and busiest ports for the last few minutes of traffic"""
+    try:
+        # Window length in minutes (default 5, max 60) and entries per ranking (default 10, max 100)
+        minutes = min(max(float(request.args.get('minutes', 5)), 0.1), 60)
+        top = min(max(int(request.args.get('top', 10)), 1), 100)
+        
+        # Answered from the in-memory buffer when it holds the whole window, otherwise with SQL
+        source, window = recent_window(minutes)
+        per_minute = window.minute_counts()
+        total = sum(count for _, count, _ in per_minute)
+        anomalous = sum(count for _, _, count in per_minute)
+        
+        return jsonify({
+            "minutes": minutes,
+            "source": source,
+            "total": total,
+            "anomalous": anomalous,
+            "anomaly_rate": (anomalous / total) * 100 if total > 0 else 0,
+            "per_minute": [{
+                "minute": minute.isoformat(),
+                "total": count,
+                "anomalous": anomalous_count,
+                "anomaly_rate": (anomalous_count / count) * 100
+            } for minute, count, anomalous_count in per_minute],
+            "top_sources": [{"ip": ip, "count": count} for ip, count in window.top_sources(top)],
+            "top_anomalous_sources": [{"ip": ip, "count": count} for ip, count in window.top_sources(top, anomalous_only=True)],
+            "top_destination_ports": [{"port": port, "count": count} for port, count in window.top_ports(top)]
+        }), 200
+    
+    except ValueError as e:
+        return jsonify({'error': 'Invalid parameter format'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analysis_bp.route('/traffic-buffer-stats', methods=['GET'])
+@token_required
+def get_traffic_buffer_stats(current_user):
+    """Get the recent traffic buffer's size and window hit counters for this worker process"""
+    try:
+        buffer = get_traffic_buffer()
+        if buffer is None:
+            return jsonify({"enabled": False}), 200
+        
+        return jsonify({
+            "enabled": True,
+            **buffer.stats()
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analysis_bp.route('/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_job(current_user, job_id):
+    """Get the progress and, once finished, the results of a queued analysis job"""
+    try:
+        job = get_job_queue().get(job_id)
+        
+        # Jobs are only visible to the user who submitted them and to admins
+        if job is None or (job['user_id'] != current_user.id and current_user.role != 'admin'):
+            return jsonify({'error': 'Job not found'}), 404
+        
+        job['progress'] = job['processed'] / job['records'] if job['records'] else 1.0
+        return jsonify(job), 200
+    
+    except JobQueueUnavailable as e:
+        return jsonify({'error': f'Job queue unavailable: {e}'}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analysis_bp.route('/jobs', methods=['GET'])
+@admin_required
+def get_job_queue_stats(current_user):
+    """Get job queue depth and counters"""
+    try:
+        return jsonify(get_job_queue().stats()), 200
+    
+    except JobQueueUnavailable as e:
+        return jsonify({'error': f'Job queue unavailable: {e}'}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analysis_bp.route('/model-stats', methods=['GET'])
+@token_required
+def get_model_stats(current_user):
+    """Get the inference profile and the inference server's latency, batch-size and cache statistics"""
+    try:
+        # Report without loading the model if nothing has used it yet
+        if ml_service.inference_server is None:
+            return jsonify({"running": False}), 200
+        
+        return jsonify({
+            "running": True,
+            "profile": ml_service.model_profile,
+            **ml_service.inference_server.stats()
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analysis_bp.route('/stream-stats', methods=['GET'])
+@token_required
+def get_stream_stats(current_user):
+    """Get streaming detector state size and detection counters"""
+    try:
+        detector = get_stream_detector()
+        if detector is None:
+            return jsonify({"enabled": False}), 200
+        
+        return jsonify({
+            "enabled": True,
+            **detector.stats()
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
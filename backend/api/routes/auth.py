@@ -4,6 +4,7 @@ import jwt
 import os
 from werkzeug.security import generate_password_hash, check_password_hash
 from models.user import User
+from services.auth_service import token_required
 from app import db
 
 # Create blueprint
@@ -68,31 +69,12 @@ def login():
     }), 200
 
 @auth_bp.route('/profile', methods=['GET'])
-def profile():
+@token_required
+def profile(current_user):
     """Get user profile"""
-    # Get token from header
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return jsonify({'error': 'Missing or invalid token'}), 401
-    
-    token = auth_header.split(' ')[1]
-    
-    try:
-        # Decode token
-        payload = jwt.decode(token, os.getenv('SECRET_KEY', 'dev_key'), algorithms=['HS256'])
-        user = User.query.get(payload['user_id'])
-        
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        return jsonify({
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'created_at': user.created_at.isoformat()
-        }), 200
-    
-    except jwt.ExpiredSignatureError:
-        return jsonify({'error': 'Token expired'}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({'error': 'Invalid token'}), 401
+    return jsonify({
+        'id': current_user.id,
+        'username': current_user.username,
+        'email': current_user.email,
+        'created_at': current_user.created_at.isoformat()
+    }), 200
@@ -1,17 +1,22 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 import jwt
 import os
 from datetime import datetime, timedelta
 from models.alert import Alert
-from models.traffic_data import TrafficData
-from models.system_log import SystemLog
-from services.auth_service import token_required
+from services.auth_service import token_required, admin_required
+from services.rollup_service import interval_counts
+from services.response_cache import cached_response, get_response_cache
+from services.alert_broker import get_alert_broker, replay_events
+from services.metrics import stage
+from services.database import replica_reads, get_replica_router
 
 # Create blueprint
 dashboard_bp = Blueprint('dashboard', __name__)
 
 @dashboard_bp.route('/summary', methods=['GET'])
 @token_required
+@cached_response('summary', ('alerts', 'traffic', 'logs'))
+@replica_reads
 def get_summary(current_user):
     """Get dashboard summary statistics"""
     try:
@@ -28,25 +33,27 @@ def get_summary(current_user):
         else:
             return jsonify({'error': 'Invalid time range'}), 400
         
-        # Get alert statistics
-        alerts = Alert.query.filter(Alert.created_at >= start_time).all()
-        high_severity = sum(1 for alert in alerts if alert.severity == 'high')
-        medium_severity = sum(1 for alert in alerts if alert.severity == 'medium')
-        low_severity = sum(1 for alert in alerts if alert.severity == 'low')
+        # Count alerts by severity, and traffic and logs by anomalous flag, from the rollups
+        with stage('query'):
+            alert_counts = interval_counts('alert', [(start_time, None)])[0]
+            traffic_counts = interval_counts('traffic', [(start_time, None)])[0]
+            log_counts = interval_counts('log', [(start_time, None)])[0]
+        
+        high_severity = alert_counts['high']
+        medium_severity = alert_counts['medium']
+        low_severity = alert_counts['low']
         
         # Get traffic statistics
-        traffic_data = TrafficData.query.filter(TrafficData.timestamp >= start_time).all()
-        total_traffic = len(traffic_data)
-        anomalous_traffic = sum(1 for data in traffic_data if data.is_anomalous)
+        total_traffic = sum(traffic_counts.values())
+        anomalous_traffic = traffic_counts[True]
         
         # Get system log statistics
-        system_logs = SystemLog.query.filter(SystemLog.timestamp >= start_time).all()
-        total_logs = len(system_logs)
-        anomalous_logs = sum(1 for log in system_logs if log.is_anomalous)
+        total_logs = sum(log_counts.values())
+        anomalous_logs = log_counts[True]
         
         return jsonify({
             'alerts': {
-                'total': len(alerts),
+                'total': sum(alert_counts.values()),
                 'high_severity': high_severity,
                 'medium_severity': medium_severity,
                 'low_severity': low_severity
@@ -69,6 +76,8 @@ def get_summary(current_user):
 
 @dashboard_bp.route('/recent-alerts', methods=['GET'])
 @token_required
+@cached_response('recent-alerts', ('alerts',))
+@replica_reads
 def get_recent_alerts(current_user):
     """Get recent alerts for dashboard"""
     try:
@@ -76,22 +85,90 @@ def get_recent_alerts(current_user):
         limit = min(int(request.args.get('limit', 10)), 100)
         
         # Get recent alerts
-        alerts = Alert.query.order_by(Alert.created_at.desc()).limit(limit).all()
-        
-        return jsonify([{
-            'id': alert.id,
-            'title': alert.title,
-            'description': alert.description,
-            'severity': alert.severity,
-            'source': alert.source,
-            'created_at': alert.created_at.isoformat()
-        } for alert in alerts]), 200
+        with stage('query'):
+            alerts = Alert.query.order_by(Alert.created_at.desc()).limit(limit).all()
+        
+        with stage('serialize'):
+            return jsonify([{
+                'id': alert.id,
+                'title': alert.title,
+                'description': alert.description,
+                'severity': alert.severity,
+                'source': alert.source,
+                'created_at': alert.created_at.isoformat()
+            } for alert in alerts]), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/stream', methods=['GET'])
+@token_required
+def stream_alerts(current_user):
+    """
+    Stream new alerts and counter deltas as server-sent events
+
+    Replaces polling /recent-alerts. Events: 'alert' (a new alert, with its id
+    as the event id), 'alert_update' (occurrences added to an open alert),
+    'alert_resolved', 'counters' (per-commit deltas of created and resolved
+    alerts by severity) and 'reset' (events were missed; reload over REST).
+    Clients resume from the Last-Event-ID header or ?last_id=; the replay can
+    repeat alerts from just before that id, so clients skip alert ids they
+    already have. Authentication
+    uses the usual bearer header, so browsers read the stream with fetch
+    rather than EventSource.
+    """
+    try:
+        broker = get_alert_broker()
+        if broker is None:
+            return jsonify({'error': 'Alert stream is disabled'}), 404
+        
+        last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+        try:
+            last_id = int(last_id) if last_id else None
+        except ValueError:
+            return jsonify({'error': 'Invalid last event id'}), 400
+        
+        # Subscribe before replaying so alerts committed in between are in the live stream
+        cursor = broker.subscribe()
+        if cursor is None:
+            response = jsonify({'error': 'Too many stream subscribers, poll /recent-alerts instead'})
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        
+        try:
+            replayed, replayed_ids = replay_events(last_id) if last_id is not None else ([], set())
+        except Exception:
+            broker.unsubscribe()
+            raise
+        
+        response = Response(broker.stream(cursor, replayed, replayed_ids), mimetype='text/event-stream')
+        # Runs even if the client disconnects before the stream starts
+        response.call_on_close(broker.unsubscribe)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/stream-stats', methods=['GET'])
+@admin_required
+def get_stream_stats(current_user):
+    """Get alert stream subscriber and delivery counters for this worker process"""
+    try:
+        broker = get_alert_broker()
+        if broker is None:
+            return jsonify({'enabled': False}), 200
+        
+        return jsonify(dict(broker.stats(), enabled=True)), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @dashboard_bp.route('/threat-timeline', methods=['GET'])
 @token_required
+@cached_response('threat-timeline', ('alerts',))
+@replica_reads
 def get_threat_timeline(current_user):
     """Get threat timeline data for dashboard"""
     try:
@@ -101,32 +178,48 @@ def get_threat_timeline(current_user):
         # Calculate start time
         start_time = datetime.utcnow() - timedelta(days=days)
         
-        # Get alerts grouped by day
-        timeline_data = []
-        
-        for i in range(days):
-            day_start = start_time + timedelta(days=i)
-            day_end = day_start + timedelta(days=1)
-            
-            # Count alerts for the day by severity
-            day_alerts = Alert.query.filter(
-                Alert.created_at >= day_start,
-                Alert.created_at < day_end
-            ).all()
-            
-            high_count = sum(1 for alert in day_alerts if alert.severity == 'high')
-            medium_count = sum(1 for alert in day_alerts if alert.severity == 'medium')
-            low_count = sum(1 for alert in day_alerts if alert.severity == 'low')
-            
-            timeline_data.append({
-                'date': day_start.strftime('%Y-%m-%d'),
-                'high': high_count,
-                'medium': medium_count,
-                'low': low_count,
-                'total': len(day_alerts)
-            })
+        # Count alerts by severity for each day from the rollups
+        day_starts = [start_time + timedelta(days=i) for i in range(days)]
+        with stage('query'):
+            day_counts = interval_counts('alert', [(day_start, day_start + timedelta(days=1)) for day_start in day_starts])
+        
+        timeline_data = [{
+            'date': day_start.strftime('%Y-%m-%d'),
+            'high': counts['high'],
+            'medium': counts['medium'],
+            'low': counts['low'],
+            'total': sum(counts.values())
+        } for day_start, counts in zip(day_starts, day_counts)]
         
         return jsonify(timeline_data), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/replica-stats', methods=['GET'])
+@admin_required
+def get_replica_stats(current_user):
+    """Get read replica lag and routing counters for this worker process"""
+    try:
+        router = get_replica_router()
+        if router is None:
+            return jsonify({'enabled': False}), 200
+        
+        return jsonify(dict(router.stats(), enabled=True)), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats(current_user):
+    """Get response cache hit and miss counters for this worker process"""
+    try:
+        cache = get_response_cache()
+        if cache is None:
+            return jsonify({'enabled': False}), 200
+        
+        return jsonify(dict(cache.stats(), enabled=True)), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,4 +1,7 @@
 import os
+import time
+import click
+from datetime import datetime, timedelta
 from flask import Flask, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
@@ -16,8 +19,13 @@ CORS(app)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'postgresql://postgres:postgres@db:5432/cybersecurity')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-# Initialize database
-db = SQLAlchemy(app)
+# Pool sizing and pre-ping (DATABASE_POOL_*), and the optional read replica (DATABASE_REPLICA_URL)
+from services.database import RoutingSession, get_engine_options, get_binds
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options()
+app.config['SQLALCHEMY_BINDS'] = get_binds()
+
+# Initialize database; dashboard, alert listing and prediction reads go to the replica when it is current
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
 migrate = Migrate(app, db)
 
 # Import and register blueprints after db initialization to avoid circular imports
@@ -31,6 +39,86 @@ app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
 app.register_blueprint(alerts_bp, url_prefix='/api/alerts')
 app.register_blueprint(analysis_bp, url_prefix='/api/analysis')
 
+# Request counts and latencies for /api/metrics (METRICS_ENABLED)
+from services.metrics import init_app as init_metrics, metrics_response
+init_metrics(app)
+
+# Per-request query counts, slow query plans and repeated statements (QUERY_PROFILER)
+from services.query_profiler import init_app as init_query_profiler
+init_query_profiler(app)
+
+from services.rollup_service import backfill_rollups
+from services.response_cache import invalidate
+
+@app.cli.command('backfill-rollups')
+@click.option('--days', type=int, default=None, help='Only rebuild the last N days (default: everything)')
+def backfill_rollups_command(days):
+    """Rebuild the dashboard rollup tables from the raw tables and the archive"""
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    totals = backfill_rollups(since)
+    invalidate('alerts', 'traffic', 'logs')
+    for kind, count in totals.items():
+        click.echo(f'{kind}: rolled up {count} rows')
+
+from services.partition_service import create_upcoming_partitions, apply_retention
+
+@app.cli.command('create-partitions')
+@click.option('--days-ahead', type=int, default=7, help='Create partitions through this many days from now')
+def create_partitions_command(days_ahead):
+    """Create upcoming traffic and log partitions (requires PARTITION_INTERVAL)"""
+    for table, names in create_upcoming_partitions(days_ahead).items():
+        click.echo(f'{table}: created {len(names)} partitions')
+
+@app.cli.command('apply-retention')
+@click.option('--days', type=int, default=lambda: int(os.getenv('RETENTION_DAYS', 90)), help='Days of traffic and log data to keep')
+@click.option('--detach', is_flag=True, help='Detach old partitions as <partition>_archived tables instead of dropping them')
+def apply_retention_command(days, detach):
+    """Drop (or detach) traffic and log partitions older than the retention period"""
+    results = apply_retention(days, detach=detach)
+    invalidate('traffic', 'logs')
+    for table, result in results.items():
+        if isinstance(result, list):
+            click.echo(f"{table}: {'detached' if detach else 'dropped'} {len(result)} partitions")
+        else:
+            click.echo(f'{table}: deleted {result} rows')
+
+from services.archive_service import archive_data
+
+@app.cli.command('archive-data')
+@click.option('--days', type=int, default=lambda: int(os.getenv('ARCHIVE_AFTER_DAYS', 30)), help='Days of traffic and log data to keep in the database')
+def archive_data_command(days):
+    """Move older traffic and log rows into the Parquet archive (ARCHIVE_DIR)"""
+    for table, (rows, files) in archive_data(days).items():
+        click.echo(f'{table}: archived {rows} rows into {files} files')
+
+from services.job_queue import get_job_queue, check_config as check_job_queue_config, JobQueueUnavailable
+
+# Several web workers cannot share the in-process job queue; the job endpoints answer 503 until it is fixed
+try:
+    check_job_queue_config()
+except JobQueueUnavailable as e:
+    print(f"Job queue unavailable ({e}), queued analysis (?async) will answer 503")
+
+@app.cli.command('job-worker')
+@click.option('--threads', type=int, default=2, help='Worker threads draining the queue')
+def job_worker_command(threads):
+    """Run analysis job workers against the Redis job queue (JOB_QUEUE, REDIS_URL)"""
+    try:
+        queue = get_job_queue(start_workers=False)
+    except JobQueueUnavailable as e:
+        raise click.ClickException(f'Job queue unavailable: {e}')
+    if queue.backend.name != 'redis':
+        raise click.ClickException('job-worker needs the Redis job queue; the in-process queue only runs inside the web process')
+    
+    queue.start(threads)
+    click.echo(f'Running {threads} job workers, press Ctrl+C to stop')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        click.echo('Stopping after the current jobs finish')
+        queue.stop()
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -39,6 +127,11 @@ def health_check():
         'message': 'AI-Enhanced Cybersecurity Threat Detector API is running'
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics of every worker sharing METRICS_MULTIPROC_DIR, else of this one (bearer METRICS_TOKEN when set)"""
+    return metrics_response()
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -0,0 +1,95 @@
+"""
+Benchmark alert listing latency by page depth: OFFSET pagination vs keyset cursors
+
+Seeds a database with synthetic alerts and reports the median latency of
+GET /api/alerts/ at increasing depths, unfiltered and filtered by severity.
+tests/test_alert_pagination.py checks both return the same pages.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_alert_pagination [--alerts N] [--per-page N] [--database-url URL]
+"""
+import os
+import argparse
+import statistics
+import tempfile
+import time
+import datetime
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--alerts', type=int, default=1000000)
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    import jwt
+    from app import app, db
+    from models.user import User
+    from models.alert import Alert
+    from services.pagination import encode_cursor
+    from benchmarks.data import seed_database
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_database(0, 0, alert_count=args.alerts)
+        user = User(username='bench', email='bench@example.com', password='x', role='admin')
+        db.session.add(user)
+        db.session.commit()
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE alerts'))
+            db.session.commit()
+        token = jwt.encode({
+            'user_id': user.id,
+            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        }, os.getenv('SECRET_KEY', 'dev_key'), algorithm='HS256')
+
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + token}
+
+    def median_ms(params):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            response = client.get('/api/alerts/', query_string=params, headers=headers)
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise SystemExit(f"Request failed: {response.status_code} {response.get_json()}")
+        return statistics.median(timings)
+
+    print(f"alerts: {args.alerts}, per_page: {args.per_page}")
+    for label, filters in (('all', {}), ('severity=high', {'severity': 'high'})):
+        def ordered():
+            return Alert.query.filter_by(**filters).order_by(Alert.created_at.desc(), Alert.id.desc())
+
+        with app.app_context():
+            matching = ordered().count()
+
+        print(f"\n{label} ({matching} rows)")
+        print(f"{'row offset':>12} {'OFFSET + COUNT':>16} {'keyset':>10}")
+        for fraction in (0, 0.01, 0.1, 0.5, 0.9, 0.999):
+            offset = int(matching * fraction) // args.per_page * args.per_page
+            page = offset // args.per_page + 1
+
+            # Cursor pointing just before the same position, built outside the timing
+            cursor = {}
+            if offset:
+                with app.app_context():
+                    boundary = ordered().offset(offset - 1).first()
+                    cursor = {'cursor': encode_cursor(boundary.created_at, boundary.id, 'next')}
+
+            offset_ms = median_ms({**filters, 'page': page, 'per_page': args.per_page})
+            keyset_ms = median_ms({**filters, **cursor, 'per_page': args.per_page})
+            print(f"{offset:>12} {offset_ms:>13.1f} ms {keyset_ms:>7.1f} ms")
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Load test the alert push stream with thousands of concurrent subscribers
+
+Starts the API on a threaded server in a separate process, opens
+--subscribers concurrent /api/dashboard/stream connections from asyncio
+clients, then posts traffic batches to /api/analysis/network-traffic and
+measures how long every subscriber takes to receive each batch's events,
+whether every subscriber received all of them, and the server memory per
+subscriber. For comparison it times the /recent-alerts poll the stream
+replaces and derives the load the same clients would cause by polling.
+
+Runs against a temporary SQLite file unless --database-url is given; with
+--redis-url events go through the Redis broker.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_alert_stream [--subscribers N] [--batches N] [--records N]
+                                            [--poll-interval S] [--redis-url URL] [--database-url URL]
+"""
+import os
+import argparse
+import asyncio
+import datetime
+import http.client
+import json
+import multiprocessing
+import statistics
+import tempfile
+import time
+
+
+def serve(ready):
+    """Run the API on a threaded development server (one thread per connection)"""
+    import logging
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    # Room for every subscriber connecting at once
+    server.socket.listen(4096)
+    ready.put(server.server_port)
+    server.serve_forever()
+
+
+def cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as stat:
+        fields = stat.read().rsplit(')', 1)[1].split()
+    # utime and stime, in clock ticks
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def rss_mib(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class Subscriber:
+    """Stream client recording when each 'counters' event (one per committed batch) arrives"""
+
+    def __init__(self):
+        self.counters_at = []
+        self.alert_events = 0
+
+    async def run(self, port, headers, connected):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=2**20)
+        writer.write(f"GET /api/dashboard/stream HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n".encode())
+        await writer.drain()
+        status = await reader.readline()
+        if b' 200 ' not in status:
+            raise RuntimeError(f"Stream request failed: {status!r}")
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line.startswith(b'retry:'):
+                connected()
+            elif line == b'event: counters\n':
+                self.counters_at.append(time.perf_counter())
+            elif line in (b'event: alert\n', b'event: alert_update\n'):
+                self.alert_events += 1
+
+
+def post(port, path, body, headers, method='POST'):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                       headers=dict(headers, **{'Content-Type': 'application/json'}))
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    if response.status != 200:
+        raise SystemExit(f"{method} {path} failed with {response.status}: {data[:200]!r}")
+    return json.loads(data)
+
+
+async def run_load(args, port, auth, server_pid, records):
+    headers = {'Authorization': auth}
+    subscribers = [Subscriber() for _ in range(args.subscribers)]
+    connected = asyncio.Semaphore(0)
+    # Connect in waves so the accept backlog is never the bottleneck
+    gate = asyncio.Semaphore(200)
+
+    async def connect(subscriber):
+        async with gate:
+            done = asyncio.Event()
+            task = asyncio.ensure_future(subscriber.run(port, f"Authorization: {auth}\r\n", done.set))
+            await done.wait()
+            connected.release()
+            return task
+
+    loop = asyncio.get_running_loop()
+    base_rss = rss_mib(server_pid)
+    start = time.perf_counter()
+    tasks = await asyncio.gather(*(connect(subscriber) for subscriber in subscribers))
+    connect_seconds = time.perf_counter() - start
+    await asyncio.sleep(1)
+    subscribed_rss = rss_mib(server_pid)
+    print(f"connected:   {args.subscribers} subscribers in {connect_seconds:.1f} s, server RSS "
+          f"{base_rss:.0f} -> {subscribed_rss:.0f} MiB "
+          f"({(subscribed_rss - base_rss) * 1024 / args.subscribers:.0f} KiB per subscriber)")
+
+    latencies, spreads, post_ms = [], [], []
+    server_cpu = cpu_seconds(server_pid)
+    for batch in range(args.batches):
+        post_start = time.perf_counter()
+        await loop.run_in_executor(None, post, port, '/api/analysis/network-traffic', records, headers)
+        post_ms.append((time.perf_counter() - post_start) * 1000)
+
+        deadline = time.perf_counter() + 60
+        while any(len(subscriber.counters_at) <= batch for subscriber in subscribers):
+            if time.perf_counter() > deadline:
+                raise SystemExit(f"Batch {batch}: not every subscriber received its events within 60 s")
+            await asyncio.sleep(0.005)
+        received = [subscriber.counters_at[batch] for subscriber in subscribers]
+        latencies.extend((at - post_start) * 1000 for at in received)
+        spreads.append((max(received) - min(received)) * 1000)
+
+    server_cpu = cpu_seconds(server_pid) - server_cpu
+    stats = await loop.run_in_executor(None, post, port, '/api/dashboard/stream-stats', None, headers, 'GET')
+    alert_events = {subscriber.alert_events for subscriber in subscribers}
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"batches:     {args.batches} x {len(records)} records, POST median {statistics.median(post_ms):.0f} ms, "
+          f"server CPU {server_cpu * 1000 / args.batches:.0f} ms per batch (ingest + fan-out)")
+    print(f"delivery:    from POST start to each subscriber p50 {quantiles[49]:.0f} ms, p99 {quantiles[98]:.0f} ms, "
+          f"max {max(latencies):.0f} ms; first to last subscriber median {statistics.median(spreads):.0f} ms")
+    print(f"complete:    alert events per subscriber {sorted(alert_events)}, broker delivered {stats['delivered']}, "
+          f"resets {stats['resets']}, rejected {stats['rejected']}")
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=2000)
+    parser.add_argument('--batches', type=int, default=10)
+    parser.add_argument('--records', type=int, default=500)
+    parser.add_argument('--poll-interval', type=float, default=5, help='Seconds between polls the stream replaces')
+    parser.add_argument('--redis-url')
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['ALERT_STREAM_MAX_SUBSCRIBERS'] = str(args.subscribers)
+    if args.redis_url:
+        os.environ['REDIS_URL'] = args.redis_url
+        os.environ['ALERT_STREAM'] = 'redis'
+    else:
+        os.environ['ALERT_STREAM'] = 'memory'
+
+    import jwt
+    from app import app, db
+    from models.user import User
+    from benchmarks.data import generate_traffic_records
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', password='x', role='admin')
+        db.session.add(user)
+        db.session.commit()
+        auth = 'Bearer ' + jwt.encode({
+            'user_id': user.id,
+            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        }, os.getenv('SECRET_KEY', 'dev_key'), algorithm='HS256')
+        db.session.remove()
+
+    ready = multiprocessing.get_context('spawn').Queue()
+    server = multiprocessing.get_context('spawn').Process(target=serve, args=(ready,), daemon=True)
+    server.start()
+    port = ready.get(timeout=60)
+    print(f"{os.cpu_count()} CPUs, server and clients share them; broker: {os.environ['ALERT_STREAM']}")
+
+    try:
+        headers = {'Authorization': auth}
+        # Polling cost the stream replaces, measured before any subscriber connects
+        post(port, '/api/analysis/network-traffic', generate_traffic_records(args.records, seed=1), headers)
+        poll_ms = []
+        for _ in range(50):
+            start = time.perf_counter()
+            post(port, '/api/dashboard/recent-alerts?limit=10', None, headers, 'GET')
+            poll_ms.append((time.perf_counter() - start) * 1000)
+        poll_rate = args.subscribers / args.poll_interval
+        print(f"polling:     /recent-alerts median {statistics.median(poll_ms):.1f} ms; {args.subscribers} clients every "
+              f"{args.poll_interval:g} s = {poll_rate:.0f} requests/s "
+              f"(~{poll_rate * statistics.median(poll_ms) / 1000:.1f} server-seconds per second)")
+
+        asyncio.run(run_load(args, port, auth, server.pid, generate_traffic_records(args.records, seed=2)))
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark historical scans over the live tables against the Parquet archive
+
+Seeds traffic and log rows over a span of days, runs the historical queries
+on the live tables, moves everything but the last week into the archive and
+runs them again, reporting query times and storage sizes.
+tests/test_archive.py checks the results are unchanged by archiving.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_archive [--traffic N] [--logs N] [--days N]
+                                       [--keep-days N] [--database-url URL]
+"""
+import os
+import argparse
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings)
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def table_size(model):
+    """Bytes used by a table and its indexes"""
+    from app import db
+
+    if db.engine.dialect.name == 'postgresql':
+        return db.session.execute(db.text('SELECT pg_total_relation_size(:table)'), {'table': model.__tablename__}).scalar()
+    # dbstat is compiled into most SQLite builds; names cover the table and its indexes
+    return db.session.execute(db.text(
+        'SELECT SUM(pgsize) FROM dbstat WHERE name = :table OR name IN '
+        '(SELECT name FROM sqlite_master WHERE type = \'index\' AND tbl_name = :table)'
+    ), {'table': model.__tablename__}).scalar()
+
+
+def protocol_sizes_sql(start):
+    """Average packet size per protocol over the live table"""
+    from app import db
+    from sqlalchemy import func
+    from models.traffic_data import TrafficData
+
+    rows = db.session.query(TrafficData.protocol, func.count(TrafficData.id), func.avg(TrafficData.packet_size)).filter(
+        TrafficData.timestamp >= start
+    ).group_by(TrafficData.protocol).all()
+    return sorted((protocol, count, round(float(average), 6)) for protocol, count, average in rows)
+
+
+def protocol_sizes_archive(start):
+    """Average packet size per protocol over the archive, reading two columns"""
+    from models.traffic_data import TrafficData
+    from services.archive_service import scan
+
+    table = scan(TrafficData, ['protocol', 'packet_size'], start).unify_dictionaries()
+    grouped = table.group_by('protocol').aggregate([('packet_size', 'count'), ('packet_size', 'mean')])
+    return sorted(
+        (protocol, count, round(average, 6)) for protocol, count, average in zip(
+            grouped.column('protocol').to_pylist(),
+            grouped.column('packet_size_count').to_pylist(),
+            grouped.column('packet_size_mean').to_pylist()
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--traffic', type=int, default=1000000)
+    parser.add_argument('--logs', type=int, default=200000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--keep-days', type=int, default=7)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['ARCHIVE_DIR'] = tempfile.mkdtemp()
+
+    from app import app, db
+    from models.traffic_data import TrafficData
+    from models.system_log import SystemLog
+    from services.archive_service import archive_data, get_archive_dir
+    from services.ml_service import predict_threats
+    from services.rollup_service import backfill_rollups, interval_counts
+    from benchmarks.data import seed_database
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_database(args.traffic, args.logs, days=args.days, ip_cardinality=2000)
+        backfill_rollups()
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+
+        now = datetime.utcnow()
+        history_start = now - timedelta(days=args.days)
+        # Odd offsets force raw-table pieces at the interval edges
+        intervals = [(now - timedelta(days=days, seconds=17), None) for days in (30, args.days - 1)]
+        # predict_threats counts back from the current time; one spare day keeps the oldest rows in its window
+        queries = {
+            f'predict_threats, {args.days + 1} days': lambda: predict_threats(history_days=args.days + 1),
+            'dashboard interval counts': lambda: [interval_counts(kind, intervals) for kind in ('traffic', 'log')]
+        }
+
+        live_timings = {}
+        for name, query in queries.items():
+            _, live_timings[name] = median_ms(query, args.repeat)
+        _, live_protocols_ms = median_ms(lambda: protocol_sizes_sql(history_start), args.repeat)
+        live_bytes = table_size(TrafficData) + table_size(SystemLog)
+        db.session.commit()
+
+        start = time.perf_counter()
+        archived = archive_data(args.keep_days)
+        archive_seconds = time.perf_counter() - start
+
+        archive_timings = {}
+        for name, query in queries.items():
+            _, archive_timings[name] = median_ms(query, args.repeat)
+
+        _, archive_protocols_ms = median_ms(lambda: protocol_sizes_archive(history_start), args.repeat)
+
+        rows = sum(count for count, _ in archived.values())
+        print(f"rows: {args.traffic} traffic, {args.logs} logs over {args.days} days; "
+              f"archived {rows} rows older than {args.keep_days} days in {archive_seconds:.1f} s")
+        print(f"{'query':<40} {'live tables':>12} {'with archive':>13}")
+        for name in queries:
+            print(f"{name:<40} {live_timings[name]:>9.1f} ms {archive_timings[name]:>10.1f} ms")
+        print(f"{'avg packet size per protocol (scan)':<40} {live_protocols_ms:>9.1f} ms {archive_protocols_ms:>10.1f} ms "
+              f"(archive only)")
+        print(f"{'storage':<40} {live_bytes / 2**20:>9.1f} MiB {directory_size(get_archive_dir()) / 2**20:>9.1f} MiB "
+              f"(tables + indexes vs Parquet)")
+
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark per-request authentication overhead with and without the user cache
+
+Runs a no-op view wrapped in token_required inside a request context, so the
+timing covers header parsing, JWT verification and loading the user.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_auth [--requests N] [--database-url URL]
+"""
+import os
+import argparse
+import tempfile
+import time
+import datetime
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    import jwt
+    from app import app, db
+    from models.user import User
+    from services import auth_service
+
+    @auth_service.token_required
+    def view(current_user):
+        return current_user.id
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', password='x', role='analyst')
+        db.session.add(user)
+        db.session.commit()
+        token = jwt.encode({
+            'user_id': user.id,
+            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        }, os.getenv('SECRET_KEY', 'dev_key'), algorithm='HS256')
+        headers = {'Authorization': 'Bearer ' + token}
+
+        def run(requests):
+            start = time.perf_counter()
+            for _ in range(requests):
+                with app.test_request_context(headers=headers):
+                    view()
+                    # Flask-SQLAlchemy ends the session at the end of each request
+                    db.session.remove()
+            return (time.perf_counter() - start) / requests * 1e6
+
+        def baseline_run(requests):
+            start = time.perf_counter()
+            for _ in range(requests):
+                with app.test_request_context(headers=headers):
+                    db.session.remove()
+            return (time.perf_counter() - start) / requests * 1e6
+
+        # Warm up, then time request context setup and teardown alone
+        baseline_run(1000)
+        baseline = baseline_run(args.requests)
+
+        def configure(ttl):
+            os.environ['AUTH_CACHE_TTL'] = ttl
+            auth_service.user_cache, auth_service._initialized = None, False
+
+        configure('0')
+        uncached = run(args.requests)
+
+        configure('60')
+        cached = run(args.requests)
+        stats = auth_service.user_cache.stats()
+
+        print(f"requests: {args.requests}; request context alone {baseline:.1f} us")
+        print(f"no cache:   {uncached:>7.1f} us/request (auth overhead {uncached - baseline:.1f} us)")
+        print(f"user cache: {cached:>7.1f} us/request (auth overhead {cached - baseline:.1f} us, "
+              f"{(uncached - baseline) / (cached - baseline):.1f}x lower; hits {stats['hits']}, misses {stats['misses']})")
+
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark the rollup-backed dashboard endpoints against the raw tables
+
+Seeds rows spread over 30 days, rebuilds the rollups and times /summary and
+/threat-timeline against the original raw-table computations for every
+supported range. tests/test_dashboard_rollups.py checks they agree.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_dashboard [--traffic N] [--logs N] [--alerts N] [--database-url URL]
+"""
+import os
+import argparse
+import datetime as dt
+import tempfile
+import time
+
+
+def raw_summary(start_time):
+    """The original /summary computation over raw rows"""
+    from models.alert import Alert
+    from models.traffic_data import TrafficData
+    from models.system_log import SystemLog
+
+    alerts = Alert.query.filter(Alert.created_at >= start_time).all()
+    traffic_data = TrafficData.query.filter(TrafficData.timestamp >= start_time).all()
+    system_logs = SystemLog.query.filter(SystemLog.timestamp >= start_time).all()
+    total_traffic = len(traffic_data)
+    anomalous_traffic = sum(1 for data in traffic_data if data.is_anomalous)
+    total_logs = len(system_logs)
+    anomalous_logs = sum(1 for log in system_logs if log.is_anomalous)
+
+    return {
+        'alerts': {
+            'total': len(alerts),
+            'high_severity': sum(1 for alert in alerts if alert.severity == 'high'),
+            'medium_severity': sum(1 for alert in alerts if alert.severity == 'medium'),
+            'low_severity': sum(1 for alert in alerts if alert.severity == 'low')
+        },
+        'traffic': {
+            'total': total_traffic,
+            'anomalous': anomalous_traffic,
+            'anomaly_rate': (anomalous_traffic / total_traffic) * 100 if total_traffic > 0 else 0
+        },
+        'logs': {
+            'total': total_logs,
+            'anomalous': anomalous_logs,
+            'anomaly_rate': (anomalous_logs / total_logs) * 100 if total_logs > 0 else 0
+        }
+    }
+
+
+def raw_timeline(start_time, days):
+    """The original /threat-timeline computation, one raw query per day"""
+    from models.alert import Alert
+
+    timeline_data = []
+    for i in range(days):
+        day_start = start_time + dt.timedelta(days=i)
+        day_alerts = Alert.query.filter(
+            Alert.created_at >= day_start,
+            Alert.created_at < day_start + dt.timedelta(days=1)
+        ).all()
+        timeline_data.append({
+            'date': day_start.strftime('%Y-%m-%d'),
+            'high': sum(1 for alert in day_alerts if alert.severity == 'high'),
+            'medium': sum(1 for alert in day_alerts if alert.severity == 'medium'),
+            'low': sum(1 for alert in day_alerts if alert.severity == 'low'),
+            'total': len(day_alerts)
+        })
+    return timeline_data
+
+
+class FrozenDatetime(dt.datetime):
+    """datetime whose utcnow() is pinned so both computations see the same ranges"""
+    now_value = None
+
+    @classmethod
+    def utcnow(cls):
+        return cls.now_value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--traffic', type=int, default=100000)
+    parser.add_argument('--logs', type=int, default=50000)
+    parser.add_argument('--alerts', type=int, default=20000)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    import jwt
+    from app import app, db
+    from models.user import User
+    from api.routes import dashboard
+    from services.rollup_service import backfill_rollups
+    from benchmarks.data import seed_database
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_database(args.traffic, args.logs, args.alerts, days=30)
+        backfill_rollups()
+
+        user = User(username='bench', email='bench@example.com', password='-', role='admin')
+        db.session.add(user)
+        db.session.commit()
+        token = jwt.encode({'user_id': user.id, 'exp': dt.datetime.utcnow() + dt.timedelta(hours=1)},
+                           os.getenv('SECRET_KEY', 'dev_key'), algorithm='HS256')
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    # Pin the clock inside the dashboard module so raw and rollup ranges are the same
+    FrozenDatetime.now_value = dt.datetime.utcnow()
+    dashboard.datetime = FrozenDatetime
+
+    queries = [
+        ('summary', f'/api/dashboard/summary?time_range={time_range}',
+         lambda delta=delta: raw_summary(FrozenDatetime.now_value - delta))
+        for time_range, delta in (('24h', dt.timedelta(hours=24)), ('7d', dt.timedelta(days=7)), ('30d', dt.timedelta(days=30)))
+    ] + [
+        ('timeline', f'/api/dashboard/threat-timeline?days={days}',
+         lambda days=days: raw_timeline(FrozenDatetime.now_value - dt.timedelta(days=days), days))
+        for days in (7, 30)
+    ]
+
+    print(f"rows: {args.traffic} traffic, {args.logs} logs, {args.alerts} alerts over 30 days")
+    for name, url, raw in queries:
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        rollup_time = time.perf_counter() - start
+        if response.status_code != 200:
+            raise SystemExit(f"Request failed: {response.status_code} {response.get_json()}")
+
+        with app.app_context():
+            start = time.perf_counter()
+            raw()
+            raw_time = time.perf_counter() - start
+
+        print(f"{url:45s} raw {raw_time * 1000:>8.1f} ms   rollups {rollup_time * 1000:>6.1f} ms")
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
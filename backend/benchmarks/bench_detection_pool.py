@@ -0,0 +1,59 @@
+"""
+Benchmark in-process log detection against the detection process pool
+
+Classifies the same large log batch in-process and with pools of 1 to N
+worker processes and reports the time per batch and the speedup over
+in-process execution. tests/test_detection_pool.py checks the results match.
+Traffic is not benchmarked: its rules always run in-process.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_detection_pool [--logs N] [--max-workers N]
+"""
+import os
+import argparse
+import statistics
+import time
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--logs', type=int, default=500000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    from services.keyword_matcher import LogKeywordMatcher
+    from services.detection_pool import DetectionPool, get_shard_size
+    from benchmarks.data import generate_log_records
+
+    messages = [entry['message'] for entry in generate_log_records(args.logs)]
+    matcher = LogKeywordMatcher()
+
+    _, inline_logs_ms = median_ms(lambda: matcher.classify_batch(messages), args.repeat)
+
+    print(f"{args.logs} log messages; {os.cpu_count()} CPUs")
+    print(f"{'mode':<20} {'logs':>10} {'speedup':>8}")
+    print(f"{'in-process':<20} {inline_logs_ms:>7.0f} ms {1:>7.2f}x")
+
+    for workers in range(1, args.max_workers + 1):
+        pool = DetectionPool(workers, get_shard_size())
+        # Start every worker process before timing
+        pool.classify_logs(matcher, messages[:workers * 10])
+
+        _, logs_ms = median_ms(lambda: pool.classify_logs(matcher, messages), args.repeat)
+        pool.shutdown()
+
+        print(f"{f'pool, {workers} workers':<20} {logs_ms:>7.0f} ms {inline_logs_ms / logs_ms:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
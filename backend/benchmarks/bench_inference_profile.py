@@ -0,0 +1,185 @@
+"""
+Benchmark the optimized inference profile against the full-precision model
+
+Fine-tunes a small local DistilBERT classifier on labeled synthetic log
+messages (unless --model-path is given), then compares the full-precision
+model with its int8 dynamically quantized copy:
+
+- accuracy on held-out messages, label agreement and score drift
+- single-text latency and batched throughput of bare forward passes
+- end-to-end inference server throughput on a log stream that repeats
+  --distinct messages, with the token and score caches off and on
+
+Thread pools are set as the optimized profile would (--threads, default the
+CPUs this process may run on, and one inter-op thread).
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_inference_profile [--dim N] [--layers N] [--train N] [--texts N] [--distinct N]
+"""
+import os
+import argparse
+import random
+import statistics
+import tempfile
+import time
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from services.inference_service import InferenceServer, quantize_model, configure_threads
+from benchmarks.data import NORMAL_MESSAGES, ANOMALOUS_MESSAGES
+from benchmarks.tiny_model import build_tiny_model
+
+
+def labeled_messages(count, seed, anomaly_rate=0.3):
+    """Generate (message, label) pairs, label 1 for messages from the anomalous templates"""
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(count):
+        anomalous = rng.random() < anomaly_rate
+        template = rng.choice(ANOMALOUS_MESSAGES if anomalous else NORMAL_MESSAGES)
+        message = template.format(ip=f"10.0.{rng.randrange(256)}.{rng.randrange(1, 255)}", port=rng.randrange(1, 65536))
+        samples.append((message, int(anomalous)))
+    return samples
+
+
+def fine_tune(model, tokenizer, samples, epochs, batch_size=32):
+    """Train the classifier on the samples so accuracy is meaningful"""
+    optimizer = torch.optim.AdamW(model.parameters(), lr=5e-4)
+    model.train()
+    for _ in range(epochs):
+        random.Random(0).shuffle(samples)
+        for start in range(0, len(samples), batch_size):
+            texts, labels = zip(*samples[start:start + batch_size])
+            encoded = tokenizer(list(texts), padding=True, truncation=True, max_length=128, return_tensors='pt')
+            loss = model(**encoded, labels=torch.tensor(labels)).loss
+            loss.backward()
+            optimizer.step()
+            optimizer.zero_grad()
+    model.eval()
+
+
+def predict(model, tokenizer, texts, batch_size=32):
+    """Return (label indexes, anomalous-class probabilities) for texts"""
+    indexes, scores = [], []
+    with torch.no_grad():
+        for start in range(0, len(texts), batch_size):
+            encoded = tokenizer(texts[start:start + batch_size], padding=True, truncation=True, max_length=128,
+                                return_tensors='pt')
+            probabilities = torch.softmax(model(**encoded).logits, dim=-1)
+            indexes.extend(probabilities.argmax(dim=-1).tolist())
+            scores.extend(probabilities[:, 1].tolist())
+    return indexes, scores
+
+
+def time_forward(model, tokenizer, texts, batch_size):
+    """Return (median single-text latency in ms, batched texts per second)"""
+    with torch.no_grad():
+        model(**tokenizer(texts[:batch_size], padding=True, return_tensors='pt'))  # warm up
+        latencies = []
+        for text in texts[:200]:
+            encoded = tokenizer(text, truncation=True, max_length=128, return_tensors='pt')
+            start = time.perf_counter()
+            model(**encoded)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        batches = [tokenizer(texts[start:start + batch_size], padding=True, truncation=True, max_length=128,
+                             return_tensors='pt') for start in range(0, len(texts), batch_size)]
+        start = time.perf_counter()
+        for encoded in batches:
+            model(**encoded)
+        throughput = len(texts) / (time.perf_counter() - start)
+    return statistics.median(latencies), throughput
+
+
+def saved_mib(model):
+    """Size of the model's saved state dict in MiB"""
+    path = os.path.join(tempfile.mkdtemp(), 'model.pt')
+    torch.save(model.state_dict(), path)
+    return os.path.getsize(path) / 2**20
+
+
+def time_server(model, tokenizer, stream, batch_size, token_cache_size, score_cache_size):
+    """Classify the stream through an inference server; return (texts per second, stats)"""
+    server = InferenceServer(model, tokenizer, max_batch_size=batch_size, max_wait_ms=1,
+                             token_cache_size=token_cache_size, score_cache_size=score_cache_size)
+    start = time.perf_counter()
+    for offset in range(0, len(stream), batch_size):
+        server.classify(stream[offset:offset + batch_size])
+    seconds = time.perf_counter() - start
+    stats = server.stats()
+    server.close()
+    return len(stream) / seconds, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model-path')
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--hidden-dim', type=int, default=1024)
+    parser.add_argument('--layers', type=int, default=4)
+    parser.add_argument('--heads', type=int, default=4)
+    parser.add_argument('--train', type=int, default=3000, help='Fine-tuning messages for the built model')
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--texts', type=int, default=2000, help='Held-out messages')
+    parser.add_argument('--distinct', type=int, default=300, help='Distinct messages in the repeated log stream')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=len(os.sched_getaffinity(0)))
+    args = parser.parse_args()
+
+    threads = configure_threads(args.threads, 1)
+    torch.manual_seed(0)
+
+    model_path = args.model_path or build_tiny_model(tempfile.mkdtemp(prefix='tiny-model-'), dim=args.dim,
+                                                     hidden_dim=args.hidden_dim, n_layers=args.layers,
+                                                     n_heads=args.heads)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    if not args.model_path:
+        start = time.perf_counter()
+        fine_tune(model, tokenizer, labeled_messages(args.train, seed=1), args.epochs)
+        print(f"model:      fine-tuned dim {args.dim}, {args.layers} layers on {args.train} messages "
+              f"in {time.perf_counter() - start:.0f} s")
+    model.eval()
+    quantized = quantize_model(model)
+    print(f"threads:    {threads['intra_op']} intra-op, {threads['inter_op']} inter-op")
+    print(f"size:       fp32 {saved_mib(model):.1f} MiB, int8 {saved_mib(quantized):.1f} MiB saved")
+
+    samples = labeled_messages(args.texts, seed=2)
+    texts, labels = [text for text, _ in samples], [label for _, label in samples]
+    fp32_indexes, fp32_scores = predict(model, tokenizer, texts)
+    int8_indexes, int8_scores = predict(quantized, tokenizer, texts)
+    fp32_accuracy = sum(i == label for i, label in zip(fp32_indexes, labels)) / len(labels)
+    int8_accuracy = sum(i == label for i, label in zip(int8_indexes, labels)) / len(labels)
+    agreement = sum(a == b for a, b in zip(fp32_indexes, int8_indexes)) / len(labels)
+    drift = [abs(a - b) for a, b in zip(fp32_scores, int8_scores)]
+    print(f"accuracy:   fp32 {fp32_accuracy:.2%}, int8 {int8_accuracy:.2%} "
+          f"(delta {(int8_accuracy - fp32_accuracy) * 100:+.2f} points) on {len(texts)} held-out messages")
+    print(f"agreement:  {agreement:.2%} same labels; anomalous score drift mean {statistics.mean(drift):.1e}, "
+          f"max {max(drift):.1e}")
+
+    print(f"{'forward':<10} {'1-text p50':>11} {f'batch {args.batch_size}':>14}")
+    fp32_latency, fp32_throughput = time_forward(model, tokenizer, texts, args.batch_size)
+    int8_latency, int8_throughput = time_forward(quantized, tokenizer, texts, args.batch_size)
+    print(f"{'fp32':<10} {fp32_latency:>8.2f} ms {fp32_throughput:>8,.0f} /s")
+    print(f"{'int8':<10} {int8_latency:>8.2f} ms {int8_throughput:>8,.0f} /s   "
+          f"({fp32_latency / int8_latency:.2f}x latency, {int8_throughput / fp32_throughput:.2f}x throughput)")
+
+    # A log stream where a few hundred distinct lines repeat with skewed frequencies
+    rng = random.Random(3)
+    pool = [text for text, _ in labeled_messages(args.distinct, seed=4)]
+    weights = [1 / (rank + 1) for rank in range(len(pool))]
+    stream = rng.choices(pool, weights=weights, k=args.texts)
+    print(f"server:     {len(stream)} texts drawn from {args.distinct} distinct messages, batches of {args.batch_size}")
+    baseline = None
+    for label, server_model in (('fp32', model), ('int8', quantized)):
+        for caches, token_cache_size, score_cache_size in (('caches off', 0, 0), ('token cache', 10000, 0),
+                                                           ('both caches', 10000, 10000)):
+            throughput, stats = time_server(server_model, tokenizer, stream, args.batch_size, token_cache_size,
+                                            score_cache_size)
+            baseline = baseline or throughput
+            hits = [f"{name.split('_')[0]} hits {stats[name]['hit_rate']:.0%}"
+                    for name in ('token_cache', 'score_cache') if stats[name]]
+            print(f"{label:<5} {caches:<12} {throughput:>8,.0f} texts/s ({throughput / baseline:.1f}x)  {', '.join(hits)}")
+
+if __name__ == '__main__':
+    main()
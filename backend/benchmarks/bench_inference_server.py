@@ -0,0 +1,72 @@
+"""
+Benchmark the micro-batching inference server against one forward pass per text
+
+Uses a tiny randomly initialized local model unless --model-path is given.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_inference_server [--texts N] [--clients N] [--max-batch-size N]
+"""
+import argparse
+import tempfile
+import threading
+import time
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from services.inference_service import InferenceServer
+from benchmarks.data import generate_log_records
+from benchmarks.tiny_model import build_tiny_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model-path')
+    parser.add_argument('--texts', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    args = parser.parse_args()
+
+    model_path = args.model_path or build_tiny_model(tempfile.mkdtemp(prefix='tiny-model-'))
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+
+    texts = [record['message'] for record in generate_log_records(args.texts, anomaly_rate=0.3)]
+
+    # Baseline: one unpadded forward pass per text, as a per-call pipeline would do
+    with torch.no_grad():
+        model(**tokenizer(texts[0], return_tensors='pt'))  # warm up
+    start = time.perf_counter()
+    with torch.no_grad():
+        for text in texts:
+            model(**tokenizer(text, truncation=True, max_length=128, return_tensors='pt'))
+    baseline_time = time.perf_counter() - start
+
+    server = InferenceServer(model, tokenizer, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+
+    shards = [texts[i::args.clients] for i in range(args.clients)]
+
+    def client(shard):
+        for text in shard:
+            server.classify([text])
+
+    threads = [threading.Thread(target=client, args=(shard,)) for shard in shards]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server_time = time.perf_counter() - start
+    stats = server.stats()
+    server.close()
+
+    print(f"texts:              {len(texts)} from {args.clients} concurrent clients")
+    print(f"one pass per text:  {len(texts) / baseline_time:,.0f} texts/sec")
+    print(f"batching server:    {len(texts) / server_time:,.0f} texts/sec ({baseline_time / server_time:.2f}x)")
+    print(f"mean batch size:    {stats['mean_batch_size']:.1f}")
+    print(f"latency p50/p95/p99: {stats['latency_ms']['p50']:.1f} / {stats['latency_ms']['p95']:.1f} / {stats['latency_ms']['p99']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
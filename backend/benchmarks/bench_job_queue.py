@@ -0,0 +1,102 @@
+"""
+Benchmark synchronous analysis requests against queued (202 Accepted) jobs
+
+Posts the same traffic batches to /api/analysis/network-traffic in both
+modes and reports how long each request holds the client, how long the
+queued jobs take to finish and how many submissions the depth cap rejects
+under a burst.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_job_queue [--records N] [--batches N] [--burst N]
+                                         [--redis-url URL] [--database-url URL]
+"""
+import os
+import argparse
+import datetime
+import statistics
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--batches', type=int, default=5)
+    parser.add_argument('--burst', type=int, default=40)
+    parser.add_argument('--redis-url')
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    if args.redis_url:
+        os.environ['REDIS_URL'] = args.redis_url
+        os.environ['JOB_QUEUE'] = 'redis'
+    else:
+        os.environ['JOB_QUEUE'] = 'memory'
+
+    import jwt
+    from app import app, db
+    from models.user import User
+    from services.job_queue import get_job_queue
+    from benchmarks.data import generate_traffic_records
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', password='x', role='admin')
+        db.session.add(user)
+        db.session.commit()
+        token = jwt.encode({
+            'user_id': user.id,
+            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        }, os.getenv('SECRET_KEY', 'dev_key'), algorithm='HS256')
+        headers = {'Authorization': 'Bearer ' + token}
+        client = app.test_client()
+        records = generate_traffic_records(args.records)
+        queue = get_job_queue()
+
+        sync_timings = []
+        for _ in range(args.batches):
+            start = time.perf_counter()
+            response = client.post('/api/analysis/network-traffic', json=records, headers=headers)
+            sync_timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise SystemExit(f"Synchronous request failed: {response.get_json()}")
+
+        accept_timings, job_ids = [], []
+        start = time.perf_counter()
+        for _ in range(args.batches):
+            request_start = time.perf_counter()
+            response = client.post('/api/analysis/network-traffic?async=1', json=records, headers=headers)
+            accept_timings.append((time.perf_counter() - request_start) * 1000)
+            if response.status_code != 202:
+                raise SystemExit(f"Queued request failed: {response.get_json()}")
+            job_ids.append(response.get_json()['job_id'])
+
+        while any(queue.get(job_id)['status'] in ('queued', 'running') for job_id in job_ids):
+            time.sleep(0.05)
+        drain_seconds = time.perf_counter() - start
+        jobs = [queue.get(job_id) for job_id in job_ids]
+        if any(job['status'] != 'completed' or job['processed'] != args.records for job in jobs):
+            raise SystemExit("Queued jobs did not complete")
+
+        small = records[:10]
+        codes = [client.post('/api/analysis/network-traffic?async=1', json=small, headers=headers).status_code
+                 for _ in range(args.burst)]
+
+        stats = queue.stats()
+        print(f"{args.batches} batches of {args.records} traffic records; backend {stats['backend']}, "
+              f"{stats['workers']} workers, max depth {stats['max_depth']}")
+        print(f"synchronous request:   median {statistics.median(sync_timings):>8.1f} ms held per batch")
+        print(f"queued request:        median {statistics.median(accept_timings):>8.1f} ms until 202")
+        print(f"queued jobs finished:  {drain_seconds:.1f} s for all batches "
+              f"({args.batches * args.records / drain_seconds:.0f} records/s)")
+        print(f"burst of {args.burst} submissions: {codes.count(202)} accepted, {codes.count(429)} rejected with 429")
+
+        queue.stop()
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark the log keyword matcher's substring scan and trie regex against the per-record loop
+
+Reports both matching strategies for the default catalog and for catalogs
+extended with --iocs strings, to check where LOG_KEYWORD_TRIE_MIN should sit.
+tests/test_keyword_matcher.py checks both strategies match the per-record loop.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_keyword_matcher [--records N] [--iocs N ...]
+"""
+import os
+import argparse
+import random
+import string
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import app  # noqa: F401 - initializes the database before the services import it
+from services.ml_service import analyze_system_logs
+from services.keyword_matcher import LogKeywordMatcher, DEFAULT_LOG_KEYWORD_CATALOG
+from benchmarks.data import generate_log_records
+
+
+def timed(func):
+    """Return the wall-clock time of a single run"""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def catalog_with_iocs(count, seed=7):
+    """Extend the default catalog with a category of random IOC strings"""
+    rng = random.Random(seed)
+    iocs = [''.join(rng.choice(string.ascii_lowercase + string.digits) for _ in range(12)) for _ in range(count)]
+    return DEFAULT_LOG_KEYWORD_CATALOG + [{
+        "category": "ioc",
+        "score": 0.9,
+        "anomaly_type": "Indicator of Compromise",
+        "keywords": iocs
+    }]
+
+
+def naive_classify(catalog, messages):
+    """Per-keyword scan of every category, the baseline for extended catalogs"""
+    results = []
+    for message in messages:
+        lowered = message.lower()
+        result = (False, 0.0, None)
+        for entry in catalog:
+            if any(keyword in lowered for keyword in entry['keywords']):
+                result = (True, entry['score'], entry['anomaly_type'])
+                break
+        results.append(result)
+    return results
+
+
+def report_strategies(catalog, messages, repeat=3):
+    """Print the throughput of the substring scan and of the trie regex for one catalog"""
+    for label, trie_min_keywords in (('scan', float('inf')), ('trie', 0)):
+        matcher = LogKeywordMatcher(catalog, trie_min_keywords=trie_min_keywords)
+        elapsed = min(timed(lambda: matcher.classify_batch(messages)) for _ in range(repeat))
+        print(f"  {label + ':':<19}{len(messages) / elapsed:,.0f} records/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=50000)
+    parser.add_argument('--iocs', type=int, nargs='*', default=[20, 40, 60, 100, 1000, 5000])
+    args = parser.parse_args()
+
+    records = generate_log_records(args.records)
+    messages = [record['message'] for record in records]
+
+    matcher = LogKeywordMatcher()
+    loop_time = timed(lambda: [analyze_system_logs(record) for record in records])
+
+    print(f"records:             {len(records)}")
+    print(f"default catalog:     {matcher.keyword_count} keywords, trie {'on' if matcher.uses_trie else 'off'}")
+    print(f"  per-record loop:   {len(records) / loop_time:,.0f} records/sec")
+    report_strategies(DEFAULT_LOG_KEYWORD_CATALOG, messages)
+
+    for count in args.iocs:
+        catalog = catalog_with_iocs(count)
+        start = time.perf_counter()
+        matcher = LogKeywordMatcher(catalog)
+        build_time = time.perf_counter() - start
+
+        sample = messages[:max(1, len(messages) // 10)]
+        naive_time = timed(lambda: naive_classify(catalog, sample))
+
+        print(f"catalog + {count} IOCs: {matcher.keyword_count} keywords, trie {'on' if matcher.uses_trie else 'off'}, "
+              f"built in {build_time * 1000:.0f} ms")
+        print(f"  per-keyword loop:  {len(sample) / naive_time:,.0f} records/sec")
+        report_strategies(catalog, sample)
+
+if __name__ == '__main__':
+    main()
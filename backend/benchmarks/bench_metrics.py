@@ -0,0 +1,110 @@
+"""
+Benchmark the cost of request and stage metrics
+
+Times a histogram observation, a stage timer and a counter increment, then
+runs the health check and the traffic ingestion endpoint in fresh
+interpreters with METRICS_ENABLED on and off (alternating, --rounds times)
+and reports the median per-request latency of each. Finally checks that
+every /api/metrics line is a comment or a well-formed sample.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_metrics [--requests N] [--batch N] [--rounds N]
+"""
+import os
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_]+="[^"]*",?)*\})? -?[0-9.e+-]+$')
+
+REQUEST_SCRIPT = """
+import os, sys, time, statistics, datetime as dt
+import jwt
+from app import app, db
+from models.user import User
+from benchmarks.data import generate_traffic_records
+
+requests, batch = int(sys.argv[1]), int(sys.argv[2])
+with app.app_context():
+    db.create_all()
+    db.session.add(User(username='bench', email='bench@example.com', password='-', role='admin'))
+    db.session.commit()
+token = jwt.encode({'user_id': 1, 'exp': dt.datetime.utcnow() + dt.timedelta(days=1)},
+                   os.getenv('SECRET_KEY', 'dev_key'), algorithm='HS256')
+headers = {'Authorization': f'Bearer {token}'}
+client = app.test_client()
+records = generate_traffic_records((requests + 5) * batch, seed=1)
+
+def timed(send):
+    for i in range(5):
+        send(i)
+    timings = []
+    for i in range(5, requests + 5):
+        start = time.perf_counter()
+        send(i)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+health = timed(lambda i: client.get('/api/health'))
+ingest = timed(lambda i: client.post('/api/analysis/network-traffic', json=records[i * batch:(i + 1) * batch],
+                                     headers=headers))
+print(health, ingest)
+"""
+
+
+def run_requests(enabled, args):
+    """Return (health, ingest) median latency in microseconds in a fresh interpreter"""
+    env = dict(os.environ, METRICS_ENABLED=str(enabled).lower(), RESPONSE_CACHE='none',
+               DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    output = subprocess.run([sys.executable, '-c', REQUEST_SCRIPT, str(args.requests), str(args.batch)], env=env,
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(output[-2]), float(output[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300, help='Timed requests per endpoint and round')
+    parser.add_argument('--batch', type=int, default=100, help='Records per ingestion request')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    from services import metrics
+    histogram = metrics.Histogram('bench_seconds', 'Benchmark histogram', ('endpoint', 'stage'))
+    counter = metrics.CounterMetric('bench_total', 'Benchmark counter', ('kind',))
+    number = 200000
+    for name, statement in (('histogram observe', lambda: histogram.observe(0.003, ('/api/x', 'query'))),
+                            ('counter inc', lambda: counter.inc(1, ('traffic',)))):
+        print(f"{name:<18} {timeit.timeit(statement, number=number) / number * 1e9:>7.0f} ns")
+
+    def timed_stage():
+        with metrics.stage('query'):
+            pass
+    print(f"{'stage timer':<18} {timeit.timeit(timed_stage, number=number) / number * 1e9:>7.0f} ns  (no request)")
+
+    runs = {True: [], False: []}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            runs[enabled].append(run_requests(enabled, args))
+    print(f"median per-request latency over {args.rounds} rounds of {args.requests} requests "
+          f"(ingest batches of {args.batch})")
+    print(f"{'endpoint':<10} {'metrics off':>12} {'metrics on':>12} {'overhead':>10}")
+    for index, name in enumerate(('health', 'ingest')):
+        off = statistics.median(run[index] for run in runs[False])
+        on = statistics.median(run[index] for run in runs[True])
+        print(f"{name:<10} {off:>9.0f} us {on:>9.0f} us {on - off:>+7.0f} us ({on / off - 1:+.1%})")
+
+    from app import app
+    os.environ.pop('METRICS_TOKEN', None)
+    exposition = app.test_client().get('/api/metrics').get_data(as_text=True)
+    malformed = [line for line in exposition.splitlines() if not line.startswith('#') and not SAMPLE_LINE.match(line)]
+    print(f"exposition: {len(exposition.splitlines())} lines, {len(malformed)} malformed")
+    for line in malformed[:5]:
+        print(f"  {line}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark 30-day range queries and retention on plain vs time-partitioned tables
+
+Seeds the same traffic and log rows over a span of days into plain tables and
+then into partitioned ones (PARTITION_INTERVAL) and reports query and
+retention times. tests/test_partitions.py checks both layouts agree.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_partitions [--traffic N] [--logs N] [--days N]
+                                          [--interval day|week] [--database-url URL]
+"""
+import os
+import argparse
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def range_queries(window_start, window_end):
+    """Named queries over one 30-day window, each returning a comparable result"""
+    from app import db
+    from sqlalchemy import func
+    from models.traffic_data import TrafficData
+    from models.system_log import SystemLog
+
+    def in_window(column):
+        return (column >= window_start, column < window_end)
+
+    return {
+        'traffic by protocol': lambda: sorted(
+            db.session.query(TrafficData.protocol, func.count(TrafficData.id))
+            .filter(*in_window(TrafficData.timestamp)).group_by(TrafficData.protocol).all()
+        ),
+        'traffic avg packet size': lambda: round(float(
+            db.session.query(func.avg(TrafficData.packet_size)).filter(*in_window(TrafficData.timestamp)).scalar()
+        ), 6),
+        'anomalous source IPs': lambda: sorted(
+            db.session.query(TrafficData.source_ip, func.count(TrafficData.id))
+            .filter(TrafficData.is_anomalous.is_(True), *in_window(TrafficData.timestamp))
+            .group_by(TrafficData.source_ip).having(func.count(TrafficData.id) >= 3).all()
+        ),
+        'logs by level': lambda: sorted(
+            db.session.query(SystemLog.log_level, func.count(SystemLog.id))
+            .filter(*in_window(SystemLog.timestamp)).group_by(SystemLog.log_level).all()
+        )
+    }
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings)
+
+
+def run_layout(interval, args, end_time, windows):
+    """Seed one table layout and time its queries and retention"""
+    from app import db
+    from benchmarks.data import seed_database
+    from services.partition_service import apply_retention
+
+    os.environ['PARTITION_INTERVAL'] = interval
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+    start = time.perf_counter()
+    seed_database(args.traffic, args.logs, days=args.days, end_time=end_time)
+    seed_seconds = time.perf_counter() - start
+
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+
+    timings = {}
+    for window_name, (window_start, window_end) in windows.items():
+        for query_name, query in range_queries(window_start, window_end).items():
+            _, timings[(window_name, query_name)] = median_ms(query, args.repeat)
+
+    # Keep the newest half of the span
+    start = time.perf_counter()
+    pruned = apply_retention((datetime.utcnow() - end_time).days + args.days // 2)
+    retention_ms = (time.perf_counter() - start) * 1000
+
+    db.session.remove()
+    db.drop_all()
+    return timings, seed_seconds, retention_ms, pruned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--traffic', type=int, default=1000000)
+    parser.add_argument('--logs', type=int, default=200000)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--interval', choices=['day', 'week'], default='day')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    from app import app
+
+    end_time = datetime.utcnow().replace(microsecond=0)
+    windows = {
+        'last 30 days': (end_time - timedelta(days=30), end_time + timedelta(seconds=1)),
+        '30 days, 90 days back': (end_time - timedelta(days=120), end_time - timedelta(days=90))
+    }
+
+    with app.app_context():
+        plain = run_layout('none', args, end_time, windows)
+        partitioned = run_layout(args.interval, args, end_time, windows)
+
+    print(f"rows: {args.traffic} traffic, {args.logs} logs over {args.days} days; "
+          f"{args.interval} partitions")
+    print(f"{'query':<50} {'plain':>10} {'partitioned':>12}")
+    for key in plain[0]:
+        label = f'{key[0]}: {key[1]}'
+        print(f"{label:<50} {plain[0][key]:>7.1f} ms {partitioned[0][key]:>9.1f} ms "
+              f"({plain[0][key] / partitioned[0][key]:.1f}x)")
+    print(f"{'seed (s)':<50} {plain[1]:>9.1f} s {partitioned[1]:>10.1f} s")
+    print(f"{'retention, oldest half':<50} {plain[2]:>7.1f} ms {partitioned[2]:>9.1f} ms "
+          f"({plain[2] / partitioned[2]:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
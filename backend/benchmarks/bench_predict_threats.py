@@ -0,0 +1,114 @@
+"""
+Benchmark predict_threats against the original row-loading implementation
+
+Seeds a database with synthetic traffic and log rows spread over 7 days and
+reports the time and peak Python memory of both versions.
+tests/test_predict_threats.py checks they return the same predictions.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_predict_threats [--traffic N] [--logs N] [--database-url URL]
+"""
+import os
+import argparse
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+
+def legacy_predict_threats(hours=24):
+    """The original implementation: load every row as an ORM object and count in Python"""
+    from models.traffic_data import TrafficData
+    from models.system_log import SystemLog
+    from models.alert import Alert
+
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(days=7)
+
+    traffic_data = TrafficData.query.filter(TrafficData.timestamp >= start_time, TrafficData.timestamp <= end_time).all()
+    system_logs = SystemLog.query.filter(SystemLog.timestamp >= start_time, SystemLog.timestamp <= end_time).all()
+    Alert.query.filter(Alert.created_at >= start_time, Alert.created_at <= end_time).all()
+
+    ip_anomaly_count = {}
+    for td in traffic_data:
+        if td.is_anomalous:
+            ip_anomaly_count[td.source_ip] = ip_anomaly_count.get(td.source_ip, 0) + 1
+
+    potential_threats = []
+    for ip, count in ip_anomaly_count.items():
+        if count >= 3:
+            potential_threats.append({
+                "source": "network",
+                "target": ip,
+                "threat_type": "Suspicious Activity",
+                "confidence": min(count / 20, 0.95),
+                "threat_level": "high" if count >= 10 else "medium",
+                "details": f"IP {ip} has shown {count} anomalous activities in the past 7 days"
+            })
+
+    host_error_count = {}
+    for log in system_logs:
+        if log.is_anomalous:
+            host_error_count[log.host] = host_error_count.get(log.host, 0) + 1
+
+    for host, count in host_error_count.items():
+        if count >= 5:
+            potential_threats.append({
+                "source": "system",
+                "target": host,
+                "threat_type": "System Anomalies",
+                "confidence": min(count / 30, 0.9),
+                "threat_level": "high" if count >= 15 else "medium",
+                "details": f"Host {host} has shown {count} anomalous log entries in the past 7 days"
+            })
+
+    return potential_threats
+
+
+def measure(func, session):
+    """Return (result, seconds, peak MiB), timing and tracing memory in separate calls"""
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    session.expunge_all()
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    session.expunge_all()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--traffic', type=int, default=200000)
+    parser.add_argument('--logs', type=int, default=100000)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    from app import app, db
+    from services.ml_service import predict_threats
+    from benchmarks.data import seed_database
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_database(args.traffic, args.logs)
+
+        _, legacy_time, legacy_peak = measure(legacy_predict_threats, db.session)
+        current, current_time, current_peak = measure(predict_threats, db.session)
+
+        print(f"rows: {args.traffic} traffic, {args.logs} logs; predictions: {len(current)}")
+        print(f"row loading: {legacy_time * 1000:>8.0f} ms, peak {legacy_peak:>7.1f} MiB")
+        print(f"aggregates:  {current_time * 1000:>8.0f} ms, peak {current_peak:>7.1f} MiB "
+              f"({legacy_time / current_time:.1f}x faster)")
+
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
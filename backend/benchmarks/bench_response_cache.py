@@ -0,0 +1,140 @@
+"""
+Benchmark the dashboard and analysis read endpoints with and without the response cache
+
+Times each cached endpoint through the test client with the cache disabled
+and on a warm cache (tests/test_response_cache.py checks both return the
+same body), then replays a dashboard refresh workload with periodic ingest
+writes and reports the hit rate and the number of times each view ran under
+a burst of concurrent requests for a cold key.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_response_cache [--traffic N] [--logs N] [--alerts N]
+                                              [--requests N] [--redis-url URL]
+                                              [--database-url URL]
+"""
+import os
+import argparse
+import datetime
+import statistics
+import tempfile
+import threading
+import time
+
+ENDPOINTS = {
+    'summary': '/api/dashboard/summary?time_range=7d',
+    'recent-alerts': '/api/dashboard/recent-alerts?limit=50',
+    'threat-timeline': '/api/dashboard/threat-timeline?days=30',
+    'alert-statistics': '/api/alerts/statistics',
+    'predict-threats': '/api/analysis/predict-threats'
+}
+
+
+def median_ms(client, url, headers, requests):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+    return response, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--traffic', type=int, default=200000)
+    parser.add_argument('--logs', type=int, default=100000)
+    parser.add_argument('--alerts', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--redis-url')
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    if args.redis_url:
+        os.environ['REDIS_URL'] = args.redis_url
+        os.environ['RESPONSE_CACHE'] = 'redis'
+    else:
+        os.environ['RESPONSE_CACHE'] = 'memory'
+
+    import jwt
+    from app import app, db
+    from models.user import User
+    from services import response_cache
+    from services.rollup_service import backfill_rollups
+    from benchmarks.data import seed_database, generate_traffic_records
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_database(args.traffic, args.logs, args.alerts)
+        backfill_rollups()
+        user = User(username='bench', email='bench@example.com', password='x', role='admin')
+        db.session.add(user)
+        db.session.commit()
+        token = jwt.encode({
+            'user_id': user.id,
+            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        }, os.getenv('SECRET_KEY', 'dev_key'), algorithm='HS256')
+        headers = {'Authorization': 'Bearer ' + token}
+        client = app.test_client()
+        cache = response_cache.get_response_cache()
+
+        print(f"rows: {args.traffic} traffic, {args.logs} logs, {args.alerts} alerts; backend {cache.backend.name}")
+        print(f"{'endpoint':<20} {'no cache':>10} {'cache hit':>11}")
+        for name, url in ENDPOINTS.items():
+            os.environ[f"RESPONSE_CACHE_TTL_{name.upper().replace('-', '_')}"] = '0'
+            _, uncached_ms = median_ms(client, url, headers, max(args.requests // 10, 3))
+            del os.environ[f"RESPONSE_CACHE_TTL_{name.upper().replace('-', '_')}"]
+
+            client.get(url, headers=headers)
+            _, cached_ms = median_ms(client, url, headers, args.requests)
+            print(f"{name:<20} {uncached_ms:>7.1f} ms {cached_ms:>8.2f} ms ({uncached_ms / cached_ms:.0f}x)")
+
+        # A dashboard refresh requests every endpoint; one small ingest batch lands every 10 refreshes
+        response_cache.response_cache._counts.clear()
+        records = generate_traffic_records(20)
+        start = time.perf_counter()
+        for refresh in range(args.requests):
+            if refresh % 10 == 9:
+                if client.post('/api/analysis/network-traffic', json=records, headers=headers).status_code != 200:
+                    raise SystemExit("Ingest failed")
+            for url in ENDPOINTS.values():
+                client.get(url, headers=headers)
+        refresh_ms = (time.perf_counter() - start) * 1000 / args.requests
+        stats = cache.stats()['endpoints']
+        hits = sum(entry['hits'] for entry in stats.values())
+        served = sum(entry['hits'] + entry['misses'] + entry['waits'] + entry['bypasses'] for entry in stats.values())
+        print(f"refresh workload: {refresh_ms:.1f} ms per refresh, hit rate {hits / served:.0%} "
+              f"with an ingest batch every 10 refreshes")
+
+        # Cold key under a burst of concurrent requests: only one should run the view
+        calls = []
+
+        @response_cache.cached_response('summary', ('alerts', 'traffic', 'logs'))
+        def slow_view():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'ok': True}, 200
+
+        def burst(threads):
+            calls.clear()
+            response_cache.invalidate('alerts', 'traffic', 'logs')
+
+            def request_view():
+                with app.test_request_context('/burst'):
+                    slow_view()
+
+            workers = [threading.Thread(target=request_view) for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            return len(calls)
+
+        print(f"cold-key burst of 32 requests: view ran {burst(32)} time(s)")
+
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark the traffic rule engine against the per-record loop
+
+Reports records/sec for each batch size in --sizes, since request batches
+are usually hundreds to a few thousand records. tests/test_rule_engine.py
+checks the engine matches the per-record loop.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_rule_engine [--records N] [--sizes N,N,...] [--repeat R]
+"""
+import os
+import json
+import argparse
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import app  # noqa: F401 - initializes the database before the services import it
+from services.ml_service import analyze_network_traffic
+from services.rule_engine import TrafficRuleEngine
+from benchmarks.data import generate_traffic_records
+
+
+def best_of(func, repeat, number=1):
+    """Return the best wall-clock time of several runs, per call"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=50000, help='Records generated; batches are cut from them')
+    parser.add_argument('--sizes', default='10,100,1000,10000,50000', help='Batch sizes')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    records = generate_traffic_records(args.records)
+    engine = TrafficRuleEngine()
+
+    print(f"{'batch':>7} {'json + loop':>14} {'per-record':>14} {'engine':>14} {'speedup':>8}  (records/sec)")
+    for size in (int(size) for size in args.sizes.split(',')):
+        batch = records[:size]
+        # Run small batches many times so each timing covers roughly the same number of records
+        number = max(1, args.records // len(batch))
+        # The original loop also serialized every record before analyzing it
+        baseline_time = best_of(lambda: [(json.dumps(record), analyze_network_traffic(record)) for record in batch],
+                                args.repeat, number)
+        loop_time = best_of(lambda: [analyze_network_traffic(record) for record in batch], args.repeat, number)
+        engine_time = best_of(lambda: engine.analyze(batch), args.repeat, number)
+        print(f"{len(batch):>7} {len(batch) / baseline_time:>14,.0f} {len(batch) / loop_time:>14,.0f} "
+              f"{len(batch) / engine_time:>14,.0f} {loop_time / engine_time:>7.2f}x")
+    print(f"rule hits: {engine.stats()['rule_hits']}")
+
+
+if __name__ == '__main__':
+    main()
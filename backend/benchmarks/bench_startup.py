@@ -0,0 +1,160 @@
+"""
+Benchmark API startup: import time and per-worker memory with and without model preloading
+
+Times importing the app in a fresh interpreter with the ML libraries loaded
+lazily (the app as it is) and eagerly (torch and transformers imported
+first, as ml_service used to), then starts gunicorn with gunicorn.conf.py
+and --workers workers in three modes:
+
+- lazy: no model is loaded until a worker first classifies text
+- warmup: INFERENCE_WARMUP, every worker loads its own model as it boots
+- preload: INFERENCE_PRELOAD, the master loads the model once and the
+  workers share it copy-on-write
+
+For each mode it reports the time until every worker is ready, and the
+resident (RSS), proportional (PSS) and private (USS) memory of each worker;
+PSS summed over the master and workers is the memory the server really uses.
+
+Uses a randomly initialized local model shaped like DistilBERT base unless
+--model-path is given.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_startup [--workers N] [--profile default|optimized] [--model-path PATH]
+"""
+import os
+import argparse
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+IMPORT_SCRIPT = """
+import os, sys, time
+start = time.perf_counter()
+if sys.argv[1] == 'eager':
+    import torch, transformers
+import app
+seconds = time.perf_counter() - start
+with open('/proc/self/status') as status:
+    rss = next(int(line.split()[1]) for line in status if line.startswith('VmRSS:'))
+print(seconds, rss / 1024, 'torch' in sys.modules)
+"""
+
+
+def memory_mib(pid):
+    """Return (RSS, PSS, USS) of a process in MiB"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            fields = line.split()
+            if len(fields) == 3 and fields[2] == 'kB':
+                values[fields[0].rstrip(':')] = int(fields[1]) / 1024
+    return values['Rss'], values['Pss'], values['Private_Clean'] + values['Private_Dirty']
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(master, workers, port, timeout=600):
+    """Wait until the server answers and the workers' memory stops growing; return the elapsed seconds"""
+    start = time.perf_counter()
+    deadline = start + timeout
+    while True:
+        if master.poll() is not None or time.perf_counter() > deadline:
+            raise SystemExit('gunicorn exited or did not start')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health', timeout=1).read()
+            break
+        except OSError:
+            time.sleep(0.1)
+
+    # Workers that load a model keep growing after the first one answers
+    last, stable_since = None, time.perf_counter()
+    while time.perf_counter() - stable_since < 3 and time.perf_counter() < deadline:
+        pids = children(master.pid)
+        total = sum(memory_mib(pid)[0] for pid in pids) if len(pids) == workers else None
+        if total is None or last is None or abs(total - last) > 1:
+            last, stable_since = total, time.perf_counter()
+        time.sleep(0.2)
+    return stable_since - start
+
+
+def run_mode(mode, args, env):
+    port = free_port()
+    log = tempfile.TemporaryFile()
+    env = dict(env, INFERENCE_PRELOAD=str(mode == 'preload').lower(), INFERENCE_WARMUP=str(mode == 'warmup').lower())
+    master = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers),
+         '--worker-class', 'gthread', '--threads', '4', '--timeout', '600', 'app:app'],
+        env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    try:
+        try:
+            ready = wait_until_ready(master, args.workers, port)
+        except SystemExit:
+            log.seek(0)
+            print(log.read().decode()[-2000:])
+            raise
+        workers = [memory_mib(pid) for pid in children(master.pid)]
+        master_memory = memory_mib(master.pid)
+    finally:
+        master.terminate()
+        master.wait()
+
+    rss, pss, uss = (statistics.mean(values) for values in zip(*workers))
+    total_pss = master_memory[1] + sum(worker[1] for worker in workers)
+    print(f"{mode:<8} {ready:>7.1f} s {master_memory[0]:>9.0f} {rss:>9.0f} {pss:>9.0f} {uss:>9.0f} {total_pss:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--profile', default='default', help='INFERENCE_PROFILE for the workers')
+    parser.add_argument('--model-path')
+    parser.add_argument('--modes', default='lazy,warmup,preload')
+    parser.add_argument('--repeat', type=int, default=3, help='Import timings per variant')
+    args = parser.parse_args()
+
+    if args.model_path:
+        model_path = args.model_path
+    else:
+        from benchmarks.tiny_model import build_tiny_model
+        model_path = build_tiny_model(tempfile.mkdtemp(prefix='startup-model-'), dim=768, hidden_dim=3072,
+                                      n_layers=6, n_heads=12)
+
+    env = dict(
+        os.environ,
+        DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'),
+        MODEL_PATH=model_path,
+        INFERENCE_PROFILE=args.profile
+    )
+
+    print(f"{'import':<8} {'time':>9} {'RSS MiB':>9}  torch loaded")
+    for variant in ('lazy', 'eager'):
+        runs = []
+        for _ in range(args.repeat):
+            output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT, variant], env=env, capture_output=True,
+                                    text=True, check=True).stdout.split()
+            runs.append((float(output[-3]), float(output[-2]), output[-1]))
+        print(f"{variant:<8} {statistics.median(run[0] for run in runs):>7.2f} s "
+              f"{statistics.median(run[1] for run in runs):>9.0f}  {runs[0][2]}")
+
+    print(f"gunicorn: {args.workers} workers, profile {args.profile}, memory in MiB (worker columns are means)")
+    print(f"{'mode':<8} {'ready':>9} {'master':>9} {'RSS':>9} {'PSS':>9} {'USS':>9} {'total PSS':>10}")
+    for mode in args.modes.split(','):
+        run_mode(mode, args, env)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark the recent traffic buffer helpers against the equivalent SQL
+
+Seeds the traffic table with rows spread over the last --minutes minutes,
+loads the same rows into a RecentTrafficBuffer and times each query helper
+(per-minute anomaly counts, top sources, top anomalous sources, destination
+port histogram) for several window lengths on the buffer and with SQL,
+checking both return the same counts. Also reports the packing rate and
+the fixed memory per buffered record.
+
+Runs against a temporary SQLite file unless --database-url is given.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_traffic_buffer [--records N] [--minutes N] [--sources N] [--database-url URL]
+"""
+import os
+import argparse
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--minutes', type=int, default=15, help='Minutes the seeded rows are spread over')
+    parser.add_argument('--sources', type=int, default=10000, help='Distinct source IPs')
+    parser.add_argument('--windows', default='1,5,15')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    # The buffer is filled by hand below
+    os.environ['RECENT_TRAFFIC_BUFFER'] = 'false'
+
+    import numpy as np
+    from app import app, db
+    from models.traffic_data import TrafficData
+    from services.traffic_buffer import RecentTrafficBuffer, DatabaseWindow, TRAFFIC_DTYPE
+    from benchmarks.data import seed_database
+
+    columns = ['source_ip', 'destination_ip', 'source_port', 'destination_port', 'protocol',
+               'packet_size', 'timestamp', 'is_anomalous', 'anomaly_score']
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        end = datetime.utcnow()
+        seed_database(args.records, 0, ip_cardinality=args.sources, days=args.minutes / 1440, end_time=end)
+
+        buffer = RecentTrafficBuffer(args.records)
+        buffer.started_at = np.datetime64(end - timedelta(minutes=args.minutes + 1), 'us')
+        rows = [dict(zip(columns, row)) for row in db.session.query(*[getattr(TrafficData, c) for c in columns])]
+        start = time.perf_counter()
+        for offset in range(0, len(rows), 1000):
+            buffer.append(buffer.pack(rows[offset:offset + 1000]))
+        pack_seconds = time.perf_counter() - start
+        del rows
+
+        print(f"database: {os.environ['DATABASE_URL'].split(':')[0]}, {args.records} rows over {args.minutes} minutes "
+              f"from {args.sources} sources")
+        print(f"buffer:   {TRAFFIC_DTYPE.itemsize} bytes per record, {buffer.stats()['memory_bytes'] / 2**20:.0f} MiB; "
+              f"pack + append {args.records / pack_seconds:,.0f} records/s")
+        print(f"{'window':>7} {'helper':<22} {'rows':>9} {'sql':>10} {'buffer':>10} {'speedup':>8}  match")
+
+        helpers = [
+            ('minute_counts', lambda window: window.minute_counts(), lambda result: result),
+            ('top_sources(10)', lambda window: window.top_sources(10), lambda result: [c for _, c in result]),
+            ('top_anomalous(10)', lambda window: window.top_sources(10, anomalous_only=True), lambda result: [c for _, c in result]),
+            ('top_ports(10)', lambda window: window.top_ports(10), lambda result: sorted(result))
+        ]
+        for minutes in map(float, args.windows.split(',')):
+            window_start = end - timedelta(minutes=minutes)
+            sql_window = DatabaseWindow(window_start, end)
+            snapshot, snapshot_ms = median_ms(lambda: buffer.window(window_start, end), args.repeat)
+            window_rows = len(snapshot.columns['timestamp'])
+            print(f"{minutes:>6g}m {'window snapshot':<22} {window_rows:>9} {'':>10} {snapshot_ms:>7.1f} ms")
+
+            for name, helper, comparable in helpers:
+                sql_result, sql_ms = median_ms(lambda: helper(sql_window), args.repeat)
+                # Time the snapshot together with the helper, as a request pays for both
+                buffer_result, buffer_ms = median_ms(lambda: helper(buffer.window(window_start, end)), args.repeat)
+                match = comparable(sql_result) == comparable(buffer_result)
+                print(f"{minutes:>6g}m {name:<22} {window_rows:>9} {sql_ms:>7.1f} ms {buffer_ms:>7.1f} ms "
+                      f"{sql_ms / buffer_ms:>7.1f}x  {match}")
+
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
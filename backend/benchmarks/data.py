@@ -0,0 +1,173 @@
+import random
+from datetime import datetime, timedelta
+
+PROTOCOLS = ['TCP', 'UDP', 'ICMP', 'HTTP', 'HTTPS', 'DNS']
+COMMON_PORTS = [53, 80, 123, 443, 993, 8080]
+SUSPICIOUS_PORTS = [22, 23, 25, 445, 3389, 4444, 5900]
+
+
+def source_ip(index):
+    """Map an integer to a distinct private IPv4 address"""
+    return f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"
+
+
+def generate_traffic_records(count, seed=42, anomaly_rate=0.05, ip_cardinality=1000):
+    """
+    Generate seeded synthetic traffic records
+
+    Args:
+        count (int): Number of records to generate
+        seed (int): Random seed
+        anomaly_rate (float): Fraction of records that hit a detection rule
+        ip_cardinality (int): Number of distinct source IPs
+
+    Returns:
+        list: List of traffic record dictionaries
+    """
+    rng = random.Random(seed)
+    start_time = datetime.utcnow() - timedelta(hours=1)
+    records = []
+
+    for i in range(count):
+        anomalous = rng.random() < anomaly_rate
+        records.append({
+            'source_ip': source_ip(rng.randrange(ip_cardinality)),
+            'destination_ip': f"192.168.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+            'source_port': rng.randrange(1024, 65536),
+            'destination_port': rng.choice(SUSPICIOUS_PORTS) if anomalous and rng.random() < 0.5 else rng.choice(COMMON_PORTS),
+            'protocol': rng.choice(PROTOCOLS),
+            'packet_size': rng.randrange(10001, 65536) if anomalous and rng.random() < 0.5 else rng.randrange(40, 1500),
+            'timestamp': (start_time + timedelta(milliseconds=i)).isoformat()
+        })
+
+    return records
+
+LOG_LEVELS = ['INFO', 'INFO', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
+LOG_SOURCES = ['sshd', 'nginx', 'kernel', 'postgres', 'auth', 'cron']
+NORMAL_MESSAGES = [
+    'Accepted publickey for deploy from {ip} port {port}',
+    'GET /api/health 200 {port}ms',
+    'Connection closed by {ip}',
+    'Started session {port} of user deploy',
+    'checkpoint complete: wrote {port} buffers',
+    'Job {port} finished successfully'
+]
+ANOMALOUS_MESSAGES = [
+    'Failed login for root from {ip} port {port}',
+    'Authentication failure for user admin from {ip}',
+    'Permission denied (publickey) for {ip}',
+    'Possible SQL injection attempt in request from {ip}',
+    'Process {port} terminated with fatal error',
+    'Unhandled exception in worker {port}',
+    'Disk usage critical on /var ({port}%)'
+]
+
+
+def generate_log_records(count, seed=42, anomaly_rate=0.05, host_cardinality=100):
+    """
+    Generate seeded synthetic system log records
+
+    Args:
+        count (int): Number of records to generate
+        seed (int): Random seed
+        anomaly_rate (float): Fraction of records with a suspicious message
+        host_cardinality (int): Number of distinct hosts
+
+    Returns:
+        list: List of log record dictionaries
+    """
+    rng = random.Random(seed)
+    start_time = datetime.utcnow() - timedelta(hours=1)
+    records = []
+
+    for i in range(count):
+        template = rng.choice(ANOMALOUS_MESSAGES if rng.random() < anomaly_rate else NORMAL_MESSAGES)
+        records.append({
+            'log_level': rng.choice(LOG_LEVELS),
+            'source': rng.choice(LOG_SOURCES),
+            'message': template.format(ip=f"10.0.{rng.randrange(256)}.{rng.randrange(1, 255)}", port=rng.randrange(1, 65536)),
+            'timestamp': (start_time + timedelta(milliseconds=i)).isoformat(),
+            'host': f"host-{rng.randrange(host_cardinality):03d}"
+        })
+
+    return records
+
+
+def seed_database(traffic_count, log_count, alert_count=0, seed=42, anomaly_rate=0.05, ip_cardinality=1000,
+                  host_cardinality=100, days=7, chunk_size=5000, end_time=None):
+    """
+    Insert seeded traffic and log rows spread evenly over the last few days
+
+    Rows are written directly with their analysis columns set (anomalous with
+    probability anomaly_rate) so large tables can be built quickly. Must be
+    called inside an application context; commits the session.
+
+    Args:
+        traffic_count (int): Number of traffic rows
+        log_count (int): Number of log rows
+        alert_count (int): Number of alert rows
+        seed (int): Random seed
+        anomaly_rate (float): Fraction of anomalous rows
+        ip_cardinality (int): Number of distinct source IPs
+        host_cardinality (int): Number of distinct hosts
+        days (int): Number of days the rows are spread over
+        chunk_size (int): Rows generated and inserted at a time
+        end_time (datetime): Newest timestamp (defaults to now)
+    """
+    from app import db
+    from models.traffic_data import TrafficData
+    from models.system_log import SystemLog
+    from models.alert import Alert
+    from services.ingest_service import insert_rows
+
+    rng = random.Random(seed)
+    end_time = end_time or datetime.utcnow()
+    span = timedelta(days=days).total_seconds()
+
+    def traffic_row(i):
+        anomalous = rng.random() < anomaly_rate
+        return {
+            'source_ip': source_ip(rng.randrange(ip_cardinality)),
+            'destination_ip': f"192.168.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+            'source_port': rng.randrange(1024, 65536),
+            'destination_port': rng.choice(COMMON_PORTS),
+            'protocol': rng.choice(PROTOCOLS),
+            'packet_size': rng.randrange(40, 1500),
+            'timestamp': end_time - timedelta(seconds=span * (1 - i / max(traffic_count, 1))),
+            'is_anomalous': anomalous,
+            'anomaly_score': 0.8 if anomalous else 0.0,
+            'anomaly_type': 'Large Packet Size' if anomalous else None,
+            'raw_data': '{}'
+        }
+
+    def log_row(i):
+        anomalous = rng.random() < anomaly_rate
+        return {
+            'log_level': rng.choice(LOG_LEVELS),
+            'source': rng.choice(LOG_SOURCES),
+            'message': rng.choice(ANOMALOUS_MESSAGES if anomalous else NORMAL_MESSAGES),
+            'timestamp': end_time - timedelta(seconds=span * (1 - i / max(log_count, 1))),
+            'host': f"host-{rng.randrange(host_cardinality):03d}",
+            'is_anomalous': anomalous,
+            'anomaly_score': 0.8 if anomalous else 0.0,
+            'anomaly_type': 'Security Keyword Detected' if anomalous else None,
+            'raw_data': '{}'
+        }
+
+    def alert_row(i):
+        source = rng.choice(['network', 'system'])
+        return {
+            'title': f"{source.title()} Anomaly",
+            'description': 'Synthetic alert',
+            'severity': rng.choice(['high', 'medium', 'medium', 'low']),
+            'source': source,
+            'is_resolved': rng.random() < 0.5,
+            'details': '{}',
+            'created_at': end_time - timedelta(seconds=span * rng.random())
+        }
+
+    tables = ((TrafficData, traffic_count, traffic_row), (SystemLog, log_count, log_row), (Alert, alert_count, alert_row))
+    for model, count, build_row in tables:
+        for start in range(0, count, chunk_size):
+            insert_rows(model, [build_row(i) for i in range(start, min(count, start + chunk_size))], mode='bulk')
+            db.session.commit()
@@ -0,0 +1,59 @@
+import os
+from transformers import DistilBertTokenizerFast, DistilBertConfig, DistilBertForSequenceClassification
+
+# Small vocabulary covering the synthetic log messages well enough to exercise tokenization
+VOCAB = [
+    '[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]',
+    'failed', 'login', 'for', 'root', 'from', 'port', 'authentication', 'failure',
+    'user', 'admin', 'permission', 'denied', 'possible', 'sql', 'injection', 'attempt',
+    'in', 'request', 'process', 'terminated', 'with', 'fatal', 'error', 'unhandled',
+    'exception', 'worker', 'disk', 'usage', 'critical', 'on', 'accepted', 'publickey',
+    'deploy', 'get', 'api', 'health', 'connection', 'closed', 'by', 'started', 'session',
+    'of', 'checkpoint', 'complete', 'wrote', 'buffers', 'job', 'finished', 'successfully'
+] + [str(i) for i in range(10)] + list('abcdefghijklmnopqrstuvwxyz./:()%-_')
+
+
+def build_tiny_model(directory, seed=0, dim=64, hidden_dim=128, n_layers=2, n_heads=2):
+    """
+    Save a small randomly initialized DistilBERT classifier and tokenizer
+
+    The result loads with from_pretrained(directory), so MODEL_PATH can point at
+    it for benchmarks without downloading anything.
+
+    Args:
+        directory (str): Output directory
+        seed (int): Seed for the random weights
+        dim (int): Hidden size (DistilBERT base uses 768)
+        hidden_dim (int): Feed-forward size (DistilBERT base uses 3072)
+        n_layers (int): Transformer layers (DistilBERT base uses 6)
+        n_heads (int): Attention heads per layer
+
+    Returns:
+        str: The output directory
+    """
+    import torch
+
+    os.makedirs(directory, exist_ok=True)
+    vocab_file = os.path.join(directory, 'vocab.txt')
+    with open(vocab_file, 'w') as f:
+        f.write('\n'.join(VOCAB) + '\n')
+
+    tokenizer = DistilBertTokenizerFast(vocab_file=vocab_file, do_lower_case=True)
+
+    torch.manual_seed(seed)
+    config = DistilBertConfig(
+        vocab_size=len(VOCAB),
+        dim=dim,
+        hidden_dim=hidden_dim,
+        n_layers=n_layers,
+        n_heads=n_heads,
+        max_position_embeddings=128,
+        num_labels=2,
+        id2label={0: 'NORMAL', 1: 'ANOMALOUS'},
+        label2id={'NORMAL': 0, 'ANOMALOUS': 1}
+    )
+    model = DistilBertForSequenceClassification(config)
+
+    tokenizer.save_pretrained(directory)
+    model.save_pretrained(directory)
+    return directory
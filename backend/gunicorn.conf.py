@@ -0,0 +1,65 @@
+"""
+Gunicorn settings read from the working directory; command-line flags (see the Dockerfile) take precedence
+
+By default the classification model is loaded by each worker the first time
+it classifies text, so workers start without importing torch. Set
+INFERENCE_PRELOAD=true to load and warm up the model once in the master
+before the workers fork: they share its weights copy-on-write and start
+their inference servers as they boot. INFERENCE_WARMUP=true instead loads
+the model in every worker as it boots, without sharing. The number of
+workers comes from WEB_CONCURRENCY.
+
+Each worker runs GUNICORN_THREADS threads (default 256). Alert stream
+subscribers hold a thread each (up to ALERT_STREAM_MAX_SUBSCRIBERS) but no
+database connection, so unless DATABASE_POOL_SIZE and DATABASE_MAX_OVERFLOW
+are set, the pool is sized to give every other thread a connection.
+WEB_CONCURRENCY times that must stay below the database's max_connections.
+"""
+import os
+import gc
+import tempfile
+
+
+def _enabled(name):
+    return os.getenv(name, 'false').lower() in ('1', 'true', 'yes')
+
+
+# Import the app in the master so the model it loads is inherited by the workers
+preload_app = _enabled('INFERENCE_PRELOAD')
+
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 256))
+
+# Request threads plus the job workers may all hold a connection at once; read by the app as it is imported
+_connections = max(threads - int(os.getenv('ALERT_STREAM_MAX_SUBSCRIBERS', 200)), 1) + int(os.getenv('JOB_WORKERS', 2))
+if not os.getenv('DATABASE_URL', '').startswith('sqlite'):
+    os.environ.setdefault('DATABASE_POOL_SIZE', str(min(_connections, 20)))
+    os.environ.setdefault('DATABASE_MAX_OVERFLOW', str(max(_connections - 20, 0)))
+
+
+# Workers add up their metrics through a directory that starts empty with every master; child_exit folds in exited ones
+if int(os.getenv('WEB_CONCURRENCY', 1)) > 1:
+    os.environ.setdefault('METRICS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='metrics-'))
+
+
+def when_ready(server):
+    """Load the model in the master once the app is imported, before any worker forks"""
+    if preload_app:
+        from services import ml_service
+        ml_service.preload_model()
+        # Objects created so far are never collected, so the collector does not write to (and unshare) their pages
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    """Start the worker's inference server before it accepts requests"""
+    if preload_app or _enabled('INFERENCE_WARMUP'):
+        from services import ml_service
+        ml_service.get_inference_server()
+
+
+def child_exit(server, worker):
+    """Fold an exited worker's metrics into the exited processes' totals so its snapshot file goes away"""
+    if os.getenv('METRICS_MULTIPROC_DIR'):
+        from services import metrics
+        metrics.merge_exited_processes()
@@ -16,9 +16,27 @@ class Alert(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime)
     
+    # Coalescing: repeated occurrences with the same fingerprint fold into one open alert
+    fingerprint = db.Column(db.String(255))  # source|anomaly type|source IP or host|severity
+    occurrences = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    first_seen = db.Column(db.DateTime)
+    last_seen = db.Column(db.DateTime)
+    
     # Relationships
     resolver = db.relationship('User', backref='resolved_alerts', lazy=True)
     
+    # Covering index for the grouped counts behind the alert statistics,
+    # (created_at, id) indexes matching the listing's keyset order under each
+    # filter, and the lookup of open aggregates by fingerprint
+    __table_args__ = (
+        db.Index('ix_alerts_fingerprint_resolved_last_seen', 'fingerprint', 'is_resolved', 'last_seen'),
+        db.Index('ix_alerts_severity_source_resolved', 'severity', 'source', 'is_resolved'),
+        db.Index('ix_alerts_created_at_id', 'created_at', 'id'),
+        db.Index('ix_alerts_severity_created_at_id', 'severity', 'created_at', 'id'),
+        db.Index('ix_alerts_source_created_at_id', 'source', 'created_at', 'id'),
+        db.Index('ix_alerts_severity_source_created_at_id', 'severity', 'source', 'created_at', 'id')
+    )
+    
     def __repr__(self):
         return f'<Alert {self.id}: {self.title}>'
     
@@ -34,5 +52,8 @@ class Alert(db.Model):
             'resolved_by': self.resolved_by,
             'details': self.details,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'occurrences': self.occurrences,
+            'first_seen': self.first_seen.isoformat() if self.first_seen else None,
+            'last_seen': self.last_seen.isoformat() if self.last_seen else None
         }
@@ -0,0 +1,27 @@
+from app import db
+
+class MetricRollup(db.Model):
+    """Pre-aggregated record counts per time bucket, used by the dashboard endpoints"""
+    __tablename__ = 'metric_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)  # Options: minute, hour
+    kind = db.Column(db.String(20), nullable=False)  # Options: alert, traffic, log
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    
+    # Dimensions (empty string when not applicable, so they can be part of the unique key)
+    severity = db.Column(db.String(20), nullable=False, default='')  # Alert severity
+    source = db.Column(db.String(50), nullable=False, default='')  # Alert or log source
+    is_anomalous = db.Column(db.Boolean, nullable=False, default=False)
+    
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint(
+            'granularity', 'kind', 'bucket_start', 'severity', 'source', 'is_anomalous',
+            name='uq_metric_rollups_bucket'
+        ),
+    )
+    
+    def __repr__(self):
+        return f'<MetricRollup {self.granularity} {self.kind} {self.bucket_start}: {self.count}>'
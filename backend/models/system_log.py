@@ -9,7 +9,7 @@ class SystemLog(db.Model):
     log_level = db.Column(db.String(20))  # INFO, WARNING, ERROR, CRITICAL, etc.
     source = db.Column(db.String(50))  # Application or service that generated the log
     message = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     host = db.Column(db.String(100))  # Hostname or IP of the system
     
     # Analysis results
@@ -20,6 +20,17 @@ class SystemLog(db.Model):
     # Raw data for further analysis
     raw_data = db.Column(db.Text)  # JSON string with full log data
     
+    # Partial index over anomalous rows only, used by the per-host anomaly counts in predict_threats
+    __table_args__ = (
+        db.Index(
+            'ix_system_logs_anomalous_timestamp', 'is_anomalous', 'timestamp', 'host',
+            postgresql_where=is_anomalous.is_(True),
+            sqlite_where=is_anomalous.is_(True)
+        ),
+        # Range-partitioned by timestamp when PARTITION_INTERVAL is set (see services.partition_service)
+        {'info': {'partition_column': 'timestamp'}}
+    )
+    
     def __repr__(self):
         return f'<SystemLog {self.id}: {self.source} - {self.log_level}>'
     
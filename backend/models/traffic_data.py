@@ -12,7 +12,7 @@ class TrafficData(db.Model):
     destination_port = db.Column(db.Integer)
     protocol = db.Column(db.String(20))  # TCP, UDP, ICMP, etc.
     packet_size = db.Column(db.Integer)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Analysis results
     is_anomalous = db.Column(db.Boolean, default=False)
@@ -22,6 +22,17 @@ class TrafficData(db.Model):
     # Raw data for further analysis
     raw_data = db.Column(db.Text)  # JSON string with full packet data
     
+    # Partial index over anomalous rows only, used by the per-source-IP anomaly counts in predict_threats
+    __table_args__ = (
+        db.Index(
+            'ix_traffic_data_anomalous_timestamp', 'is_anomalous', 'timestamp', 'source_ip',
+            postgresql_where=is_anomalous.is_(True),
+            sqlite_where=is_anomalous.is_(True)
+        ),
+        # Range-partitioned by timestamp when PARTITION_INTERVAL is set (see services.partition_service)
+        {'info': {'partition_column': 'timestamp'}}
+    )
+    
     def __repr__(self):
         return f'<TrafficData {self.id}: {self.source_ip} -> {self.destination_ip}>'
     
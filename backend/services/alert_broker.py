@@ -0,0 +1,431 @@
+import os
+import json
+import time
+import threading
+from collections import Counter
+from datetime import timedelta
+import redis
+from sqlalchemy import and_, event, or_
+from sqlalchemy.orm import Session
+from app import db
+from models.alert import Alert
+
+# Session.info key holding alert events waiting for the transaction to commit
+_PENDING_KEY = 'alert_broker_events'
+
+# Redis channel the alert events of every process are published on
+_CHANNEL = 'alerts:events'
+
+
+def get_buffer_size():
+    """Get the number of recent events kept for subscribers that fall behind"""
+    return int(os.getenv('ALERT_STREAM_BUFFER', 10000))
+
+
+def get_max_subscribers():
+    """
+    Get the most concurrent stream subscribers per process
+
+    Every subscriber holds a server thread, so this has to stay below the
+    worker's thread count to leave threads for ordinary requests.
+    """
+    return int(os.getenv('ALERT_STREAM_MAX_SUBSCRIBERS', 200))
+
+
+def get_heartbeat_seconds():
+    """Get the idle time after which a keepalive comment is sent"""
+    return float(os.getenv('ALERT_STREAM_HEARTBEAT', 15))
+
+
+def get_max_stream_seconds():
+    """Get how long a stream stays open before the client has to reconnect (and authenticate again)"""
+    return float(os.getenv('ALERT_STREAM_MAX_SECONDS', 600))
+
+
+def get_replay_grace_seconds():
+    """
+    Get how far before a resuming client's last seen alert the replay looks for alerts it missed
+
+    Alert ids are assigned when a transaction inserts its alerts, not when it
+    commits, so an alert with a lower id than the last one a client saw can
+    still commit after it. This should exceed the longest ingest transaction.
+    """
+    return float(os.getenv('ALERT_STREAM_REPLAY_GRACE', 60))
+
+
+def get_replay_limit():
+    """Get the most missed alerts replayed to a resuming client before it is told to reload instead"""
+    return int(os.getenv('ALERT_STREAM_REPLAY_LIMIT', 500))
+
+
+def format_event(name, data, event_id=None):
+    """
+    Encode one server-sent event
+
+    Args:
+        name (str): Event name
+        data (dict): JSON payload
+        event_id (int): Alert id clients resume from, for alert events
+
+    Returns:
+        bytes: The encoded event
+    """
+    lines = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{lines}event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def alert_event(alert_id, row):
+    """Build the 'alert' event for a new alert from its column values"""
+    return ('alert', alert_id, {
+        'id': alert_id,
+        'title': row['title'],
+        'description': row['description'],
+        'severity': row['severity'],
+        'source': row['source'],
+        'occurrences': row.get('occurrences') or 1,
+        'created_at': row['created_at'].isoformat()
+    })
+
+
+class AlertBroker:
+    """
+    In-process fan-out of alert events to stream subscribers
+
+    Events are encoded once and written to a ring buffer under increasing
+    sequence numbers; each subscriber only keeps its cursor and waits on a
+    shared condition, so publishing costs the same however many subscribers
+    are connected. A subscriber that falls more than the buffer size behind
+    gets a 'reset' event telling it to reload instead of the events it missed.
+
+    Only subscribers in this process see the events, so with several worker
+    processes the Redis broker is needed.
+    """
+
+    name = 'memory'
+
+    def __init__(self, buffer_size, max_subscribers):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._ring = [None] * buffer_size
+        self._seq = 0
+        self._condition = threading.Condition()
+        self.subscribers = 0
+        self._counts = Counter()
+
+    def subscribe(self):
+        """
+        Register a subscriber
+
+        Returns:
+            int: The subscriber's starting cursor, or None when the process is at its subscriber limit
+        """
+        with self._condition:
+            if self.subscribers >= self.max_subscribers:
+                self._counts['rejected'] += 1
+                return None
+            self.subscribers += 1
+            self._counts['subscribed'] += 1
+            return self._seq
+
+    def unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
+
+    def publish(self, events):
+        """
+        Publish events to every subscriber
+
+        Args:
+            events (list): List of (name, alert id or None, data) tuples
+        """
+        self.deliver(events)
+
+    def deliver(self, events):
+        """Encode events and hand them to this process's subscribers"""
+        # Resuming clients replay from the table, so nothing needs buffering without subscribers
+        if not self.subscribers:
+            return
+        encoded = [(alert_id, format_event(name, data, alert_id if name == 'alert' else None))
+                   for name, alert_id, data in events]
+        with self._condition:
+            for entry in encoded:
+                self._seq += 1
+                self._ring[self._seq % self.buffer_size] = entry
+            self._counts['delivered'] += len(encoded)
+            self._condition.notify_all()
+
+    def read(self, cursor, timeout):
+        """
+        Wait for events after cursor
+
+        Args:
+            cursor (int): Sequence number of the last event the subscriber saw
+            timeout (float): Longest wait in seconds
+
+        Returns:
+            tuple: (new cursor, list of (alert id, encoded event), whether events were lost)
+        """
+        with self._condition:
+            if self._seq == cursor:
+                self._condition.wait(timeout)
+            latest = self._seq
+            if latest - cursor > self.buffer_size:
+                self._counts['resets'] += 1
+                return latest, [], True
+            return latest, [self._ring[seq % self.buffer_size] for seq in range(cursor + 1, latest + 1)], False
+
+    def stream(self, cursor, replayed, replayed_ids):
+        """
+        Generate a subscriber's event stream
+
+        Args:
+            cursor (int): Cursor returned by subscribe
+            replayed (list): Encoded events sent first
+            replayed_ids (set): Alert ids already sent; their live alert events are skipped
+
+        Yields:
+            bytes: Encoded events and keepalive comments
+        """
+        # Sets the client's reconnection delay and flushes the headers
+        yield b"retry: 3000\n\n" + b"".join(replayed)
+
+        heartbeat = get_heartbeat_seconds()
+        deadline = time.monotonic() + get_max_stream_seconds()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+
+            cursor, entries, lost = self.read(cursor, min(heartbeat, remaining))
+            if lost:
+                yield format_event('reset', {'reason': 'behind'})
+            chunks = [chunk for alert_id, chunk in entries if alert_id is None or alert_id not in replayed_ids]
+            if chunks:
+                yield b"".join(chunks)
+            elif not lost:
+                yield b": keepalive\n\n"
+
+    def stats(self):
+        """
+        Get subscriber and delivery counters for this process
+
+        Returns:
+            dict: backend, subscribers, max_subscribers, subscribed, rejected,
+            delivered (events written to the ring) and resets (subscribers that fell behind)
+        """
+        with self._condition:
+            counts = Counter(self._counts)
+            subscribers = self.subscribers
+        return {
+            'backend': self.name,
+            'subscribers': subscribers,
+            'max_subscribers': self.max_subscribers,
+            'subscribed': counts['subscribed'],
+            'rejected': counts['rejected'],
+            'delivered': counts['delivered'],
+            'resets': counts['resets']
+        }
+
+
+class RedisAlertBroker(AlertBroker):
+    """
+    Alert broker fanned out across processes with Redis pub/sub
+
+    Each process publishes its committed events on one channel and runs a
+    single listener thread that hands every message to its own subscribers,
+    so Redis sees one subscription per process rather than per client. When
+    publishing fails the events still reach this process's subscribers;
+    after the listener reconnects its subscribers get a 'reset' event since
+    messages sent in between are lost.
+    """
+
+    name = 'redis'
+
+    def __init__(self, client, buffer_size, max_subscribers):
+        super().__init__(buffer_size, max_subscribers)
+        self.client = client
+        self._listener = threading.Thread(target=self._listen, name='alert-broker-listener', daemon=True)
+        self._listener.start()
+
+    def publish(self, events):
+        try:
+            self.client.publish(_CHANNEL, json.dumps(events))
+        except redis.RedisError as e:
+            print(f"Alert broker: publish failed ({e}), delivering to this process only")
+            self.deliver(events)
+
+    def _listen(self):
+        connected_before = False
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(_CHANNEL)
+                if connected_before:
+                    self.deliver([('reset', None, {'reason': 'reconnected'})])
+                connected_before = True
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self.deliver(json.loads(message['data']))
+            except redis.RedisError as e:
+                print(f"Alert broker: Redis listener failed ({e}), reconnecting")
+            finally:
+                # Release the failed subscription's connection before opening another
+                pubsub.close()
+            time.sleep(1)
+
+
+def _create_broker():
+    """
+    Create the broker selected by ALERT_STREAM
+
+    'redis' uses REDIS_URL, 'memory' fans out within the process, 'none'
+    disables the stream. The default, 'auto', uses Redis when REDIS_URL is
+    set and falls back to memory when Redis cannot be reached.
+    """
+    setting = os.getenv('ALERT_STREAM', 'auto').lower()
+    if setting == 'none':
+        return None
+    buffer_size, max_subscribers = get_buffer_size(), get_max_subscribers()
+
+    redis_url = os.getenv('REDIS_URL')
+    if setting in ('auto', 'redis') and redis_url:
+        # The socket timeout has to outlast the listener's polling interval
+        client = redis.Redis.from_url(redis_url, socket_timeout=5, socket_connect_timeout=0.5, decode_responses=True)
+        try:
+            client.ping()
+            return RedisAlertBroker(client, buffer_size, max_subscribers)
+        except redis.RedisError as e:
+            print(f"Alert broker: Redis unavailable ({e}), using the in-process broker")
+
+    return AlertBroker(buffer_size, max_subscribers)
+
+
+alert_broker = None
+_initialized = False
+_alert_broker_lock = threading.Lock()
+
+
+def get_alert_broker():
+    """Get the process-wide alert broker, or None when the stream is disabled"""
+    global alert_broker, _initialized
+
+    with _alert_broker_lock:
+        if not _initialized:
+            alert_broker = _create_broker()
+            _initialized = True
+    return alert_broker
+
+
+def replay_events(after_id):
+    """
+    Encode the alerts a resuming client may have missed
+
+    These are the alerts after its last seen alert, plus the lower ids
+    created up to ALERT_STREAM_REPLAY_GRACE seconds before it, which may
+    have committed after the client saw it. Clients ignore alert ids they
+    already have.
+
+    Args:
+        after_id (int): Last alert id the client saw
+
+    Returns:
+        tuple: (list of encoded events, set of the alert ids sent). When more
+        than ALERT_STREAM_REPLAY_LIMIT alerts were missed a single 'reset'
+        event is returned instead.
+    """
+    limit = get_replay_limit()
+    missed = Alert.id > after_id
+    last_seen = db.session.get(Alert, after_id)
+    if last_seen is not None:
+        grace_start = last_seen.created_at - timedelta(seconds=get_replay_grace_seconds())
+        missed = or_(missed, and_(Alert.id < after_id, Alert.created_at >= grace_start))
+    alerts = Alert.query.filter(missed).order_by(Alert.id).limit(limit + 1).all()
+    if len(alerts) > limit:
+        return [format_event('reset', {'reason': 'replay_limit'})], set()
+
+    events = [alert_event(alert.id, {
+        'title': alert.title,
+        'description': alert.description,
+        'severity': alert.severity,
+        'source': alert.source,
+        'occurrences': alert.occurrences,
+        'created_at': alert.created_at
+    }) for alert in alerts]
+    return [format_event(name, data, alert_id) for name, alert_id, data in events], {alert.id for alert in alerts}
+
+
+def _pending():
+    """Get the events and counter deltas pending on the current session's transaction"""
+    return db.session.info.setdefault(_PENDING_KEY, {'events': [], 'created': Counter(), 'resolved': Counter(), 'occurrences': 0})
+
+
+def queue_alerts_created(alert_rows, ids):
+    """
+    Publish new alerts once the current transaction commits
+
+    Args:
+        alert_rows (list): Inserted alert column dictionaries
+        ids (list): Their ids, in the same order
+    """
+    if get_alert_broker() is None:
+        return
+    pending = _pending()
+    for alert_id, row in zip(ids, alert_rows):
+        pending['events'].append(alert_event(alert_id, row))
+        pending['created'][row['severity']] += 1
+        pending['occurrences'] += row.get('occurrences') or 1
+
+
+def queue_alert_updates(updates):
+    """
+    Publish occurrences added to open aggregate alerts once the current transaction commits
+
+    Args:
+        updates (list): Dictionaries with alert_id, added and new_last_seen
+    """
+    if get_alert_broker() is None:
+        return
+    pending = _pending()
+    for update in updates:
+        pending['events'].append(('alert_update', None, {
+            'id': update['alert_id'],
+            'added': update['added'],
+            'last_seen': update['new_last_seen'].isoformat()
+        }))
+        pending['occurrences'] += update['added']
+
+
+def queue_alert_resolved(alert):
+    """
+    Publish an alert's resolution once the current transaction commits
+
+    Call before setting is_resolved so alerts that were already resolved are not published again.
+
+    Args:
+        alert (Alert): Alert about to be resolved
+    """
+    if get_alert_broker() is None or alert.is_resolved:
+        return
+    pending = _pending()
+    pending['events'].append(('alert_resolved', None, {'id': alert.id, 'severity': alert.severity, 'source': alert.source}))
+    pending['resolved'][alert.severity] += 1
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_pending_events(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending or alert_broker is None:
+        return
+    # Dashboard counters apply the deltas instead of refetching the summary
+    counters = {
+        'created': dict(pending['created']),
+        'resolved': dict(pending['resolved']),
+        'occurrences': pending['occurrences']
+    }
+    alert_broker.publish(pending['events'] + [('counters', None, counters)])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_events(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,231 @@
+import os
+import threading
+from collections import Counter
+from datetime import timedelta
+from sqlalchemy import bindparam, event, func, update
+from sqlalchemy.orm import Session
+from app import db
+from models.alert import Alert
+from services.alert_broker import queue_alert_updates
+
+# Session.info key holding coalescing counters waiting for the transaction to commit
+_PENDING_KEY = 'alert_coalescing_counts'
+
+# Fingerprints looked up per query
+_LOOKUP_CHUNK = 1000
+
+
+def get_window_seconds():
+    """
+    Get how long an aggregate alert stays open for new occurrences after its last one
+
+    0 disables coalescing: every occurrence gets its own alert row.
+    """
+    return int(os.getenv('ALERT_COALESCE_WINDOW', 300))
+
+
+def fingerprint(source, anomaly_type, entity, severity):
+    """
+    Build the key occurrences are coalesced on
+
+    Severity is part of the key so the per-severity alert counters and rollups
+    never need to move an existing alert between severities.
+
+    Args:
+        source (str): Alert source ('network', 'system')
+        anomaly_type (str): Anomaly type or streaming detector name
+        entity (str): Source IP for network alerts, host for system alerts
+        severity (str): Alert severity
+    """
+    return f"{source}|{anomaly_type}|{entity}|{severity}"[:255]
+
+
+def _group(alert_rows, window):
+    """
+    Fold rows sharing a fingerprint into aggregates, keeping the earliest row's text and details
+
+    Rows are taken in first_seen order, and an occurrence more than window
+    after the previous one of its fingerprint starts a new aggregate, so a
+    batch spanning hours becomes several alerts like a stream of small
+    batches would.
+
+    Returns:
+        tuple: (groups in first_seen order, index of each row's group)
+    """
+    groups = []
+    membership = [None] * len(alert_rows)
+    current = {}
+    for index in sorted(range(len(alert_rows)), key=lambda i: alert_rows[i]['first_seen']):
+        row = alert_rows[index]
+        group_index = current.get(row['fingerprint'])
+        if group_index is None or row['first_seen'] - groups[group_index]['last_seen'] > window:
+            group_index = current[row['fingerprint']] = len(groups)
+            groups.append(dict(row))
+        else:
+            group = groups[group_index]
+            group['occurrences'] += row['occurrences']
+            group['last_seen'] = max(group['last_seen'], row['last_seen'])
+        membership[index] = group_index
+    return groups, membership
+
+
+def _open_aggregates(groups, window):
+    """
+    Find the newest open aggregate for each group's fingerprint
+
+    An aggregate is open while it is unresolved and its last occurrence is at
+    most window before the group's first one.
+
+    Returns:
+        dict: fingerprint -> (alert id, first_seen, last_seen)
+    """
+    cutoff = min(group['first_seen'] for group in groups) - window
+    fingerprints = [group['fingerprint'] for group in groups]
+
+    found = {}
+    for start in range(0, len(fingerprints), _LOOKUP_CHUNK):
+        rows = db.session.query(Alert.id, Alert.fingerprint, Alert.first_seen, Alert.last_seen).filter(
+            Alert.fingerprint.in_(fingerprints[start:start + _LOOKUP_CHUNK]),
+            Alert.is_resolved.is_(False),
+            Alert.last_seen >= cutoff
+        ).order_by(Alert.last_seen).all()
+        # Ordered by last_seen, so the newest aggregate per fingerprint wins
+        found.update((fp, (alert_id, first_seen, last_seen)) for alert_id, fp, first_seen, last_seen in rows)
+
+    return {
+        group['fingerprint']: found[group['fingerprint']]
+        for group in groups
+        if group['fingerprint'] in found and found[group['fingerprint']][2] >= group['first_seen'] - window
+    }
+
+
+def coalesce(alert_rows, now):
+    """
+    Coalesce new alert occurrences into open aggregate alerts
+
+    Rows sharing a fingerprint within the batch become one row per run of
+    occurrences no more than the window apart, and the earliest run of a
+    fingerprint with an open aggregate adds its occurrences to it with a
+    single UPDATE instead of inserting. The caller is responsible for
+    committing the session.
+
+    Args:
+        alert_rows (list): Alert column dictionaries, each with fingerprint,
+            occurrences, first_seen and last_seen
+        now (datetime): Time recorded as updated_at on aggregates
+
+    Returns:
+        tuple: (rows that still need to be inserted as new aggregates, target
+        of each input row: ('alert', id) of the open aggregate it was added
+        to or ('insert', index) of its row in the inserts)
+    """
+    window = get_window_seconds()
+    if not alert_rows or window <= 0:
+        return alert_rows, [('insert', index) for index in range(len(alert_rows))]
+
+    window = timedelta(seconds=window)
+    groups, membership = _group(alert_rows, window)
+    # Later runs of a fingerprint start more than window after the earliest one ends, so only it can extend an aggregate
+    earliest = {}
+    for group in groups:
+        earliest.setdefault(group['fingerprint'], group)
+    open_aggregates = _open_aggregates(list(earliest.values()), window)
+
+    targets = []
+    updates = []
+    inserts = []
+    for group in groups:
+        aggregate = open_aggregates.get(group['fingerprint']) if earliest[group['fingerprint']] is group else None
+        if aggregate is None:
+            targets.append(('insert', len(inserts)))
+            inserts.append(group)
+            continue
+        targets.append(('alert', aggregate[0]))
+        updates.append({
+            'alert_id': aggregate[0],
+            'added': group['occurrences'],
+            # A late batch can hold occurrences older than the aggregate's first one
+            'new_first_seen': min(aggregate[1], group['first_seen']),
+            'new_last_seen': max(aggregate[2], group['last_seen']),
+            'now': now
+        })
+    if updates:
+        table = Alert.__table__
+        statement = update(table).where(table.c.id == bindparam('alert_id')).values(
+            occurrences=table.c.occurrences + bindparam('added'),
+            first_seen=bindparam('new_first_seen'),
+            last_seen=bindparam('new_last_seen'),
+            updated_at=bindparam('now')
+        )
+        db.session.connection().execute(statement, updates)
+        queue_alert_updates(updates)
+
+    pending = db.session.info.setdefault(_PENDING_KEY, Counter())
+    pending['occurrences'] += sum(row['occurrences'] for row in alert_rows)
+    pending['inserted'] += len(inserts)
+    pending['merged_in_batch'] += len(alert_rows) - len(groups)
+    pending['merged_into_open'] += sum(entry['added'] for entry in updates)
+    return inserts, [targets[group_index] for group_index in membership]
+
+
+class CoalescingCounters:
+    """Committed coalescing counters for this process"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def apply(self, counts):
+        with self._lock:
+            self._counts.update(counts)
+
+    def snapshot(self):
+        with self._lock:
+            return Counter(self._counts)
+
+
+coalescing_counters = CoalescingCounters()
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending_counts(session):
+    counts = session.info.pop(_PENDING_KEY, None)
+    if counts:
+        coalescing_counters.apply(counts)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_counts(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def get_coalescing_stats():
+    """
+    Get alert suppression metrics
+
+    'process' covers occurrences committed by this process since it started;
+    'table' compares alert rows with the occurrences they represent.
+
+    Returns:
+        dict: window_seconds, process counters and table totals, each with a
+        suppression_ratio (share of occurrences that did not insert a row)
+    """
+    counts = coalescing_counters.snapshot()
+    rows, occurrences = db.session.query(func.count(Alert.id), func.sum(Alert.occurrences)).one()
+    occurrences = occurrences or 0
+
+    return {
+        'window_seconds': get_window_seconds(),
+        'process': {
+            'occurrences': counts['occurrences'],
+            'inserted': counts['inserted'],
+            'merged_in_batch': counts['merged_in_batch'],
+            'merged_into_open': counts['merged_into_open'],
+            'suppression_ratio': 1 - counts['inserted'] / counts['occurrences'] if counts['occurrences'] else 0.0
+        },
+        'table': {
+            'alerts': rows,
+            'occurrences': int(occurrences),
+            'suppression_ratio': 1 - rows / occurrences if occurrences else 0.0
+        }
+    }
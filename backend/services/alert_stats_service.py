@@ -0,0 +1,308 @@
+import os
+import time
+import threading
+from collections import Counter
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from app import db
+from models.alert import Alert
+from services.database import primary_reads
+
+# Keys always present in the statistics response, even when their count is zero
+KNOWN_SEVERITIES = ['high', 'medium', 'low']
+KNOWN_SOURCES = ['network', 'system', 'application']
+
+# Session.info key holding counter deltas waiting for the transaction to commit
+_PENDING_KEY = 'alert_stat_deltas'
+
+
+def is_cache_enabled():
+    """
+    Check whether the in-process alert counter cache is enabled (ALERT_STATS_CACHE)
+
+    The counters only see alerts committed by this process, so the default,
+    'auto', only enables them when this process commits all the alerts: a
+    single web worker (WEB_CONCURRENCY unset or 1) running its jobs on the
+    in-process queue (JOB_QUEUE=memory, or no REDIS_URL).
+    """
+    setting = os.getenv('ALERT_STATS_CACHE', 'auto').lower()
+    if setting != 'auto':
+        return setting in ('1', 'true', 'yes')
+    job_queue = os.getenv('JOB_QUEUE', 'auto').lower()
+    in_process_jobs = job_queue == 'memory' or (job_queue == 'auto' and not os.getenv('REDIS_URL'))
+    return int(os.getenv('WEB_CONCURRENCY', 1)) <= 1 and in_process_jobs
+
+
+def get_refresh_interval():
+    """
+    Get the number of seconds after which the counters are rebuilt from the table
+
+    Counters only see writes made by this process, so a deployment that turns
+    them on (ALERT_STATS_CACHE=true) with several worker processes relies on
+    the periodic rebuild to pick up the others' writes.
+    0 disables the periodic rebuild.
+    """
+    return float(os.getenv('ALERT_STATS_REFRESH_SECONDS', 300))
+
+
+def grouped_counts():
+    """
+    Count alerts per (severity, source, is_resolved) with one grouped query
+
+    Returns:
+        Counter: Mapping of (severity, source, is_resolved) to count
+    """
+    # The counter cache applies this process's commits on top, so it must not load from a lagging replica
+    with primary_reads():
+        rows = db.session.query(
+            Alert.severity,
+            Alert.source,
+            Alert.is_resolved,
+            func.count(Alert.id)
+        ).group_by(Alert.severity, Alert.source, Alert.is_resolved).all()
+
+    return Counter({(severity, source, bool(is_resolved)): count for severity, source, is_resolved, count in rows})
+
+
+def summarize(counts):
+    """
+    Build the statistics response from grouped counts
+
+    Args:
+        counts (Counter): Mapping of (severity, source, is_resolved) to count
+
+    Returns:
+        dict: total_alerts, by_severity, by_source and by_status
+    """
+    by_severity = dict.fromkeys(KNOWN_SEVERITIES, 0)
+    by_source = dict.fromkeys(KNOWN_SOURCES, 0)
+    by_status = {'resolved': 0, 'unresolved': 0}
+
+    for (severity, source, is_resolved), count in counts.items():
+        if not count:
+            continue
+        by_severity[severity] = by_severity.get(severity, 0) + count
+        by_source[source] = by_source.get(source, 0) + count
+        by_status['resolved' if is_resolved else 'unresolved'] += count
+
+    return {
+        'total_alerts': sum(by_status.values()),
+        'by_severity': by_severity,
+        'by_source': by_source,
+        'by_status': by_status
+    }
+
+
+class AlertCounterCache:
+    """
+    In-process alert counters keyed by (severity, source, is_resolved)
+
+    The counters are loaded with one grouped query and then kept current by
+    applying the deltas of committed transactions, so reading them costs the
+    same no matter how many alerts the table holds.
+
+    The grouped query runs without holding the lock, so reads and commits
+    carry on while the counters are rebuilt. Deltas committed meanwhile are
+    recorded and replayed onto the query's result before it replaces the
+    counters. A transaction whose commit lands just before the query starts
+    but whose deltas arrive after the rebuild began is counted twice until
+    the next rebuild.
+    """
+
+    def __init__(self, refresh_interval=0):
+        self.refresh_interval = refresh_interval
+        self._counts = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        # Deltas applied during each rebuild in progress, keyed by a token per rebuild
+        self._rebuild_deltas = {}
+
+    @property
+    def loaded(self):
+        return self._counts is not None
+
+    def snapshot(self):
+        """
+        Get a copy of the counters, loading them from the table on first use
+
+        When the counters are older than refresh_interval one caller rebuilds
+        them while the others keep reading the current values.
+
+        Returns:
+            Counter: Mapping of (severity, source, is_resolved) to count
+        """
+        with self._lock:
+            if self._counts is not None:
+                stale = (
+                    self.refresh_interval > 0
+                    and time.monotonic() - self._loaded_at > self.refresh_interval
+                    and not self._refreshing
+                )
+                if not stale:
+                    return Counter(self._counts)
+                self._refreshing = True
+
+        try:
+            self.rebuild()
+        finally:
+            self._refreshing = False
+        with self._lock:
+            return Counter(self._counts)
+
+    def rebuild(self):
+        """
+        Rebuild the counters from the table and report how far they had drifted
+
+        Returns:
+            dict: Mapping of 'severity/source/resolved|unresolved' to (cached, actual)
+            for every group whose cached count was wrong
+        """
+        token = object()
+        with self._lock:
+            self._rebuild_deltas[token] = Counter()
+        try:
+            counts = grouped_counts()
+        finally:
+            with self._lock:
+                committed = self._rebuild_deltas.pop(token)
+        return self._replace(counts, committed)
+
+    def _replace(self, counts, committed):
+        """Swap in freshly queried counts plus the deltas committed while they were queried"""
+        for key, delta in committed.items():
+            counts[key] += delta
+
+        with self._lock:
+            previous = self._counts
+            self._counts = counts
+            self._loaded_at = time.monotonic()
+
+        if previous is None:
+            return {}
+        drift = {}
+        for key in set(previous) | set(counts):
+            if previous.get(key, 0) != counts.get(key, 0):
+                severity, source, is_resolved = key
+                label = f"{severity}/{source}/{'resolved' if is_resolved else 'unresolved'}"
+                drift[label] = (previous.get(key, 0), counts.get(key, 0))
+        return drift
+
+    def apply(self, deltas):
+        """Add committed deltas to the counters, and to every rebuild in progress"""
+        with self._lock:
+            for committed in self._rebuild_deltas.values():
+                committed.update(deltas)
+            if self._counts is None:
+                return
+            for key, delta in deltas.items():
+                self._counts[key] += delta
+
+    def reset(self):
+        """Drop the counters so the next read reloads them"""
+        with self._lock:
+            self._counts = None
+            self._loaded_at = None
+
+
+alert_counter_cache = None
+
+
+def get_alert_counter_cache():
+    """Get the process-wide alert counter cache, or None when it is disabled"""
+    global alert_counter_cache
+
+    if not is_cache_enabled():
+        return None
+    if alert_counter_cache is None:
+        alert_counter_cache = AlertCounterCache(refresh_interval=get_refresh_interval())
+    return alert_counter_cache
+
+
+def _pending_deltas():
+    """Get the counter deltas pending on the current session's transaction"""
+    return db.session.info.setdefault(_PENDING_KEY, Counter())
+
+
+def record_alerts_created(alerts):
+    """
+    Count newly created alerts once the current transaction commits
+
+    Args:
+        alerts: Iterable of (severity, source) tuples
+    """
+    if get_alert_counter_cache() is None:
+        return
+    pending = _pending_deltas()
+    for severity, source in alerts:
+        pending[(severity, source, False)] += 1
+
+
+def record_alert_resolved(alert):
+    """
+    Move an alert from unresolved to resolved once the current transaction commits
+
+    Call before setting is_resolved so alerts that were already resolved are not counted twice.
+
+    Args:
+        alert (Alert): Alert about to be resolved
+    """
+    if get_alert_counter_cache() is None or alert.is_resolved:
+        return
+    pending = _pending_deltas()
+    pending[(alert.severity, alert.source, False)] -= 1
+    pending[(alert.severity, alert.source, True)] += 1
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending_deltas(session):
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if deltas and alert_counter_cache is not None:
+        alert_counter_cache.apply(deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_deltas(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def get_alert_statistics():
+    """
+    Get alert statistics from the counter cache, or from one grouped query when it is disabled
+
+    Returns:
+        dict: total_alerts, by_severity, by_source and by_status
+    """
+    cache = get_alert_counter_cache()
+    counts = cache.snapshot() if cache is not None else grouped_counts()
+    return summarize(counts)
+
+
+def check_alert_statistics():
+    """
+    Rebuild the counter cache from the table and report any drift
+
+    Returns:
+        dict: Mapping of drifted groups to (cached, actual) counts
+    """
+    cache = get_alert_counter_cache()
+    if cache is None:
+        return {}
+    return cache.rebuild()
+
+
+def cached_count(severity=None, source=None):
+    """
+    Count alerts matching optional severity and source filters from the counter cache
+
+    Returns:
+        int: Alert count, or None when the counter cache is disabled
+    """
+    cache = get_alert_counter_cache()
+    if cache is None:
+        return None
+
+    return sum(
+        count for (group_severity, group_source, _), count in cache.snapshot().items()
+        if (severity is None or group_severity == severity) and (source is None or group_source == source)
+    )
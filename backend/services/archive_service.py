@@ -0,0 +1,421 @@
+import os
+import re
+from datetime import datetime, timedelta
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+from sqlalchemy import Boolean, DateTime, Float, Integer, MetaData, bindparam, func, inspect, select, text
+from app import db
+from models.traffic_data import TrafficData
+from models.system_log import SystemLog
+from services import partition_service
+
+# Models whose aged rows move to the columnar archive
+ARCHIVED_MODELS = (TrafficData, SystemLog)
+
+# Low-cardinality string columns stored dictionary-encoded (one small dictionary plus integer codes)
+DICTIONARY_COLUMNS = {
+    'traffic_data': ('source_ip', 'destination_ip', 'protocol', 'anomaly_type'),
+    'system_logs': ('log_level', 'source', 'host', 'anomaly_type')
+}
+
+# Rows per Parquet row group; each group carries min/max statistics used to skip it during scans
+ROW_GROUP_SIZE = 8192
+
+_PARQUET_FORMAT = ds.ParquetFileFormat()
+_FILESYSTEM = fs.LocalFileSystem(use_mmap=True)
+
+_DAY_PATTERN = re.compile(r'^day=(\d{4}-\d{2}-\d{2})$')
+_WRITING_PREFIX = '.writing-'
+_PENDING_PREFIX = '.pending-'
+_PENDING_PATTERN = re.compile(r'^\.pending-(\d+)-(\d+)-(\w+)\.parquet$')
+
+
+def get_archive_dir():
+    """Get the directory holding the archive files (ARCHIVE_DIR, default backend/data/archive)"""
+    default = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'archive')
+    return os.getenv('ARCHIVE_DIR', default)
+
+
+def _table_dir(model):
+    return os.path.join(get_archive_dir(), model.__tablename__)
+
+
+def _arrow_type(column):
+    """Arrow type used to archive a table column"""
+    if column.name in DICTIONARY_COLUMNS.get(column.table.name, ()):
+        return pa.dictionary(pa.int32(), pa.string())
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp('us')
+    return pa.string()
+
+
+def archive_schema(model):
+    """Arrow schema of a model's archive files: every table column, raw_data included"""
+    return pa.schema([pa.field(column.name, _arrow_type(column)) for column in model.__table__.columns])
+
+
+def _to_arrow(schema, rows):
+    """Convert result rows into an Arrow table, dictionary-encoding the configured columns"""
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+# --- Writing ---
+
+def _write_day(model, source, day_start, day_end):
+    """
+    Stream the rows of source with timestamp in [day_start, day_end) into a pending archive file
+
+    The file is written under a hidden name so scans ignore it until the rows
+    have been removed from the database and it is published.
+
+    Returns:
+        tuple: (pending_path, final_path, ids), or None when the range holds no rows
+    """
+    schema = archive_schema(model)
+    timestamp = source.c.timestamp
+    # Anomalous rows first: row-group statistics then let anomaly scans skip the rest of the file
+    statement = select(*source.c).where(timestamp >= day_start, timestamp < day_end).order_by(
+        source.c.is_anomalous.desc(), timestamp, source.c.id
+    )
+    result = db.session.execute(statement, execution_options={'yield_per': ROW_GROUP_SIZE})
+
+    day_dir = os.path.join(_table_dir(model), f'day={day_start:%Y-%m-%d}')
+    os.makedirs(day_dir, exist_ok=True)
+    writing_path = os.path.join(day_dir, f'{_WRITING_PREFIX}{source.name}-{os.getpid()}.parquet')
+
+    ids = []
+    writer = None
+    try:
+        for rows in result.partitions():
+            batch = _to_arrow(schema, rows)
+            if writer is None:
+                writer = pq.ParquetWriter(writing_path, schema, compression='zstd')
+            writer.write_table(batch)
+            ids.extend(batch.column('id').to_pylist())
+    except Exception:
+        if writer is not None:
+            writer.close()
+            os.remove(writing_path)
+        raise
+    if writer is None:
+        return None
+    writer.close()
+
+    # The pending name records where the rows came from so an interrupted run can be resolved
+    min_id, max_id = min(ids), max(ids)
+    pending_path = os.path.join(day_dir, f'{_PENDING_PREFIX}{min_id}-{max_id}-{source.name}.parquet')
+    os.replace(writing_path, pending_path)
+    return pending_path, os.path.join(day_dir, f'part-{min_id}-{max_id}.parquet'), ids
+
+
+def _recover_pending(model):
+    """
+    Resolve pending files left by an interrupted archive run
+
+    A pending file whose rows are still in their source table never took
+    effect and is removed; one whose rows are gone was committed and is
+    published. Rows are matched by the exact ids stored in the file: an id
+    range would also cover rows of other days, since ids follow insert order
+    while timestamps come from clients.
+    """
+    table_dir = _table_dir(model)
+    if not os.path.isdir(table_dir):
+        return
+
+    connection = db.session.connection()
+    tables = set(inspect(connection).get_table_names())
+    tables.add(model.__tablename__)
+    for day in os.listdir(table_dir):
+        day_dir = os.path.join(table_dir, day)
+        for name in os.listdir(day_dir):
+            path = os.path.join(day_dir, name)
+            if name.startswith(_WRITING_PREFIX):
+                # The write itself was interrupted, before any row was removed
+                os.remove(path)
+                continue
+            match = _PENDING_PATTERN.match(name)
+            if match is None:
+                continue
+
+            min_id, max_id, source = int(match.group(1)), int(match.group(2)), match.group(3)
+            if source in tables and _any_row_left(connection, source, path):
+                os.remove(path)
+            else:
+                os.replace(path, os.path.join(day_dir, f'part-{min_id}-{max_id}.parquet'))
+
+
+def _any_row_left(connection, source, path, batch_size=10000):
+    """Check whether any row archived in a pending file is still in its source table"""
+    ids = pq.read_table(path, columns=['id']).column('id').to_pylist()
+    statement = text(f'SELECT 1 FROM {source} WHERE id IN :ids LIMIT 1').bindparams(bindparam('ids', expanding=True))
+    return any(
+        connection.execute(statement, {'ids': ids[start:start + batch_size]}).first() is not None
+        for start in range(0, len(ids), batch_size)
+    )
+
+
+def _next_day(source, after=None, end=None):
+    """Start of the day holding the oldest row of source in [after, end), or None when there is none"""
+    timestamp = source.c.timestamp
+    statement = select(func.min(timestamp))
+    if after is not None:
+        statement = statement.where(timestamp >= after)
+    if end is not None:
+        statement = statement.where(timestamp < end)
+    first = db.session.execute(statement).scalar()
+    return partition_service.period_start(first, 'day') if first is not None else None
+
+
+def _archive_live_rows(model, cutoff, batch_size):
+    """Move rows older than cutoff (a day boundary) from a plain table, one committed day at a time"""
+    table = model.__table__
+
+    archived, files = 0, 0
+    day = _next_day(table, end=cutoff)
+    while day is not None:
+        day_end = day + timedelta(days=1)
+        written = _write_day(model, table, day, day_end)
+        day = _next_day(table, day_end, cutoff)
+        if written is None:
+            continue
+
+        pending_path, final_path, ids = written
+        try:
+            for start in range(0, len(ids), batch_size):
+                db.session.execute(table.delete().where(table.c.id.in_(ids[start:start + batch_size])))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            os.remove(pending_path)
+            raise
+        os.replace(pending_path, final_path)
+        archived += len(ids)
+        files += 1
+
+    return archived, files
+
+
+def _archive_detached(model, name):
+    """Move every row of a detached <partition>_archived table to the archive and drop the table"""
+    source = model.__table__.to_metadata(MetaData(), name=name)
+
+    written = []
+    try:
+        day = _next_day(source)
+        while day is not None:
+            day_written = _write_day(model, source, day, day + timedelta(days=1))
+            if day_written is not None:
+                written.append(day_written)
+            day = _next_day(source, day + timedelta(days=1))
+        db.session.execute(text(f'DROP TABLE {name}'))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        for pending_path, _, _ in written:
+            os.remove(pending_path)
+        raise
+
+    for pending_path, final_path, _ in written:
+        os.replace(pending_path, final_path)
+    return sum(len(ids) for _, _, ids in written), len(written)
+
+
+def archive_data(archive_days, batch_size=10000):
+    """
+    Move traffic and log rows older than archive_days into the columnar archive
+
+    Rows are written to one Parquet file per day and table under
+    ARCHIVE_DIR/<table>/day=YYYY-MM-DD/ and removed from the database once the
+    file is complete. Partitioned tables detach their old partitions and
+    archive them whole; <partition>_archived tables left by
+    'flask apply-retention --detach' are archived as well. Only whole days
+    are archived.
+
+    Args:
+        archive_days (int): Days of data to keep in the database
+        batch_size (int): Rows deleted from a plain table per statement
+
+    Returns:
+        dict: Per table, (rows archived, files written)
+    """
+    cutoff = partition_service.period_start(datetime.utcnow() - timedelta(days=archive_days), 'day')
+
+    results = {}
+    for model in ARCHIVED_MODELS:
+        _recover_pending(model)
+        if partition_service.is_partitioned(model):
+            partition_service.detach_partitions(model, cutoff)
+            archived, files = 0, 0
+        else:
+            archived, files = _archive_live_rows(model, cutoff, batch_size)
+
+        for name in partition_service.list_detached_partitions(model):
+            detached_rows, detached_files = _archive_detached(model, name)
+            archived += detached_rows
+            files += detached_files
+        results[model.__tablename__] = (archived, files)
+    return results
+
+
+# --- Scanning ---
+
+def _archived_days(model):
+    """List (day, directory) pairs of a model's archive holding at least one published file"""
+    table_dir = _table_dir(model)
+    if not os.path.isdir(table_dir):
+        return []
+    days = []
+    for name in os.listdir(table_dir):
+        match = _DAY_PATTERN.match(name)
+        day_dir = os.path.join(table_dir, name)
+        if match and any(file.startswith('part-') for file in os.listdir(day_dir)):
+            days.append((datetime.fromisoformat(match.group(1)), day_dir))
+    return sorted(days)
+
+
+def archived_until(model):
+    """
+    Get the end of the newest archived day of a model
+
+    Callers use it to skip the archive for time ranges it cannot contain.
+
+    Returns:
+        datetime: Exclusive upper bound of archived timestamps, or None when the archive is empty
+    """
+    days = _archived_days(model)
+    return days[-1][0] + timedelta(days=1) if days else None
+
+
+# Parquet fragments with their footers parsed, by path; published files never change
+_fragments = {}
+
+
+def _dataset(model, start, end):
+    """Memory-mapped dataset over the archive files of the days overlapping [start, end), or None"""
+    paths = [
+        os.path.join(day_dir, name)
+        for day, day_dir in _archived_days(model)
+        if (start is None or day + timedelta(days=1) > start) and (end is None or day < end)
+        for name in sorted(os.listdir(day_dir)) if name.startswith('part-')
+    ]
+    if not paths:
+        return None
+
+    fragments = []
+    for path in paths:
+        fragment = _fragments.get(path)
+        if fragment is None:
+            fragment = _PARQUET_FORMAT.make_fragment(path, _FILESYSTEM)
+            fragment.ensure_complete_metadata()
+            _fragments[path] = fragment
+        fragments.append(fragment)
+    return ds.FileSystemDataset(fragments, archive_schema(model), _PARQUET_FORMAT, _FILESYSTEM)
+
+
+def _filter(start, end, match):
+    """Filter expression for [start, end) plus column equality conditions"""
+    conditions = []
+    if start is not None:
+        conditions.append(ds.field('timestamp') >= start)
+    if end is not None:
+        conditions.append(ds.field('timestamp') < end)
+    for column, value in (match or {}).items():
+        conditions.append(ds.field(column) == value)
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def scan(model, columns, start=None, end=None, match=None):
+    """
+    Read archived rows of a model with timestamp in [start, end)
+
+    Only files of the days overlapping the range are opened, and only the
+    requested columns are read from the memory-mapped files. Filters are
+    evaluated on whole column batches; row groups whose statistics fall
+    outside the range are skipped without decoding.
+
+    Args:
+        model: TrafficData or SystemLog
+        columns (list): Column names to return
+        start (datetime): Inclusive lower bound, or None
+        end (datetime): Exclusive upper bound, or None
+        match (dict): Column name to required value
+
+    Returns:
+        pyarrow.Table: The requested columns of the matching rows
+    """
+    dataset = _dataset(model, start, end)
+    if dataset is None:
+        schema = archive_schema(model)
+        return pa.schema([schema.field(column) for column in columns]).empty_table()
+    return dataset.to_table(columns=columns, filter=_filter(start, end, match))
+
+
+def group_counts(model, key_column, start=None, end=None, match=None):
+    """
+    Count archived rows per value of a column
+
+    Args:
+        model: TrafficData or SystemLog
+        key_column (str): Column to group by
+        start (datetime): Inclusive lower bound, or None
+        end (datetime): Exclusive upper bound, or None
+        match (dict): Column name to required value
+
+    Returns:
+        dict: Mapping of key to (count, lowest id)
+    """
+    table = scan(model, [key_column, 'id'], start, end, match)
+    if table.num_rows == 0:
+        return {}
+
+    # Each row group carries its own dictionary; grouping needs them merged into one
+    grouped = table.unify_dictionaries().group_by(key_column).aggregate([('id', 'count'), ('id', 'min')])
+    return {
+        key: (count, first_id)
+        for key, count, first_id in zip(
+            grouped.column(key_column).to_pylist(),
+            grouped.column('id_count').to_pylist(),
+            grouped.column('id_min').to_pylist()
+        )
+    }
+
+
+def minute_counts(model, columns, since=None):
+    """
+    Count archived rows per minute and combination of column values
+
+    Args:
+        model: TrafficData or SystemLog
+        columns (list): Column names to group by besides the minute
+        since (datetime): Only count rows from this time onwards
+
+    Returns:
+        list: (minute, *values, count) tuples
+    """
+    table = scan(model, ['timestamp'] + list(columns), since)
+    if table.num_rows == 0:
+        return []
+
+    table = table.append_column('minute', pc.floor_temporal(table.column('timestamp'), unit='minute'))
+    grouped = table.unify_dictionaries().group_by(['minute'] + list(columns)).aggregate([('timestamp', 'count')])
+    names = ['minute'] + list(columns) + ['timestamp_count']
+    return list(zip(*(grouped.column(name).to_pylist() for name in names)))
@@ -1,35 +1,293 @@
 import jwt
 import os
+import time
+import threading
+from collections import OrderedDict
 from functools import wraps
+import redis
 from flask import request, jsonify
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
 from models.user import User
 
+# Session.info key holding ids of users changed in the current transaction
+_CHANGED_USERS_KEY = 'auth_changed_user_ids'
+
+# Marks a transaction that changed users with a bulk UPDATE or DELETE
+_ALL_USERS = 'all'
+
+# Redis key counting user changes made by any process
+_VERSION_KEY = 'auth:users:version'
+
+class AuthenticatedUser:
+    """Detached snapshot of the user fields request handlers read"""
+
+    __slots__ = ('id', 'username', 'email', 'role', 'is_active', 'created_at')
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.role = user.role
+        self.is_active = user.is_active
+        self.created_at = user.created_at
+
+    def __repr__(self):
+        return f'<AuthenticatedUser {self.username}>'
+
+class UserCache:
+    """
+    Thread-safe LRU cache of verified users, bounded by size and entry age
+
+    Entries are dropped when the user row is updated or deleted in this
+    process. With a Redis client, every committed user change also bumps a
+    shared version, and entries cached under an older version are misses,
+    so changes made by other processes apply on their next request.
+    """
+
+    def __init__(self, max_size=1024, ttl=60, redis_client=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis = redis_client
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def current_version(self):
+        """
+        Get the shared user version, or None without Redis
+
+        Raises:
+            redis.RedisError: When Redis cannot be reached
+        """
+        if self.redis is None:
+            return None
+        return self.redis.get(_VERSION_KEY)
+
+    def get(self, user_id, version=None):
+        """Return the cached user, or None when missing, expired or cached under another version"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() - entry[1] > self.ttl or entry[2] != version:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user, version=None):
+        """Cache a verified user, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[user.id] = (user, time.monotonic(), version)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """Drop a user from the cache"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Drop every cached user"""
+        with self._lock:
+            self._entries.clear()
+
+    def bump(self):
+        """Tell every process sharing the Redis version that users changed"""
+        if self.redis is None:
+            return
+        try:
+            self.redis.incr(_VERSION_KEY)
+        except redis.RedisError as e:
+            print(f"User cache: could not publish a user change to Redis ({e})")
+
+    def stats(self):
+        """Return cache size and hit/miss counters"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+user_cache = None
+_initialized = False
+
+def _create_cache():
+    """
+    Create the user cache for this process, or None when it must stay off
+
+    With REDIS_URL the processes share a version key, so a user changed by
+    one worker is reloaded by all of them on their next request. Without
+    Redis the cache only runs in a single web worker (WEB_CONCURRENCY unset
+    or 1): other workers would keep authorizing a deactivated user or a
+    demoted admin until their entries expired.
+    """
+    max_size = int(os.getenv('AUTH_CACHE_SIZE', 1024))
+    ttl = float(os.getenv('AUTH_CACHE_TTL', 60))
+    if max_size <= 0 or ttl <= 0:
+        return None
+
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url:
+        client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        try:
+            client.ping()
+            return UserCache(max_size=max_size, ttl=ttl, redis_client=client)
+        except redis.RedisError as e:
+            print(f"User cache: Redis unavailable ({e})")
+
+    if int(os.getenv('WEB_CONCURRENCY', 1)) > 1:
+        print("User cache: disabled, several web workers need Redis to share user changes")
+        return None
+    return UserCache(max_size=max_size, ttl=ttl)
+
+def get_user_cache():
+    """
+    Get the process-wide user cache, or None when disabled
+
+    Configured with AUTH_CACHE_SIZE (default 1024) and AUTH_CACHE_TTL in
+    seconds (default 60); a size or TTL of 0 disables the cache.
+    """
+    global user_cache, _initialized
+
+    if not _initialized:
+        user_cache = _create_cache()
+        _initialized = True
+    return user_cache
+
+def invalidate_user(user_id):
+    """Drop a user from this process's cache"""
+    if user_cache is not None:
+        user_cache.invalidate(user_id)
+
+def _changed_users(session):
+    return session.info.setdefault(_CHANGED_USERS_KEY, set())
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    # Drop the entry now so this transaction's own requests see the change,
+    # and again after commit in case another request re-cached the old row meanwhile
+    invalidate_user(target.id)
+    _changed_users(Session.object_session(target)).add(target.id)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_user_change(orm_execute_state):
+    # Bulk UPDATE and DELETE statements skip the mapper events above
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is User:
+        if user_cache is not None:
+            user_cache.clear()
+        _changed_users(orm_execute_state.session).add(_ALL_USERS)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    changed = session.info.pop(_CHANGED_USERS_KEY, None)
+    if changed and user_cache is not None:
+        if _ALL_USERS in changed:
+            user_cache.clear()
+        for user_id in changed - {_ALL_USERS}:
+            user_cache.invalidate(user_id)
+        user_cache.bump()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    changed = session.info.pop(_CHANGED_USERS_KEY, None)
+    if changed and user_cache is not None:
+        # Entries re-cached during the transaction may hold its uncommitted changes
+        if _ALL_USERS in changed:
+            user_cache.clear()
+        for user_id in changed - {_ALL_USERS}:
+            user_cache.invalidate(user_id)
+
+def load_user(user_id):
+    """
+    Load a user by id through the cache
+
+    Args:
+        user_id (int): User id from a verified token
+
+    Returns:
+        AuthenticatedUser: User snapshot, or None if the user does not exist
+    """
+    cache = get_user_cache()
+    version = None
+    if cache is not None:
+        try:
+            # Read before loading, so a change committed meanwhile leaves this entry outdated
+            version = cache.current_version()
+        except redis.RedisError:
+            # Without the shared version the cached entries cannot be trusted
+            cache = None
+    if cache is not None:
+        user = cache.get(user_id, version)
+        if user is not None:
+            return user
+
+    model = db.session.get(User, user_id)
+    if model is None:
+        return None
+
+    user = AuthenticatedUser(model)
+    if cache is not None:
+        cache.put(user, version)
+    return user
+
+def authenticate_request(require_admin=False):
+    """
+    Verify the request's bearer token and load its user
+
+    Args:
+        require_admin (bool): Also require the admin role
+
+    Returns:
+        tuple: (user, None) on success, or (None, (response, status)) on failure
+    """
+    # Get token from header
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None, (jsonify({'error': 'Missing or invalid token'}), 401)
+    
+    token = auth_header.split(' ')[1]
+    
+    try:
+        # Decode token
+        payload = jwt.decode(token, os.getenv('SECRET_KEY', 'dev_key'), algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        return None, (jsonify({'error': 'Token expired'}), 401)
+    except jwt.InvalidTokenError:
+        return None, (jsonify({'error': 'Invalid token'}), 401)
+    
+    current_user = load_user(payload['user_id'])
+    
+    if not current_user:
+        return None, (jsonify({'error': 'User not found'}), 404)
+    
+    if not current_user.is_active:
+        return None, (jsonify({'error': 'User account is inactive'}), 403)
+    
+    if require_admin and current_user.role != 'admin':
+        return None, (jsonify({'error': 'Admin privileges required'}), 403)
+    
+    return current_user, None
+
 def token_required(f):
     """Decorator for routes that require authentication"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        # Get token from header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Missing or invalid token'}), 401
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            # Decode token
-            payload = jwt.decode(token, os.getenv('SECRET_KEY', 'dev_key'), algorithms=['HS256'])
-            current_user = User.query.get(payload['user_id'])
-            
-            if not current_user:
-                return jsonify({'error': 'User not found'}), 404
-            
-            if not current_user.is_active:
-                return jsonify({'error': 'User account is inactive'}), 403
-            
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
+        current_user, error = authenticate_request()
+        if error:
+            return error
         
         # Pass user to the route
         return f(current_user, *args, **kwargs)
@@ -40,31 +298,9 @@ def admin_required(f):
     """Decorator for routes that require admin privileges"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        # Get token from header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Missing or invalid token'}), 401
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            # Decode token
-            payload = jwt.decode(token, os.getenv('SECRET_KEY', 'dev_key'), algorithms=['HS256'])
-            current_user = User.query.get(payload['user_id'])
-            
-            if not current_user:
-                return jsonify({'error': 'User not found'}), 404
-            
-            if not current_user.is_active:
-                return jsonify({'error': 'User account is inactive'}), 403
-            
-            if current_user.role != 'admin':
-                return jsonify({'error': 'Admin privileges required'}), 403
-            
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
+        current_user, error = authenticate_request(require_admin=True)
+        if error:
+            return error
         
         # Pass user to the route
         return f(current_user, *args, **kwargs)
@@ -0,0 +1,265 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+# Flask-SQLAlchemy bind key of the read replica engine
+REPLICA_BIND = 'replica'
+
+# Set while a replica_reads view runs with a usable replica
+_replica_reads = ContextVar('replica_reads', default=False)
+
+# Session.info key set once the current transaction has flushed writes
+_WROTE_KEY = 'replica_reads_wrote'
+
+replica_router = None
+
+
+def _enabled(name, default):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+def get_engine_options():
+    """
+    Get the SQLAlchemy engine options for the primary and the replica
+
+    Pool sizing is only passed when set, so SQLite's pools keep their
+    defaults: DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW and
+    DATABASE_POOL_TIMEOUT (seconds). DATABASE_POOL_RECYCLE (seconds)
+    replaces connections older than that, and DATABASE_POOL_PRE_PING
+    (default true) checks each connection as it leaves the pool.
+
+    Returns:
+        dict: Engine options for SQLALCHEMY_ENGINE_OPTIONS
+    """
+    options = {'pool_pre_ping': _enabled('DATABASE_POOL_PRE_PING', 'true')}
+    for option, name, cast in (('pool_size', 'DATABASE_POOL_SIZE', int),
+                               ('max_overflow', 'DATABASE_MAX_OVERFLOW', int),
+                               ('pool_timeout', 'DATABASE_POOL_TIMEOUT', float),
+                               ('pool_recycle', 'DATABASE_POOL_RECYCLE', int)):
+        if os.getenv(name):
+            options[option] = cast(os.getenv(name))
+    return options
+
+
+def get_replica_url():
+    """Get the read replica's database URL (DATABASE_REPLICA_URL), or None without a replica"""
+    return os.getenv('DATABASE_REPLICA_URL') or None
+
+
+def get_binds():
+    """Get SQLALCHEMY_BINDS: the replica engine when DATABASE_REPLICA_URL is set"""
+    url = get_replica_url()
+    return {REPLICA_BIND: url} if url else {}
+
+
+@contextmanager
+def primary_reads():
+    """
+    Keep the enclosed reads on the primary inside a replica_reads view
+
+    For reads that seed state kept up to date with later commits, which must
+    not start from a lagging copy.
+    """
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class RoutingSession(Session):
+    """
+    Session sending plain SELECTs to the replica inside replica_reads views
+
+    Flushes, locking reads, textual SQL and session.connection() calls stay on
+    the primary, so writes and dialect checks never reach the replica. Once a
+    transaction has flushed writes, its reads stay on the primary as well, so
+    it sees its own changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and _replica_reads.get() and not self._flushing and not self.info.get(_WROTE_KEY)
+                and getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_written(session, flush_context):
+    session.info[_WROTE_KEY] = True
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _clear_written(session, transaction):
+    # Savepoints ending leave the outer transaction's writes in place
+    if transaction.parent is None:
+        session.info.pop(_WROTE_KEY, None)
+
+
+class ReplicaRouter:
+    """
+    Decides whether reads may go to the replica
+
+    The replica is used while its last check succeeded and found it at most
+    max_lag seconds behind the primary. Checks run at most every
+    check_interval seconds, by one request at a time, so reads are at most
+    about max_lag + check_interval seconds stale. A failed replica query
+    marks the replica unavailable until the next check.
+    """
+
+    def __init__(self, engine, max_lag=10, check_interval=5):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._usable = False
+        self._lag = None
+        self._checked_at = None
+        self._checking = False
+        self._lock = threading.Lock()
+        self._replica_requests = 0
+        self._primary_requests = 0
+        self._fallbacks = 0
+        self._last_error = None
+
+        event.listen(engine, 'handle_error', self._on_error)
+
+    def measure_lag(self):
+        """
+        Query how many seconds the replica trails the primary
+
+        PostgreSQL standbys report the age of the last replayed transaction,
+        or 0 when everything received has been replayed; other databases
+        (including a PostgreSQL server that is not a standby) count as current.
+
+        Returns:
+            float: Replication lag in seconds
+        """
+        with self.engine.connect() as connection:
+            if connection.dialect.name == 'postgresql':
+                return float(connection.execute(text(
+                    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+                    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+                )).scalar())
+            connection.execute(text('SELECT 1'))
+            return 0.0
+
+    def _check(self):
+        lag, error = None, None
+        try:
+            lag = self.measure_lag()
+            if lag > self.max_lag:
+                error = f'{lag:.1f} s behind'
+        except Exception as e:
+            error = str(e)
+        usable = error is None
+        with self._lock:
+            if usable != self._usable:
+                print("Read replica: in use" if usable else f"Read replica: unavailable ({error}), reading from the primary")
+            self._lag, self._usable, self._checked_at, self._checking = lag, usable, time.monotonic(), False
+            if error:
+                self._last_error = error
+
+    def usable(self):
+        """Check whether this request's reads may go to the replica, rechecking it when due"""
+        with self._lock:
+            due = (self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval)
+            check = due and not self._checking
+            if check:
+                self._checking = True
+        if check:
+            self._check()
+        with self._lock:
+            if self._usable:
+                self._replica_requests += 1
+            else:
+                self._primary_requests += 1
+            return self._usable
+
+    def _on_error(self, context):
+        if not _replica_reads.get():
+            return
+        with self._lock:
+            self._usable = False
+            self._checked_at = time.monotonic()
+            self._last_error = str(context.original_exception)
+        if has_request_context():
+            g.replica_failed = True
+
+    def record_fallback(self):
+        with self._lock:
+            self._fallbacks += 1
+
+    def stats(self):
+        """
+        Get the replica state and routing counters of this process
+
+        Returns:
+            dict: usable, lag_seconds, max_lag_seconds, replica_requests,
+            primary_requests, fallbacks and last_error
+        """
+        with self._lock:
+            return {
+                'usable': self._usable,
+                'lag_seconds': self._lag,
+                'max_lag_seconds': self.max_lag,
+                'replica_requests': self._replica_requests,
+                'primary_requests': self._primary_requests,
+                'fallbacks': self._fallbacks,
+                'last_error': self._last_error
+            }
+
+
+def get_replica_router():
+    """
+    Get the replica router, or None when no DATABASE_REPLICA_URL is configured
+
+    DATABASE_REPLICA_MAX_LAG (seconds, default 10) is the staleness bound and
+    DATABASE_REPLICA_CHECK_SECONDS (default 5) how often the lag is measured.
+    """
+    global replica_router
+
+    if replica_router is None and get_replica_url():
+        from app import db
+        replica_router = ReplicaRouter(
+            db.engines[REPLICA_BIND],
+            max_lag=float(os.getenv('DATABASE_REPLICA_MAX_LAG', 10)),
+            check_interval=float(os.getenv('DATABASE_REPLICA_CHECK_SECONDS', 5))
+        )
+
+    return replica_router
+
+
+def replica_reads(f):
+    """
+    Decorator running a read-only view's SELECTs on the replica when it is usable
+
+    Apply below cached_response so cache hits skip the replica check. When a
+    replica query fails, the view runs again on the primary.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        router = get_replica_router()
+        if router is None or not router.usable():
+            return f(*args, **kwargs)
+
+        token = _replica_reads.set(True)
+        try:
+            response = f(*args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+        if not g.pop('replica_failed', False):
+            return response
+
+        from app import db
+        db.session.rollback()
+        router.record_fallback()
+        return f(*args, **kwargs)
+
+    return decorated
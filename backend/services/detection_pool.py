@@ -0,0 +1,140 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from services.keyword_matcher import LogKeywordMatcher, load_log_keyword_catalog
+
+# Keyword matcher built once in each worker process
+_worker_matcher = None
+
+
+def _init_worker(catalog):
+    global _worker_matcher
+
+    _worker_matcher = LogKeywordMatcher(catalog)
+
+
+def _classify_log_shard(messages):
+    """Classify one shard of log messages, returning the top category index per message (-1 for none) as bytes"""
+    return np.array(list(map(_worker_matcher.top_index, messages)), dtype=np.int16).tobytes()
+
+
+def get_detection_mode():
+    """
+    Get the configured detection mode
+
+    'inline' (default) runs detection in the calling thread. 'process' shards
+    large log batches across a pool of DETECTION_WORKERS processes.
+    """
+    return os.getenv('DETECTION_MODE', 'inline')
+
+
+def get_worker_count():
+    """Get the number of detection processes (defaults to the CPU count)"""
+    return int(os.getenv('DETECTION_WORKERS', 0)) or os.cpu_count() or 1
+
+
+def get_min_batch_size():
+    """Get the smallest batch sent to the process pool; smaller batches run in-process"""
+    return int(os.getenv('DETECTION_MIN_BATCH', 20000))
+
+
+def get_shard_size():
+    """Get the largest number of records pickled into one task"""
+    return int(os.getenv('DETECTION_SHARD_SIZE', 25000))
+
+
+class DetectionPool:
+    """
+    Process pool that shards large log batches across cores
+
+    Shards carry bare log messages rather than record dictionaries, and come
+    back as packed int16 codes. Results are merged in input order. Traffic
+    rules always run in-process: a pass over a batch costs less than
+    pickling it for a worker. If the pool
+    breaks, for instance because a worker was killed, the batch is analyzed
+    in-process and the pool is recreated on next use.
+    """
+
+    def __init__(self, workers, shard_size):
+        self.workers = workers
+        self.shard_size = shard_size
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            # Forking a process with running threads (inference, job workers) can copy held locks
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(load_log_keyword_catalog(),)
+        )
+        self.broken = False
+
+    def _shards(self, items):
+        """Split items into roughly equal shards, one or more per worker"""
+        count = max(self.workers, -(-len(items) // self.shard_size))
+        size = -(-len(items) // count)
+        return [items[start:start + size] for start in range(0, len(items), size)]
+
+    def classify_logs(self, matcher, messages):
+        """
+        Classify log messages across the pool
+
+        Args:
+            matcher (LogKeywordMatcher): Matcher whose outcomes are used
+            messages (list): List of log messages
+
+        Returns:
+            list: List of (is_anomalous, anomaly_score, anomaly_type) tuples
+        """
+        try:
+            shards = list(self.executor.map(_classify_log_shard, self._shards(messages)))
+        except BrokenProcessPool as e:
+            self._broke(e)
+            return matcher.classify_batch(messages)
+
+        outcomes = [matcher.outcomes[category] for category in matcher.categories] + [matcher.no_match]
+        results = []
+        for indexes in shards:
+            # -1 picks the trailing no-match outcome
+            results.extend(map(outcomes.__getitem__, np.frombuffer(indexes, dtype=np.int16).tolist()))
+        return results
+
+    def _broke(self, error):
+        print(f"Detection pool failed ({error}), analyzing in-process and restarting the pool")
+        self.broken = True
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        self.executor.shutdown(wait=True)
+
+
+detection_pool = None
+_detection_pool_lock = threading.Lock()
+
+
+def get_detection_pool(batch_size):
+    """
+    Get the process pool for a batch, or None when the batch should run in-process
+
+    Batches run in-process unless DETECTION_MODE is 'process', more than one
+    worker is configured and the batch has at least DETECTION_MIN_BATCH records.
+
+    Args:
+        batch_size (int): Number of records in the batch
+    """
+    global detection_pool
+
+    if get_detection_mode() != 'process' or batch_size < get_min_batch_size():
+        return None
+    workers = get_worker_count()
+    if workers < 2:
+        return None
+
+    with _detection_pool_lock:
+        if detection_pool is not None and detection_pool.broken:
+            detection_pool.executor.shutdown(wait=False)
+            detection_pool = None
+        if detection_pool is None:
+            detection_pool = DetectionPool(workers, get_shard_size())
+    return detection_pool
@@ -0,0 +1,396 @@
+import time
+import queue
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import torch
+from services.metrics import model_batch
+
+
+class InferenceTimeout(Exception):
+    """Raised when a request misses its deadline before reaching the model"""
+    pass
+
+
+class InferenceRequest:
+    """A single normalized text waiting to be classified"""
+
+    __slots__ = ('text', 'deadline', 'submitted_at', 'future')
+
+    def __init__(self, text, deadline):
+        self.text = text
+        self.deadline = deadline
+        self.submitted_at = time.monotonic()
+        self.future = Future()
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache bounded by entry count"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value, or None when missing"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Cache a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Return cache size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+def normalize_text(text, lowercase=False):
+    """
+    Normalize a message into the cache key it is classified under
+
+    Runs of whitespace collapse to single spaces and the ends are stripped,
+    which WordPiece tokenizers ignore anyway; the text is lowercased only
+    when the tokenizer lowercases it too, so a cached result is exactly what
+    the model would return for the original message.
+
+    Args:
+        text (str): Message to normalize
+        lowercase (bool): Whether the tokenizer lowercases its input
+
+    Returns:
+        str: The normalized message
+    """
+    text = ' '.join(text.split())
+    return text.lower() if lowercase else text
+
+
+def quantize_model(model):
+    """
+    Quantize a model's linear layers to int8 for CPU inference
+
+    Weights are quantized ahead of time and activations dynamically per
+    batch, so no calibration data is needed. Only CPU execution is supported.
+
+    Args:
+        model: Sequence classification model in eval mode
+
+    Returns:
+        The quantized model (config and labels are kept)
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def configure_threads(intra_op=None, inter_op=None):
+    """
+    Set torch's CPU thread pools for this process
+
+    The inter-op pool can only be sized before torch first uses it; a late
+    call keeps the current size and reports it.
+
+    Args:
+        intra_op (int): Threads used inside one operator (matrix multiplies)
+        inter_op (int): Threads used to run independent operators concurrently
+
+    Returns:
+        dict: The intra_op and inter_op thread counts in effect
+    """
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op and inter_op != torch.get_num_interop_threads():
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:
+            print(f"Inference: could not set inter-op threads to {inter_op} ({e})")
+    return {'intra_op': torch.get_num_threads(), 'inter_op': torch.get_num_interop_threads()}
+
+
+@contextmanager
+def single_threaded():
+    """Run torch operators on the calling thread only, restoring the intra-op thread count afterwards"""
+    threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(threads)
+
+
+def warm_up(model, tokenizer, max_length=128):
+    """Run one forward pass so first-call initialization is paid up front"""
+    with torch.no_grad():
+        model(**tokenizer(['warmup'], truncation=True, max_length=max_length, return_tensors='pt'))
+
+
+class InferenceServer:
+    """
+    In-process micro-batching inference server for a sequence classifier
+
+    Callers submit texts from any thread. A single background worker collects
+    pending requests into batches bounded by max_batch_size and max_wait_ms,
+    pads them into one tensor batch and runs one forward pass per batch.
+    Requests whose deadline passes while queued fail with InferenceTimeout
+    instead of occupying a slot in the batch.
+
+    Texts are classified by their normalized form (see normalize_text).
+    Repeated messages are answered from a score cache without queueing, and
+    the token ids of recently seen messages are cached so batches only
+    tokenize new ones; identical messages within a batch share one row.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size=32, max_wait_ms=5, max_length=128,
+                 default_timeout=None, stats_window=10000, warmup=True, token_cache_size=0,
+                 score_cache_size=0):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_length = max_length
+        self.default_timeout = default_timeout
+        self.labels = getattr(model.config, 'id2label', None) or {}
+        self.lowercase = bool(getattr(tokenizer, 'do_lower_case', False))
+        self.token_cache = LRUCache(token_cache_size) if token_cache_size > 0 else None
+        self.score_cache = LRUCache(score_cache_size) if score_cache_size > 0 else None
+
+        self.model.eval()
+        if warmup:
+            # The first forward pass pays one-off initialization costs; keep them out of request deadlines
+            warm_up(self.model, self.tokenizer, self.max_length)
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=stats_window)
+        self._batch_sizes = {}
+        self._completed = 0
+        self._timed_out = 0
+        self._failed = 0
+
+        self._running = True
+        self._worker = threading.Thread(target=self._run, name='inference-worker', daemon=True)
+        self._worker.start()
+
+    def submit(self, text, timeout=None):
+        """
+        Queue a text for classification
+
+        Args:
+            text (str): Text to classify
+            timeout (float): Seconds before the request expires (defaults to default_timeout)
+
+        Returns:
+            Future: Resolves to a (label, score) tuple
+        """
+        if not self._running:
+            raise RuntimeError('Inference server is stopped')
+
+        text = normalize_text(text, self.lowercase)
+        if self.score_cache is not None:
+            result = self.score_cache.get(text)
+            if result is not None:
+                future = Future()
+                future.set_result(result)
+                return future
+
+        timeout = timeout if timeout is not None else self.default_timeout
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        request = InferenceRequest(text, deadline)
+        self._queue.put(request)
+        return request.future
+
+    def classify(self, texts, timeout=None):
+        """
+        Classify texts and wait for the results
+
+        Args:
+            texts (list): Texts to classify
+            timeout (float): Seconds before the requests expire
+
+        Returns:
+            list: List of (label, score) tuples in input order
+        """
+        timeout = timeout if timeout is not None else self.default_timeout
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        futures = [self.submit(text, timeout) for text in texts]
+        results = []
+        for future in futures:
+            remaining = max(0, deadline - time.monotonic()) if deadline is not None else None
+            try:
+                results.append(future.result(remaining))
+            except FutureTimeoutError:
+                raise InferenceTimeout('Inference request timed out')
+        return results
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until the batch is full or max_wait elapses"""
+        batch = [self._queue.get()]
+        if batch[0] is None:
+            return None
+
+        batch_deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = batch_deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # Put the shutdown marker back so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        """Worker loop"""
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+
+            # Drop requests that expired while queued
+            now = time.monotonic()
+            live = []
+            for request in batch:
+                if request.deadline is not None and request.deadline < now:
+                    request.future.set_exception(InferenceTimeout('Inference request expired in queue'))
+                    with self._stats_lock:
+                        self._timed_out += 1
+                elif request.future.set_running_or_notify_cancel():
+                    live.append(request)
+
+            if live:
+                self._process(live)
+
+    def _encode(self, texts):
+        """Tokenize texts into one padded batch, reusing cached token ids"""
+        if self.token_cache is None:
+            return self.tokenizer(
+                texts,
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors='pt'
+            )
+
+        input_ids = [self.token_cache.get(text) for text in texts]
+        missing = [i for i, ids in enumerate(input_ids) if ids is None]
+        if missing:
+            encoded = self.tokenizer([texts[i] for i in missing], truncation=True, max_length=self.max_length)
+            for i, ids in zip(missing, encoded['input_ids']):
+                input_ids[i] = ids
+                self.token_cache.put(texts[i], ids)
+
+        # Pad directly; the tokenizer's pad() is slower than tokenizing from scratch
+        width = max(len(ids) for ids in input_ids)
+        padded = torch.full((len(input_ids), width), self.tokenizer.pad_token_id or 0, dtype=torch.long)
+        attention_mask = torch.zeros((len(input_ids), width), dtype=torch.long)
+        left = self.tokenizer.padding_side == 'left'
+        for row, ids in enumerate(input_ids):
+            columns = slice(width - len(ids), width) if left else slice(0, len(ids))
+            padded[row, columns] = torch.tensor(ids)
+            attention_mask[row, columns] = 1
+        return {'input_ids': padded, 'attention_mask': attention_mask}
+
+    def _forward(self, texts):
+        """Tokenize texts into one padded batch and return (scores, label indexes)"""
+        encoded = self._encode(texts)
+        with torch.no_grad():
+            logits = self.model(**encoded).logits
+        return torch.softmax(logits, dim=-1).max(dim=-1)
+
+    def _process(self, batch):
+        """Run one padded forward pass for a batch of requests"""
+        # Identical messages share one row of the batch
+        texts = list(dict.fromkeys(request.text for request in batch))
+        start = time.perf_counter()
+        try:
+            scores, indexes = self._forward(texts)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            with self._stats_lock:
+                self._failed += len(batch)
+            return
+
+        results = {}
+        for text, index, score in zip(texts, indexes.tolist(), scores.tolist()):
+            results[text] = (self.labels.get(index, str(index)), score)
+            if self.score_cache is not None:
+                self.score_cache.put(text, results[text])
+
+        model_batch(len(texts), time.perf_counter() - start)
+        finished = time.monotonic()
+        for request in batch:
+            request.future.set_result(results[request.text])
+
+        with self._stats_lock:
+            self._completed += len(batch)
+            self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+            self._latencies.extend(finished - request.submitted_at for request in batch)
+
+    def stats(self):
+        """
+        Get latency and batch-size statistics
+
+        Returns:
+            dict: Request counters, batch-size distribution, latency percentiles in
+            milliseconds (score cache hits are not included) and cache counters
+        """
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            batch_sizes = dict(self._batch_sizes)
+            completed, timed_out, failed = self._completed, self._timed_out, self._failed
+
+        batches = sum(batch_sizes.values())
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))] * 1000
+
+        return {
+            'completed': completed,
+            'timed_out': timed_out,
+            'failed': failed,
+            'queued': self._queue.qsize(),
+            'batches': batches,
+            'mean_batch_size': completed / batches if batches else 0,
+            'batch_sizes': {str(size): count for size, count in sorted(batch_sizes.items())},
+            'latency_ms': {
+                'p50': percentile(50),
+                'p95': percentile(95),
+                'p99': percentile(99),
+                'max': latencies[-1] * 1000 if latencies else None
+            },
+            'token_cache': self.token_cache.stats() if self.token_cache is not None else None,
+            'score_cache': self.score_cache.stats() if self.score_cache is not None else None
+        }
+
+    def close(self, timeout=None):
+        """Stop the worker after draining the requests already queued"""
+        if self._running:
+            self._running = False
+            self._queue.put(None)
+            self._worker.join(timeout)
@@ -0,0 +1,494 @@
+import os
+import io
+import json
+from datetime import datetime
+from sqlalchemy import insert, text
+from app import db
+from models.traffic_data import TrafficData
+from models.system_log import SystemLog
+from models.alert import Alert
+from services.ml_service import analyze_network_traffic_batch, analyze_system_logs_batch
+from services.rollup_service import record_rollups
+from services.alert_stats_service import record_alerts_created
+from services.response_cache import mark_changed
+from services.stream_detector import DETECTORS, detect_traffic, detect_logs
+from services.alert_coalescing_service import coalesce, fingerprint
+from services.alert_broker import queue_alerts_created
+from services.traffic_buffer import buffer_traffic
+from services.metrics import stage, alerts_created, records_analyzed
+from services import partition_service
+
+# Minimum anomaly score for an anomalous record to raise an alert
+ALERT_THRESHOLD = 0.7
+
+
+def get_ingest_mode():
+    """
+    Get the configured ingest mode
+
+    'bulk' (default) writes rows with chunked Core INSERT ... RETURNING, or COPY
+    on PostgreSQL. 'orm' adds one ORM object per row to the session.
+    """
+    return os.getenv('INGEST_MODE', 'bulk')
+
+
+def get_chunk_size():
+    """Get the number of rows written per INSERT/COPY statement"""
+    return int(os.getenv('INGEST_CHUNK_SIZE', 1000))
+
+
+def _copy_value(value):
+    """Format a value for PostgreSQL COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _copy_rows(model, rows):
+    """Insert rows with PostgreSQL COPY, reserving ids from the table sequence first"""
+    table = model.__table__
+    connection = db.session.connection()
+
+    ids = connection.execute(
+        text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+        {'table': table.name, 'count': len(rows)}
+    ).scalars().all()
+
+    columns = ['id'] + list(rows[0].keys())
+    buffer = io.StringIO()
+    for row_id, row in zip(ids, rows):
+        buffer.write(str(row_id))
+        for column in columns[1:]:
+            buffer.write('\t')
+            buffer.write(_copy_value(row[column]))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+    return ids
+
+
+def _supports_copy():
+    """Check whether the current connection can use the COPY fast path"""
+    dialect = db.session.connection().dialect
+    return dialect.name == 'postgresql' and dialect.driver == 'psycopg2'
+
+
+def insert_rows(model, rows, mode=None, chunk_size=None):
+    """
+    Insert rows into a model's table and return their ids in input order
+
+    Args:
+        model: Model class to insert into
+        rows (list): List of column dictionaries, all with the same keys
+        mode (str): 'bulk' or 'orm' (defaults to INGEST_MODE)
+        chunk_size (int): Rows per statement (defaults to INGEST_CHUNK_SIZE)
+
+    Returns:
+        list: Primary keys of the inserted rows
+    """
+    if not rows:
+        return []
+
+    mode = mode or get_ingest_mode()
+    chunk_size = chunk_size or get_chunk_size()
+
+    if mode not in ('bulk', 'orm'):
+        raise ValueError(f"Unknown ingest mode '{mode}'")
+
+    if partition_service.is_partitioned(model):
+        if db.session.connection().dialect.name == 'sqlite':
+            # SQLite partitions are separate tables behind a read-only view, so both modes route rows directly
+            return partition_service.insert_sqlite_partitioned(model, rows, chunk_size)
+        column = model.__table__.info['partition_column']
+        partition_service.start_scheduler()
+        partition_service.ensure_partitions(model, [row.get(column) or datetime.utcnow() for row in rows])
+
+    if mode == 'orm':
+        objects = [model(**row) for row in rows]
+        db.session.add_all(objects)
+        db.session.flush()
+        return [obj.id for obj in objects]
+
+    # Core statements on the session's connection skip ORM unit-of-work bookkeeping
+    connection = db.session.connection()
+    use_copy = _supports_copy()
+    table = model.__table__
+    statement = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+    ids = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        if use_copy:
+            ids.extend(_copy_rows(model, chunk))
+        else:
+            ids.extend(connection.execute(statement, chunk).scalars().all())
+    return ids
+
+
+def _parse_timestamp(record):
+    """Parse a record timestamp, defaulting to the current time"""
+    return datetime.fromisoformat(record.get('timestamp')) if record.get('timestamp') else datetime.utcnow()
+
+
+def _result(row_id, is_anomalous, anomaly_score, anomaly_type):
+    """Build the per-record analysis result returned to the client"""
+    return {
+        "id": row_id,
+        "is_anomalous": is_anomalous,
+        "anomaly_score": anomaly_score,
+        "anomaly_type": anomaly_type if is_anomalous else None
+    }
+
+
+def _alert_summary(alert_row, anomaly_score):
+    """Build the per-alert summary returned to the client"""
+    return {
+        "title": alert_row['title'],
+        "severity": alert_row['severity'],
+        "anomaly_score": anomaly_score
+    }
+
+
+def _add_stream_alerts(detections, alert_rows, alerts):
+    """Add an alert for each streaming detection"""
+    for detection in detections:
+        text = DETECTORS[detection['detector']]
+        fields = {'key': detection['key'], 'value': detection['value'], 'window': detection['window_seconds']}
+        seen = datetime.fromisoformat(detection['window_start'])
+        alert_rows.append({
+            'title': text['title'].format(**fields),
+            'description': text['description'].format(**fields),
+            'severity': "high",
+            'source': text['source'],
+            'fingerprint': fingerprint(text['source'], detection['detector'], detection['key'], "high"),
+            'occurrences': 1,
+            'first_seen': seen,
+            'last_seen': seen,
+            'details': json.dumps(detection)
+        })
+        alerts.append(_alert_summary(alert_rows[-1], None))
+
+
+def _insert_alerts(alert_rows, alerts, mode):
+    """
+    Coalesce alert rows into open aggregates and insert the rest in bulk
+
+    Each summary in alerts (one per alert row) gets the id of the alert row
+    its occurrence was inserted as or added to.
+    """
+    now = datetime.utcnow()
+    if alert_rows:
+        mark_changed('alerts')
+    occurrences = sum(row['occurrences'] for row in alert_rows)
+    inserts, targets = coalesce(alert_rows, now)
+    for row in inserts:
+        row.update(is_resolved=False, created_at=now)
+    ids = insert_rows(Alert, inserts, mode)
+    queue_alerts_created(inserts, ids)
+    record_rollups('alert', ((now, row['severity'], row['source'], False) for row in inserts))
+    record_alerts_created((row['severity'], row['source']) for row in inserts)
+    alerts_created(((row['severity'], row['source']) for row in inserts), occurrences - len(inserts))
+    for summary, (kind, target) in zip(alerts, targets):
+        summary['alert_id'] = ids[target] if kind == 'insert' else target
+
+
+def count_alerts(alerts):
+    """
+    Count the alert rows inserted or updated for a list of occurrence summaries
+
+    Returns:
+        int: Distinct alert ids; coalesced occurrences share one
+    """
+    return len({alert['alert_id'] for alert in alerts})
+
+
+def ingest_traffic(records, mode=None):
+    """
+    Analyze and store a batch of traffic records, creating alerts for high confidence anomalies
+
+    The caller is responsible for committing the session.
+
+    Args:
+        records (list): List of traffic record dictionaries
+        mode (str): 'bulk' or 'orm' (defaults to INGEST_MODE)
+
+    Returns:
+        tuple: (results, alerts) lists for the response; alerts has one
+        summary per alert occurrence, with the alert_id it was coalesced into
+    """
+    analysis_results = analyze_network_traffic_batch(records)
+
+    rows = [{
+        'source_ip': record.get('source_ip'),
+        'destination_ip': record.get('destination_ip'),
+        'source_port': record.get('source_port'),
+        'destination_port': record.get('destination_port'),
+        'protocol': record.get('protocol'),
+        'packet_size': record.get('packet_size'),
+        'timestamp': _parse_timestamp(record),
+        'is_anomalous': is_anomalous,
+        'anomaly_score': anomaly_score,
+        'anomaly_type': anomaly_type,
+        'raw_data': json.dumps(record)
+    } for record, (is_anomalous, anomaly_score, anomaly_type) in zip(records, analysis_results)]
+
+    with stage('insert'):
+        ids = insert_rows(TrafficData, rows, mode)
+    record_rollups('traffic', ((row['timestamp'], None, None, row['is_anomalous']) for row in rows))
+    records_analyzed('traffic', len(rows))
+    mark_changed('traffic')
+    buffer_traffic(rows)
+
+    alert_rows = []
+    alerts = []
+    results = []
+    for record, row, row_id, (is_anomalous, anomaly_score, anomaly_type) in zip(records, rows, ids, analysis_results):
+        if is_anomalous and anomaly_score > ALERT_THRESHOLD:  # High confidence anomaly
+            severity = "high" if anomaly_score > 0.9 else "medium"
+            alert_rows.append({
+                'title': f"Network Anomaly Detected: {anomaly_type}",
+                'description': f"Suspicious traffic detected from {record.get('source_ip')} to {record.get('destination_ip')}",
+                'severity': severity,
+                'source': "network",
+                'fingerprint': fingerprint("network", anomaly_type, record.get('source_ip'), severity),
+                'occurrences': 1,
+                'first_seen': row['timestamp'],
+                'last_seen': row['timestamp'],
+                'details': json.dumps({
+                    "traffic_id": row_id,
+                    "anomaly_score": anomaly_score,
+                    "anomaly_type": anomaly_type,
+                    "source_ip": record.get('source_ip'),
+                    "destination_ip": record.get('destination_ip'),
+                    "protocol": record.get('protocol'),
+                    "timestamp": record.get('timestamp')
+                })
+            })
+            alerts.append(_alert_summary(alert_rows[-1], anomaly_score))
+        results.append(_result(row_id, is_anomalous, anomaly_score, anomaly_type))
+
+    # Repeated behaviour across records (scans, floods, brute force) is caught by the streaming detectors
+    with stage('alerts'):
+        _add_stream_alerts(detect_traffic(rows), alert_rows, alerts)
+        _insert_alerts(alert_rows, alerts, mode)
+    return results, alerts
+
+
+def ingest_logs(log_entries, mode=None):
+    """
+    Analyze and store a batch of system log entries, creating alerts for high confidence anomalies
+
+    The caller is responsible for committing the session.
+
+    Args:
+        log_entries (list): List of log entry dictionaries
+        mode (str): 'bulk' or 'orm' (defaults to INGEST_MODE)
+
+    Returns:
+        tuple: (results, alerts) lists for the response; alerts has one
+        summary per alert occurrence, with the alert_id it was coalesced into
+    """
+    analysis_results = analyze_system_logs_batch(log_entries)
+
+    rows = [{
+        'log_level': log_entry.get('log_level'),
+        'source': log_entry.get('source'),
+        'message': log_entry.get('message'),
+        'timestamp': _parse_timestamp(log_entry),
+        'host': log_entry.get('host'),
+        'is_anomalous': is_anomalous,
+        'anomaly_score': anomaly_score,
+        'anomaly_type': anomaly_type,
+        'raw_data': json.dumps(log_entry)
+    } for log_entry, (is_anomalous, anomaly_score, anomaly_type) in zip(log_entries, analysis_results)]
+
+    with stage('insert'):
+        ids = insert_rows(SystemLog, rows, mode)
+    record_rollups('log', ((row['timestamp'], None, row['source'], row['is_anomalous']) for row in rows))
+    records_analyzed('logs', len(rows))
+    mark_changed('logs')
+
+    alert_rows = []
+    alerts = []
+    results = []
+    for log_entry, row, row_id, (is_anomalous, anomaly_score, anomaly_type) in zip(log_entries, rows, ids, analysis_results):
+        if is_anomalous and anomaly_score > ALERT_THRESHOLD:  # High confidence anomaly
+            severity = "high" if anomaly_score > 0.9 else "medium"
+            alert_rows.append({
+                'title': f"System Log Anomaly: {anomaly_type}",
+                'description': f"Suspicious log entry detected from {log_entry.get('source')} on {log_entry.get('host')}",
+                'severity': severity,
+                'source': "system",
+                'fingerprint': fingerprint("system", anomaly_type, log_entry.get('host'), severity),
+                'occurrences': 1,
+                'first_seen': row['timestamp'],
+                'last_seen': row['timestamp'],
+                'details': json.dumps({
+                    "log_id": row_id,
+                    "anomaly_score": anomaly_score,
+                    "anomaly_type": anomaly_type,
+                    "message": log_entry.get('message'),
+                    "source": log_entry.get('source'),
+                    "host": log_entry.get('host'),
+                    "timestamp": log_entry.get('timestamp')
+                })
+            })
+            alerts.append(_alert_summary(alert_rows[-1], anomaly_score))
+        results.append(_result(row_id, is_anomalous, anomaly_score, anomaly_type))
+
+    # Repeated behaviour across records (scans, floods, brute force) is caught by the streaming detectors
+    with stage('alerts'):
+        _add_stream_alerts(detect_logs(rows), alert_rows, alerts)
+        _insert_alerts(alert_rows, alerts, mode)
+    return results, alerts
+
+
+def get_stream_chunk_size():
+    """Get the default number of records analyzed and committed per streaming chunk"""
+    return int(os.getenv('STREAM_CHUNK_SIZE', 1000))
+
+
+def _ingest_chunk(ingest, records, positions, position_key='line'):
+    """
+    Ingest and commit one chunk, isolating bad records if the chunk fails
+
+    Args:
+        ingest: ingest_traffic or ingest_logs
+        records (list): Records in the chunk
+        positions: Position of each record reported in its error
+        position_key (str): Key of the position in each error
+
+    Returns:
+        tuple: (results, alerts, errors)
+    """
+    try:
+        results, alerts = ingest(records)
+        db.session.commit()
+        return results, alerts, []
+    except Exception:
+        db.session.rollback()
+
+    # Retry one record at a time so only the bad records are rejected
+    results, alerts, errors = [], [], []
+    for record, position in zip(records, positions):
+        try:
+            record_results, record_alerts = ingest([record])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            errors.append({position_key: position, "error": str(e)})
+            continue
+        results.extend(record_results)
+        alerts.extend(record_alerts)
+    return results, alerts, errors
+
+
+def stream_ingest(lines, ingest, chunk_size=None):
+    """
+    Analyze and store newline-delimited JSON records in committed chunks
+
+    Only one chunk is held in memory at a time. Records that are not valid JSON
+    objects or that fail to ingest are rejected individually without affecting
+    the rest of their chunk.
+
+    Args:
+        lines: Iterable of NDJSON lines (bytes or str)
+        ingest: ingest_traffic or ingest_logs
+        chunk_size (int): Records per chunk (defaults to STREAM_CHUNK_SIZE)
+
+    Yields:
+        dict: One result per chunk, followed by a final summary
+    """
+    chunk_size = chunk_size or get_stream_chunk_size()
+    summary = {
+        "summary": True,
+        "chunks": 0,
+        "records": 0,
+        "accepted": 0,
+        "rejected": 0,
+        "anomalies_detected": 0,
+        "alerts_generated": 0,
+        "alert_occurrences": 0
+    }
+
+    def flush(records, line_numbers, parse_errors):
+        results, alerts, ingest_errors = _ingest_chunk(ingest, records, line_numbers) if records else ([], [], [])
+        errors = sorted(parse_errors + ingest_errors, key=lambda error: error["line"])
+        anomalies = sum(1 for r in results if r["is_anomalous"])
+
+        summary["chunks"] += 1
+        summary["records"] += len(records) + len(parse_errors)
+        summary["accepted"] += len(results)
+        summary["rejected"] += len(errors)
+        summary["anomalies_detected"] += anomalies
+        summary["alerts_generated"] += count_alerts(alerts)
+        summary["alert_occurrences"] += len(alerts)
+
+        return {
+            "chunk": summary["chunks"],
+            "records": len(records) + len(parse_errors),
+            "anomalies_detected": anomalies,
+            "alerts_generated": count_alerts(alerts),
+            "alert_occurrences": len(alerts),
+            "error_count": len(errors),
+            "errors": errors,
+            "results": results
+        }
+
+    records, line_numbers, errors = [], [], []
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            errors.append({"line": line_number, "error": f"Invalid JSON: {str(e)}"})
+            record = None
+        else:
+            if not isinstance(record, dict):
+                errors.append({"line": line_number, "error": "Expected a JSON object"})
+                record = None
+
+        if record is not None:
+            records.append(record)
+            line_numbers.append(line_number)
+
+        if len(records) + len(errors) >= chunk_size:
+            yield flush(records, line_numbers, errors)
+            records, line_numbers, errors = [], [], []
+
+    if records or errors:
+        yield flush(records, line_numbers, errors)
+
+    yield summary
+
+
+def ingest_records(records, ingest, chunk_size=None):
+    """
+    Analyze and store a list of records in committed chunks
+
+    Records that fail to ingest are rejected individually without affecting
+    the rest of their chunk.
+
+    Args:
+        records (list): Record dictionaries
+        ingest: ingest_traffic or ingest_logs
+        chunk_size (int): Records per chunk (defaults to STREAM_CHUNK_SIZE)
+
+    Yields:
+        tuple: (results, alerts, errors) per chunk; each error gives the index of its record
+    """
+    chunk_size = chunk_size or get_stream_chunk_size()
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        yield _ingest_chunk(ingest, chunk, range(start, start + len(chunk)), 'index')
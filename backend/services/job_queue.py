@@ -0,0 +1,394 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import Counter, deque
+from datetime import datetime
+import redis
+from app import app
+from services.ingest_service import ingest_traffic, ingest_logs, ingest_records, count_alerts
+
+# Ingest function run for each job kind
+INGEST_FUNCTIONS = {
+    'traffic': ingest_traffic,
+    'logs': ingest_logs
+}
+
+_KEY_PREFIX = 'jobs:'
+_QUEUE_KEY = _KEY_PREFIX + 'queue'
+
+
+class QueueFull(Exception):
+    """Raised when the queue already holds the maximum number of waiting jobs"""
+    pass
+
+
+class JobQueueUnavailable(Exception):
+    """Raised by a backend that cannot be reached"""
+    pass
+
+
+def get_max_depth():
+    """Get the maximum number of jobs waiting in the queue before submissions are rejected"""
+    return int(os.getenv('JOB_QUEUE_MAX_DEPTH', 100))
+
+
+def get_max_records():
+    """Get the maximum number of records accepted in one job"""
+    return int(os.getenv('JOB_MAX_RECORDS', 100000))
+
+
+def get_result_ttl():
+    """Get the number of seconds a job and its results are kept"""
+    return int(os.getenv('JOB_RESULT_TTL', 3600))
+
+
+def get_result_limit():
+    """
+    Get the most results and errors kept with a finished job (JOB_RESULT_LIMIT)
+
+    Results beyond it are not kept; every result refers to its stored row by
+    id, and the job's counters cover all records.
+    """
+    return int(os.getenv('JOB_RESULT_LIMIT', 1000))
+
+
+def get_worker_count():
+    """Get the number of worker threads each web process runs (0 leaves jobs to `flask job-worker`)"""
+    return int(os.getenv('JOB_WORKERS', 2))
+
+
+class MemoryBackend:
+    """
+    In-process queue and job store
+
+    Jobs are only visible to, and only run by, the process that accepted
+    them, and are lost when it exits.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_depth, result_ttl):
+        self.max_depth = max_depth
+        self.result_ttl = result_ttl
+        self._queue = deque()
+        self._jobs = {}
+        self._condition = threading.Condition()
+
+    def _prune(self):
+        now = time.monotonic()
+        for job_id in [job_id for job_id, (_, expires_at) in self._jobs.items() if expires_at <= now]:
+            del self._jobs[job_id]
+
+    def push(self, job, records):
+        with self._condition:
+            if len(self._queue) >= self.max_depth:
+                return False
+            self._prune()
+            self._jobs[job['id']] = (dict(job), time.monotonic() + self.result_ttl)
+            self._queue.append((job['id'], records))
+            self._condition.notify()
+            return True
+
+    def pop(self, timeout):
+        with self._condition:
+            if not self._queue:
+                self._condition.wait(timeout)
+            if not self._queue:
+                return None
+            job_id, records = self._queue.popleft()
+            entry = self._jobs.get(job_id)
+            return (dict(entry[0]), records) if entry is not None else None
+
+    def save(self, job):
+        with self._condition:
+            self._jobs[job['id']] = (dict(job), time.monotonic() + self.result_ttl)
+
+    def load(self, job_id):
+        with self._condition:
+            entry = self._jobs.get(job_id)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            return dict(entry[0])
+
+    def depth(self):
+        with self._condition:
+            return len(self._queue)
+
+
+class RedisBackend:
+    """
+    Redis list queue and job store shared by every process
+
+    A job that was running in a process that died stays 'running' until it
+    expires.
+    """
+
+    name = 'redis'
+
+    def __init__(self, client, max_depth, result_ttl):
+        self.client = client
+        self.max_depth = max_depth
+        self.result_ttl = result_ttl
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return getattr(self.client, method)(*args, **kwargs)
+        except redis.RedisError as e:
+            raise JobQueueUnavailable(str(e)) from e
+
+    def push(self, job, records):
+        job_key = _KEY_PREFIX + job['id']
+        self._call('set', job_key, json.dumps(job), ex=self.result_ttl)
+        self._call('set', job_key + ':records', json.dumps(records), ex=self.result_ttl)
+        # LPUSH reports the new length atomically, so concurrent submissions cannot overshoot the cap
+        if self._call('lpush', _QUEUE_KEY, job['id']) > self.max_depth:
+            self._call('lrem', _QUEUE_KEY, 1, job['id'])
+            self._call('delete', job_key, job_key + ':records')
+            return False
+        return True
+
+    def pop(self, timeout):
+        popped = self._call('brpop', _QUEUE_KEY, timeout=max(int(timeout), 1))
+        if popped is None:
+            return None
+        job_key = _KEY_PREFIX + popped[1]
+        job, records = self._call('mget', [job_key, job_key + ':records'])
+        self._call('delete', job_key + ':records')
+        if job is None or records is None:
+            return None
+        return json.loads(job), json.loads(records)
+
+    def save(self, job):
+        self._call('set', _KEY_PREFIX + job['id'], json.dumps(job), ex=self.result_ttl)
+
+    def load(self, job_id):
+        job = self._call('get', _KEY_PREFIX + job_id)
+        return json.loads(job) if job is not None else None
+
+    def depth(self):
+        return self._call('llen', _QUEUE_KEY)
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+class JobQueue:
+    """
+    Queue of analysis batches drained by a pool of worker threads
+
+    Workers run the same chunked ingest as the streaming endpoints, committing
+    each chunk and recording progress on the job as they go.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._workers = []
+        self._running = False
+        self._counts = Counter()
+        self._counts_lock = threading.Lock()
+
+    def _count(self, outcome):
+        with self._counts_lock:
+            self._counts[outcome] += 1
+
+    def submit(self, kind, records, user_id):
+        """
+        Queue a batch of records for analysis
+
+        Args:
+            kind (str): 'traffic' or 'logs'
+            records (list): Record dictionaries
+            user_id (int): Id of the submitting user
+
+        Returns:
+            dict: The queued job
+
+        Raises:
+            QueueFull: The queue already holds JOB_QUEUE_MAX_DEPTH waiting jobs
+            JobQueueUnavailable: The backend cannot be reached
+        """
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'user_id': user_id,
+            'status': 'queued',
+            'records': len(records),
+            'processed': 0,
+            'anomalies_detected': 0,
+            'alerts_generated': 0,
+            'alert_occurrences': 0,
+            'error_count': 0,
+            'created_at': _now(),
+            'started_at': None,
+            'finished_at': None
+        }
+        if not self.backend.push(job, records):
+            self._count('rejected')
+            raise QueueFull(f'Job queue is full ({self.backend.max_depth} jobs waiting)')
+        self._count('submitted')
+        return job
+
+    def get(self, job_id):
+        """Get a job by id, or None if it does not exist or has expired"""
+        return self.backend.load(job_id)
+
+    def _save(self, job):
+        try:
+            self.backend.save(job)
+        except JobQueueUnavailable:
+            # The stored job lags behind until a later save gets through
+            pass
+
+    def _process(self, job, records):
+        job.update(status='running', started_at=_now())
+        self._save(job)
+
+        limit = get_result_limit()
+        results, errors = [], []
+        try:
+            with app.app_context():
+                for chunk_results, chunk_alerts, chunk_errors in ingest_records(records, INGEST_FUNCTIONS[job['kind']]):
+                    results.extend(chunk_results[:limit - len(results)])
+                    errors.extend(chunk_errors[:limit - len(errors)])
+                    job['processed'] += len(chunk_results) + len(chunk_errors)
+                    job['anomalies_detected'] += sum(1 for r in chunk_results if r["is_anomalous"])
+                    job['alerts_generated'] += count_alerts(chunk_alerts)
+                    job['alert_occurrences'] += len(chunk_alerts)
+                    job['error_count'] += len(chunk_errors)
+                    self._save(job)
+            job.update(status='completed', results=results,
+                       results_truncated=len(results) < job['processed'] - job['error_count'])
+            self._count('completed')
+        except Exception as e:
+            job.update(status='failed', error=str(e))
+            self._count('failed')
+        job.update(errors=errors, errors_truncated=len(errors) < job['error_count'])
+
+        job['finished_at'] = _now()
+        self._save(job)
+
+    def _work(self):
+        while self._running:
+            try:
+                popped = self.backend.pop(timeout=1)
+            except JobQueueUnavailable:
+                time.sleep(1)
+                continue
+            if popped is not None:
+                self._process(*popped)
+
+    def start(self, workers):
+        """Start worker threads draining the queue"""
+        self._running = True
+        for _ in range(workers):
+            worker = threading.Thread(target=self._work, name='analysis-job-worker', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        """Stop the workers once their current jobs finish"""
+        self._running = False
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def stats(self):
+        """
+        Get queue counters
+
+        Returns:
+            dict: backend name, depth, worker count and submitted, rejected,
+            completed and failed totals for this process
+        """
+        with self._counts_lock:
+            counts = Counter(self._counts)
+        try:
+            depth = self.backend.depth()
+        except JobQueueUnavailable:
+            depth = None
+        return {
+            'backend': self.backend.name,
+            'depth': depth,
+            'max_depth': self.backend.max_depth,
+            'workers': len(self._workers),
+            **{outcome: counts[outcome] for outcome in ('submitted', 'rejected', 'completed', 'failed')}
+        }
+
+
+def _several_web_workers():
+    return int(os.getenv('WEB_CONCURRENCY', 1)) > 1
+
+
+def check_config():
+    """
+    Check that several web workers (WEB_CONCURRENCY) are not sharing the in-process queue
+
+    Each worker would only see the jobs it accepted, so polling a job would
+    answer 404 whenever the request lands on another worker. The queue is
+    refused instead, and the job endpoints answer 503 with the reason.
+
+    Raises:
+        JobQueueUnavailable: WEB_CONCURRENCY > 1 with JOB_QUEUE=memory or without REDIS_URL
+    """
+    if _several_web_workers() and (os.getenv('JOB_QUEUE', 'auto').lower() == 'memory' or not os.getenv('REDIS_URL')):
+        raise JobQueueUnavailable('several web workers (WEB_CONCURRENCY) need the Redis job queue, set REDIS_URL')
+
+
+def _create_backend():
+    """
+    Create the backend selected by JOB_QUEUE
+
+    'redis' uses REDIS_URL, 'memory' keeps jobs in the process. The default,
+    'auto', uses Redis when REDIS_URL is set and falls back to memory when
+    Redis cannot be reached, unless there are several web workers.
+
+    Raises:
+        JobQueueUnavailable: The configuration is refused by check_config, or Redis
+        cannot be reached and several web workers need it
+    """
+    check_config()
+    setting = os.getenv('JOB_QUEUE', 'auto').lower()
+    max_depth, result_ttl = get_max_depth(), get_result_ttl()
+
+    redis_url = os.getenv('REDIS_URL')
+    if setting in ('auto', 'redis') and redis_url:
+        # The socket timeout has to outlast the blocking pop
+        client = redis.Redis.from_url(redis_url, socket_timeout=5, socket_connect_timeout=0.5, decode_responses=True)
+        try:
+            client.ping()
+            return RedisBackend(client, max_depth, result_ttl)
+        except redis.RedisError as e:
+            if _several_web_workers():
+                raise JobQueueUnavailable(str(e)) from e
+            print(f"Job queue: Redis unavailable ({e}), using the in-process queue")
+
+    return MemoryBackend(max_depth, result_ttl)
+
+
+job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue(start_workers=True):
+    """
+    Get the process-wide job queue, creating it on first use
+
+    Args:
+        start_workers (bool): Start JOB_WORKERS worker threads when the queue is created
+
+    Raises:
+        JobQueueUnavailable: The queue cannot be created; the next call tries again
+    """
+    global job_queue
+
+    with _job_queue_lock:
+        if job_queue is None:
+            job_queue = JobQueue(_create_backend())
+            if start_workers:
+                if job_queue.backend.name == 'memory' and get_worker_count() == 0:
+                    print("Job queue: JOB_WORKERS=0 with the in-process queue, queued jobs will never run")
+                job_queue.start(get_worker_count())
+    return job_queue
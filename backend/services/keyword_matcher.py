@@ -0,0 +1,203 @@
+import os
+import re
+import json
+
+# Default keyword catalog for system log analysis. Categories are listed in
+# priority order: when a message matches several categories the first one
+# determines the score and anomaly type, so security keywords outrank error
+# keywords as in ml_service.analyze_system_logs.
+DEFAULT_LOG_KEYWORD_CATALOG = [
+    {
+        "category": "security",
+        "score": 0.8,
+        "anomaly_type": "Security Keyword Detected",
+        "keywords": [
+            'failed login', 'authentication failure', 'permission denied',
+            'unauthorized', 'exploit', 'injection', 'overflow', 'attack',
+            'malware', 'virus', 'trojan', 'ransomware', 'breach'
+        ]
+    },
+    {
+        "category": "error",
+        "score": 0.6,
+        "anomaly_type": "Error Pattern Detected",
+        "keywords": ['error', 'exception', 'fail', 'critical', 'fatal']
+    }
+]
+
+
+def load_log_keyword_catalog():
+    """
+    Load the log keyword catalog
+
+    The catalog is read from the JSON file named by LOG_KEYWORDS_PATH when it
+    is set, otherwise the built-in defaults are used.
+
+    Returns:
+        list: List of category dictionaries in priority order
+    """
+    catalog_path = os.getenv('LOG_KEYWORDS_PATH')
+    if not catalog_path:
+        return DEFAULT_LOG_KEYWORD_CATALOG
+
+    with open(catalog_path) as f:
+        return json.load(f)
+
+
+def get_trie_min_keywords():
+    """
+    Get the catalog size from which keywords are matched with one compiled trie regex (LOG_KEYWORD_TRIE_MIN)
+
+    Smaller catalogs are scanned keyword by keyword, which measured faster
+    up to about 60 keywords (the default catalog has 18).
+    """
+    return int(os.getenv('LOG_KEYWORD_TRIE_MIN', 64))
+
+
+def _trie_pattern(node):
+    """Convert a character trie into a regular expression that prefers the longest keyword"""
+    is_terminal = '' in node
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char != '']
+
+    if not branches:
+        return ''
+
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if is_terminal:
+        # Greedy optional suffix tries the longer keyword first
+        pattern = '(?:' + pattern + ')?'
+    return pattern
+
+
+class LogKeywordMatcher:
+    """
+    Multi-pattern keyword matcher built once from a keyword catalog
+
+    Catalogs of at least LOG_KEYWORD_TRIE_MIN keywords are compiled into a
+    single trie-shaped regular expression. A plain search finds the first
+    keyword (most messages match nothing and stop there), then a lookahead
+    scan from that point visits every remaining position, so overlapping
+    keywords are not lost. Each match is the longest keyword starting at its
+    position; the categories of shorter keywords sharing the same start are
+    recovered from a prefix table, so every matched category is reported.
+
+    Smaller catalogs are scanned with substring checks in priority order,
+    stopping at the first keyword found when only the top category is needed.
+    """
+
+    def __init__(self, catalog=None, trie_min_keywords=None):
+        catalog = catalog if catalog is not None else load_log_keyword_catalog()
+        if trie_min_keywords is None:
+            trie_min_keywords = get_trie_min_keywords()
+
+        self.categories = [entry['category'] for entry in catalog]
+        self.outcomes = {
+            entry['category']: (True, float(entry['score']), entry['anomaly_type'])
+            for entry in catalog
+        }
+        self.no_match = (False, 0.0, None)
+
+        # Keyword -> indexes of every category that lists it
+        keyword_categories = {}
+        for index, entry in enumerate(catalog):
+            for keyword in entry['keywords']:
+                keyword = keyword.lower()
+                if keyword:
+                    keyword_categories.setdefault(keyword, set()).add(index)
+
+        trie = {}
+        for keyword in keyword_categories:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = True
+
+        # Each keyword also implies the categories of every keyword that is its prefix
+        self.prefix_categories = {}
+        for keyword in keyword_categories:
+            indexes = set()
+            for end in range(1, len(keyword) + 1):
+                indexes |= keyword_categories.get(keyword[:end], set())
+            self.prefix_categories[keyword] = frozenset(indexes)
+
+        self.keyword_count = len(keyword_categories)
+        # Lowercased keywords of each category, in priority order, for the substring scan
+        self.category_keywords = [
+            tuple(dict.fromkeys(keyword.lower() for keyword in entry['keywords'] if keyword))
+            for entry in catalog
+        ]
+        self.search_pattern = None
+        self.pattern = None
+        self.uses_trie = self.keyword_count >= max(trie_min_keywords, 1)
+        if self.uses_trie:
+            trie_pattern = _trie_pattern(trie)
+            self.search_pattern = re.compile(trie_pattern)
+            self.pattern = re.compile('(?=(' + trie_pattern + '))')
+
+    def match_indexes(self, message):
+        """Return the set of matched category indexes for a message"""
+        message = message.lower()
+        if not self.uses_trie:
+            return {index for index, keywords in enumerate(self.category_keywords)
+                    if any(keyword in message for keyword in keywords)}
+
+        first = self.search_pattern.search(message)
+        if first is None:
+            return set()
+
+        indexes = set()
+        prefix_categories = self.prefix_categories
+        for keyword in set(self.pattern.findall(message, first.start())):
+            indexes |= prefix_categories[keyword]
+        return indexes
+
+    def match(self, message):
+        """
+        Find every keyword category present in a message
+
+        Args:
+            message (str): Log message
+
+        Returns:
+            list: Matched category names in priority order
+        """
+        return [self.categories[index] for index in sorted(self.match_indexes(message))]
+
+    def classify(self, message):
+        """
+        Classify a log message using the highest priority matched category
+
+        Args:
+            message (str): Log message
+
+        Returns:
+            tuple: (is_anomalous, anomaly_score, anomaly_type)
+        """
+        index = self.top_index(message)
+        if index < 0:
+            return self.no_match
+        return self.outcomes[self.categories[index]]
+
+    def top_index(self, message):
+        """Return the index of the highest priority matched category, or -1 when nothing matches"""
+        if self.uses_trie:
+            return min(self.match_indexes(message), default=-1)
+
+        message = message.lower()
+        for index, keywords in enumerate(self.category_keywords):
+            for keyword in keywords:
+                if keyword in message:
+                    return index
+        return -1
+
+    def classify_batch(self, messages):
+        """
+        Classify a batch of log messages
+
+        Args:
+            messages (list): List of log messages
+
+        Returns:
+            list: List of (is_anomalous, anomaly_score, anomaly_type) tuples
+        """
+        return list(map(self.classify, messages))
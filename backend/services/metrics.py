@@ -0,0 +1,502 @@
+import os
+import json
+import time
+import atexit
+import threading
+from bisect import bisect_left
+from collections import Counter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from flask import Response, g, has_request_context, request
+
+# Session.info key holding counter increments waiting for the transaction to commit
+_PENDING_KEY = 'metrics_pending'
+
+# Upper bounds in seconds of the request and stage latency buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the model batch size buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def is_enabled():
+    """Check whether request and stage metrics are collected (METRICS_ENABLED, default true)"""
+    return os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+
+def get_metrics_token():
+    """Get the bearer token /api/metrics requires (METRICS_TOKEN), or None when it is open"""
+    return os.getenv('METRICS_TOKEN') or None
+
+
+def get_multiprocess_dir():
+    """
+    Get the directory worker processes share their metrics through (METRICS_MULTIPROC_DIR), or None
+
+    gunicorn.conf.py points it at a fresh directory when there are several workers.
+    """
+    return os.getenv('METRICS_MULTIPROC_DIR') or None
+
+
+def get_flush_seconds():
+    """Get how often a process writes its metrics to the shared directory (METRICS_FLUSH_SECONDS, default 5)"""
+    return float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class CounterMetric:
+    """Monotonic counter per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, labels=()):
+        """
+        Add to the counter
+
+        Args:
+            amount (float): Amount added
+            labels (tuple): Label values in the order of the counter's label names
+        """
+        _start_flusher()
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        """Get this process's values as JSON-serializable [labels, value] pairs"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def merge(self, snapshots):
+        """Add up snapshots of several processes into one snapshot"""
+        values = {}
+        for snapshot in snapshots:
+            for key, value in snapshot:
+                values[tuple(key)] = values.get(tuple(key), 0) + value
+        return [[list(key), value] for key, value in sorted(values.items())]
+
+    def samples(self, snapshots=None):
+        """
+        Render the counter's samples
+
+        Args:
+            snapshots (list): Snapshots of several processes to add up (defaults to this process's)
+        """
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}'
+                for key, value in self.merge(snapshots if snapshots is not None else [self.snapshot()])]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram per label combination
+
+    Memory is bounded by the bucket count times the label combinations, and
+    an observation is a binary search plus two additions under a lock.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        """
+        Record one observation
+
+        Args:
+            value (float): Observed value
+            labels (tuple): Label values in the order of the histogram's label names
+        """
+        index = bisect_left(self.buckets, value)
+        _start_flusher()
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf) and the sum of the observations
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self):
+        """Get this process's series as JSON-serializable [labels, bucket counts, sum] lists"""
+        with self._lock:
+            return [[list(key), list(counts), total] for key, (counts, total) in self._series.items()]
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+    def merge(self, snapshots):
+        """Add up snapshots of several processes into one snapshot"""
+        series = {}
+        for snapshot in snapshots:
+            for key, counts, total in snapshot:
+                merged = series.setdefault(tuple(key), [[0] * len(counts), 0.0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+        return [[list(key), counts, total] for key, (counts, total) in sorted(series.items())]
+
+    def samples(self, snapshots=None):
+        """
+        Render the histogram's samples
+
+        Args:
+            snapshots (list): Snapshots of several processes to add up (defaults to this process's)
+        """
+        lines = []
+        for key, counts, total in self.merge(snapshots if snapshots is not None else [self.snapshot()]):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = 'le="' + str(bound) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {cumulative}')
+        return lines
+
+
+REQUESTS = CounterMetric('http_requests_total', 'HTTP requests handled', ('method', 'endpoint', 'status'))
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Time spent handling HTTP requests',
+                            ('method', 'endpoint'))
+STAGE_SECONDS = Histogram('request_stage_duration_seconds', 'Time spent in each stage of a request',
+                          ('endpoint', 'stage'))
+RECORDS_ANALYZED = CounterMetric('records_analyzed_total', 'Traffic records and log entries run through detection and committed', ('kind',))
+ALERTS_CREATED = CounterMetric('alerts_created_total', 'Alert rows committed', ('source', 'severity'))
+ALERTS_COALESCED = CounterMetric('alerts_coalesced_total', 'Alert occurrences committed without a new alert row (coalesced)')
+MODEL_BATCH_SIZE = Histogram('model_batch_size', 'Texts per model forward pass', buckets=BATCH_SIZE_BUCKETS)
+MODEL_BATCH_SECONDS = Histogram('model_batch_duration_seconds', 'Time per model forward pass, tokenization included')
+
+REGISTRY = (REQUESTS, REQUEST_SECONDS, STAGE_SECONDS, RECORDS_ANALYZED, ALERTS_CREATED, ALERTS_COALESCED,
+            MODEL_BATCH_SIZE, MODEL_BATCH_SECONDS)
+
+_enabled = is_enabled()
+_directory = get_multiprocess_dir()
+
+# File in the shared directory holding the added-up metrics of exited processes
+_EXITED_FILE = 'exited.json'
+
+# Process that runs the flusher thread, and the file it writes (pid plus start time, as pids get reused)
+_flusher_pid = None
+_snapshot_path = None
+_flusher_lock = threading.Lock()
+
+
+def write_snapshot():
+    """Write this process's metrics to its file in the shared directory"""
+    if _snapshot_path is None:
+        return
+    temporary = f'{_snapshot_path}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump({metric.name: metric.snapshot() for metric in REGISTRY}, f)
+    os.replace(temporary, _snapshot_path)
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(get_flush_seconds())
+        try:
+            write_snapshot()
+        except OSError as e:
+            print(f"Metrics: writing {_snapshot_path} failed ({e})")
+
+
+def _start_flusher():
+    """Start writing this process's metrics to the shared directory, once per process"""
+    global _flusher_pid, _snapshot_path
+
+    if _directory is None or _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+        _snapshot_path = os.path.join(_directory, f'{os.getpid()}-{time.time_ns()}.json')
+    threading.Thread(target=_flush_periodically, name='metrics-flusher', daemon=True).start()
+    atexit.register(write_snapshot)
+
+
+def _read_snapshots(directory):
+    """Read the metrics every process wrote to the shared directory, including exited ones"""
+    snapshots = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                snapshots[name] = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+    exited = snapshots.pop(_EXITED_FILE, None)
+    if exited is None:
+        return list(snapshots.values())
+    # Files already added to the exited processes' totals may not have been removed yet
+    return [snapshot for name, snapshot in snapshots.items() if name not in exited['merged']] + [exited['metrics']]
+
+
+def _pid_exited(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+def merge_exited_processes(directory=None):
+    """
+    Fold the snapshot files of exited processes into one file of their totals
+
+    Called by gunicorn's child_exit hook in the master (gunicorn.conf.py), so
+    the shared directory keeps one file per live process instead of growing
+    with every worker restart, while the totals stay monotonic. The totals
+    file is replaced first and lists the files it absorbed, so a worker
+    reading the directory before they are removed skips them instead of
+    counting them twice.
+
+    Args:
+        directory (str): Shared directory (defaults to METRICS_MULTIPROC_DIR)
+
+    Returns:
+        int: Number of snapshot files folded in
+    """
+    directory = directory or get_multiprocess_dir()
+    if directory is None:
+        return 0
+
+    names = []
+    for name in sorted(os.listdir(directory)):
+        pid = name.split('-', 1)[0]
+        if name.endswith('.json') and pid.isdigit() and _pid_exited(int(pid)):
+            names.append(name)
+    if not names:
+        return 0
+
+    snapshots = []
+    path = os.path.join(directory, _EXITED_FILE)
+    try:
+        with open(path) as f:
+            snapshots.append(json.load(f)['metrics'])
+    except (OSError, ValueError):
+        pass
+    folded = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+        folded.append(name)
+    if not folded:
+        return 0
+
+    merged = {metric.name: metric.merge([snapshot.get(metric.name, []) for snapshot in snapshots])
+              for metric in REGISTRY}
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump({'merged': folded, 'metrics': merged}, f)
+    os.replace(temporary, path)
+
+    for name in folded:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+    return len(folded)
+
+
+def _reset_after_fork():
+    global _flusher_pid, _snapshot_path
+
+    # Workers forked from a preloading master start from zero instead of repeating the master's counts
+    for metric in REGISTRY:
+        metric.reset()
+    _flusher_pid, _snapshot_path = None, None
+
+
+if _directory is not None:
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _endpoint():
+    """Route rule of the current request, bounded by the number of routes"""
+    if not has_request_context():
+        return 'background'
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+class stage:
+    """
+    Time a stage of the current request
+
+    Usage:
+        with stage('detection'):
+            ...
+
+    Outside a request (job workers, CLI commands) the endpoint label is 'background'.
+    """
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if _enabled:
+            STAGE_SECONDS.observe(time.perf_counter() - self.start, (_endpoint(), self.name))
+        return False
+
+
+def records_analyzed(kind, count):
+    """
+    Count records run through detection once the current transaction commits
+
+    Call after the records' rows are written: a chunk that fails is then
+    rolled back with its count, and only the per-record retries that commit
+    are counted.
+    """
+    if _enabled:
+        _pending().append((RECORDS_ANALYZED, count, (kind,)))
+
+
+def model_batch(size, seconds):
+    """Record one model forward pass"""
+    if _enabled:
+        MODEL_BATCH_SIZE.observe(size)
+        MODEL_BATCH_SECONDS.observe(seconds)
+
+
+def _pending():
+    """Get the counter increments pending on the current session's transaction"""
+    from app import db
+    return db.session.info.setdefault(_PENDING_KEY, [])
+
+
+def alerts_created(alerts, coalesced=0):
+    """
+    Count alerts once the current transaction commits
+
+    Args:
+        alerts: Iterable of (severity, source) tuples of inserted alert rows
+        coalesced (int): Occurrences folded into an open aggregate or another row of the batch
+    """
+    if not _enabled:
+        return
+    pending = _pending()
+    tally = Counter((source, severity) for severity, source in alerts)
+    pending.extend((ALERTS_CREATED, count, labels) for labels, count in tally.items())
+    if coalesced:
+        pending.append((ALERTS_COALESCED, coalesced, ()))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending(session):
+    for metric, amount, labels in session.info.pop(_PENDING_KEY, ()):
+        metric.inc(amount, labels)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _record_request(status):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    endpoint = _endpoint()
+    REQUEST_SECONDS.observe(time.perf_counter() - start, (request.method, endpoint))
+    REQUESTS.inc(1, (request.method, endpoint, str(status)))
+
+
+def init_app(app):
+    """
+    Install the request timing hooks on the app
+
+    Durations run from before_request to after_request, so a streamed
+    response is timed until its first chunk is ready rather than to the end
+    of the stream. Requests ending in an unhandled exception count as 500.
+    """
+    if not _enabled:
+        return
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _finish_request_timer(response):
+        _record_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _finish_failed_request_timer(exc):
+        _record_request(500)
+
+
+def render():
+    """
+    Render every metric in the Prometheus text exposition format
+
+    With METRICS_MULTIPROC_DIR, the metrics of every process that wrote to
+    it are added up, so any worker answers for all of them; the other
+    workers' values are up to METRICS_FLUSH_SECONDS old. Otherwise only
+    this process's metrics are reported.
+
+    Returns:
+        str: The exposition, one HELP/TYPE header per metric
+    """
+    snapshots = None
+    if _directory is not None:
+        _start_flusher()
+        write_snapshot()
+        snapshots = _read_snapshots(_directory)
+
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples([snapshot.get(metric.name, []) for snapshot in snapshots]
+                                    if snapshots is not None else None))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_response():
+    """Build the /api/metrics response, checking METRICS_TOKEN when it is set"""
+    if not _enabled:
+        return Response('Metrics are disabled\n', status=404, mimetype='text/plain')
+    token = get_metrics_token()
+    if token is not None and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(render(), mimetype='text/plain; version=0.0.4')
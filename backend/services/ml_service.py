@@ -1,28 +1,84 @@
 import os
 import json
-import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
-import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from transformers import pipeline
+from sqlalchemy import func
 from app import db
 from models.traffic_data import TrafficData
 from models.system_log import SystemLog
-from models.alert import Alert
+from services.rule_engine import TrafficRuleEngine
+from services.keyword_matcher import LogKeywordMatcher
+from services.detection_pool import get_detection_pool
+from services import archive_service
+from services.metrics import stage
+
+# torch and transformers are imported when the model is first loaded: the
+# rule-based detection path does not need them and they dominate startup
+# time and memory
 
 # Initialize tokenizer and model (lazy loading)
 tokenizer = None
 model = None
 
+# CPU optimizations applied to the loaded model (set by load_model and get_inference_server)
+model_profile = None
+
+# Micro-batching inference server for the model (started on first use)
+inference_server = None
+
+# Compiled traffic rule engine and log keyword matcher (built on first use)
+traffic_rule_engine = None
+log_keyword_matcher = None
+
+def get_inference_profile():
+    """
+    Get the inference settings selected by INFERENCE_PROFILE
+
+    'default' runs the full-precision model with torch's default threads.
+    'optimized' quantizes the linear layers to int8 and sizes the thread
+    pools explicitly: INFERENCE_THREADS intra-op threads (default: the CPUs
+    this process may run on; divide them between worker processes) and
+    INFERENCE_INTEROP_THREADS inter-op threads (default 1, the forward
+    passes run one at a time). INFERENCE_QUANTIZE and the thread variables
+    also override either profile on their own.
+
+    Returns:
+        dict: name, quantize, intra_op_threads and inter_op_threads (None keeps torch's default)
+    """
+    name = os.getenv('INFERENCE_PROFILE', 'default').lower()
+    optimized = name == 'optimized'
+
+    quantize = os.getenv('INFERENCE_QUANTIZE')
+    intra_op = os.getenv('INFERENCE_THREADS')
+    inter_op = os.getenv('INFERENCE_INTEROP_THREADS')
+    return {
+        'name': name,
+        'quantize': quantize.lower() in ('1', 'true', 'yes') if quantize is not None else optimized,
+        'intra_op_threads': int(intra_op) if intra_op else (len(os.sched_getaffinity(0)) if optimized else None),
+        'inter_op_threads': int(inter_op) if inter_op else (1 if optimized else None)
+    }
+
+def optimize_model():
+    """Apply the selected inference profile's model changes to the loaded model"""
+    global model, model_profile
+    from services.inference_service import quantize_model
+    
+    profile = get_inference_profile()
+    model.eval()
+    if profile['quantize']:
+        model = quantize_model(model)
+    
+    model_profile = {'name': profile['name'], 'quantized': profile['quantize'], 'preloaded': False}
+
 def load_model():
-    """Load the transformer model and tokenizer"""
+    """Load the transformer model and tokenizer and apply the inference profile"""
     global tokenizer, model
     
     # Check if model is already loaded
     if tokenizer is not None and model is not None:
         return
     
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    
     # Get model path from environment or use default
     model_path = os.getenv('MODEL_PATH', 'distilbert-base-uncased')
     
@@ -37,6 +93,69 @@ def load_model():
         # Fallback to a simpler model if custom model fails
         tokenizer = AutoTokenizer.from_pretrained('distilbert-base-uncased')
         model = AutoModelForSequenceClassification.from_pretrained('distilbert-base-uncased')
+    
+    optimize_model()
+
+def preload_model():
+    """
+    Load and warm up the model in a process that forks workers afterwards
+
+    Called in the gunicorn master when INFERENCE_PRELOAD is set (see
+    gunicorn.conf.py). The workers share the model's weights copy-on-write
+    instead of each loading its own copy. torch's thread pool must not be
+    started before the fork, since the children's first forward pass would
+    deadlock, so loading, quantization and the warmup pass run on one
+    thread; each worker sizes its own pools in get_inference_server.
+    """
+    from services.inference_service import single_threaded, warm_up
+    
+    # Tokenizer threads started before the fork are disabled in the children anyway
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+    with single_threaded():
+        load_model()
+        warm_up(model, tokenizer)
+    model_profile['preloaded'] = True
+    print(f"Model preloaded for forked workers: {model_profile}")
+
+def get_inference_server():
+    """Get the inference server, loading the model and starting the batching worker once"""
+    global inference_server
+    
+    if inference_server is None:
+        from services.inference_service import InferenceServer, configure_threads
+        
+        load_model()
+        profile = get_inference_profile()
+        model_profile['threads'] = configure_threads(profile['intra_op_threads'], profile['inter_op_threads'])
+        print(f"Inference profile: {model_profile}")
+        inference_server = InferenceServer(
+            model,
+            tokenizer,
+            max_batch_size=int(os.getenv('INFERENCE_MAX_BATCH_SIZE', 32)),
+            max_wait_ms=float(os.getenv('INFERENCE_MAX_WAIT_MS', 5)),
+            max_length=int(os.getenv('INFERENCE_MAX_LENGTH', 128)),
+            default_timeout=float(os.getenv('INFERENCE_TIMEOUT', 2.0)),
+            token_cache_size=int(os.getenv('INFERENCE_TOKEN_CACHE_SIZE', 10000)),
+            score_cache_size=int(os.getenv('INFERENCE_SCORE_CACHE_SIZE', 10000))
+        )
+    
+    return inference_server
+
+def classify_texts(texts, timeout=None):
+    """
+    Classify texts with the transformer model
+    
+    Concurrent callers share padded forward passes through the inference server.
+    
+    Args:
+        texts (list): Texts to classify
+        timeout (float): Seconds to wait before giving up (defaults to INFERENCE_TIMEOUT)
+        
+    Returns:
+        list: List of (label, score) tuples
+    """
+    with stage('inference'):
+        return get_inference_server().classify(texts, timeout)
 
 def analyze_network_traffic(traffic_data):
     """
@@ -51,9 +170,6 @@ def analyze_network_traffic(traffic_data):
     # Simple rule-based detection for now
     # In a real implementation, this would use the transformer model
     
-    # Convert traffic data to string for analysis
-    traffic_str = json.dumps(traffic_data)
-    
     # Example rules (in a real system, these would be more sophisticated)
     is_anomalous = False
     anomaly_score = 0.0
@@ -74,14 +190,40 @@ def analyze_network_traffic(traffic_data):
         anomaly_type = "Large Packet Size"
     
     # In a real implementation, we would use the transformer model:
-    # load_model()
-    # classifier = pipeline('text-classification', model=model, tokenizer=tokenizer)
-    # result = classifier(traffic_str)
-    # is_anomalous = result[0]['label'] == 'ANOMALOUS'
-    # anomaly_score = result[0]['score']
+    # label, anomaly_score = classify_texts([json.dumps(traffic_data)])[0]
+    # is_anomalous = label == 'ANOMALOUS'
     
     return is_anomalous, anomaly_score, anomaly_type
 
+def get_traffic_rule_engine():
+    """Get the compiled traffic rule engine, compiling the configured rules once"""
+    global traffic_rule_engine
+    
+    if traffic_rule_engine is None:
+        traffic_rule_engine = TrafficRuleEngine()
+    
+    return traffic_rule_engine
+
+def analyze_network_traffic_batch(traffic_records):
+    """
+    Analyze a batch of network traffic records for anomalies
+    
+    Produces the same results as calling analyze_network_traffic on each
+    record, but scores the whole batch with one pass per compiled rule.
+    
+    Args:
+        traffic_records (list): List of traffic data dictionaries
+        
+    Returns:
+        list: List of (is_anomalous, anomaly_score, anomaly_type) tuples
+    """
+    if not traffic_records:
+        return []
+    
+    # Always in-process: pickling a batch for the detection processes costs more than scoring it
+    with stage('detection'):
+        return get_traffic_rule_engine().analyze(traffic_records)
+
 def analyze_system_logs(log_data):
     """
     Analyze system logs for anomalies
@@ -95,8 +237,8 @@ def analyze_system_logs(log_data):
     # Simple rule-based detection for now
     # In a real implementation, this would use the transformer model
     
-    # Convert log data to string for analysis
-    log_message = log_data.get('message', '')
+    # Lowercase the message once for keyword matching
+    log_message = log_data.get('message', '').lower()
     
     # Example rules (in a real system, these would be more sophisticated)
     is_anomalous = False
@@ -111,7 +253,7 @@ def analyze_system_logs(log_data):
     ]
     
     for keyword in security_keywords:
-        if keyword.lower() in log_message.lower():
+        if keyword in log_message:
             is_anomalous = True
             anomaly_score = 0.8
             anomaly_type = "Security Keyword Detected"
@@ -122,105 +264,148 @@ def analyze_system_logs(log_data):
     
     if not is_anomalous:
         for keyword in error_keywords:
-            if keyword.lower() in log_message.lower():
+            if keyword in log_message:
                 is_anomalous = True
                 anomaly_score = 0.6
                 anomaly_type = "Error Pattern Detected"
                 break
     
     # In a real implementation, we would use the transformer model:
-    # load_model()
-    # classifier = pipeline('text-classification', model=model, tokenizer=tokenizer)
-    # result = classifier(log_message)
-    # is_anomalous = result[0]['label'] == 'ANOMALOUS'
-    # anomaly_score = result[0]['score']
+    # label, anomaly_score = classify_texts([log_message])[0]
+    # is_anomalous = label == 'ANOMALOUS'
     
     return is_anomalous, anomaly_score, anomaly_type
 
-def predict_threats(hours=24):
+def get_log_keyword_matcher():
+    """Get the log keyword matcher, compiling the configured keyword catalog once"""
+    global log_keyword_matcher
+    
+    if log_keyword_matcher is None:
+        log_keyword_matcher = LogKeywordMatcher()
+    
+    return log_keyword_matcher
+
+def analyze_system_logs_batch(log_entries):
+    """
+    Analyze a batch of system log entries for anomalies
+    
+    Produces the same results as calling analyze_system_logs on each entry,
+    but scans each message once with the compiled keyword matcher.
+    
+    Args:
+        log_entries (list): List of log data dictionaries
+        
+    Returns:
+        list: List of (is_anomalous, anomaly_score, anomaly_type) tuples
+    """
+    messages = [log_entry.get('message', '') for log_entry in log_entries]
+    # Large batches are sharded across the detection processes when DETECTION_MODE=process
+    with stage('detection'):
+        pool = get_detection_pool(len(messages))
+        if pool is not None:
+            return pool.classify_logs(get_log_keyword_matcher(), messages)
+        
+        return get_log_keyword_matcher().classify_batch(messages)
+
+def _anomaly_counts(model, key_column, start_time, end_time, threshold):
+    """
+    Count anomalous rows per key in a time window, live table and archive combined
+
+    Args:
+        model: TrafficData or SystemLog
+        key_column: Column to group by
+        start_time (datetime): Window start
+        end_time (datetime): Window end (inclusive)
+        threshold (int): Minimum count for a key to be returned
+
+    Returns:
+        list: (key, count) tuples for keys with at least threshold anomalies, in first-seen order
+    """
+    anomaly_count = func.count(model.id)
+    query = db.session.query(key_column, anomaly_count).filter(
+        model.is_anomalous.is_(True),
+        model.timestamp >= start_time,
+        model.timestamp <= end_time
+    ).group_by(key_column)
+
+    # The HAVING threshold keeps only keys with multiple anomalies (first-seen order matches a row scan)
+    archived_until = archive_service.archived_until(model)
+    if archived_until is None or archived_until <= start_time:
+        return query.having(anomaly_count >= threshold).order_by(func.min(model.id)).all()
+
+    # Part of the window is archived: the threshold applies to the combined counts
+    totals = {key: (count, first_id) for key, count, first_id in query.add_columns(func.min(model.id)).all()}
+    archived = archive_service.group_counts(model, key_column.key, start_time, match={'is_anomalous': True})
+    for key, (count, first_id) in archived.items():
+        live_count, live_first_id = totals.get(key, (0, first_id))
+        totals[key] = (live_count + count, min(live_first_id, first_id))
+
+    ranked = sorted((first_id, key, count) for key, (count, first_id) in totals.items() if count >= threshold)
+    return [(key, count) for _, key, count in ranked]
+
+def predict_threats(hours=24, history_days=7):
     """
     Predict potential threats based on historical data
     
     Args:
         hours (int): Number of hours to predict ahead
+        history_days (int): Days of history to analyze, including archived rows
         
     Returns:
         list: List of predicted threats
     """
     # Get historical data
     end_time = datetime.utcnow()
-    start_time = end_time - timedelta(days=7)  # Use last 7 days of data
-    
-    # Get traffic data
-    traffic_data = TrafficData.query.filter(
-        TrafficData.timestamp >= start_time,
-        TrafficData.timestamp <= end_time
-    ).all()
-    
-    # Get system logs
-    system_logs = SystemLog.query.filter(
-        SystemLog.timestamp >= start_time,
-        SystemLog.timestamp <= end_time
-    ).all()
-    
-    # Get alerts
-    alerts = Alert.query.filter(
-        Alert.created_at >= start_time,
-        Alert.created_at <= end_time
-    ).all()
+    start_time = end_time - timedelta(days=history_days)
+    
+    # Count anomalies by source IP in the database and archive
+    with stage('query'):
+        ip_anomaly_counts = _anomaly_counts(
+            TrafficData, TrafficData.source_ip, start_time, end_time,
+            3  # Threshold for suspicious activity
+        )
     
     # In a real implementation, this would use more sophisticated ML techniques
     # For now, we'll use a simple heuristic approach
     
-    # Count anomalies by source IP
-    ip_anomaly_count = {}
-    for td in traffic_data:
-        if td.is_anomalous:
-            if td.source_ip not in ip_anomaly_count:
-                ip_anomaly_count[td.source_ip] = 0
-            ip_anomaly_count[td.source_ip] += 1
-    
     # Identify potential threats
     potential_threats = []
     
     # IPs with multiple anomalies
-    for ip, count in ip_anomaly_count.items():
-        if count >= 3:  # Threshold for suspicious activity
-            threat_level = "medium"
-            if count >= 10:
-                threat_level = "high"
-            
-            potential_threats.append({
-                "source": "network",
-                "target": ip,
-                "threat_type": "Suspicious Activity",
-                "confidence": min(count / 20, 0.95),  # Cap at 95%
-                "threat_level": threat_level,
-                "details": f"IP {ip} has shown {count} anomalous activities in the past 7 days"
-            })
+    for ip, count in ip_anomaly_counts:
+        threat_level = "medium"
+        if count >= 10:
+            threat_level = "high"
+        
+        potential_threats.append({
+            "source": "network",
+            "target": ip,
+            "threat_type": "Suspicious Activity",
+            "confidence": min(count / 20, 0.95),  # Cap at 95%
+            "threat_level": threat_level,
+            "details": f"IP {ip} has shown {count} anomalous activities in the past {history_days} days"
+        })
     
     # Look for patterns in system logs
-    host_error_count = {}
-    for log in system_logs:
-        if log.is_anomalous:
-            if log.host not in host_error_count:
-                host_error_count[log.host] = 0
-            host_error_count[log.host] += 1
+    with stage('query'):
+        host_error_counts = _anomaly_counts(
+            SystemLog, SystemLog.host, start_time, end_time,
+            5  # Threshold for suspicious activity
+        )
     
     # Hosts with multiple anomalies
-    for host, count in host_error_count.items():
-        if count >= 5:  # Threshold for suspicious activity
-            threat_level = "medium"
-            if count >= 15:
-                threat_level = "high"
-            
-            potential_threats.append({
-                "source": "system",
-                "target": host,
-                "threat_type": "System Anomalies",
-                "confidence": min(count / 30, 0.9),  # Cap at 90%
-                "threat_level": threat_level,
-                "details": f"Host {host} has shown {count} anomalous log entries in the past 7 days"
-            })
+    for host, count in host_error_counts:
+        threat_level = "medium"
+        if count >= 15:
+            threat_level = "high"
+        
+        potential_threats.append({
+            "source": "system",
+            "target": host,
+            "threat_type": "System Anomalies",
+            "confidence": min(count / 30, 0.9),  # Cap at 90%
+            "threat_level": threat_level,
+            "details": f"Host {host} has shown {count} anomalous log entries in the past {history_days} days"
+        })
     
     return potential_threats
@@ -0,0 +1,132 @@
+import json
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_, text
+from app import db
+
+
+def encode_cursor(sort_value, row_id, direction):
+    """
+    Encode a page boundary as an opaque URL-safe cursor
+
+    Args:
+        sort_value (datetime): Sort column value of the boundary row
+        row_id (int): Id of the boundary row
+        direction (str): 'next' to continue after the row, 'prev' to go back before it
+
+    Returns:
+        str: Cursor string
+    """
+    payload = json.dumps({'t': sort_value.isoformat(), 'i': row_id, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor
+
+    Returns:
+        tuple: (sort_value, row_id, direction)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        sort_value, row_id, direction = datetime.fromisoformat(payload['t']), int(payload['i']), payload['d']
+    except (TypeError, KeyError, json.JSONDecodeError, UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError('Invalid cursor') from e
+
+    if direction not in ('next', 'prev'):
+        raise ValueError('Invalid cursor')
+    return sort_value, row_id, direction
+
+
+def _before(sort_column, id_column, sort_value, row_id):
+    """Rows that sort after the boundary in descending (sort_column, id_column) order"""
+    # The redundant bound on sort_column alone lets the planner seek the index instead of filtering a scan
+    return and_(sort_column <= sort_value, or_(sort_column < sort_value, id_column < row_id))
+
+
+def _after(sort_column, id_column, sort_value, row_id):
+    """Rows that sort before the boundary in descending (sort_column, id_column) order"""
+    return and_(sort_column >= sort_value, or_(sort_column > sort_value, id_column > row_id))
+
+
+def keyset_paginate(query, sort_column, id_column, per_page, cursor=None):
+    """
+    Fetch one page of a query ordered newest first by (sort_column, id_column)
+
+    Each page is a range scan that starts at the cursor position, so late
+    pages cost the same as the first one. No COUNT query is issued.
+
+    Args:
+        query: Filtered query to paginate
+        sort_column: Timestamp column to order by (descending)
+        id_column: Unique tie-breaker column (descending)
+        per_page (int): Page size
+        cursor (str): Cursor from a previous page, or None for the first page
+
+    Returns:
+        dict: items, has_next, has_prev, next_cursor and prev_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    direction = 'next'
+    if cursor:
+        sort_value, row_id, direction = decode_cursor(cursor)
+        if direction == 'next':
+            query = query.filter(_before(sort_column, id_column, sort_value, row_id))
+        else:
+            query = query.filter(_after(sort_column, id_column, sort_value, row_id))
+
+    if direction == 'next':
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        # Walk backwards from the cursor, then restore newest-first order
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    # One extra row tells whether another page exists in the walking direction
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+
+    if direction == 'next':
+        has_next, has_prev = has_more, cursor is not None
+    else:
+        items.reverse()
+        has_next, has_prev = True, has_more
+
+    def boundary(item, page_direction):
+        return encode_cursor(getattr(item, sort_column.key), getattr(item, id_column.key), page_direction)
+
+    return {
+        'items': items,
+        'has_next': has_next and bool(items),
+        'has_prev': has_prev and bool(items),
+        'next_cursor': boundary(items[-1], 'next') if has_next and items else None,
+        'prev_cursor': boundary(items[0], 'prev') if has_prev and items else None
+    }
+
+
+def estimate_count(query):
+    """
+    Estimate the number of rows a query returns from the planner's statistics
+
+    Only PostgreSQL exposes row estimates cheaply; other databases return None.
+
+    Args:
+        query: Query to estimate
+
+    Returns:
+        int: Estimated row count, or None when no estimate is available
+    """
+    if db.session.connection().dialect.name != 'postgresql':
+        return None
+
+    statement = query.statement.compile(dialect=db.session.connection().dialect, compile_kwargs={'literal_binds': True})
+    plan = db.session.execute(text('EXPLAIN (FORMAT JSON) ' + str(statement))).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
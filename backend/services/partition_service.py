@@ -0,0 +1,487 @@
+import os
+import re
+import time
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import MetaData, event, insert, inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateTable
+from app import db
+from models.traffic_data import TrafficData
+from models.system_log import SystemLog
+
+# Models whose tables declare a partition column in Table.info
+PARTITIONED_MODELS = (TrafficData, SystemLog)
+
+INTERVALS = {
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1)
+}
+
+# SQLite caps a compound SELECT at 500 terms by default and the view spends one on the template table
+MAX_SQLITE_PARTITIONS = 499
+
+
+def get_partition_interval():
+    """
+    Get the configured partition interval
+
+    PARTITION_INTERVAL is 'day', 'week', or 'none' (default) for plain tables.
+    It decides how the tables are created, so changing it requires recreating
+    them.
+
+    Returns:
+        str: 'day', 'week' or None
+    """
+    interval = os.getenv('PARTITION_INTERVAL', 'none').lower()
+    if interval in ('', 'none'):
+        return None
+    if interval not in INTERVALS:
+        raise ValueError(f"Unknown partition interval '{interval}'")
+    return interval
+
+
+def is_partitioned(model):
+    """Check whether a model's table is partitioned under the current configuration"""
+    table = getattr(model, '__table__', model)
+    return 'partition_column' in table.info and get_partition_interval() is not None
+
+
+def period_start(timestamp, interval):
+    """Truncate a timestamp to the start of its day, or of its week (Monday)"""
+    start = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == 'week':
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def partition_name(table_name, start):
+    """Name of the partition covering the period starting at start"""
+    return f'{table_name}_p{start:%Y%m%d}'
+
+
+def _name_pattern(table_name):
+    return re.compile(rf'^{re.escape(table_name)}_p(\d{{8}})$')
+
+
+def _is_sqlite(connection):
+    return connection.dialect.name == 'sqlite'
+
+
+# --- DDL: native partitioned parents on PostgreSQL, template table + view on SQLite ---
+
+@compiles(CreateTable, 'postgresql')
+def _create_partitioned_table(element, compiler, **kw):
+    """Create partitioned tables as RANGE-partitioned parents on PostgreSQL"""
+    sql = compiler.visit_create_table(element, **kw)
+    column = element.element.info.get('partition_column')
+    if column is None or get_partition_interval() is None:
+        return sql
+
+    # PostgreSQL requires the partition column in the primary key; the ORM keeps using id alone
+    sql = sql.replace('PRIMARY KEY (id)', f'PRIMARY KEY (id, {column})')
+    return sql.rstrip() + f' PARTITION BY RANGE ({column})\n\n'
+
+
+def _template_name(table_name):
+    return f'{table_name}_template'
+
+
+def _sqlite_view_exists(connection, name):
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = :name"),
+        {'name': name}
+    ).first() is not None
+
+
+def _sqlite_partition_names(connection, table_name):
+    names = connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars()
+    pattern = _name_pattern(table_name)
+    return sorted(name for name in names if pattern.match(name))
+
+
+def _rebuild_sqlite_view(connection, table_name):
+    """Point the view named after the table at the template plus every partition"""
+    partitions = _sqlite_partition_names(connection, table_name)
+    if len(partitions) > MAX_SQLITE_PARTITIONS:
+        raise ValueError(
+            f"{table_name} has {len(partitions)} partitions; SQLite supports at most "
+            f"{MAX_SQLITE_PARTITIONS}. Use weekly partitions or a shorter retention."
+        )
+
+    selects = ' UNION ALL '.join(f'SELECT * FROM {name}' for name in [_template_name(table_name)] + partitions)
+    connection.exec_driver_sql(f'DROP VIEW IF EXISTS {table_name}')
+    connection.exec_driver_sql(f'CREATE VIEW {table_name} AS {selects}')
+
+
+def _after_create(target, connection, **kw):
+    """On SQLite, turn a freshly created table into an empty template behind a UNION ALL view"""
+    if not _is_sqlite(connection) or not is_partitioned(target):
+        return
+
+    connection.exec_driver_sql(f'ALTER TABLE {target.name} RENAME TO {_template_name(target.name)}')
+    connection.exec_driver_sql(
+        'CREATE TABLE IF NOT EXISTS partition_id_sequences '
+        '(name VARCHAR(64) PRIMARY KEY, last_id INTEGER NOT NULL)'
+    )
+    _rebuild_sqlite_view(connection, target.name)
+
+
+def _before_drop(target, connection, **kw):
+    """On SQLite, drop the view and partitions and restore the template so DROP TABLE works"""
+    if not _is_sqlite(connection) or not _sqlite_view_exists(connection, target.name):
+        return
+
+    connection.exec_driver_sql(f'DROP VIEW {target.name}')
+    for name in _sqlite_partition_names(connection, target.name):
+        connection.exec_driver_sql(f'DROP TABLE {name}')
+    connection.exec_driver_sql(f'ALTER TABLE {_template_name(target.name)} RENAME TO {target.name}')
+    connection.exec_driver_sql('DELETE FROM partition_id_sequences WHERE name = ?', (target.name,))
+
+
+for _model in PARTITIONED_MODELS:
+    event.listen(_model.__table__, 'after_create', _after_create)
+    event.listen(_model.__table__, 'before_drop', _before_drop)
+
+
+# --- Partition management ---
+
+_sqlite_partition_tables = {}
+
+
+def _sqlite_partition_table(table, name):
+    """Table object for a SQLite partition: a copy of the model table with its own index names"""
+    partition = _sqlite_partition_tables.get(name)
+    if partition is None:
+        partition = table.to_metadata(MetaData(), name=name)
+        partition.info = {}
+        # Column-level indexes are already named after the copy; explicitly named ones need a suffix
+        suffix = name[len(table.name) + 1:]
+        for index in partition.indexes:
+            if name not in index.name:
+                index.name = f'{index.name}_{suffix}'
+        _sqlite_partition_tables[name] = partition
+    return partition
+
+
+def list_partitions(model):
+    """
+    List the partitions of a model's table
+
+    Returns:
+        list: (period_start, name) tuples in time order
+    """
+    table = model.__table__
+    connection = db.session.connection()
+
+    if _is_sqlite(connection):
+        names = _sqlite_partition_names(connection, table.name)
+    else:
+        names = connection.execute(text(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'WHERE parent.relname = :table'
+        ), {'table': table.name}).scalars().all()
+
+    pattern = _name_pattern(table.name)
+    partitions = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            partitions.append((datetime.strptime(match.group(1), '%Y%m%d'), name))
+    return sorted(partitions)
+
+
+def get_lock_timeout():
+    """Get how long creating a PostgreSQL partition waits for its parent table (PARTITION_LOCK_TIMEOUT seconds, default 5)"""
+    return float(os.getenv('PARTITION_LOCK_TIMEOUT', 5))
+
+
+def get_days_ahead():
+    """Get how many days of partitions the scheduler keeps created ahead (PARTITION_DAYS_AHEAD, default 7)"""
+    return int(os.getenv('PARTITION_DAYS_AHEAD', 7))
+
+
+def get_schedule_interval():
+    """Get the seconds between scheduled runs of create_upcoming_partitions (PARTITION_SCHEDULE_SECONDS, default 6 hours)"""
+    return float(os.getenv('PARTITION_SCHEDULE_SECONDS', 6 * 3600))
+
+
+# Partition names known to exist per table, so ingests do not list the partitions every batch.
+# Partitions pruned by another process stay listed until this one restarts; retention only removes past periods.
+_known_partitions = {}
+_known_partitions_lock = threading.Lock()
+
+_scheduler = None
+
+
+def _holds_table_lock(connection, table_name):
+    """Check whether the transaction on connection already holds a lock on a table"""
+    return connection.execute(text(
+        'SELECT 1 FROM pg_locks WHERE pid = pg_backend_pid() AND relation = to_regclass(:table)'
+    ), {'table': table_name}).first() is not None
+
+
+def _create_pg_partition(connection, table_name, name, start, end):
+    try:
+        with connection.begin_nested():
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table_name} "
+                f"FOR VALUES FROM ('{start.isoformat(' ')}') TO ('{end.isoformat(' ')}')"
+            ))
+    except DBAPIError:
+        # A partition created concurrently by another worker is not an error
+        if connection.execute(text('SELECT to_regclass(:name)'), {'name': name}).scalar() is None:
+            raise
+
+
+def ensure_partitions(model, timestamps):
+    """
+    Create any missing partitions covering the given timestamps
+
+    On PostgreSQL, CREATE TABLE ... PARTITION OF locks the parent table
+    exclusively until its transaction ends, so each partition is created in
+    its own short transaction on a separate connection, waiting at most
+    PARTITION_LOCK_TIMEOUT seconds for the parent. Only when the caller's
+    transaction already holds a lock on the parent (which the separate
+    connection would wait for) is it created in the caller's transaction.
+    On SQLite, partitions are created in the caller's transaction.
+
+    Args:
+        model: Partitioned model class
+        timestamps: Iterable of datetimes
+
+    Returns:
+        list: Names of the partitions created
+    """
+    interval = get_partition_interval()
+    table = model.__table__
+    connection = db.session.connection()
+
+    starts = {period_start(timestamp, interval) for timestamp in timestamps if timestamp is not None}
+    known = _known_partitions.get(table.name, set())
+    if all(partition_name(table.name, start) in known for start in starts):
+        return []
+    existing = {name for _, name in list_partitions(model)}
+    with _known_partitions_lock:
+        _known_partitions[table.name] = existing
+    missing = sorted(start for start in starts if partition_name(table.name, start) not in existing)
+    if not missing:
+        return []
+
+    created = []
+    if _is_sqlite(connection):
+        for start in missing:
+            name = partition_name(table.name, start)
+            _sqlite_partition_table(table, name).create(connection, checkfirst=True)
+            created.append(name)
+        _rebuild_sqlite_view(connection, table.name)
+    elif _holds_table_lock(connection, table.name):
+        for start in missing:
+            name = partition_name(table.name, start)
+            _create_pg_partition(connection, table.name, name, start, start + INTERVALS[interval])
+            created.append(name)
+    else:
+        for start in missing:
+            name = partition_name(table.name, start)
+            with db.engine.connect() as own_connection, own_connection.begin():
+                own_connection.execute(text(f"SET LOCAL lock_timeout = '{int(get_lock_timeout() * 1000)}ms'"))
+                _create_pg_partition(own_connection, table.name, name, start, start + INTERVALS[interval])
+            created.append(name)
+
+    with _known_partitions_lock:
+        _known_partitions.setdefault(table.name, set()).update(created)
+    return created
+
+
+def _allocate_sqlite_ids(connection, table_name, count):
+    """Reserve count consecutive ids shared by all of a table's SQLite partitions"""
+    last_id = connection.execute(text(
+        'INSERT INTO partition_id_sequences (name, last_id) VALUES (:name, :count) '
+        'ON CONFLICT (name) DO UPDATE SET last_id = last_id + :count RETURNING last_id'
+    ), {'name': table_name, 'count': count}).scalar()
+    return list(range(last_id - count + 1, last_id + 1))
+
+
+def insert_sqlite_partitioned(model, rows, chunk_size):
+    """
+    Insert rows into their SQLite partitions and return their ids in input order
+
+    Args:
+        model: Partitioned model class
+        rows (list): List of column dictionaries
+        chunk_size (int): Rows per INSERT statement
+
+    Returns:
+        list: Ids assigned to the rows
+    """
+    interval = get_partition_interval()
+    table = model.__table__
+    column = table.info['partition_column']
+    connection = db.session.connection()
+
+    now = datetime.utcnow()
+    rows = [row if row.get(column) is not None else {**row, column: now} for row in rows]
+    ensure_partitions(model, [row[column] for row in rows])
+
+    ids = _allocate_sqlite_ids(connection, table.name, len(rows))
+    groups = {}
+    for row_id, row in zip(ids, rows):
+        groups.setdefault(period_start(row[column], interval), []).append({**row, 'id': row_id})
+
+    for start, group in groups.items():
+        statement = insert(_sqlite_partition_table(table, partition_name(table.name, start)))
+        for offset in range(0, len(group), chunk_size):
+            connection.execute(statement, group[offset:offset + chunk_size])
+    return ids
+
+
+def create_upcoming_partitions(days_ahead=7):
+    """
+    Create the partitions from today through days_ahead days from now
+
+    Creating them ahead of time (with the create-partitions command, or the
+    scheduler each ingesting process starts on PostgreSQL, see start_scheduler) keeps partition
+    DDL and its lock on the parent table off the ingest path.
+
+    Returns:
+        dict: Names of the partitions created per table
+    """
+    if get_partition_interval() is None:
+        return {}
+
+    now = datetime.utcnow()
+    timestamps = [now + timedelta(days=day) for day in range(days_ahead + 1)]
+    created = {model.__tablename__: ensure_partitions(model, timestamps) for model in PARTITIONED_MODELS}
+    db.session.commit()
+    return created
+
+
+def _run_scheduler():
+    from app import app
+
+    while True:
+        try:
+            with app.app_context():
+                create_upcoming_partitions(get_days_ahead())
+        except Exception as e:
+            print(f"Partition scheduler: creating upcoming partitions failed ({e})")
+        time.sleep(get_schedule_interval())
+
+
+def start_scheduler():
+    """Start the thread creating upcoming partitions every PARTITION_SCHEDULE_SECONDS, once per process"""
+    global _scheduler
+
+    if _scheduler is not None:
+        return
+    with _known_partitions_lock:
+        if _scheduler is not None:
+            return
+        _scheduler = threading.Thread(target=_run_scheduler, name='partition-scheduler', daemon=True)
+    _scheduler.start()
+
+
+def _prune_partitions(model, cutoff, detach):
+    """Drop or detach every partition of a model whose period ends at or before cutoff"""
+    interval = get_partition_interval()
+    table = model.__table__
+    connection = db.session.connection()
+
+    pruned = []
+    for start, name in list_partitions(model):
+        if start + INTERVALS[interval] > cutoff:
+            continue
+        if detach:
+            if not _is_sqlite(connection):
+                connection.execute(text(f'ALTER TABLE {table.name} DETACH PARTITION {name}'))
+                # The inherited id default references the parent's sequence and would block dropping the parent
+                connection.execute(text(f'ALTER TABLE {name} ALTER COLUMN id DROP DEFAULT'))
+            connection.execute(text(f'ALTER TABLE {name} RENAME TO {name}_archived'))
+        else:
+            connection.execute(text(f'DROP TABLE {name}'))
+        _sqlite_partition_tables.pop(name, None)
+        with _known_partitions_lock:
+            _known_partitions.get(table.name, set()).discard(name)
+        pruned.append(name)
+
+    if pruned and _is_sqlite(connection):
+        _rebuild_sqlite_view(connection, table.name)
+    return pruned
+
+
+def detach_partitions(model, cutoff):
+    """
+    Detach every partition of a model whose period ends at or before cutoff
+
+    The partitions are kept as standalone <partition>_archived tables. Commits.
+
+    Returns:
+        list: Names of the detached partitions
+    """
+    if not is_partitioned(model):
+        return []
+    detached = _prune_partitions(model, cutoff, detach=True)
+    db.session.commit()
+    return detached
+
+
+def list_detached_partitions(model):
+    """
+    List the <partition>_archived tables left behind by detaching partitions of a model
+
+    Returns:
+        list: Table names in time order
+    """
+    pattern = re.compile(rf'^{re.escape(model.__tablename__)}_p\d{{8}}_archived$')
+    names = inspect(db.session.connection()).get_table_names()
+    return sorted(name for name in names if pattern.match(name))
+
+
+def _prune_rows(model, cutoff, batch_size):
+    """Delete rows older than cutoff in id batches, committing each batch"""
+    table = model.__table__
+    column = table.c[table.info['partition_column']]
+
+    deleted = 0
+    while True:
+        batch = db.session.execute(
+            db.select(table.c.id).where(column < cutoff).limit(batch_size)
+        ).scalars().all()
+        if not batch:
+            return deleted
+        db.session.execute(table.delete().where(table.c.id.in_(batch)))
+        db.session.commit()
+        deleted += len(batch)
+
+
+def apply_retention(retention_days, detach=False, batch_size=10000):
+    """
+    Remove traffic and log data older than the retention period
+
+    Partitioned tables lose whole partitions: dropped, or with detach=True
+    detached and renamed to <partition>_archived for archiving. Only
+    partitions lying entirely before the cutoff are removed, so up to one
+    period of older rows can remain. Plain tables fall back to DELETEs in
+    batches of batch_size rows.
+
+    Args:
+        retention_days (int): Days of data to keep
+        detach (bool): Keep pruned partitions as standalone archive tables
+        batch_size (int): Rows per DELETE for plain tables
+
+    Returns:
+        dict: Per table, the partitions pruned or the number of rows deleted
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+
+    results = {}
+    for model in PARTITIONED_MODELS:
+        if is_partitioned(model):
+            results[model.__tablename__] = _prune_partitions(model, cutoff, detach)
+            db.session.commit()
+        else:
+            results[model.__tablename__] = _prune_rows(model, cutoff, batch_size)
+    return results
@@ -0,0 +1,243 @@
+import os
+import re
+import time
+import threading
+from collections import Counter
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from flask import g, has_request_context, request
+
+# Connection.info key of the start times of the statements running on it
+_START_KEY = 'query_profiler_start'
+
+# Placeholder lists such as "IN (?, ?, ?)" from expanding parameters, and inline literals
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r'\s+')
+
+# EXPLAIN prefix per dialect; statements of other dialects are logged without a plan
+_EXPLAIN_PREFIXES = {
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN '
+}
+
+# Most statement shapes whose last plan is remembered
+_PLAN_CACHE_SIZE = 1000
+
+_installed = False
+_plans = {}
+_plans_lock = threading.Lock()
+
+
+def _enabled(name, default='false'):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+def is_enabled():
+    """Check whether the query profiler is on (QUERY_PROFILER, default false)"""
+    return _enabled('QUERY_PROFILER')
+
+
+def get_slow_query_seconds():
+    """Get the duration above which a statement is logged with its plan (QUERY_PROFILER_SLOW_MS, default 100)"""
+    return float(os.getenv('QUERY_PROFILER_SLOW_MS', 100)) / 1000
+
+
+def get_explain_interval():
+    """Get the seconds a statement shape's plan is reused before it is explained again (QUERY_PROFILER_EXPLAIN_SECONDS, default 300)"""
+    return float(os.getenv('QUERY_PROFILER_EXPLAIN_SECONDS', 300))
+
+
+def get_repeat_threshold():
+    """Get how often one statement shape may run in a request before it is flagged (QUERY_PROFILER_REPEAT, default 5)"""
+    return int(os.getenv('QUERY_PROFILER_REPEAT', 5))
+
+
+def statement_shape(statement):
+    """
+    Reduce a statement to its shape so repeats with other parameters compare equal
+
+    Args:
+        statement (str): SQL as sent to the driver
+
+    Returns:
+        str: The statement with literals and placeholder lists replaced by ?
+    """
+    shape = _WHITESPACE.sub(' ', statement).strip()
+    shape = _PLACEHOLDER_LIST.sub('(?)', shape)
+    return _LITERAL.sub('?', shape)
+
+
+class RequestProfile:
+    """Queries run while handling one request"""
+
+    __slots__ = ('count', 'seconds', 'shapes', 'slow')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        # (seconds, statement, plan) of the statements over the slow query threshold
+        self.slow = []
+
+    def repeated(self, threshold):
+        """
+        Get the statement shapes run at least threshold times
+
+        Returns:
+            list: (shape, count) tuples, most repeated first
+        """
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+def current_profile():
+    """Get the query profile of the current request, or None outside requests or when the profiler is off"""
+    if not has_request_context():
+        return None
+    return g.get('query_profile')
+
+
+def _run_explain(connection, prefix, statement, parameters):
+    """
+    Run EXPLAIN on the connection the statement ran on, with a cursor of its own
+
+    Checking out a second pooled connection for every slow statement would
+    exhaust the pool under exactly the load that makes statements slow. On
+    PostgreSQL the EXPLAIN runs in a savepoint, so a failing one does not
+    abort the statement's transaction.
+    """
+    savepoint = connection.dialect.name == 'postgresql'
+    cursor = connection.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute('SAVEPOINT query_profiler_explain')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception:
+            if savepoint:
+                cursor.execute('ROLLBACK TO SAVEPOINT query_profiler_explain')
+            raise
+        if savepoint:
+            cursor.execute('RELEASE SAVEPOINT query_profiler_explain')
+        return '\n'.join(' '.join(str(value) for value in row) for row in rows)
+    finally:
+        cursor.close()
+
+
+def explain(connection, statement, parameters):
+    """
+    Get the query plan of a statement
+
+    Each statement shape is explained at most once per
+    QUERY_PROFILER_EXPLAIN_SECONDS; slow statements of the same shape in
+    between are logged with the remembered plan. The EXPLAIN goes straight to
+    the driver, so it is not profiled itself.
+
+    Args:
+        connection: SQLAlchemy connection the statement ran on
+        statement (str): SQL as sent to the driver
+        parameters: Driver parameters of the statement
+
+    Returns:
+        str: The plan, one row per line, or None when it cannot be explained
+    """
+    prefix = _EXPLAIN_PREFIXES.get(connection.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+
+    shape = statement_shape(statement)
+    now = time.monotonic()
+    with _plans_lock:
+        remembered = _plans.get(shape)
+    if remembered is not None and now - remembered[0] < get_explain_interval():
+        return remembered[1]
+
+    try:
+        plan = _run_explain(connection, prefix, statement, parameters)
+    except Exception as e:
+        plan = f'(plan unavailable: {e})'
+    with _plans_lock:
+        if len(_plans) >= _PLAN_CACHE_SIZE and shape not in _plans:
+            _plans.clear()
+        _plans[shape] = (now, plan)
+    return plan
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_START_KEY)
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+
+    slow = seconds >= get_slow_query_seconds()
+    # Server-side cursors still hold their rows on the connection, so they are not explained
+    explainable = slow and not executemany and not context.execution_options.get('stream_results')
+    plan = explain(conn, statement, parameters) if explainable else None
+    profile = current_profile()
+    if profile is not None:
+        profile.count += 1
+        profile.seconds += seconds
+        profile.shapes[statement_shape(statement)] += 1
+        if slow:
+            profile.slow.append((seconds, statement, plan))
+    elif slow:
+        # Statements outside requests (job workers, CLI commands) are logged right away
+        _log_slow('background', seconds, statement, plan)
+
+
+def _log_slow(endpoint, seconds, statement, plan):
+    print(f"Slow query ({seconds * 1000:.1f} ms) in {endpoint}: {_WHITESPACE.sub(' ', statement).strip()}")
+    if plan:
+        print('  plan: ' + plan.replace('\n', '\n        '))
+
+
+def init_app(app):
+    """
+    Install the profiler on every engine and the app's request hooks
+
+    Does nothing unless QUERY_PROFILER is set. Each request then counts its
+    queries and database time, logs statements slower than
+    QUERY_PROFILER_SLOW_MS with their plan (explaining each statement shape
+    at most once per QUERY_PROFILER_EXPLAIN_SECONDS), and logs statement shapes run
+    QUERY_PROFILER_REPEAT or more times (N+1 patterns). In debug mode, or
+    with QUERY_PROFILER_HEADERS, the totals are also returned in the
+    X-Query-Count, X-Query-Time-Ms and X-Query-Max-Repeat response headers.
+    """
+    global _installed
+    if not is_enabled():
+        return
+
+    # Listening on the Engine class covers every engine, including ones created later
+    if not _installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _installed = True
+
+    headers = app.debug or _enabled('QUERY_PROFILER_HEADERS')
+    repeat_threshold = get_repeat_threshold()
+
+    @app.before_request
+    def _start_query_profile():
+        g.query_profile = RequestProfile()
+
+    @app.after_request
+    def _finish_query_profile(response):
+        profile = g.pop('query_profile', None)
+        if profile is None:
+            return response
+        endpoint = f"{request.method} {request.path}"
+        for seconds, statement, plan in profile.slow:
+            _log_slow(endpoint, seconds, statement, plan)
+        for shape, count in profile.repeated(repeat_threshold):
+            print(f"Repeated query ({count} times) in {endpoint}: {shape}")
+        if headers:
+            response.headers['X-Query-Count'] = str(profile.count)
+            response.headers['X-Query-Time-Ms'] = f'{profile.seconds * 1000:.1f}'
+            response.headers['X-Query-Max-Repeat'] = str(max(profile.shapes.values(), default=0))
+        return response
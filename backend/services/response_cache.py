@@ -0,0 +1,372 @@
+import os
+import time
+import threading
+from collections import Counter, OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+import redis
+from flask import current_app, make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+
+# Seconds each endpoint's responses stay cached, overridable with RESPONSE_CACHE_TTL_<NAME>
+DEFAULT_TTLS = {
+    'summary': 30,
+    'recent-alerts': 10,
+    'threat-timeline': 60,
+    'alert-statistics': 30,
+    'predict-threats': 300
+}
+
+# Session.info key holding the scopes written by the current transaction
+_PENDING_KEY = 'response_cache_scopes'
+
+_KEY_PREFIX = 'response:'
+
+
+class CacheUnavailable(Exception):
+    """Raised by a backend that cannot be reached; callers serve the response uncached"""
+
+
+class MemoryBackend:
+    """
+    In-process LRU backend
+
+    Each worker process has its own entries and versions, so writes handled by
+    one worker only invalidate that worker's entries; the others serve theirs
+    until the TTL expires.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        # Versions live outside the LRU: evicting one would resurrect entries keyed by an older version
+        self._versions = Counter()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def add(self, key, value, ttl):
+        """Set key only if it holds no live value; returns whether it was set"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return False
+            self._entries[key] = (value, time.monotonic() + ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_versions(self, scopes):
+        with self._lock:
+            return [self._versions[scope] for scope in scopes]
+
+    def bump(self, scopes):
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] += 1
+
+
+class RedisBackend:
+    """
+    Redis backend shared by every worker process
+
+    Connection errors surface as CacheUnavailable so requests fall back to
+    running the endpoint.
+    """
+
+    name = 'redis'
+
+    def __init__(self, client):
+        self.client = client
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return getattr(self.client, method)(*args, **kwargs)
+        except redis.RedisError as e:
+            raise CacheUnavailable(str(e)) from e
+
+    def get(self, key):
+        return self._call('get', key)
+
+    def set(self, key, value, ttl):
+        self._call('set', key, value, px=int(ttl * 1000))
+
+    def add(self, key, value, ttl):
+        return bool(self._call('set', key, value, px=int(ttl * 1000), nx=True))
+
+    def delete(self, key):
+        self._call('delete', key)
+
+    def get_versions(self, scopes):
+        keys = [f'{_KEY_PREFIX}version:{scope}' for scope in scopes]
+        versions = self._call('mget', keys)
+        for index, version in enumerate(versions):
+            if version is None:
+                # Start missing (e.g. evicted) versions at the clock so old entries are never reused
+                self._call('set', keys[index], time.time_ns() // 1000000, nx=True)
+                versions[index] = self._call('get', keys[index])
+        return [int(version) for version in versions]
+
+    def bump(self, scopes):
+        pipeline = self.client.pipeline(transaction=False)
+        for scope in scopes:
+            pipeline.incr(f'{_KEY_PREFIX}version:{scope}')
+        try:
+            pipeline.execute()
+        except redis.RedisError as e:
+            raise CacheUnavailable(str(e)) from e
+
+
+def get_ttl(name):
+    """Get the TTL in seconds for an endpoint's cached responses (0 disables caching it)"""
+    return float(os.getenv(f"RESPONSE_CACHE_TTL_{name.upper().replace('-', '_')}", DEFAULT_TTLS[name]))
+
+
+def get_lock_timeout():
+    """Get the longest time a request waits for another request to compute the same response"""
+    return float(os.getenv('RESPONSE_CACHE_LOCK_TIMEOUT', 10))
+
+
+class ResponseCache:
+    """
+    Cache of JSON responses keyed by endpoint, query string and data versions
+
+    Writes bump the version of the scopes they touch, which changes the key of
+    every response depending on them; the stale entries are never read again
+    and expire on their own. On a miss only one request computes the response
+    while concurrent requests for the same key wait for it.
+    """
+
+    def __init__(self, backend, lock_timeout=10):
+        self.backend = backend
+        self.lock_timeout = lock_timeout
+        self._counts = Counter()
+        self._counts_lock = threading.Lock()
+
+    def _count(self, name, outcome):
+        with self._counts_lock:
+            self._counts[(name, outcome)] += 1
+
+    def _key(self, name, scopes):
+        versions = self.backend.get_versions(scopes)
+        arguments = urlencode(sorted(request.args.items(multi=True)))
+        return f"{_KEY_PREFIX}{name}:{'.'.join(map(str, versions))}:{arguments}"
+
+    def _wait(self, key, lock_key):
+        """
+        Poll for a response another request is computing
+
+        Gives up when the other request releases its lock without storing a
+        response (an error, for instance) or after the lock timeout.
+        """
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.01
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            body = self.backend.get(key)
+            if body is not None or self.backend.get(lock_key) is None:
+                return body
+            delay = min(delay * 2, 0.1)
+        return None
+
+    def _cached(self, body, outcome):
+        response = current_app.response_class(body, status=200, mimetype='application/json')
+        response.headers['X-Cache'] = outcome
+        return response
+
+    def respond(self, name, scopes, view):
+        """
+        Serve an endpoint's response from the cache, calling view on a miss
+
+        Only 200 responses are stored.
+
+        Args:
+            name (str): Endpoint name (a DEFAULT_TTLS key)
+            scopes (tuple): Data scopes the response depends on
+            view (callable): Computes the response
+
+        Returns:
+            Response: The cached or freshly computed response
+        """
+        ttl = get_ttl(name)
+        if ttl <= 0:
+            return view()
+
+        lock_key = None
+        try:
+            key = self._key(name, scopes)
+            body = self.backend.get(key)
+            if body is not None:
+                self._count(name, 'hits')
+                return self._cached(body, 'HIT')
+
+            if self.backend.add(f'{key}:lock', b'1', self.lock_timeout):
+                lock_key = f'{key}:lock'
+            else:
+                body = self._wait(key, f'{key}:lock')
+                if body is not None:
+                    self._count(name, 'waits')
+                    return self._cached(body, 'WAIT')
+        except CacheUnavailable:
+            self._count(name, 'bypasses')
+            return view()
+
+        self._count(name, 'misses')
+        try:
+            response = make_response(view())
+            if response.status_code == 200:
+                self.backend.set(key, response.get_data(), ttl)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        except CacheUnavailable:
+            return response
+        finally:
+            if lock_key is not None:
+                try:
+                    self.backend.delete(lock_key)
+                except CacheUnavailable:
+                    pass
+
+    def bump(self, scopes):
+        """Invalidate every cached response depending on the given scopes"""
+        try:
+            self.backend.bump(sorted(scopes))
+        except CacheUnavailable:
+            # A missed bump leaves the entries depending on these scopes stale until their TTL expires
+            pass
+
+    def stats(self):
+        """
+        Get per-endpoint cache counters
+
+        Returns:
+            dict: backend name and, per endpoint, hits, waits (served after
+            another request computed the response), misses, bypasses and hit_rate
+        """
+        with self._counts_lock:
+            counts = Counter(self._counts)
+
+        endpoints = {}
+        for name in DEFAULT_TTLS:
+            entry = {outcome: counts[(name, outcome)] for outcome in ('hits', 'waits', 'misses', 'bypasses')}
+            served = sum(entry.values())
+            entry['hit_rate'] = (entry['hits'] + entry['waits']) / served if served else 0.0
+            entry['ttl'] = get_ttl(name)
+            endpoints[name] = entry
+        return {'backend': self.backend.name, 'endpoints': endpoints}
+
+
+def _create_backend():
+    """
+    Create the backend selected by RESPONSE_CACHE
+
+    'redis' uses REDIS_URL, 'memory' an in-process LRU of RESPONSE_CACHE_SIZE
+    entries, 'none' disables the cache. The default, 'auto', uses Redis when
+    REDIS_URL is set and falls back to memory when Redis cannot be reached.
+    """
+    setting = os.getenv('RESPONSE_CACHE', 'auto').lower()
+    if setting == 'none':
+        return None
+
+    redis_url = os.getenv('REDIS_URL')
+    if setting in ('auto', 'redis') and redis_url:
+        client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        try:
+            client.ping()
+            return RedisBackend(client)
+        except redis.RedisError as e:
+            print(f"Response cache: Redis unavailable ({e}), using the in-process cache")
+
+    return MemoryBackend(max_size=int(os.getenv('RESPONSE_CACHE_SIZE', 1024)))
+
+
+response_cache = None
+_initialized = False
+
+
+def get_response_cache():
+    """Get the process-wide response cache, or None when it is disabled"""
+    global response_cache, _initialized
+
+    if not _initialized:
+        backend = _create_backend()
+        response_cache = ResponseCache(backend, lock_timeout=get_lock_timeout()) if backend is not None else None
+        _initialized = True
+    return response_cache
+
+
+def cached_response(name, scopes):
+    """
+    Decorator caching a read endpoint's JSON response
+
+    Apply below token_required so every request is still authenticated.
+
+    Args:
+        name (str): Endpoint name (a DEFAULT_TTLS key)
+        scopes (tuple): Data the response depends on: 'alerts', 'traffic' and/or 'logs'
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            cache = get_response_cache()
+            if cache is None:
+                return f(*args, **kwargs)
+            return cache.respond(name, scopes, lambda: f(*args, **kwargs))
+
+        return decorated
+
+    return decorator
+
+
+def mark_changed(*scopes):
+    """
+    Invalidate cached responses depending on the given scopes once the current transaction commits
+
+    Args:
+        scopes: 'alerts', 'traffic' and/or 'logs'
+    """
+    if get_response_cache() is None:
+        return
+    db.session.info.setdefault(_PENDING_KEY, set()).update(scopes)
+
+
+def invalidate(*scopes):
+    """Invalidate cached responses depending on the given scopes now"""
+    cache = get_response_cache()
+    if cache is not None:
+        cache.bump(scopes)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_pending_scopes(session):
+    scopes = session.info.pop(_PENDING_KEY, None)
+    if scopes and response_cache is not None:
+        response_cache.bump(scopes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_scopes(session):
+    session.info.pop(_PENDING_KEY, None)
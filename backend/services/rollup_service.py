@@ -0,0 +1,339 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import and_, event, func, literal, select, union_all
+from sqlalchemy.orm import Session
+from app import db
+from models.alert import Alert
+from models.traffic_data import TrafficData
+from models.system_log import SystemLog
+from models.metric_rollup import MetricRollup
+from services import archive_service
+
+GRANULARITIES = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1)
+}
+
+# Raw table columns behind each rollup kind: (timestamp column, dashboard key column)
+RAW_SOURCES = {
+    'alert': (Alert.created_at, Alert.severity),
+    'traffic': (TrafficData.timestamp, TrafficData.is_anomalous),
+    'log': (SystemLog.timestamp, SystemLog.is_anomalous)
+}
+
+# Models whose old rows may have moved to the columnar archive
+ARCHIVED_SOURCES = {
+    'traffic': TrafficData,
+    'log': SystemLog
+}
+
+# Rollup column holding the dashboard key for each kind
+ROLLUP_KEYS = {
+    'alert': MetricRollup.severity,
+    'traffic': MetricRollup.is_anomalous,
+    'log': MetricRollup.is_anomalous
+}
+
+_UNIQUE_COLUMNS = ['granularity', 'kind', 'bucket_start', 'severity', 'source', 'is_anomalous']
+
+# Session.info key holding rollup counts waiting for the transaction to commit
+_PENDING_KEY = 'rollup_counts'
+
+
+def floor_time(timestamp, granularity):
+    """Truncate a timestamp to the start of its minute or hour bucket"""
+    if granularity == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def ceil_time(timestamp, granularity):
+    """Round a timestamp up to the next minute or hour boundary"""
+    floored = floor_time(timestamp, granularity)
+    return floored if floored == timestamp else floored + GRANULARITIES[granularity]
+
+
+def _dialect_insert(connection):
+    """Get an INSERT construct supporting ON CONFLICT for the connection's database, or None"""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+def _upsert_counts(connection, kind, counts):
+    """Add counts keyed by (granularity, bucket_start, severity, source, is_anomalous) to the rollups"""
+    if not counts:
+        return
+
+    # Sorted keys give concurrent writers the same lock order
+    rows = [{
+        'granularity': granularity,
+        'kind': kind,
+        'bucket_start': bucket_start,
+        'severity': severity,
+        'source': source,
+        'is_anomalous': is_anomalous,
+        'count': count
+    } for (granularity, bucket_start, severity, source, is_anomalous), count in sorted(counts.items())]
+
+    table = MetricRollup.__table__
+    dialect_insert = _dialect_insert(connection)
+
+    if dialect_insert is not None:
+        statement = dialect_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=_UNIQUE_COLUMNS,
+            set_={'count': table.c['count'] + statement.excluded['count']}
+        )
+        connection.execute(statement, rows)
+        return
+
+    # Generic fallback: update existing buckets, insert missing ones
+    for row in rows:
+        key = and_(*[table.c[column] == row[column] for column in _UNIQUE_COLUMNS])
+        result = connection.execute(table.update().where(key).values(count=table.c['count'] + row['count']))
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
+
+
+def record_rollups(kind, entries):
+    """
+    Add newly ingested records to the minute and hour rollups once the current transaction commits
+
+    Every ingest adds to the same current minute and hour rows, so upserting
+    them in the ingest transaction would hold their row locks until it
+    commits and serialize concurrent ingests. The counts are instead upserted
+    in a short transaction of their own right after the commit. Rollups can
+    briefly trail the raw rows, and if that upsert fails the raw rows are
+    kept without their rollups until `flask backfill-rollups` rebuilds them.
+
+    Args:
+        kind (str): 'alert', 'traffic' or 'log'
+        entries: Iterable of (timestamp, severity, source, is_anomalous) tuples
+    """
+    counts = db.session.info.setdefault(_PENDING_KEY, {}).setdefault(kind, Counter())
+    for timestamp, severity, source, is_anomalous in entries:
+        if timestamp is None:
+            continue
+        for granularity in GRANULARITIES:
+            counts[(granularity, floor_time(timestamp, granularity), severity or '', source or '', bool(is_anomalous))] += 1
+
+
+@event.listens_for(Session, 'after_commit')
+def _upsert_pending_counts(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    try:
+        with db.engine.begin() as connection:
+            for kind, counts in sorted(pending.items()):
+                _upsert_counts(connection, kind, counts)
+    except Exception as e:
+        print(f"Rollups: upserting committed counts failed ({e}), run `flask backfill-rollups` to repair them")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_counts(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _decompose(start, end):
+    """
+    Split [start, end) into raw, minute and hour pieces
+
+    Whole hours come from hour rollups, whole minutes at the edges from minute
+    rollups, and the partial minutes at either end from the raw table. An end
+    of None means the range is open.
+
+    Returns:
+        list: (granularity, piece_start, piece_end) tuples
+    """
+    minute_start = ceil_time(start, 'minute')
+    if end is not None and minute_start >= end:
+        return [('raw', start, end)]
+
+    pieces = []
+    if start < minute_start:
+        pieces.append(('raw', start, minute_start))
+
+    hour_start = ceil_time(minute_start, 'hour')
+    minute_end = floor_time(end, 'minute') if end is not None else None
+    hour_end = floor_time(end, 'hour') if end is not None else None
+
+    if end is not None and hour_start >= hour_end:
+        if minute_start < minute_end:
+            pieces.append(('minute', minute_start, minute_end))
+    else:
+        if minute_start < hour_start:
+            pieces.append(('minute', minute_start, hour_start))
+        pieces.append(('hour', hour_start, hour_end))
+        if end is not None and hour_end < minute_end:
+            pieces.append(('minute', hour_end, minute_end))
+
+    if end is not None and minute_end < end:
+        pieces.append(('raw', minute_end, end))
+
+    return pieces
+
+
+def _in_range(column, start, end):
+    """Build a half-open range condition, with end None meaning unbounded"""
+    if end is None:
+        return column >= start
+    return and_(column >= start, column < end)
+
+
+def _count_pieces(timestamp_column, key_column, count_column, pieces, filters):
+    """
+    Count rows per (piece, key) in one round trip
+
+    Each piece is its own grouped SELECT over an index range, combined with UNION ALL.
+
+    Returns:
+        list: (piece_index, key, count) rows
+    """
+    selects = [
+        select(
+            literal(index).label('piece'),
+            key_column.label('group_key'),
+            count_column.label('row_count')
+        ).where(*filters, _in_range(timestamp_column, start, end)).group_by(key_column)
+        for index, (start, end) in enumerate(pieces)
+    ]
+    statement = selects[0] if len(selects) == 1 else union_all(*selects)
+    return db.session.execute(statement).all()
+
+
+def _count_archived_pieces(kind, pieces):
+    """
+    Count archived rows per (piece, is_anomalous) for pieces reaching back into the archive
+
+    Returns:
+        list: (piece_index, key, count) rows
+    """
+    model = ARCHIVED_SOURCES[kind]
+    archived_until = archive_service.archived_until(model)
+    if archived_until is None:
+        return []
+
+    rows = []
+    for index, (start, end) in enumerate(pieces):
+        if start >= archived_until:
+            continue
+        for key, (count, _) in archive_service.group_counts(model, 'is_anomalous', start, end).items():
+            rows.append((index, key, count))
+    return rows
+
+
+def interval_counts(kind, intervals):
+    """
+    Count records per dashboard key for each time interval using the rollups
+
+    Args:
+        kind (str): 'alert' (keyed by severity), 'traffic' or 'log' (keyed by is_anomalous)
+        intervals (list): Non-overlapping (start, end) tuples; end may be None for an open range
+
+    Returns:
+        list: One Counter per interval mapping key to count
+    """
+    results = [Counter() for _ in intervals]
+
+    pieces = {'raw': [], 'minute': [], 'hour': []}
+    owners = {'raw': [], 'minute': [], 'hour': []}
+    for index, (start, end) in enumerate(intervals):
+        for granularity, piece_start, piece_end in _decompose(start, end):
+            pieces[granularity].append((piece_start, piece_end))
+            owners[granularity].append(index)
+
+    timestamp_column, key_column = RAW_SOURCES[kind]
+    for granularity, granularity_pieces in pieces.items():
+        if not granularity_pieces:
+            continue
+
+        if granularity == 'raw':
+            rows = _count_pieces(timestamp_column, key_column, func.count(), granularity_pieces, [])
+            if kind in ARCHIVED_SOURCES:
+                rows += _count_archived_pieces(kind, granularity_pieces)
+        else:
+            rows = _count_pieces(
+                MetricRollup.bucket_start,
+                ROLLUP_KEYS[kind],
+                func.sum(MetricRollup.count),
+                granularity_pieces,
+                [MetricRollup.granularity == granularity, MetricRollup.kind == kind]
+            )
+
+        for piece, key, count in rows:
+            if kind != 'alert':
+                key = bool(key)
+            results[owners[granularity][piece]][key] += int(count)
+
+    return results
+
+
+def minute_bucket(column):
+    """SQL expression truncating a timestamp column to the minute"""
+    if db.session.connection().dialect.name == 'sqlite':
+        return func.strftime('%Y-%m-%d %H:%M:00', column)
+    return func.date_trunc('minute', column)
+
+
+def backfill_rollups(since=None):
+    """
+    Rebuild the rollups from the raw tables and the archive
+
+    Args:
+        since (datetime): Only rebuild buckets from this time onwards (rounded down to the hour)
+
+    Returns:
+        dict: Number of raw rows rolled up per kind
+    """
+    since = floor_time(since, 'hour') if since is not None else None
+    sources = {
+        'alert': (Alert.created_at, Alert.severity, Alert.source, None),
+        'traffic': (TrafficData.timestamp, None, None, TrafficData.is_anomalous),
+        'log': (SystemLog.timestamp, None, SystemLog.source, SystemLog.is_anomalous)
+    }
+
+    totals = {}
+    for kind, (timestamp_column, severity_column, source_column, anomalous_column) in sources.items():
+        stale = MetricRollup.query.filter(MetricRollup.kind == kind)
+        if since is not None:
+            stale = stale.filter(MetricRollup.bucket_start >= since)
+        stale.delete(synchronize_session=False)
+
+        columns = [column for column in (severity_column, source_column, anomalous_column) if column is not None]
+        bucket = minute_bucket(timestamp_column)
+        query = db.session.query(bucket, *columns, func.count()).filter(timestamp_column.isnot(None))
+        if since is not None:
+            query = query.filter(timestamp_column >= since)
+
+        rows = query.group_by(bucket, *columns).all()
+        if kind in ARCHIVED_SOURCES:
+            # Archived rows are no longer in the table but their buckets must not be lost
+            rows += archive_service.minute_counts(ARCHIVED_SOURCES[kind], [column.key for column in columns], since)
+
+        counts = Counter()
+        total = 0
+        for row in rows:
+            bucket_start = datetime.fromisoformat(row[0]) if isinstance(row[0], str) else row[0]
+            values = iter(row[1:-1])
+            dimensions = (
+                next(values) or '' if severity_column is not None else '',
+                next(values) or '' if source_column is not None else '',
+                bool(next(values)) if anomalous_column is not None else False
+            )
+            for granularity in GRANULARITIES:
+                counts[(granularity, floor_time(bucket_start, granularity)) + dimensions] += row[-1]
+            total += row[-1]
+
+        _upsert_counts(db.session.connection(), kind, counts)
+        totals[kind] = total
+
+    db.session.commit()
+    return totals
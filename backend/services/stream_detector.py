@@ -0,0 +1,523 @@
+import os
+import math
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+from operator import itemgetter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_EPOCH = datetime(1970, 1, 1)
+_MASK64 = (1 << 64) - 1
+
+# Session.info key holding the rows to feed to the detectors once the transaction commits
+_PENDING_KEY = 'stream_detector_rows'
+
+# Registers per HyperLogLog are 2 ** HLL_PRECISION; 64 registers give ~13% standard error in 64 bytes
+HLL_PRECISION = 6
+
+# Count-min sketch dimensions; each window's sketch holds depth * width counters
+CMS_WIDTH = 1 << 16
+CMS_DEPTH = 4
+
+# Lowercased message fragments counted as failed logins for brute-force detection
+FAILED_LOGIN_PATTERNS = (
+    'failed login', 'failed password', 'authentication failure', 'invalid user', 'login failed'
+)
+
+# Alert text per detector; format fields come from the detection
+DETECTORS = {
+    'port_scan': {
+        'title': "Port Scan Detected: {key}",
+        'description': "{key} contacted about {value} distinct destination ports within {window} seconds",
+        'source': 'network'
+    },
+    'flood': {
+        'title': "Traffic Flood Detected: {key}",
+        'description': "{key} sent about {value} packets within {window} seconds",
+        'source': 'network'
+    },
+    'brute_force': {
+        'title': "Brute Force Detected: {key}",
+        'description': "{value} failed logins on {key} within {window} seconds",
+        'source': 'system'
+    }
+}
+
+
+def is_enabled():
+    """Check whether streaming detection runs during ingest"""
+    return os.getenv('STREAM_DETECTION', 'true').lower() in ('1', 'true', 'yes')
+
+
+def get_window_seconds():
+    """Get the length of the sliding window the detectors count over"""
+    return int(os.getenv('STREAM_WINDOW_SECONDS', 60))
+
+
+def get_thresholds():
+    """Get the per-window values at which each detector raises an alert"""
+    return {
+        'port_scan': int(os.getenv('PORT_SCAN_THRESHOLD', 100)),
+        'flood': int(os.getenv('FLOOD_THRESHOLD', 1000)),
+        'brute_force': int(os.getenv('BRUTE_FORCE_THRESHOLD', 10))
+    }
+
+
+def get_max_keys():
+    """Get the largest number of source IPs (and of hosts) whose state is kept"""
+    return int(os.getenv('STREAM_MAX_KEYS', 100000))
+
+
+def _mix64(value):
+    """SplitMix64 finalizer, spreading integer keys over 64 bits"""
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+def _register_update(value):
+    """Map a hashed value to a HyperLogLog (register index, rank) pair"""
+    suffix_bits = 64 - HLL_PRECISION
+    suffix = value & ((1 << suffix_bits) - 1)
+    return value >> suffix_bits, suffix_bits - suffix.bit_length() + 1
+
+
+# Register updates for every valid port, computed once
+_PORT_UPDATES = [_register_update(_mix64(port)) for port in range(65536)]
+
+
+def _port_update(port):
+    if isinstance(port, int) and 0 <= port < 65536:
+        return _PORT_UPDATES[port]
+    return _register_update(_mix64(hash(str(port)) & _MASK64))
+
+
+class HyperLogLog:
+    """Distinct-count estimator in 2 ** HLL_PRECISION one-byte registers"""
+
+    __slots__ = ('registers',)
+
+    _m = 1 << HLL_PRECISION
+    _alpha = 0.709  # bias correction for 64 registers
+    _inverse_powers = [2.0 ** -rank for rank in range(66)]
+
+    def __init__(self, registers=None):
+        self.registers = registers if registers is not None else bytearray(self._m)
+
+    def add(self, update):
+        """Apply a (register index, rank) update; returns whether the register changed"""
+        index, rank = update
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def union(self, other):
+        """Return a new estimator counting the values of both"""
+        return HyperLogLog(bytearray(map(max, self.registers, other.registers)))
+
+    @classmethod
+    def max_zeros(cls, value):
+        """
+        Largest number of empty registers at which an estimate can still reach value
+
+        Each empty register adds 1 to the harmonic sum, capping the raw
+        estimate at alpha * m * m / zeros, and linear counting only reaches
+        value with at most m * exp(-value / m) empty registers.
+        """
+        m = cls._m
+        return max(m * math.exp(-value / m), cls._alpha * m * m / value)
+
+    def zeros(self):
+        return self.registers.count(0)
+
+    def estimate(self):
+        m = self._m
+        registers = self.registers
+        raw = self._alpha * m * m / sum(map(self._inverse_powers.__getitem__, registers))
+        zeros = registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate while registers are still empty
+            return m * math.log(m / zeros)
+        return raw
+
+
+class CountMinSketch:
+    """Approximate per-key counters in a fixed depth * width table; estimates never undercount"""
+
+    __slots__ = ('rows',)
+
+    def __init__(self):
+        self.rows = [[0] * CMS_WIDTH for _ in range(CMS_DEPTH)]
+
+    @staticmethod
+    def indexes(key_hash):
+        """Get a key's counter index in each row; double hashing derives them all from one 64-bit hash"""
+        first, second = key_hash & 0xFFFFFFFF, (key_hash >> 32) | 1
+        return [(first + row * second) % CMS_WIDTH for row in range(CMS_DEPTH)]
+
+    def add(self, indexes, count=1):
+        """Add to a key's count and return its new estimate"""
+        estimate = None
+        for row, index in zip(self.rows, indexes):
+            row[index] += count
+            if estimate is None or row[index] < estimate:
+                estimate = row[index]
+        return estimate
+
+    def query(self, indexes):
+        return min(row[index] for row, index in zip(self.rows, indexes))
+
+
+class _SketchOverlay:
+    """Counts added on top of a read-only sketch, for previews"""
+
+    __slots__ = ('base', 'added')
+
+    def __init__(self, base):
+        self.base = base
+        self.added = Counter()
+
+    def add(self, indexes, count=1):
+        self.added[tuple(indexes)] += count
+        return self.query(indexes)
+
+    def query(self, indexes):
+        return (self.base.query(indexes) if self.base is not None else 0) + self.added[tuple(indexes)]
+
+
+class _KeyState:
+    """Sliding-window state kept for one source IP or host"""
+
+    __slots__ = ('window', 'current', 'previous', 'alerted')
+
+    def __init__(self, window, current):
+        self.window = window
+        self.current = current
+        self.previous = None
+        # Detectors that already alerted for this key in the current window (a tuple keeps idle keys small)
+        self.alerted = ()
+
+    def copy(self):
+        state = _KeyState(self.window, self._copy_value(self.current))
+        state.previous = self._copy_value(self.previous)
+        state.alerted = self.alerted
+        return state
+
+    @staticmethod
+    def _copy_value(value):
+        return HyperLogLog(bytearray(value.registers)) if isinstance(value, HyperLogLog) else value
+
+
+class StreamDetector:
+    """
+    In-memory streaming detectors for port scans, floods and brute-force logins
+
+    Each window of window_seconds is counted separately and the sliding count
+    is the current window plus the previous one weighted by how much of it
+    still overlaps the last window_seconds. Distinct destination ports per
+    source IP are counted with a HyperLogLog, packets per source IP with a
+    count-min sketch shared by every source in the window, and failed logins
+    per host exactly. Per-key state is evicted least recently seen first once
+    max_keys keys are tracked. Each detector alerts at most once per key per
+    window; records older than the previous window are ignored.
+    """
+
+    def __init__(self, window_seconds=60, thresholds=None, max_keys=100000):
+        self.window_seconds = window_seconds
+        self.thresholds = thresholds or get_thresholds()
+        self.max_keys = max_keys
+        self._sources = OrderedDict()
+        self._hosts = OrderedDict()
+        self._sketches = {}
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        # Port-scan estimates are skipped while too many registers are empty to reach the threshold
+        self._scan_max_zeros = HyperLogLog.max_zeros(self.thresholds['port_scan'])
+
+    def _position(self, timestamp):
+        """Return a timestamp's window and the weight of the previous window at that time"""
+        seconds = (timestamp - _EPOCH).total_seconds()
+        window = int(seconds // self.window_seconds)
+        return window, 1.0 - (seconds - window * self.window_seconds) / self.window_seconds
+
+    def _state(self, states, key, window, new_value):
+        """Get a key's state rotated to window, or None if window is too old to count"""
+        state = states.get(key)
+        if state is None:
+            state = states[key] = _KeyState(window, new_value())
+            if len(states) > self.max_keys:
+                states.popitem(last=False)
+                self._counts['evictions'] += 1
+            return state
+
+        states.move_to_end(key)
+        if window > state.window:
+            state.previous = state.current if window == state.window + 1 else None
+            state.current = new_value()
+            state.window = window
+            state.alerted = ()
+        elif window < state.window - 1:
+            return None
+        return state
+
+    def _sketch(self, window):
+        """Get the packet sketch for a window, keeping only the two newest"""
+        sketch = self._sketches.get(window)
+        if sketch is None:
+            if self._sketches and window < min(self._sketches):
+                return None
+            sketch = self._sketches[window] = CountMinSketch()
+            for old in sorted(self._sketches)[:-2]:
+                del self._sketches[old]
+        return sketch
+
+    def _previous_sketch(self, window):
+        """Get the packet sketch of the window before window, if it is still kept"""
+        return self._sketches.get(window - 1)
+
+    def _detect(self, detections, state, detector, key, value, window):
+        if value >= self.thresholds[detector]:
+            state.alerted += (detector,)
+            self._counts[detector] += 1
+            detections.append({
+                'detector': detector,
+                'key': key,
+                'value': int(round(value)),
+                'threshold': self.thresholds[detector],
+                'window_seconds': self.window_seconds,
+                'window_start': datetime.utcfromtimestamp(window * self.window_seconds).isoformat()
+            })
+
+    def observe_traffic(self, rows):
+        """
+        Feed traffic rows through the port-scan and flood detectors
+
+        Args:
+            rows (list): Dictionaries with source_ip, destination_port and timestamp (datetime)
+
+        Returns:
+            list: Detection dictionaries (detector, key, value, threshold, window_seconds, window_start)
+        """
+        detections = []
+        with self._lock:
+            for row in rows:
+                source_ip = row.get('source_ip')
+                if source_ip is None:
+                    continue
+                window, weight = self._position(row['timestamp'])
+                state = self._state(self._sources, source_ip, window, HyperLogLog)
+                sketch = self._sketch(window) if state is not None else None
+                if sketch is None:
+                    self._counts['late'] += 1
+                    continue
+                self._counts['traffic'] += 1
+
+                update = _port_update(row.get('destination_port'))
+                indexes = CountMinSketch.indexes(hash(source_ip) & _MASK64)
+                if window < state.window:
+                    # Late record for the previous window: count it without alerting
+                    if state.previous is not None:
+                        state.previous.add(update)
+                    sketch.add(indexes)
+                    continue
+
+                if state.current.add(update) and 'port_scan' not in state.alerted:
+                    # The union has at least zeros(current) + zeros(previous) - m empty registers
+                    zeros = state.current.zeros()
+                    if state.previous is not None:
+                        zeros += state.previous.zeros() - HyperLogLog._m
+                    if zeros <= self._scan_max_zeros:
+                        distinct = state.current.estimate()
+                        if state.previous is not None:
+                            distinct += (state.current.union(state.previous).estimate() - distinct) * weight
+                        self._detect(detections, state, 'port_scan', source_ip, distinct, window)
+
+                packets = sketch.add(indexes)
+                if 'flood' not in state.alerted:
+                    # Sources without previous-window state sent nothing then (or were evicted since)
+                    previous = self._previous_sketch(window) if state.previous is not None else None
+                    if previous is not None:
+                        packets += previous.query(indexes) * weight
+                    self._detect(detections, state, 'flood', source_ip, packets, window)
+        return detections
+
+    def observe_logs(self, rows):
+        """
+        Feed log rows through the brute-force detector
+
+        Args:
+            rows (list): Dictionaries with host, message and timestamp (datetime)
+
+        Returns:
+            list: Detection dictionaries (detector, key, value, threshold, window_seconds, window_start)
+        """
+        detections = []
+        with self._lock:
+            for row in rows:
+                message = (row.get('message') or '').lower()
+                if row.get('host') is None or not any(pattern in message for pattern in FAILED_LOGIN_PATTERNS):
+                    continue
+                window, weight = self._position(row['timestamp'])
+                state = self._state(self._hosts, row['host'], window, int)
+                if state is None:
+                    self._counts['late'] += 1
+                    continue
+                self._counts['failed_logins'] += 1
+
+                if window < state.window:
+                    state.previous = (state.previous or 0) + 1
+                    continue
+
+                state.current += 1
+                if 'brute_force' not in state.alerted:
+                    self._detect(detections, state, 'brute_force', row['host'],
+                                 state.current + (state.previous or 0) * weight, window)
+        return detections
+
+    def preview_traffic(self, rows):
+        """
+        Get the detections observe_traffic would return for rows, without changing any state
+
+        Returns:
+            list: Detection dictionaries, as from observe_traffic
+        """
+        with self._lock:
+            return _Preview(self).observe_traffic(rows)
+
+    def preview_logs(self, rows):
+        """
+        Get the detections observe_logs would return for rows, without changing any state
+
+        Returns:
+            list: Detection dictionaries, as from observe_logs
+        """
+        with self._lock:
+            return _Preview(self).observe_logs(rows)
+
+    def stats(self):
+        """
+        Get detector counters
+
+        Returns:
+            dict: tracked sources and hosts, records observed, late records,
+            evictions and detections per detector
+        """
+        with self._lock:
+            counts = Counter(self._counts)
+            return {
+                'window_seconds': self.window_seconds,
+                'thresholds': dict(self.thresholds),
+                'max_keys': self.max_keys,
+                'tracked_sources': len(self._sources),
+                'tracked_hosts': len(self._hosts),
+                'traffic_observed': counts['traffic'],
+                'failed_logins_observed': counts['failed_logins'],
+                'late_records': counts['late'],
+                'evictions': counts['evictions'],
+                'detections': {detector: counts[detector] for detector in DETECTORS}
+            }
+
+
+class _Preview(StreamDetector):
+    """
+    Copy-on-write view of a detector
+
+    Key state is copied from the detector on first use and packet counts are
+    added to overlays of its sketches, so the detectors run over a batch as
+    if it had been observed while the detector itself stays unchanged. The
+    caller holds the detector's lock.
+    """
+
+    def __init__(self, base):
+        super().__init__(base.window_seconds, base.thresholds, math.inf)
+        self._base = base
+
+    def _state(self, states, key, window, new_value):
+        if key not in states:
+            base_state = (self._base._sources if states is self._sources else self._base._hosts).get(key)
+            if base_state is not None:
+                states[key] = base_state.copy()
+        return super()._state(states, key, window, new_value)
+
+    def _sketch(self, window):
+        sketch = self._sketches.get(window)
+        if sketch is None:
+            newest = sorted(set(self._base._sketches) | set(self._sketches))[-2:]
+            if newest and window < newest[0]:
+                return None
+            sketch = self._sketches[window] = _SketchOverlay(self._base._sketches.get(window))
+        return sketch
+
+    def _previous_sketch(self, window):
+        return self._sketches.get(window - 1) or self._base._sketches.get(window - 1)
+
+
+stream_detector = None
+_stream_detector_lock = threading.Lock()
+
+
+def get_stream_detector():
+    """Get the process-wide stream detector, or None when STREAM_DETECTION is off"""
+    global stream_detector
+
+    if not is_enabled():
+        return None
+    with _stream_detector_lock:
+        if stream_detector is None:
+            stream_detector = StreamDetector(get_window_seconds(), get_thresholds(), get_max_keys())
+    return stream_detector
+
+
+def _detect_on_commit(kind, rows):
+    """
+    Preview the detections for ingested rows and feed the rows to the detectors once the transaction commits
+
+    Rows are sorted by timestamp first, so an unordered batch is not counted
+    as late. Detections are evaluated against the committed state plus these
+    rows, so alerts can be inserted in the same transaction; a rollback (or a
+    retry of the same rows) leaves the detectors untouched.
+
+    Args:
+        kind (str): 'traffic' or 'logs'
+        rows (list): Ingested column dictionaries with datetime timestamps
+
+    Returns:
+        list: Detection dictionaries ([] when STREAM_DETECTION is off)
+    """
+    detector = get_stream_detector()
+    if detector is None or not rows:
+        return []
+    from app import db
+    rows = sorted(rows, key=itemgetter('timestamp'))
+    detections = detector.preview_traffic(rows) if kind == 'traffic' else detector.preview_logs(rows)
+    db.session.info.setdefault(_PENDING_KEY, []).append((kind, rows))
+    return detections
+
+
+def detect_traffic(rows):
+    """Run the port-scan and flood detectors over ingested traffic rows (see _detect_on_commit)"""
+    return _detect_on_commit('traffic', rows)
+
+
+def detect_logs(rows):
+    """Run the brute-force detector over ingested log rows (see _detect_on_commit)"""
+    return _detect_on_commit('logs', rows)
+
+
+@event.listens_for(Session, 'after_commit')
+def _observe_pending_rows(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending and stream_detector is not None:
+        for kind, rows in pending:
+            if kind == 'traffic':
+                stream_detector.observe_traffic(rows)
+            else:
+                stream_detector.observe_logs(rows)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_rows(session):
+    session.info.pop(_PENDING_KEY, None)
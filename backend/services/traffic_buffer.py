@@ -0,0 +1,471 @@
+import os
+import ipaddress
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import numpy as np
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from app import db
+from models.traffic_data import TrafficData
+from services.rollup_service import minute_bucket
+
+# One recent traffic record; aligned to 56 bytes. Addresses are 16-byte IPv6
+# (IPv4 as ::ffff:a.b.c.d) split into high and low 64-bit halves, with (0, 0)
+# for missing or unparseable addresses; ports and sizes are 0 when missing.
+TRAFFIC_DTYPE = np.dtype([
+    ('timestamp', 'M8[us]'),
+    ('source_ip', 'u8', (2,)),
+    ('destination_ip', 'u8', (2,)),
+    ('packet_size', 'u4'),
+    ('anomaly_score', 'f4'),
+    ('source_port', 'u2'),
+    ('destination_port', 'u2'),
+    ('protocol', 'u1'),
+    ('is_anomalous', '?')
+], align=True)
+
+# Protocol code for names beyond the 254 the code table holds (0 is missing)
+_OTHER_PROTOCOL = 255
+
+# Records per block; windows only scan blocks whose timestamp range overlaps them
+_BLOCK_SIZE = 4096
+
+# Fields copied out of the buffer for window queries
+WINDOW_FIELDS = ('timestamp', 'source_ip', 'source_port', 'destination_port', 'is_anomalous')
+
+# Session.info key holding packed records waiting for the transaction to commit
+_PENDING_KEY = 'traffic_buffer_records'
+
+# Timestamps are converted to microseconds since the epoch in Python; numpy's datetime conversion is ten times slower
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# Low half of an IPv4-mapped address, before the IPv4 address bits
+_IPV4_MAPPED = 0xffff << 32
+
+
+def is_enabled():
+    """
+    Check whether the recent traffic buffer is enabled (RECENT_TRAFFIC_BUFFER)
+
+    The default, 'auto', only enables it when this process commits all the
+    traffic: a single web worker (WEB_CONCURRENCY unset or 1) running its
+    jobs on the in-process queue (JOB_QUEUE=memory, or no REDIS_URL).
+    """
+    setting = os.getenv('RECENT_TRAFFIC_BUFFER', 'auto').lower()
+    if setting != 'auto':
+        return setting in ('1', 'true', 'yes')
+    job_queue = os.getenv('JOB_QUEUE', 'auto').lower()
+    in_process_jobs = job_queue == 'memory' or (job_queue == 'auto' and not os.getenv('REDIS_URL'))
+    return int(os.getenv('WEB_CONCURRENCY', 1)) <= 1 and in_process_jobs
+
+
+def get_capacity():
+    """Get the number of records the buffer holds (TRAFFIC_DTYPE.itemsize bytes each)"""
+    return int(os.getenv('RECENT_TRAFFIC_CAPACITY', 1000000))
+
+
+@lru_cache(maxsize=65536)
+def _pack_address(address):
+    try:
+        packed = ipaddress.ip_address(address).packed
+    except ValueError:
+        return None
+    value = int.from_bytes(packed, 'big')
+    if len(packed) == 4:
+        return 0, _IPV4_MAPPED | value
+    return value >> 64, value & 0xffffffffffffffff
+
+
+def pack_address(address):
+    """
+    Pack an IP address string into its (high, low) 64-bit halves
+
+    Returns:
+        tuple: (high, low), or None when address is missing or not an IP address
+    """
+    return _pack_address(address) if isinstance(address, str) else None
+
+
+def unpack_address(high, low):
+    """Format packed (high, low) halves as an IPv4 or IPv6 address string, or None for (0, 0)"""
+    high, low = int(high), int(low)
+    if high == 0 and low >> 32 == 0xffff:
+        return str(ipaddress.IPv4Address(low & 0xffffffff))
+    if high == 0 and low == 0:
+        return None
+    return str(ipaddress.IPv6Address(high << 64 | low))
+
+
+def _utc_naive(timestamp):
+    """Convert an aware timestamp to naive UTC, as stored in the table"""
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _bounded(value, limit):
+    """Keep integer values within [0, limit], mapping anything else to 0"""
+    return value if type(value) is int and 0 <= value <= limit else 0
+
+
+def _address_counts(addresses):
+    """
+    Count rows per packed address
+
+    IPv4 rows all share the high half, so they are counted on the low half
+    alone; the remaining (IPv6) rows are sorted on both halves.
+
+    Args:
+        addresses (ndarray): (n, 2) array of packed addresses
+
+    Returns:
+        tuple: (high, low, counts) arrays, one entry per distinct address
+    """
+    high, low = addresses[:, 0], addresses[:, 1]
+    v4 = high == 0
+    v4_low, v4_counts = np.unique(low[v4], return_counts=True)
+
+    v6_high, v6_low = high[~v4], low[~v4]
+    if not len(v6_high):
+        return np.zeros(len(v4_low), dtype=np.uint64), v4_low, v4_counts
+
+    order = np.lexsort((v6_low, v6_high))
+    v6_high, v6_low = v6_high[order], v6_low[order]
+    starts = np.flatnonzero(np.r_[True, (v6_high[1:] != v6_high[:-1]) | (v6_low[1:] != v6_low[:-1])])
+    v6_counts = np.diff(np.r_[starts, len(v6_high)])
+    return (np.concatenate([np.zeros(len(v4_low), dtype=np.uint64), v6_high[starts]]),
+            np.concatenate([v4_low, v6_low[starts]]),
+            np.concatenate([v4_counts, v6_counts]))
+
+
+def _top(counts, n):
+    """Get the indexes of the n largest counts (all when n is None), largest first"""
+    if n is not None and len(counts) > n:
+        candidates = np.argpartition(-counts, n - 1)[:n]
+    else:
+        candidates = np.arange(len(counts))
+    return candidates[np.argsort(-counts[candidates], kind='stable')]
+
+
+class BufferWindow:
+    """
+    Recent traffic query helpers over a snapshot of the buffered records in a time window
+
+    Args:
+        columns (dict): Contiguous array per WINDOW_FIELDS field
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def minute_counts(self):
+        """
+        Count records and anomalous records per minute
+
+        Returns:
+            list: (minute start, total, anomalous) tuples for minutes with traffic, oldest first
+        """
+        minutes = self.columns['timestamp'].astype('M8[m]')
+        if not len(minutes):
+            return []
+        first = minutes.min()
+        offsets = (minutes - first).astype(np.int64)
+        totals = np.bincount(offsets)
+        anomalous = np.bincount(offsets, weights=self.columns['is_anomalous'])
+        return [
+            ((first + np.timedelta64(int(offset), 'm')).astype(datetime), int(totals[offset]), int(anomalous[offset]))
+            for offset in np.flatnonzero(totals)
+        ]
+
+    def top_sources(self, n=None, anomalous_only=False):
+        """
+        Rank source addresses by record count
+
+        Args:
+            n (int): Number of sources to return (all when None)
+            anomalous_only (bool): Only count anomalous records
+
+        Returns:
+            list: (source IP, count) tuples, busiest first
+        """
+        addresses = self.columns['source_ip']
+        if anomalous_only:
+            addresses = addresses[self.columns['is_anomalous']]
+        high, low, counts = _address_counts(addresses)
+        known = (high != 0) | (low != 0)
+        high, low, counts = high[known], low[known], counts[known]
+        return [(unpack_address(high[i], low[i]), int(counts[i])) for i in _top(counts, n)]
+
+    def top_ports(self, n=None, field='destination_port'):
+        """
+        Rank ports by record count (port histogram)
+
+        Args:
+            n (int): Number of ports to return (all when None)
+            field (str): 'destination_port' or 'source_port'
+
+        Returns:
+            list: (port, count) tuples, busiest first; records without a port are skipped
+        """
+        counts = np.bincount(self.columns[field], minlength=65536)
+        counts[0] = 0
+        ports = np.flatnonzero(counts)
+        return [(int(ports[i]), int(counts[ports[i]])) for i in _top(counts[ports], n)]
+
+
+class DatabaseWindow:
+    """The BufferWindow helpers answered with SQL on the traffic table"""
+
+    def __init__(self, start, end):
+        self.filters = (TrafficData.timestamp >= start, TrafficData.timestamp <= end)
+
+    def minute_counts(self):
+        bucket = minute_bucket(TrafficData.timestamp)
+        rows = db.session.query(bucket, TrafficData.is_anomalous, func.count(TrafficData.id)).filter(
+            *self.filters
+        ).group_by(bucket, TrafficData.is_anomalous).all()
+
+        counts = {}
+        for minute, is_anomalous, count in rows:
+            # SQLite buckets are strings
+            minute = datetime.fromisoformat(minute) if isinstance(minute, str) else minute
+            total, anomalous = counts.get(minute, (0, 0))
+            counts[minute] = (total + count, anomalous + (count if is_anomalous else 0))
+        return [(minute, total, anomalous) for minute, (total, anomalous) in sorted(counts.items())]
+
+    def top_sources(self, n=None, anomalous_only=False):
+        count = func.count(TrafficData.id)
+        query = db.session.query(TrafficData.source_ip, count).filter(*self.filters)
+        if anomalous_only:
+            query = query.filter(TrafficData.is_anomalous.is_(True))
+        query = query.group_by(TrafficData.source_ip).order_by(count.desc())
+        return [(ip, count) for ip, count in (query.limit(n) if n is not None else query).all()]
+
+    def top_ports(self, n=None, field='destination_port'):
+        column = getattr(TrafficData, field)
+        count = func.count(TrafficData.id)
+        query = db.session.query(column, count).filter(*self.filters, column.isnot(None), column != 0)
+        query = query.group_by(column).order_by(count.desc())
+        return [(port, count) for port, count in (query.limit(n) if n is not None else query).all()]
+
+
+class RecentTrafficBuffer:
+    """
+    Fixed-size ring buffer of recently committed traffic records
+
+    Records are packed into a NumPy structured array of TRAFFIC_DTYPE, so the
+    buffer always takes capacity * TRAFFIC_DTYPE.itemsize bytes. The oldest
+    and newest timestamp of every block of records is kept alongside, so
+    windows skip the blocks outside them and copy the blocks inside them
+    whole; traffic arrives roughly in time order, so most blocks are one or
+    the other. A window is
+    only answered from the buffer when the buffer saw every record in it: it
+    has been filling since before the window starts and has not overwritten
+    any record inside the window. Callers fall back to SQL otherwise.
+
+    Only records committed by this process are buffered, and every worker
+    allocates its own buffer, so it is off by default when other processes
+    also ingest traffic (several web workers, Redis job workers); see
+    is_enabled.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._records = np.zeros(capacity, dtype=TRAFFIC_DTYPE)
+        self._timestamps = self._records['timestamp'].view(np.int64)
+        blocks = -(-capacity // _BLOCK_SIZE)
+        self._block_min = np.zeros(blocks, dtype=np.int64)
+        self._block_max = np.zeros(blocks, dtype=np.int64)
+        self._written = 0
+        self._protocols = {}
+        # Windows starting before this, or at or before the newest overwritten record, are incomplete
+        self.started_at = np.datetime64(datetime.utcnow(), 'us')
+        self._evicted_until = None
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def _protocol_code(self, name):
+        code = self._protocols.get(name)
+        if code is None:
+            code = len(self._protocols) + 1 if len(self._protocols) < _OTHER_PROTOCOL - 1 else _OTHER_PROTOCOL
+            if code != _OTHER_PROTOCOL:
+                self._protocols[name] = code
+        return code
+
+    def pack(self, rows):
+        """
+        Pack traffic rows into TRAFFIC_DTYPE records
+
+        Args:
+            rows (list): Traffic column dictionaries as written by ingest
+
+        Returns:
+            ndarray: The packed records
+        """
+        records = np.zeros(len(rows), dtype=TRAFFIC_DTYPE)
+        records['timestamp'] = np.array([(_utc_naive(row['timestamp']) - _EPOCH) // _MICROSECOND for row in rows],
+                                        dtype=np.int64).view('M8[us]')
+        unparsed = 0
+        for field in ('source_ip', 'destination_ip'):
+            packed = [pack_address(row[field]) for row in rows]
+            if None in packed:
+                unparsed += packed.count(None)
+                packed = [address or (0, 0) for address in packed]
+            records[field] = packed
+        records['source_port'] = [_bounded(row['source_port'], 65535) for row in rows]
+        records['destination_port'] = [_bounded(row['destination_port'], 65535) for row in rows]
+        records['packet_size'] = [_bounded(row['packet_size'], 0xffffffff) for row in rows]
+        records['anomaly_score'] = [row['anomaly_score'] or 0.0 for row in rows]
+        records['is_anomalous'] = [bool(row['is_anomalous']) for row in rows]
+        with self._lock:
+            records['protocol'] = [self._protocol_code(row['protocol']) if row['protocol'] else 0 for row in rows]
+            self._counts['unparsed_addresses'] += unparsed
+        return records
+
+    def append(self, records):
+        """Write packed records over the oldest ones"""
+        with self._lock:
+            if len(records) > self.capacity:
+                self._evict(records['timestamp'][:-self.capacity])
+                records = records[-self.capacity:]
+
+            positions = (self._written + np.arange(len(records))) % self.capacity
+            # Slots below the fill level hold records about to be overwritten
+            overwritten = positions[positions < min(self._written, self.capacity)]
+            if len(overwritten):
+                self._evict(self._records['timestamp'][overwritten])
+            self._records[positions] = records
+            self._written += len(records)
+
+            filled = min(self._written, self.capacity)
+            for block in np.unique(positions // _BLOCK_SIZE):
+                timestamps = self._timestamps[block * _BLOCK_SIZE:min((block + 1) * _BLOCK_SIZE, filled)]
+                self._block_min[block] = timestamps.min()
+                self._block_max[block] = timestamps.max()
+
+    def _evict(self, timestamps):
+        newest = timestamps.max()
+        if self._evicted_until is None or newest > self._evicted_until:
+            self._evicted_until = newest
+
+    def window(self, start, end):
+        """
+        Snapshot the records in a time window
+
+        Args:
+            start (datetime): Window start (inclusive)
+            end (datetime): Window end (inclusive)
+
+        Returns:
+            BufferWindow: Helpers over the window, or None when the buffer does not hold all of it
+        """
+        start, end = np.datetime64(start, 'us'), np.datetime64(end, 'us')
+        with self._lock:
+            if start < self.started_at or (self._evicted_until is not None and self._evicted_until >= start):
+                self._counts['misses'] += 1
+                return None
+            self._counts['hits'] += 1
+
+            start, end = start.astype(np.int64), end.astype(np.int64)
+            filled = min(self._written, self.capacity)
+            blocks = -(-filled // _BLOCK_SIZE)
+            block_min, block_max = self._block_min[:blocks], self._block_max[:blocks]
+            pieces = {field: [] for field in WINDOW_FIELDS}
+            for block in np.flatnonzero((block_max >= start) & (block_min <= end)):
+                first, last = block * _BLOCK_SIZE, min((block + 1) * _BLOCK_SIZE, filled)
+                records = self._records[first:last]
+                if block_min[block] < start or block_max[block] > end:
+                    timestamps = self._timestamps[first:last]
+                    records = records[(timestamps >= start) & (timestamps <= end)]
+                for field in WINDOW_FIELDS:
+                    pieces[field].append(records[field])
+            # Concatenating copies the columns, so the snapshot outlives later appends
+            empty = np.zeros(0, dtype=TRAFFIC_DTYPE)
+            return BufferWindow({field: np.concatenate(arrays or [empty[field]]) for field, arrays in pieces.items()})
+
+    def stats(self):
+        """
+        Get the buffer size and counters
+
+        Returns:
+            dict: capacity, records held, bytes_per_record, memory_bytes, the time
+            from which windows are complete, window hits and misses and unparsed addresses
+        """
+        with self._lock:
+            counts = Counter(self._counts)
+            covered_from = self.started_at if self._evicted_until is None else max(self.started_at, self._evicted_until)
+            records = min(self._written, self.capacity)
+        return {
+            'capacity': self.capacity,
+            'records': records,
+            'bytes_per_record': TRAFFIC_DTYPE.itemsize,
+            'memory_bytes': self._records.nbytes,
+            'complete_after': covered_from.astype(datetime).isoformat(),
+            'window_hits': counts['hits'],
+            'window_misses': counts['misses'],
+            'unparsed_addresses': counts['unparsed_addresses']
+        }
+
+
+traffic_buffer = None
+_traffic_buffer_lock = threading.Lock()
+
+
+def get_traffic_buffer():
+    """Get the process-wide recent traffic buffer, or None when it is disabled"""
+    global traffic_buffer
+
+    if not is_enabled():
+        return None
+    with _traffic_buffer_lock:
+        if traffic_buffer is None:
+            traffic_buffer = RecentTrafficBuffer(get_capacity())
+    return traffic_buffer
+
+
+def buffer_traffic(rows):
+    """
+    Add ingested traffic rows to the buffer once the current transaction commits
+
+    Args:
+        rows (list): Traffic column dictionaries as inserted
+    """
+    buffer = get_traffic_buffer()
+    if buffer is None or not rows:
+        return
+    db.session.info.setdefault(_PENDING_KEY, []).append(buffer.pack(rows))
+
+
+@event.listens_for(Session, 'after_commit')
+def _append_pending_records(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending and traffic_buffer is not None:
+        traffic_buffer.append(np.concatenate(pending))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_records(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def recent_window(minutes):
+    """
+    Get query helpers over the last few minutes of traffic
+
+    Args:
+        minutes (float): Window length
+
+    Returns:
+        tuple: ('buffer', BufferWindow) when the buffer holds the whole window,
+        otherwise ('database', DatabaseWindow)
+    """
+    end = datetime.utcnow()
+    start = end - timedelta(minutes=minutes)
+    buffer = get_traffic_buffer()
+    window = buffer.window(start, end) if buffer is not None else None
+    if window is not None:
+        return 'buffer', window
+    return 'database', DatabaseWindow(start, end)
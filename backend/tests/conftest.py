@@ -0,0 +1,66 @@
+"""
+Shared test fixtures
+
+app.py reads its configuration when it is imported, so the environment is
+set here first: a temporary SQLite database, no Redis or read replica, and
+the per-process caches switched off so no state leaks between tests. Tests
+of a cache turn it on themselves. Tests of PostgreSQL-only paths are skipped
+unless TEST_POSTGRES_URL points at an empty database they can create tables in.
+
+Run from the backend directory:
+    python -m pytest -q
+"""
+import os
+import tempfile
+import datetime
+import pytest
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['ARCHIVE_DIR'] = tempfile.mkdtemp()
+for name in ('REDIS_URL', 'DATABASE_REPLICA_URL', 'WEB_CONCURRENCY', 'PARTITION_INTERVAL'):
+    os.environ.pop(name, None)
+os.environ['JOB_QUEUE'] = 'memory'
+os.environ['RESPONSE_CACHE'] = 'none'
+os.environ['ALERT_STATS_CACHE'] = 'false'
+os.environ['RECENT_TRAFFIC_BUFFER'] = 'false'
+os.environ['AUTH_CACHE_SIZE'] = '0'
+
+import jwt
+from app import app as flask_app, db
+
+
+@pytest.fixture
+def app():
+    """The Flask app inside an application context, on freshly created tables"""
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def auth_headers(app):
+    """Bearer headers of a freshly created admin user"""
+    from models.user import User
+
+    user = User(username='admin', email='admin@example.com', password='x', role='admin')
+    db.session.add(user)
+    db.session.commit()
+    token = jwt.encode({
+        'user_id': user.id,
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    }, os.getenv('SECRET_KEY', 'dev_key'), algorithm='HS256')
+    return {'Authorization': 'Bearer ' + token}
+
+
+@pytest.fixture(scope='session')
+def tiny_model(tmp_path_factory):
+    """A small randomly initialized DistilBERT classifier and its tokenizer, built once"""
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    from benchmarks.tiny_model import build_tiny_model
+
+    path = build_tiny_model(str(tmp_path_factory.mktemp('tiny-model')))
+    model = AutoModelForSequenceClassification.from_pretrained(path)
+    model.eval()
+    return model, AutoTokenizer.from_pretrained(path)
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from models.alert import Alert
+from services.alert_coalescing_service import fingerprint
+from services.ingest_service import _insert_alerts
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def window(monkeypatch):
+    monkeypatch.setenv('ALERT_COALESCE_WINDOW', '300')
+
+
+def occurrence(entity, seen):
+    return {
+        'title': f'Port scan from {entity}', 'description': 'scan', 'severity': 'high', 'source': 'network',
+        'fingerprint': fingerprint('network', 'port_scan', entity, 'high'),
+        'occurrences': 1, 'first_seen': seen, 'last_seen': seen, 'details': '{}'
+    }
+
+
+def store(rows):
+    """Coalesce and insert a batch as the ingest path does, returning the alert id of each row"""
+    summaries = [{} for _ in rows]
+    _insert_alerts(rows, summaries, None)
+    db.session.commit()
+    return [summary['alert_id'] for summary in summaries]
+
+
+def alerts():
+    return Alert.query.order_by(Alert.id).all()
+
+
+def test_batch_rows_merge_per_fingerprint(app):
+    ids = store([
+        occurrence('10.0.0.1', START + timedelta(seconds=20)),
+        occurrence('10.0.0.2', START),
+        occurrence('10.0.0.1', START),
+        occurrence('10.0.0.1', START + timedelta(seconds=40))
+    ])
+
+    assert ids[0] == ids[2] == ids[3] != ids[1]
+    merged = db.session.get(Alert, ids[0])
+    assert merged.occurrences == 3
+    assert (merged.first_seen, merged.last_seen) == (START, START + timedelta(seconds=40))
+    assert len(alerts()) == 2
+
+
+def test_batch_rows_further_apart_than_the_window_stay_separate(app):
+    ids = store([occurrence('10.0.0.1', START), occurrence('10.0.0.1', START + timedelta(seconds=301))])
+
+    assert ids[0] != ids[1]
+    assert [alert.occurrences for alert in alerts()] == [1, 1]
+
+
+def test_later_batch_merges_into_the_open_aggregate(app):
+    [alert_id] = set(store([occurrence('10.0.0.1', START), occurrence('10.0.0.1', START + timedelta(seconds=10))]))
+
+    # A late occurrence older than the aggregate's first, and a newer one
+    ids = store([occurrence('10.0.0.1', START - timedelta(seconds=30)), occurrence('10.0.0.1', START + timedelta(seconds=60))])
+
+    assert ids == [alert_id, alert_id]
+    [aggregate] = alerts()
+    assert aggregate.occurrences == 4
+    assert aggregate.first_seen == START - timedelta(seconds=30)
+    assert aggregate.last_seen == START + timedelta(seconds=60)
+
+
+def test_resolved_aggregate_starts_a_new_alert(app):
+    [alert_id] = store([occurrence('10.0.0.1', START)])
+    db.session.get(Alert, alert_id).is_resolved = True
+    db.session.commit()
+
+    [new_id] = store([occurrence('10.0.0.1', START + timedelta(seconds=10))])
+
+    assert new_id != alert_id
+    assert [(alert.occurrences, alert.is_resolved) for alert in alerts()] == [(1, True), (1, False)]
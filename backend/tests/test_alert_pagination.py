@@ -0,0 +1,46 @@
+import pytest
+from models.alert import Alert
+from services.pagination import encode_cursor
+from benchmarks.data import seed_database
+
+PER_PAGE = 20
+
+
+@pytest.mark.parametrize('filters', [{}, {'severity': 'high'}])
+def test_keyset_pages_match_offset_pages(app, client, auth_headers, filters):
+    seed_database(0, 0, alert_count=500)
+    ordered = Alert.query.filter_by(**filters).order_by(Alert.created_at.desc(), Alert.id.desc())
+    matching = ordered.count()
+
+    for fraction in (0, 0.1, 0.5, 0.9):
+        offset = int(matching * fraction) // PER_PAGE * PER_PAGE
+        # Cursor pointing just before the same position
+        cursor = {}
+        if offset:
+            boundary = ordered.offset(offset - 1).first()
+            cursor = {'cursor': encode_cursor(boundary.created_at, boundary.id, 'next')}
+
+        offset_page = client.get('/api/alerts/', headers=auth_headers,
+                                 query_string={**filters, 'page': offset // PER_PAGE + 1, 'per_page': PER_PAGE})
+        keyset_page = client.get('/api/alerts/', headers=auth_headers,
+                                 query_string={**filters, **cursor, 'per_page': PER_PAGE})
+
+        assert offset_page.status_code == keyset_page.status_code == 200
+        offset_ids = [alert['id'] for alert in offset_page.get_json()['alerts']]
+        assert offset_ids == [alert['id'] for alert in keyset_page.get_json()['alerts']]
+        assert offset_ids
+
+
+def test_next_cursors_walk_every_alert_once(app, client, auth_headers):
+    seed_database(0, 0, alert_count=105)
+    expected = [alert.id for alert in Alert.query.order_by(Alert.created_at.desc(), Alert.id.desc())]
+
+    seen, params = [], {'per_page': PER_PAGE}
+    while True:
+        page = client.get('/api/alerts/', headers=auth_headers, query_string=params).get_json()
+        seen.extend(alert['id'] for alert in page['alerts'])
+        if not page['pagination']['has_next']:
+            break
+        params = {'per_page': PER_PAGE, 'cursor': page['pagination']['next_cursor']}
+
+    assert seen == expected
@@ -0,0 +1,73 @@
+import pytest
+from models.alert import Alert
+from services import alert_stats_service
+from services.alert_stats_service import (
+    AlertCounterCache, get_alert_counter_cache, grouped_counts, is_cache_enabled, summarize
+)
+from benchmarks.bench_alert_statistics import legacy_statistics
+from benchmarks.data import seed_database
+
+
+def test_grouped_and_cached_counts_match_per_column_counts(app):
+    seed_database(0, 0, alert_count=2000)
+
+    legacy = legacy_statistics()
+    grouped = summarize(grouped_counts())
+    cached = summarize(AlertCounterCache().snapshot())
+
+    for key in ('by_severity', 'by_source', 'by_status'):
+        for name, count in legacy[key].items():
+            assert grouped[key][name] == count
+            assert cached[key][name] == count
+    assert grouped['total_alerts'] == cached['total_alerts'] == 2000
+
+
+def test_statistics_endpoint_matches_per_column_counts(app, client, auth_headers):
+    seed_database(0, 0, alert_count=500)
+
+    response = client.get('/api/alerts/statistics', headers=auth_headers)
+
+    assert response.status_code == 200
+    statistics = response.get_json()
+    for key, counts in legacy_statistics().items():
+        for name, count in counts.items():
+            assert statistics[key][name] == count
+
+
+@pytest.fixture
+def counter_cache(app, monkeypatch):
+    """A fresh process-wide alert counter cache for this test"""
+    monkeypatch.setenv('ALERT_STATS_CACHE', 'true')
+    monkeypatch.setattr(alert_stats_service, 'alert_counter_cache', None)
+    return get_alert_counter_cache()
+
+
+def test_commit_during_rebuild_is_counted_once(client, auth_headers, counter_cache, monkeypatch):
+    seed_database(0, 0, alert_count=200)
+    counter_cache.snapshot()
+    alert_id = Alert.query.filter_by(is_resolved=False).first().id
+    query = alert_stats_service.grouped_counts
+
+    def query_then_resolve():
+        counts = query()
+        # Reads and commits are not blocked while the rebuild queries the table
+        assert not counter_cache._lock.locked()
+        assert client.put(f'/api/alerts/{alert_id}/resolve', headers=auth_headers).status_code == 200
+        return counts
+
+    monkeypatch.setattr(alert_stats_service, 'grouped_counts', query_then_resolve)
+    counter_cache.rebuild()
+
+    assert counter_cache.snapshot() == query()
+
+
+def test_cache_defaults_to_a_single_worker(monkeypatch):
+    monkeypatch.setenv('ALERT_STATS_CACHE', 'auto')
+    assert is_cache_enabled()
+
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    assert not is_cache_enabled()
+
+    monkeypatch.delenv('WEB_CONCURRENCY')
+    monkeypatch.setenv('JOB_QUEUE', 'redis')
+    assert not is_cache_enabled()
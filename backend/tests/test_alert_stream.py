@@ -0,0 +1,115 @@
+import time
+import datetime as dt
+import pytest
+import redis
+from models.alert import Alert
+from services import alert_broker
+from services.alert_broker import AlertBroker, RedisAlertBroker
+from services.ingest_service import insert_rows
+
+
+@pytest.fixture
+def stream_env(app, monkeypatch):
+    """A fresh in-process broker whose streams close quickly"""
+    monkeypatch.setenv('ALERT_STREAM', 'memory')
+    monkeypatch.setenv('ALERT_STREAM_MAX_SECONDS', '0.1')
+    monkeypatch.setenv('ALERT_STREAM_HEARTBEAT', '0.05')
+    monkeypatch.setattr(alert_broker, 'alert_broker', None)
+    monkeypatch.setattr(alert_broker, '_initialized', False)
+    return monkeypatch
+
+
+def insert_alerts(count):
+    now = dt.datetime.utcnow()
+    return insert_rows(Alert, [{
+        'title': f'Alert {index}', 'description': 'test', 'severity': 'high', 'source': 'network',
+        'is_resolved': False, 'details': '{}', 'created_at': now
+    } for index in range(count)], mode='bulk')
+
+
+def read_stream(client, headers, last_id):
+    response = client.get('/api/dashboard/stream', headers=dict(headers, **{'Last-Event-ID': str(last_id)}))
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    return response.get_data(as_text=True)
+
+
+def event_ids(body):
+    return [int(line[4:]) for line in body.splitlines() if line.startswith('id: ')]
+
+
+def test_resuming_client_gets_the_alerts_it_missed(client, auth_headers, stream_env):
+    ids = insert_alerts(5)
+
+    body = read_stream(client, auth_headers, ids[1])
+
+    # Alerts created just before the last seen one may have committed after it, so they are replayed too
+    assert event_ids(body) == [ids[0]] + ids[2:]
+    assert 'event: reset' not in body
+
+
+def test_resuming_too_far_behind_gets_a_reset(client, auth_headers, stream_env):
+    stream_env.setenv('ALERT_STREAM_REPLAY_LIMIT', '2')
+    ids = insert_alerts(5)
+
+    body = read_stream(client, auth_headers, ids[0])
+
+    assert event_ids(body) == []
+    assert 'event: reset\ndata: {"reason": "replay_limit"}' in body
+
+
+def test_subscriber_behind_the_ring_gets_a_reset():
+    broker = AlertBroker(buffer_size=4, max_subscribers=10)
+    cursor = broker.subscribe()
+
+    broker.deliver([('alert', alert_id, {'id': alert_id}) for alert_id in range(1, 4)])
+    cursor, entries, lost = broker.read(cursor, 0)
+    assert [alert_id for alert_id, _ in entries] == [1, 2, 3] and not lost
+
+    broker.deliver([('alert', alert_id, {'id': alert_id}) for alert_id in range(4, 10)])
+    cursor, entries, lost = broker.read(cursor, 0)
+    assert entries == [] and lost
+    assert broker.stats()['resets'] == 1
+
+
+class FlakyPubSub:
+    """Stands in for a Redis subscription whose first connection drops"""
+
+    def __init__(self, fail):
+        self.fail = fail
+        self.closed = False
+
+    def subscribe(self, channel):
+        pass
+
+    def get_message(self, timeout):
+        if self.fail:
+            raise redis.ConnectionError('connection reset')
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        self.closed = True
+
+
+class FlakyRedis:
+    def __init__(self):
+        self.pubsubs = []
+
+    def pubsub(self, ignore_subscribe_messages):
+        self.pubsubs.append(FlakyPubSub(fail=not self.pubsubs))
+        return self.pubsubs[-1]
+
+
+def test_listener_closes_the_dropped_subscription_before_reconnecting():
+    client = FlakyRedis()
+    broker = RedisAlertBroker(client, buffer_size=16, max_subscribers=10)
+    cursor = broker.subscribe()
+
+    deadline = time.monotonic() + 10
+    while len(client.pubsubs) < 2 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert len(client.pubsubs) == 2
+    assert client.pubsubs[0].closed and not client.pubsubs[1].closed
+    cursor, entries, lost = broker.read(cursor, 1)
+    assert [chunk for _, chunk in entries] == [b'event: reset\ndata: {"reason": "reconnected"}\n\n']
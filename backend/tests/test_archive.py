@@ -0,0 +1,42 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from app import db
+from services.archive_service import archive_data
+from services.ml_service import predict_threats
+from services.rollup_service import backfill_rollups, interval_counts
+from benchmarks.bench_archive import protocol_sizes_sql, protocol_sizes_archive
+from benchmarks.data import seed_database
+
+DAYS = 20
+KEEP_DAYS = 7
+
+
+def test_historical_queries_unchanged_by_archiving(app, monkeypatch, tmp_path):
+    monkeypatch.setenv('ARCHIVE_DIR', str(tmp_path))
+    seed_database(5000, 2000, days=DAYS, anomaly_rate=0.1, ip_cardinality=50, host_cardinality=20)
+    backfill_rollups()
+
+    now = datetime.utcnow()
+    history_start = now - timedelta(days=DAYS)
+    # Odd offsets force raw-table pieces at the interval edges
+    intervals = [(now - timedelta(days=days, seconds=17), None) for days in (10, DAYS - 1)]
+    queries = {
+        # One spare day keeps the oldest rows in the prediction window
+        'predict_threats': lambda: predict_threats(history_days=DAYS + 1),
+        'interval counts': lambda: [interval_counts(kind, intervals) for kind in ('traffic', 'log')]
+    }
+    live = {name: query() for name, query in queries.items()}
+    assert live['predict_threats'] and all(sum(counts[-1].values()) for counts in live['interval counts'])
+    live_protocols = protocol_sizes_sql(history_start)
+    db.session.commit()
+
+    archived = archive_data(KEEP_DAYS)
+
+    assert all(rows for rows, _ in archived.values())
+    for name, query in queries.items():
+        assert query() == live[name], name
+
+    # Rows left in the table plus archived rows add up to the original rows per protocol
+    remaining = Counter({protocol: count for protocol, count, _ in protocol_sizes_sql(history_start)})
+    archived_rows = Counter({protocol: count for protocol, count, _ in protocol_sizes_archive(history_start)})
+    assert remaining + archived_rows == Counter({protocol: count for protocol, count, _ in live_protocols})
@@ -0,0 +1,93 @@
+import pytest
+from app import db
+from models.user import User
+from services import auth_service
+from services.auth_service import AuthenticatedUser, UserCache, get_user_cache
+
+
+class SharedVersionStore:
+    """Stands in for the Redis server that worker processes share"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+
+@pytest.fixture
+def user_cache(app, monkeypatch):
+    """A fresh in-process user cache for this test"""
+    monkeypatch.setenv('AUTH_CACHE_SIZE', '1024')
+    monkeypatch.setattr(auth_service, 'user_cache', None)
+    monkeypatch.setattr(auth_service, '_initialized', False)
+    return get_user_cache()
+
+
+def admin_user():
+    return User.query.filter_by(username='admin').one()
+
+
+def cached_request(client, url, headers, cache):
+    """Make a request twice, checking the second one was authorized from the cache"""
+    assert client.get(url, headers=headers).status_code == 200
+    hits = cache.stats()['hits']
+    assert client.get(url, headers=headers).status_code == 200
+    assert cache.stats()['hits'] == hits + 1
+
+
+def test_deactivation_applies_immediately(client, auth_headers, user_cache):
+    cached_request(client, '/api/auth/profile', auth_headers, user_cache)
+
+    admin_user().is_active = False
+    db.session.commit()
+
+    assert client.get('/api/auth/profile', headers=auth_headers).status_code == 403
+
+
+def test_role_change_applies_immediately(client, auth_headers, user_cache):
+    cached_request(client, '/api/dashboard/cache-stats', auth_headers, user_cache)
+
+    admin_user().role = 'analyst'
+    db.session.commit()
+
+    assert client.get('/api/dashboard/cache-stats', headers=auth_headers).status_code == 403
+    assert client.get('/api/auth/profile', headers=auth_headers).status_code == 200
+
+
+def test_bulk_update_applies_immediately(client, auth_headers, user_cache):
+    cached_request(client, '/api/dashboard/cache-stats', auth_headers, user_cache)
+
+    User.query.filter_by(username='admin').update({'role': 'analyst'})
+    db.session.commit()
+
+    assert client.get('/api/dashboard/cache-stats', headers=auth_headers).status_code == 403
+
+
+def test_change_reaches_other_processes_through_the_shared_version(client, auth_headers, monkeypatch):
+    shared = SharedVersionStore()
+    monkeypatch.setattr(auth_service, 'user_cache', UserCache(redis_client=shared))
+    monkeypatch.setattr(auth_service, '_initialized', True)
+    # Another worker's cache, holding the admin from before the change
+    other = UserCache(redis_client=shared)
+    user = admin_user()
+    other.put(AuthenticatedUser(user), other.current_version())
+    assert other.get(user.id, other.current_version()) is not None
+
+    user.role = 'analyst'
+    db.session.commit()
+
+    assert other.get(user.id, other.current_version()) is None
+
+
+def test_cache_off_for_several_workers_without_redis(app, monkeypatch):
+    monkeypatch.setenv('AUTH_CACHE_SIZE', '1024')
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    monkeypatch.setattr(auth_service, 'user_cache', None)
+    monkeypatch.setattr(auth_service, '_initialized', False)
+
+    assert get_user_cache() is None
@@ -0,0 +1,68 @@
+import os
+import json
+import pytest
+from sqlalchemy import create_engine
+from app import db
+from models.alert import Alert
+from models.traffic_data import TrafficData
+from services import ingest_service
+from services.ingest_service import ingest_traffic, insert_rows
+from benchmarks.data import generate_traffic_records
+
+
+def traffic_rows(count):
+    """Rows told apart by their source port"""
+    return [{
+        'source_ip': '10.0.0.1', 'destination_ip': '192.168.0.1', 'source_port': 1000 + index,
+        'destination_port': 443, 'protocol': 'TCP', 'packet_size': 512, 'timestamp': None,
+        'is_anomalous': False, 'anomaly_score': 0.0, 'anomaly_type': None, 'raw_data': '{}'
+    } for index in range(count)]
+
+
+def assert_ids_follow_input_order(ids, rows):
+    assert len(set(ids)) == len(rows)
+    ports = dict(db.session.query(TrafficData.id, TrafficData.source_port).filter(TrafficData.id.in_(ids)).all())
+    assert [ports[row_id] for row_id in ids] == [row['source_port'] for row in rows]
+
+
+@pytest.mark.parametrize('mode', ['bulk', 'orm'])
+def test_ids_follow_input_order(app, mode):
+    # Several chunks, the last one partial
+    rows = traffic_rows(25)
+
+    ids = insert_rows(TrafficData, rows, mode=mode, chunk_size=7)
+
+    assert_ids_follow_input_order(ids, rows)
+
+
+def test_alert_details_reference_their_stored_row(app):
+    records = generate_traffic_records(300, anomaly_rate=0.5)
+
+    results, alerts = ingest_traffic(records, mode='bulk')
+    db.session.commit()
+
+    assert alerts
+    for alert in Alert.query.filter(Alert.details.contains('traffic_id')).all():
+        details = json.loads(alert.details)
+        row = db.session.get(TrafficData, details['traffic_id'])
+        assert row is not None and row.source_ip == details['source_ip']
+    assert [result['id'] for result in results] == [row.id for row in TrafficData.query.order_by(TrafficData.id)]
+
+
+@pytest.mark.skipif(not os.getenv('TEST_POSTGRES_URL'), reason='TEST_POSTGRES_URL is not set')
+def test_copy_ids_follow_input_order_on_postgresql(app, monkeypatch):
+    engine = create_engine(os.environ['TEST_POSTGRES_URL'])
+    db.session.remove()
+    monkeypatch.setitem(db.engines, None, engine)
+    db.metadata.create_all(engine)
+    try:
+        assert ingest_service._supports_copy()
+        rows = traffic_rows(25)
+
+        ids = insert_rows(TrafficData, rows, mode='bulk', chunk_size=7)
+
+        assert_ids_follow_input_order(ids, rows)
+    finally:
+        db.session.remove()
+        db.metadata.drop_all(engine)
+        engine.dispose()
@@ -0,0 +1,128 @@
+import datetime as dt
+import pytest
+from app import db
+from api.routes import dashboard
+from models.alert import Alert
+from models.metric_rollup import MetricRollup
+from models.traffic_data import TrafficData
+from models.system_log import SystemLog
+from services import rollup_service
+from services.ingest_service import ingest_traffic, insert_rows
+from services.rollup_service import backfill_rollups
+from benchmarks.bench_dashboard import FrozenDatetime, raw_summary, raw_timeline
+from benchmarks.data import seed_database, generate_traffic_records, generate_log_records
+
+SUMMARY_RANGES = {'24h': dt.timedelta(hours=24), '7d': dt.timedelta(days=7), '30d': dt.timedelta(days=30)}
+TIMELINE_DAYS = (7, 30)
+
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    """Pin the dashboard clock mid-minute so range edges fall inside minute and hour buckets"""
+    monkeypatch.setattr(FrozenDatetime, 'now_value', dt.datetime.utcnow().replace(second=30, microsecond=500000))
+    monkeypatch.setattr(dashboard, 'datetime', FrozenDatetime)
+    return FrozenDatetime.now_value
+
+
+def assert_endpoints_match_raw(client, headers, now):
+    for time_range, delta in SUMMARY_RANGES.items():
+        response = client.get('/api/dashboard/summary', headers=headers, query_string={'time_range': time_range})
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body.pop('time_range') == time_range
+        assert body == raw_summary(now - delta), time_range
+
+    for days in TIMELINE_DAYS:
+        response = client.get('/api/dashboard/threat-timeline', headers=headers, query_string={'days': days})
+        assert response.status_code == 200
+        assert response.get_json() == raw_timeline(now - dt.timedelta(days=days), days), days
+
+
+def boundary_rows(boundary):
+    """Timestamps on both sides of a range edge, inside the minute and hour buckets it splits"""
+    hour_start = boundary.replace(minute=0, second=0, microsecond=0)
+    minute_start = boundary.replace(second=0, microsecond=0)
+    return [
+        hour_start, minute_start - dt.timedelta(microseconds=1), minute_start,
+        boundary - dt.timedelta(seconds=10), boundary - dt.timedelta(microseconds=1), boundary,
+        boundary + dt.timedelta(microseconds=1), boundary + dt.timedelta(seconds=20),
+        minute_start + dt.timedelta(minutes=1), hour_start + dt.timedelta(minutes=59, seconds=59)
+    ]
+
+
+def insert_at(timestamps):
+    """Insert one traffic row, one log row and one alert at each timestamp, alternating keys"""
+    insert_rows(TrafficData, [{
+        'source_ip': '10.0.0.1', 'destination_ip': '192.168.0.1', 'source_port': 40000, 'destination_port': 443,
+        'protocol': 'TCP', 'packet_size': 512, 'timestamp': timestamp, 'is_anomalous': index % 2 == 0,
+        'anomaly_score': 0.0, 'anomaly_type': None, 'raw_data': '{}'
+    } for index, timestamp in enumerate(timestamps)], mode='bulk')
+    insert_rows(SystemLog, [{
+        'log_level': 'INFO', 'source': 'sshd', 'message': 'boundary', 'timestamp': timestamp, 'host': 'host-000',
+        'is_anomalous': index % 3 == 0, 'anomaly_score': 0.0, 'anomaly_type': None, 'raw_data': '{}'
+    } for index, timestamp in enumerate(timestamps)], mode='bulk')
+    insert_rows(Alert, [{
+        'title': 'Boundary', 'description': 'boundary', 'severity': ('high', 'medium', 'low')[index % 3],
+        'source': 'network', 'is_resolved': False, 'details': '{}', 'created_at': timestamp
+    } for index, timestamp in enumerate(timestamps)], mode='bulk')
+
+
+def test_endpoints_match_raw_tables_after_backfill(app, client, auth_headers, frozen_now):
+    seed_database(5000, 2000, alert_count=2000, days=31, end_time=frozen_now)
+    backfill_rollups()
+
+    assert_endpoints_match_raw(client, auth_headers, frozen_now)
+
+
+def test_buckets_straddling_the_range_start(app, client, auth_headers, frozen_now):
+    # Every summary start and every timeline day edge splits a minute and an hour bucket
+    edges = [frozen_now - delta for delta in SUMMARY_RANGES.values()]
+    edges += [frozen_now - dt.timedelta(days=days) for days in range(1, max(TIMELINE_DAYS) + 1)]
+    timestamps = [timestamp for edge in edges for timestamp in boundary_rows(edge)]
+    insert_at(timestamps)
+    backfill_rollups()
+
+    # Rows just before the edge share its buckets but must not be counted
+    summary = client.get('/api/dashboard/summary', headers=auth_headers, query_string={'time_range': '24h'}).get_json()
+    assert summary['traffic']['total'] == sum(1 for timestamp in timestamps if timestamp >= edges[0])
+    assert_endpoints_match_raw(client, auth_headers, frozen_now)
+
+
+def test_rollups_kept_up_to_date_on_ingest(app, client, auth_headers, monkeypatch):
+    traffic = generate_traffic_records(500, anomaly_rate=0.3)
+    logs = generate_log_records(500, anomaly_rate=0.3)
+    assert client.post('/api/analysis/network-traffic', json=traffic, headers=auth_headers).status_code == 200
+    assert client.post('/api/analysis/system-logs', json=logs, headers=auth_headers).status_code == 200
+
+    # No backfill: the counts come from rollups written by the ingest path
+    now = dt.datetime.utcnow() + dt.timedelta(seconds=1)
+    monkeypatch.setattr(FrozenDatetime, 'now_value', now)
+    monkeypatch.setattr(dashboard, 'datetime', FrozenDatetime)
+
+    assert raw_summary(now - SUMMARY_RANGES['24h'])['alerts']['total'] > 0
+    assert_endpoints_match_raw(client, auth_headers, now)
+
+
+def test_rolled_back_ingest_leaves_no_rollups(app):
+    ingest_traffic(generate_traffic_records(100, anomaly_rate=0.3))
+    db.session.rollback()
+
+    assert MetricRollup.query.count() == 0
+
+
+def test_failed_rollup_upsert_keeps_the_rows_until_backfill(app, client, auth_headers, monkeypatch):
+    def fail(connection, kind, counts):
+        raise RuntimeError('rollup table locked')
+
+    traffic = generate_traffic_records(200, anomaly_rate=0.3)
+    with monkeypatch.context() as patch:
+        patch.setattr(rollup_service, '_upsert_counts', fail)
+        assert client.post('/api/analysis/network-traffic', json=traffic, headers=auth_headers).status_code == 200
+
+    # The raw rows committed without their rollups, and the backfill repairs them
+    assert TrafficData.query.count() == 200 and MetricRollup.query.count() == 0
+    backfill_rollups()
+    now = dt.datetime.utcnow() + dt.timedelta(seconds=1)
+    monkeypatch.setattr(FrozenDatetime, 'now_value', now)
+    monkeypatch.setattr(dashboard, 'datetime', FrozenDatetime)
+    assert_endpoints_match_raw(client, auth_headers, now)
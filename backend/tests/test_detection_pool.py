@@ -0,0 +1,16 @@
+from services.keyword_matcher import LogKeywordMatcher
+from services.detection_pool import DetectionPool
+from benchmarks.data import generate_log_records
+
+
+def test_pool_matches_in_process_classification():
+    messages = [record['message'] for record in generate_log_records(3000, anomaly_rate=0.3)]
+    matcher = LogKeywordMatcher()
+    # Small shards so the batch is split across both workers
+    pool = DetectionPool(2, 500)
+    try:
+        assert pool.classify_logs(matcher, messages) == matcher.classify_batch(messages)
+        # A broken pool answers in-process, which would hide a worker bug
+        assert not pool.broken
+    finally:
+        pool.shutdown()
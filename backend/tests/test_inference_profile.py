@@ -0,0 +1,102 @@
+import copy
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('transformers')
+
+from services.ml_service import get_inference_profile
+from services.inference_service import InferenceServer, normalize_text, quantize_model
+from benchmarks.bench_inference_profile import labeled_messages, fine_tune
+
+
+def classify(model, tokenizer, texts):
+    """Class probabilities of one padded forward pass"""
+    with torch.no_grad():
+        encoded = tokenizer(texts, padding=True, truncation=True, max_length=128, return_tensors='pt')
+        return torch.softmax(model(**encoded).logits, dim=-1)
+
+
+@pytest.fixture(scope='module')
+def trained_model(tiny_model):
+    """A copy of the tiny classifier, briefly trained so its scores have clear margins"""
+    model, tokenizer = tiny_model
+    model = copy.deepcopy(model)
+    torch.manual_seed(0)
+    fine_tune(model, tokenizer, labeled_messages(256, seed=0), epochs=2)
+    return model, tokenizer
+
+
+def test_quantized_model_matches_full_precision(trained_model):
+    model, tokenizer = trained_model
+    quantized = quantize_model(model)
+    samples = labeled_messages(128, seed=1)
+    texts, labels = [text for text, _ in samples], torch.tensor([label for _, label in samples])
+
+    full, int8 = classify(model, tokenizer, texts), classify(quantized, tokenizer, texts)
+
+    assert isinstance(quantized.classifier, torch.ao.nn.quantized.dynamic.Linear)
+    assert isinstance(model.classifier, torch.nn.Linear)
+    assert (full - int8).abs().max() < 0.02
+    # Labels agree wherever the full-precision model is not on the fence
+    clear = (full.max(dim=-1).values - 0.5).abs() > 0.02
+    assert clear.sum() > 100
+    assert torch.equal(full.argmax(dim=-1)[clear], int8.argmax(dim=-1)[clear])
+    accuracy = lambda probabilities: (probabilities.argmax(dim=-1) == labels).float().mean().item()
+    assert accuracy(int8) == pytest.approx(accuracy(full), abs=0.02)
+
+
+def test_cached_results_match_uncached(trained_model):
+    model, tokenizer = trained_model
+    texts = [text for text, _ in labeled_messages(40, seed=2)] * 3
+    uncached = InferenceServer(model, tokenizer, max_batch_size=16, warmup=False)
+    cached = InferenceServer(model, tokenizer, max_batch_size=16, warmup=False,
+                             token_cache_size=1000, score_cache_size=1000)
+    try:
+        expected = uncached.classify(texts)
+        from_scores = cached.classify(texts)
+        # Without the score cache the texts run through the model again, from cached token ids
+        cached.score_cache = None
+        from_tokens = cached.classify(texts)
+    finally:
+        uncached.close()
+        cached.close()
+
+    for results in (from_scores, from_tokens):
+        for (label, score), (cached_label, cached_score) in zip(expected, results):
+            assert label == cached_label and score == pytest.approx(cached_score, abs=1e-5)
+    assert cached.token_cache.stats()['hits'] >= 80
+
+
+def test_repeated_messages_come_from_the_score_cache(trained_model):
+    model, tokenizer = trained_model
+    server = InferenceServer(model, tokenizer, warmup=False, score_cache_size=100)
+    try:
+        first = server.classify(['Failed login for root from 10.0.0.1'])
+        # The tokenizer lowercases, so case and spacing variants are the same message
+        again = server.classify(['failed  login for ROOT from 10.0.0.1 ', 'Failed login for root from 10.0.0.1'])
+    finally:
+        server.close()
+
+    assert again == first * 2
+    assert server.stats()['completed'] == 1 and server.score_cache.stats()['hits'] == 2
+
+
+def test_normalize_text():
+    assert normalize_text('  Failed\tlogin \n for  root ') == 'Failed login for root'
+    assert normalize_text('Failed  LOGIN', lowercase=True) == 'failed login'
+
+
+def test_inference_profile_settings(monkeypatch):
+    for name in ('INFERENCE_PROFILE', 'INFERENCE_QUANTIZE', 'INFERENCE_THREADS', 'INFERENCE_INTEROP_THREADS'):
+        monkeypatch.delenv(name, raising=False)
+    assert get_inference_profile() == {'name': 'default', 'quantize': False,
+                                       'intra_op_threads': None, 'inter_op_threads': None}
+
+    monkeypatch.setenv('INFERENCE_PROFILE', 'optimized')
+    profile = get_inference_profile()
+    assert profile['quantize'] and profile['inter_op_threads'] == 1 and profile['intra_op_threads'] >= 1
+
+    monkeypatch.setenv('INFERENCE_QUANTIZE', 'false')
+    monkeypatch.setenv('INFERENCE_THREADS', '3')
+    profile = get_inference_profile()
+    assert not profile['quantize'] and profile['intra_op_threads'] == 3
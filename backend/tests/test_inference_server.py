@@ -0,0 +1,74 @@
+import threading
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('transformers')
+
+from services.inference_service import InferenceServer, InferenceTimeout
+from benchmarks.data import generate_log_records
+
+
+def unbatched(model, tokenizer, texts):
+    """One unpadded forward pass per text, as a per-call pipeline would run"""
+    labels = model.config.id2label
+    results = []
+    with torch.no_grad():
+        for text in texts:
+            probabilities = torch.softmax(model(**tokenizer(text, truncation=True, max_length=128,
+                                                            return_tensors='pt')).logits, dim=-1)[0]
+            score, index = probabilities.max(dim=-1)
+            results.append((labels[index.item()], score.item()))
+    return results
+
+
+@pytest.fixture
+def server(tiny_model):
+    model, tokenizer = tiny_model
+    server = InferenceServer(model, tokenizer, max_batch_size=16, max_wait_ms=20)
+    yield server
+    server.close()
+
+
+def test_concurrent_clients_share_padded_batches(tiny_model, server):
+    texts = [record['message'] for record in generate_log_records(64, anomaly_rate=0.3)]
+    shards = [texts[i::8] for i in range(8)]
+    results = {}
+
+    def client(shard):
+        for text, result in zip(shard, server.classify(shard)):
+            results[text] = result
+
+    threads = [threading.Thread(target=client, args=(shard,)) for shard in shards]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Padding does not change a text's result
+    for text, (label, score) in zip(texts, unbatched(*tiny_model, texts)):
+        assert results[text][0] == label and results[text][1] == pytest.approx(score, abs=1e-5)
+    stats = server.stats()
+    assert stats['completed'] == 64 and stats['failed'] == 0
+    assert stats['mean_batch_size'] > 1 and max(int(size) for size in stats['batch_sizes']) <= 16
+
+
+def test_identical_messages_share_one_row(server):
+    first, second = server.classify(['disk  usage critical on /var ', 'disk usage critical on /var'])
+
+    assert first == second
+    assert server.stats()['batch_sizes'] == {'2': 1}
+
+
+def test_request_expiring_in_the_queue_times_out(tiny_model):
+    model, tokenizer = tiny_model
+    # The worker waits for more requests before running the batch, so a short deadline passes first
+    server = InferenceServer(model, tokenizer, max_batch_size=16, max_wait_ms=100, warmup=False)
+    try:
+        with pytest.raises(InferenceTimeout):
+            server.classify(['failed login for root'], timeout=0.01)
+        # Lands in the same batch, which drops the expired request instead of running it
+        server.classify(['failed login for root'], timeout=5)
+        stats = server.stats()
+        assert stats['timed_out'] == 1 and stats['completed'] == 1
+    finally:
+        server.close()
@@ -0,0 +1,90 @@
+import time
+import pytest
+from services import job_queue
+from benchmarks.data import generate_traffic_records
+
+
+@pytest.fixture
+def queue_env(app, monkeypatch):
+    """A fresh in-process job queue, created by the first request with the environment the test sets"""
+    monkeypatch.setattr(job_queue, 'job_queue', None)
+    yield monkeypatch
+    if job_queue.job_queue is not None:
+        job_queue.job_queue.stop()
+
+
+def submit(client, headers, records):
+    return client.post('/api/analysis/network-traffic', json=records, headers=headers, query_string={'async': '1'})
+
+
+def wait_for_job(client, headers, location):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        response = client.get(location, headers=headers)
+        assert response.status_code == 200
+        job = response.get_json()
+        if job['status'] in ('completed', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError('job did not finish')
+
+
+def test_queued_batch_is_accepted_and_analyzed(client, auth_headers, queue_env):
+    queue_env.setenv('JOB_WORKERS', '1')
+    records = generate_traffic_records(100, anomaly_rate=0.2)
+
+    response = submit(client, auth_headers, records)
+
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body['status'] == 'queued' and body['records'] == 100
+    assert response.headers['Location'].endswith('/jobs/' + body['job_id'])
+
+    job = wait_for_job(client, auth_headers, response.headers['Location'])
+    assert job['status'] == 'completed'
+    assert job['processed'] == 100 and job['progress'] == 1.0
+    assert len(job['results']) == 100 and not job['results_truncated']
+
+
+def test_results_are_capped(client, auth_headers, queue_env):
+    queue_env.setenv('JOB_WORKERS', '1')
+    queue_env.setenv('JOB_RESULT_LIMIT', '5')
+
+    response = submit(client, auth_headers, generate_traffic_records(50, anomaly_rate=0.2))
+    job = wait_for_job(client, auth_headers, response.headers['Location'])
+
+    assert job['status'] == 'completed' and job['processed'] == 50
+    assert len(job['results']) == 5 and job['results_truncated']
+
+
+def test_full_queue_answers_429(client, auth_headers, queue_env):
+    # No workers, so the first job stays queued
+    queue_env.setenv('JOB_WORKERS', '0')
+    queue_env.setenv('JOB_QUEUE_MAX_DEPTH', '1')
+    records = generate_traffic_records(10)
+
+    assert submit(client, auth_headers, records).status_code == 202
+    response = submit(client, auth_headers, records)
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '5'
+    assert job_queue.job_queue.stats()['rejected'] == 1
+
+
+def test_oversized_batch_answers_413(client, auth_headers, queue_env):
+    queue_env.setenv('JOB_MAX_RECORDS', '10')
+
+    assert submit(client, auth_headers, generate_traffic_records(11)).status_code == 413
+
+
+def test_several_workers_without_redis_answer_503(client, auth_headers, queue_env):
+    queue_env.setenv('WEB_CONCURRENCY', '4')
+
+    response = submit(client, auth_headers, generate_traffic_records(10))
+
+    assert response.status_code == 503
+    assert 'REDIS_URL' in response.get_json()['error']
+    assert client.get('/api/analysis/jobs/missing', headers=auth_headers).status_code == 503
+    # Analysis in the request still works
+    assert client.post('/api/analysis/network-traffic', json=generate_traffic_records(10),
+                       headers=auth_headers).status_code == 200
@@ -0,0 +1,52 @@
+import pytest
+from services.ml_service import analyze_system_logs
+from services.keyword_matcher import LogKeywordMatcher
+from benchmarks.bench_keyword_matcher import catalog_with_iocs, naive_classify
+from benchmarks.data import generate_log_records
+
+# Forces the substring scan or the trie regex whatever the catalog size
+STRATEGIES = {'scan': float('inf'), 'trie': 0}
+
+
+@pytest.fixture(scope='module')
+def messages():
+    return [record['message'] for record in generate_log_records(5000, anomaly_rate=0.3)]
+
+
+@pytest.mark.parametrize('strategy', STRATEGIES)
+def test_default_catalog_matches_per_record_analysis(app, messages, strategy):
+    matcher = LogKeywordMatcher(trie_min_keywords=STRATEGIES[strategy])
+    records = [{'message': message} for message in messages]
+
+    assert matcher.classify_batch(messages) == [analyze_system_logs(record) for record in records]
+
+
+@pytest.mark.parametrize('strategy', STRATEGIES)
+@pytest.mark.parametrize('iocs', [40, 1000])
+def test_extended_catalog_matches_keyword_scan(messages, strategy, iocs):
+    catalog = catalog_with_iocs(iocs)
+    matcher = LogKeywordMatcher(catalog, trie_min_keywords=STRATEGIES[strategy])
+
+    assert matcher.classify_batch(messages) == naive_classify(catalog, messages)
+
+
+def test_strategies_report_the_same_categories(messages):
+    catalog = catalog_with_iocs(40)
+    scan = LogKeywordMatcher(catalog, trie_min_keywords=STRATEGIES['scan'])
+    trie = LogKeywordMatcher(catalog, trie_min_keywords=STRATEGIES['trie'])
+
+    assert not scan.uses_trie and trie.uses_trie
+    assert [scan.match_indexes(message) for message in messages] == [trie.match_indexes(message) for message in messages]
+    assert [scan.top_index(message) for message in messages] == [trie.top_index(message) for message in messages]
+
+
+def test_overlapping_keywords_are_all_reported():
+    catalog = [
+        {'category': 'a', 'score': 0.9, 'anomaly_type': 'A', 'keywords': ['fail']},
+        {'category': 'b', 'score': 0.8, 'anomaly_type': 'B', 'keywords': ['failed login']},
+        {'category': 'c', 'score': 0.7, 'anomaly_type': 'C', 'keywords': ['login']}
+    ]
+    for trie_min_keywords in STRATEGIES.values():
+        matcher = LogKeywordMatcher(catalog, trie_min_keywords=trie_min_keywords)
+        assert matcher.match('Failed login for root') == ['a', 'b', 'c']
+        assert matcher.classify('nothing here') == (False, 0.0, None)
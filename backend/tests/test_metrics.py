@@ -0,0 +1,80 @@
+import json
+import os
+import subprocess
+import sys
+from services import metrics
+from services.metrics import CounterMetric, Histogram
+
+
+def test_exposition_format():
+    counter = CounterMetric('jobs_total', 'Jobs run', ('kind',))
+    counter.inc(2, ('traffic',))
+    counter.inc(1, ('logs',))
+    histogram = Histogram('job_seconds', 'Job duration', ('kind',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, ('traffic',))
+
+    assert counter.samples() == ['jobs_total{kind="logs"} 1', 'jobs_total{kind="traffic"} 2']
+    assert histogram.samples() == [
+        'job_seconds_bucket{kind="traffic",le="0.1"} 1',
+        'job_seconds_bucket{kind="traffic",le="1.0"} 2',
+        'job_seconds_bucket{kind="traffic",le="+Inf"} 3',
+        'job_seconds_sum{kind="traffic"} 5.55',
+        'job_seconds_count{kind="traffic"} 3'
+    ]
+
+
+def test_metrics_endpoint(client):
+    assert client.get('/api/health').status_code == 200
+
+    response = client.get('/api/metrics')
+
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    lines = response.get_data(as_text=True).splitlines()
+    assert '# HELP http_requests_total HTTP requests handled' in lines
+    assert '# TYPE http_requests_total counter' in lines
+    assert '# TYPE http_request_duration_seconds histogram' in lines
+    assert any(line.startswith('http_requests_total{method="GET",endpoint="/api/health",status="200"} ')
+               for line in lines)
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def write_snapshot(directory, name, requests):
+    with open(os.path.join(directory, name), 'w') as f:
+        json.dump({'http_requests_total': [[['GET', '/api/health', '200'], requests]]}, f)
+
+
+def total_requests(directory):
+    snapshots = metrics._read_snapshots(str(directory))
+    return sum(value for _, value in metrics.REQUESTS.merge([s.get('http_requests_total', []) for s in snapshots]))
+
+
+def test_exited_workers_are_folded_into_one_file(tmp_path):
+    dead = exited_pid()
+    write_snapshot(tmp_path, f'{dead}-1.json', 3)
+    write_snapshot(tmp_path, f'{dead}-2.json', 4)
+    write_snapshot(tmp_path, f'{os.getpid()}-3.json', 5)
+    assert total_requests(tmp_path) == 12
+
+    assert metrics.merge_exited_processes(str(tmp_path)) == 2
+    assert sorted(os.listdir(tmp_path)) == [f'{os.getpid()}-3.json', 'exited.json']
+    assert total_requests(tmp_path) == 12
+
+    # Later exits add to the same file
+    write_snapshot(tmp_path, f'{exited_pid()}-4.json', 6)
+    assert metrics.merge_exited_processes(str(tmp_path)) == 1
+    assert len(os.listdir(tmp_path)) == 2 and total_requests(tmp_path) == 18
+
+
+def test_folded_files_not_yet_removed_are_not_counted_twice(tmp_path):
+    name = f'{exited_pid()}-1.json'
+    write_snapshot(tmp_path, name, 3)
+    with open(tmp_path / 'exited.json', 'w') as f:
+        json.dump({'merged': [name], 'metrics': {'http_requests_total': [[['GET', '/api/health', '200'], 3]]}}, f)
+
+    assert total_requests(tmp_path) == 3
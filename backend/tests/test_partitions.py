@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from app import db
+from benchmarks.bench_partitions import range_queries
+from benchmarks.data import seed_database
+from services.partition_service import list_partitions
+from models.traffic_data import TrafficData
+
+DAYS = 60
+
+
+def run_queries(monkeypatch, interval, end_time, windows):
+    """Recreate the tables for one layout, seed them and run every range query"""
+    monkeypatch.setenv('PARTITION_INTERVAL', interval)
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    try:
+        seed_database(5000, 2000, days=DAYS, end_time=end_time, anomaly_rate=0.2, ip_cardinality=200)
+        partitions = len(list_partitions(TrafficData)) if interval != 'none' else 0
+        results = {
+            (window_name, query_name): query()
+            for window_name, (window_start, window_end) in windows.items()
+            for query_name, query in range_queries(window_start, window_end).items()
+        }
+    finally:
+        # Drop while the layout is still configured, so the partitions go too
+        db.session.remove()
+        db.drop_all()
+        monkeypatch.setenv('PARTITION_INTERVAL', 'none')
+        db.create_all()
+    return results, partitions
+
+
+def test_range_queries_match_on_partitioned_tables(app, monkeypatch):
+    end_time = datetime.utcnow().replace(microsecond=0)
+    windows = {
+        'last 30 days': (end_time - timedelta(days=30), end_time + timedelta(seconds=1)),
+        '20 days, 30 days back': (end_time - timedelta(days=50), end_time - timedelta(days=30))
+    }
+
+    plain, _ = run_queries(monkeypatch, 'none', end_time, windows)
+    partitioned, partitions = run_queries(monkeypatch, 'day', end_time, windows)
+
+    assert partitions > DAYS
+    assert partitioned == plain
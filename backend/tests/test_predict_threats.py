@@ -0,0 +1,15 @@
+from datetime import datetime, timedelta
+from services.ml_service import predict_threats
+from benchmarks.bench_predict_threats import legacy_predict_threats
+from benchmarks.data import seed_database
+
+
+def test_aggregates_match_row_loading(app):
+    # Few IPs and hosts so both thresholds are crossed; rows stay clear of the 7-day window edges
+    seed_database(3000, 2000, anomaly_rate=0.1, ip_cardinality=50, host_cardinality=20, days=6,
+                  end_time=datetime.utcnow() - timedelta(hours=1))
+
+    predictions = predict_threats()
+
+    assert predictions == legacy_predict_threats()
+    assert {prediction['source'] for prediction in predictions} == {'network', 'system'}
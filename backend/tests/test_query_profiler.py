@@ -0,0 +1,63 @@
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from services import query_profiler
+
+
+@pytest.fixture
+def profiled(monkeypatch, tmp_path):
+    """A small app with the profiler and its headers on, querying a one-connection pool"""
+    monkeypatch.setenv('QUERY_PROFILER', 'true')
+    monkeypatch.setenv('QUERY_PROFILER_HEADERS', 'true')
+    monkeypatch.setattr(query_profiler, '_plans', {})
+    # A second connection for the EXPLAIN would time out
+    engine = create_engine('sqlite:///' + str(tmp_path / 'profiled.db'), pool_size=1, max_overflow=0, pool_timeout=1)
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)'))
+        connection.execute(text("INSERT INTO items (name) VALUES ('a'), ('b'), ('c')"))
+
+    app = Flask('profiled')
+
+    @app.route('/items')
+    def items():
+        with engine.connect() as connection:
+            names = [connection.execute(text(f'SELECT name FROM items WHERE id = {item_id}')).scalar()
+                     for item_id in (1, 2, 3)]
+        return jsonify(names)
+
+    query_profiler.init_app(app)
+    yield app.test_client()
+    event.remove(Engine, 'before_cursor_execute', query_profiler._before_cursor_execute)
+    event.remove(Engine, 'after_cursor_execute', query_profiler._after_cursor_execute)
+    query_profiler._installed = False
+    engine.dispose()
+
+
+def test_headers_report_counts_and_repeats(profiled):
+    response = profiled.get('/items')
+
+    assert response.get_json() == ['a', 'b', 'c']
+    assert response.headers['X-Query-Count'] == '3'
+    assert response.headers['X-Query-Max-Repeat'] == '3'
+    assert float(response.headers['X-Query-Time-Ms']) >= 0
+
+
+def test_slow_statements_are_explained_once_per_shape_on_their_own_connection(profiled, monkeypatch, capsys):
+    monkeypatch.setenv('QUERY_PROFILER_SLOW_MS', '0')
+    explained = []
+    run_explain = query_profiler._run_explain
+
+    def counting_explain(connection, prefix, statement, parameters):
+        explained.append(statement)
+        return run_explain(connection, prefix, statement, parameters)
+
+    monkeypatch.setattr(query_profiler, '_run_explain', counting_explain)
+
+    response = profiled.get('/items')
+
+    assert response.status_code == 200
+    assert len(explained) == 1
+    output = capsys.readouterr().out
+    assert output.count('Slow query') == 3 and output.count('plan: ') == 3
+    assert 'plan unavailable' not in output and 'items' in output.split('plan: ')[1]
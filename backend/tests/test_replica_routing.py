@@ -0,0 +1,113 @@
+import datetime as dt
+import pytest
+from sqlalchemy import create_engine, func, select, text
+from app import db
+from models.alert import Alert
+from services import database
+from services.database import REPLICA_BIND, ReplicaRouter, get_replica_router, replica_reads
+from benchmarks.data import generate_traffic_records
+
+
+def alert_row(title):
+    return {'title': title, 'description': title, 'severity': 'high', 'source': 'network',
+            'is_resolved': False, 'details': '{}', 'created_at': dt.datetime.utcnow()}
+
+
+def count_alerts(engine):
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(Alert.__table__)).scalar()
+
+
+def register_replica(monkeypatch, url):
+    """Register url as the replica bind, as DATABASE_REPLICA_URL would at startup, with a fresh router"""
+    engine = create_engine(url)
+    monkeypatch.setenv('DATABASE_REPLICA_URL', url)
+    # Measure the replica on every request
+    monkeypatch.setenv('DATABASE_REPLICA_CHECK_SECONDS', '0')
+    monkeypatch.setitem(db.engines, REPLICA_BIND, engine)
+    monkeypatch.setattr(database, 'replica_router', None)
+    return engine
+
+
+@pytest.fixture
+def replica(app, monkeypatch, tmp_path):
+    """A second SQLite file with the same tables, holding a different alert than the primary"""
+    engine = register_replica(monkeypatch, 'sqlite:///' + str(tmp_path / 'replica.db'))
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(Alert.__table__.insert(), [alert_row('on replica')])
+
+    db.session.execute(Alert.__table__.insert(), [alert_row('on primary')])
+    db.session.commit()
+    yield engine
+    engine.dispose()
+
+
+def recent_alert_titles(client, headers):
+    response = client.get('/api/dashboard/recent-alerts', headers=headers)
+    assert response.status_code == 200
+    return [alert['title'] for alert in response.get_json()]
+
+
+def test_reads_go_to_the_replica(client, auth_headers, replica):
+    assert recent_alert_titles(client, auth_headers) == ['on replica']
+
+    stats = get_replica_router().stats()
+    assert stats['usable'] and stats['replica_requests'] == 1 and stats['primary_requests'] == 0
+
+
+def test_writes_go_to_the_primary(client, auth_headers, replica):
+    records = generate_traffic_records(200, anomaly_rate=0.5)
+    response = client.post('/api/analysis/network-traffic', json=records, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.get_json()['alerts_generated'] > 0
+
+    assert count_alerts(db.engine) == 1 + response.get_json()['alerts_generated']
+    assert count_alerts(replica) == 1
+
+
+def test_reads_after_a_write_stay_on_the_primary(app, replica):
+    @replica_reads
+    def write_then_read():
+        before = [alert.title for alert in Alert.query.all()]
+        db.session.add(Alert(**alert_row('written')))
+        db.session.flush()
+        return before, [alert.title for alert in Alert.query.order_by(Alert.id).all()]
+
+    with app.test_request_context():
+        before, after = write_then_read()
+    db.session.rollback()
+
+    assert before == ['on replica']
+    assert after == ['on primary', 'written']
+
+
+def test_lagging_replica_falls_back_to_the_primary(client, auth_headers, replica, monkeypatch):
+    monkeypatch.setattr(ReplicaRouter, 'measure_lag', lambda self: 60.0)
+
+    assert recent_alert_titles(client, auth_headers) == ['on primary']
+
+    stats = get_replica_router().stats()
+    assert not stats['usable'] and stats['lag_seconds'] == 60.0 and stats['primary_requests'] == 1
+    assert stats['last_error'] == '60.0 s behind'
+
+
+def test_replica_down_falls_back_to_the_primary(app, client, auth_headers, monkeypatch, tmp_path):
+    db.session.execute(Alert.__table__.insert(), [alert_row('on primary')])
+    db.session.commit()
+    # A database file in a directory that does not exist cannot be opened
+    register_replica(monkeypatch, 'sqlite:///' + str(tmp_path / 'missing' / 'replica.db'))
+
+    assert recent_alert_titles(client, auth_headers) == ['on primary']
+    assert not get_replica_router().stats()['usable']
+
+
+def test_replica_failing_mid_request_reruns_on_the_primary(client, auth_headers, replica):
+    # The lag check passes, but the query itself fails
+    with replica.begin() as connection:
+        connection.execute(text('DROP TABLE alerts'))
+
+    assert recent_alert_titles(client, auth_headers) == ['on primary']
+
+    stats = get_replica_router().stats()
+    assert stats['fallbacks'] == 1 and not stats['usable']
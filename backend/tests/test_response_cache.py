@@ -0,0 +1,44 @@
+import pytest
+from services import response_cache
+from services.rollup_service import backfill_rollups
+from benchmarks.bench_response_cache import ENDPOINTS
+from benchmarks.data import seed_database, generate_traffic_records
+
+
+@pytest.fixture
+def memory_cache(app, monkeypatch):
+    """A fresh in-process response cache for this test"""
+    monkeypatch.setenv('RESPONSE_CACHE', 'memory')
+    monkeypatch.setattr(response_cache, 'response_cache', None)
+    monkeypatch.setattr(response_cache, '_initialized', False)
+    return response_cache.get_response_cache()
+
+
+@pytest.mark.parametrize('name', ENDPOINTS)
+def test_cache_hit_matches_uncached_response(app, client, auth_headers, memory_cache, monkeypatch, name):
+    seed_database(2000, 1000, alert_count=500, anomaly_rate=0.2, ip_cardinality=50, host_cardinality=20)
+    backfill_rollups()
+    url = ENDPOINTS[name]
+    ttl_setting = f"RESPONSE_CACHE_TTL_{name.upper().replace('-', '_')}"
+
+    monkeypatch.setenv(ttl_setting, '0')
+    uncached = client.get(url, headers=auth_headers)
+    monkeypatch.delenv(ttl_setting)
+    client.get(url, headers=auth_headers)
+    cached = client.get(url, headers=auth_headers)
+
+    assert uncached.status_code == cached.status_code == 200
+    assert cached.headers.get('X-Cache') == 'HIT'
+    assert cached.get_json() == uncached.get_json()
+
+
+def test_ingest_invalidates_cached_summary(app, client, auth_headers, memory_cache):
+    url = ENDPOINTS['summary']
+    before = client.get(url, headers=auth_headers).get_json()
+
+    response = client.post('/api/analysis/network-traffic', json=generate_traffic_records(20), headers=auth_headers)
+    assert response.status_code == 200
+
+    after = client.get(url, headers=auth_headers)
+    assert after.headers.get('X-Cache') != 'HIT'
+    assert after.get_json()['traffic']['total'] == before['traffic']['total'] + 20
@@ -0,0 +1,19 @@
+from services.ml_service import analyze_network_traffic
+from services.rule_engine import TrafficRuleEngine
+from benchmarks.data import generate_traffic_records
+
+
+def test_engine_matches_per_record_analysis(app):
+    records = generate_traffic_records(5000, anomaly_rate=0.3)
+    engine = TrafficRuleEngine()
+
+    assert engine.analyze(records) == [analyze_network_traffic(record) for record in records]
+
+
+def test_engine_matches_per_record_analysis_on_small_batches(app):
+    records = generate_traffic_records(200, seed=7, anomaly_rate=0.5)
+    engine = TrafficRuleEngine()
+
+    for size in (1, 2, 10, 100):
+        batch = records[:size]
+        assert engine.analyze(batch) == [analyze_network_traffic(record) for record in batch]
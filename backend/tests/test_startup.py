@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INGEST_SCRIPT = """
+import sys
+from app import app, db
+from services.ingest_service import ingest_traffic, ingest_logs
+from benchmarks.data import generate_traffic_records, generate_log_records
+
+with app.app_context():
+    db.create_all()
+    ingest_traffic(generate_traffic_records(200, anomaly_rate=0.3))
+    ingest_logs(generate_log_records(200, anomaly_rate=0.3))
+    db.session.commit()
+print([name for name in ('torch', 'transformers') if name in sys.modules])
+"""
+
+PRELOAD_SCRIPT = """
+import os
+import sys
+import app
+from services import ml_service
+
+ml_service.preload_model()
+pid = os.fork()
+if pid == 0:
+    # A worker forked after preloading classifies with the master's model
+    label, score = ml_service.classify_texts(['Failed login for root from 10.0.0.1'], timeout=30)[0]
+    print(label, ml_service.model_profile['preloaded'], flush=True)
+    os._exit(0)
+_, status = os.waitpid(pid, 0)
+sys.exit(os.waitstatus_to_exitcode(status))
+"""
+
+
+def run_python(script, tmp_path, **env):
+    """Run a script in a fresh interpreter from the backend directory on its own SQLite database"""
+    environment = dict(os.environ, DATABASE_URL='sqlite:///' + str(tmp_path / 'startup.db'), **env)
+    result = subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=environment,
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip().splitlines()
+
+
+def test_rule_based_ingest_does_not_import_the_ml_libraries(tmp_path):
+    assert run_python(INGEST_SCRIPT, tmp_path)[-1] == '[]'
+
+
+def test_preloaded_model_classifies_in_a_forked_worker(tmp_path):
+    pytest.importorskip('torch')
+    pytest.importorskip('transformers')
+    from benchmarks.tiny_model import build_tiny_model
+
+    model_path = build_tiny_model(str(tmp_path / 'model'))
+    output = run_python(PRELOAD_SCRIPT, tmp_path, MODEL_PATH=model_path, INFERENCE_PROFILE='optimized')
+
+    assert output[-1] in ('NORMAL True', 'ANOMALOUS True')
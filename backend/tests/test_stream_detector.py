@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+from app import db
+from models.alert import Alert
+from services import stream_detector
+from services.stream_detector import StreamDetector
+from services.ingest_service import ingest_logs
+
+# Start of a 60-second window
+WINDOW_START = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def detector(**thresholds):
+    return StreamDetector(60, dict({'port_scan': 1000, 'flood': 100000, 'brute_force': 1000}, **thresholds))
+
+
+def traffic(source_ip, ports, at=WINDOW_START):
+    return [{'source_ip': source_ip, 'destination_port': port, 'timestamp': at} for port in ports]
+
+
+def failed_logins(count, at, host='host-001'):
+    return [{'host': host, 'message': 'Failed password for root from 10.0.0.1', 'timestamp': at}] * count
+
+
+def test_port_scan_alerts_once_per_window_above_the_threshold():
+    scans = detector(port_scan=50)
+
+    assert scans.observe_traffic(traffic('10.0.0.1', range(25))) == []
+    # Repeated ports are not distinct
+    assert scans.observe_traffic(traffic('10.0.0.1', list(range(25)) * 4)) == []
+
+    [detection] = scans.observe_traffic(traffic('10.0.0.1', range(25, 200)))
+    assert detection['detector'] == 'port_scan' and detection['key'] == '10.0.0.1'
+    assert 50 <= detection['value'] <= 70
+    assert detection['window_start'] == WINDOW_START.isoformat()
+    assert scans.observe_traffic(traffic('10.0.0.1', range(200, 400))) == []
+    assert scans.stats()['detections']['port_scan'] == 1
+
+
+def test_flood_alerts_at_the_packet_threshold():
+    floods = detector(flood=100)
+
+    assert floods.observe_traffic(traffic('10.0.0.2', [443] * 99)) == []
+    assert floods.observe_traffic(traffic('10.0.0.3', [443] * 99)) == []
+
+    [detection] = floods.observe_traffic(traffic('10.0.0.2', [443]))
+    assert (detection['detector'], detection['key'], detection['value']) == ('flood', '10.0.0.2', 100)
+
+
+def test_brute_force_counts_failed_logins_per_host():
+    logins = detector(brute_force=5)
+    rows = failed_logins(4, WINDOW_START) + failed_logins(4, WINDOW_START, host='host-002')
+    rows += [{'host': 'host-001', 'message': 'Accepted publickey for deploy', 'timestamp': WINDOW_START}] * 10
+
+    assert logins.observe_logs(rows) == []
+
+    [detection] = logins.observe_logs(failed_logins(1, WINDOW_START))
+    assert (detection['detector'], detection['key'], detection['value']) == ('brute_force', 'host-001', 5)
+
+
+def test_previous_window_counts_by_its_remaining_overlap():
+    logins = detector(brute_force=10)
+    assert logins.observe_logs(failed_logins(8, WINDOW_START + timedelta(seconds=50))) == []
+
+    # One second into the next window the previous one still weighs 59/60: 2 + 7.87 is below 10, 3 + 7.87 is not
+    next_window = WINDOW_START + timedelta(seconds=61)
+    assert logins.observe_logs(failed_logins(2, next_window)) == []
+    [detection] = logins.observe_logs(failed_logins(1, next_window))
+    assert detection['value'] == 11
+
+    # Near the end of the window the previous one barely counts
+    late = detector(brute_force=10)
+    late.observe_logs(failed_logins(8, WINDOW_START))
+    assert late.observe_logs(failed_logins(9, WINDOW_START + timedelta(seconds=119))) == []
+
+
+def test_records_older_than_the_previous_window_are_ignored():
+    logins = detector(brute_force=3)
+    logins.observe_logs(failed_logins(1, WINDOW_START + timedelta(minutes=5)))
+
+    assert logins.observe_logs(failed_logins(5, WINDOW_START)) == []
+    assert logins.stats()['late_records'] == 5
+
+
+def test_ingest_alerts_and_feeds_the_detector_only_on_commit(app, monkeypatch):
+    logins = detector(brute_force=5)
+    monkeypatch.setattr(stream_detector, 'stream_detector', logins)
+    now = datetime.utcnow()
+    entries = [{'log_level': 'WARNING', 'source': 'sshd', 'host': 'host-009', 'timestamp': now.isoformat(),
+                'message': 'Failed password for root from 10.0.0.9'} for _ in range(5)]
+
+    _, alerts = ingest_logs(entries)
+    assert 'Brute Force Detected: host-009' in [alert['title'] for alert in alerts]
+    db.session.rollback()
+    assert logins.stats()['failed_logins_observed'] == 0
+
+    ingest_logs(entries)
+    db.session.commit()
+    assert logins.stats()['failed_logins_observed'] == 5
+    assert Alert.query.filter_by(title='Brute Force Detected: host-009').count() == 1
@@ -0,0 +1,39 @@
+import json
+from services import metrics
+from benchmarks.data import generate_traffic_records
+
+
+def analyzed_traffic():
+    return dict((tuple(labels), value) for labels, value in metrics.RECORDS_ANALYZED.snapshot()).get(('traffic',), 0)
+
+
+def stream(client, headers, lines, chunk_size):
+    response = client.post('/api/analysis/network-traffic/stream', data='\n'.join(lines) + '\n', headers=headers,
+                           query_string={'chunk_size': chunk_size}, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_bad_lines_are_reported_without_rejecting_their_chunk(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(metrics, '_enabled', True)
+    records = generate_traffic_records(7, anomaly_rate=0.0)
+    records[4]['timestamp'] = 'not a timestamp'
+    # Analyzed fine, but the database rejects the row
+    records[5]['source_port'] = {'port': 80}
+    lines = [json.dumps(record) for record in records[:3]]
+    lines += ['{"source_ip": ', '[1, 2]', '']
+    lines += [json.dumps(record) for record in records[3:]]
+    before = analyzed_traffic()
+
+    *chunks, summary = stream(client, auth_headers, lines, chunk_size=4)
+
+    # Line 6 is blank; lines 8 and 9 fail their chunk, which is retried record by record
+    errors = [error for chunk in chunks for error in chunk['errors']]
+    assert [error['line'] for error in errors] == [4, 5, 8, 9]
+    assert errors[0]['error'].startswith('Invalid JSON') and errors[1]['error'] == 'Expected a JSON object'
+    assert 'Invalid isoformat' in errors[2]['error'] and 'type' in errors[3]['error']
+    assert [chunk['records'] for chunk in chunks] == [4, 4, 1]
+    assert sum(len(chunk['results']) for chunk in chunks) == 5
+    assert summary['records'] == 9 and summary['accepted'] == 5 and summary['rejected'] == 4
+    # Records of the failed chunk are counted once, when their retry commits
+    assert analyzed_traffic() - before == 5
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app import db
+from services import traffic_buffer
+from services.ingest_service import ingest_traffic
+from services.traffic_buffer import get_traffic_buffer, pack_address, unpack_address
+from benchmarks.data import generate_traffic_records
+
+
+@pytest.fixture
+def buffer_env(app, monkeypatch):
+    """A fresh, enabled recent traffic buffer, filling since ten minutes ago"""
+    monkeypatch.setenv('RECENT_TRAFFIC_BUFFER', 'true')
+    monkeypatch.setenv('RECENT_TRAFFIC_CAPACITY', '1000')
+    monkeypatch.setattr(traffic_buffer, 'traffic_buffer', None)
+    buffer = get_traffic_buffer()
+    buffer.started_at -= np.timedelta64(10, 'm')
+    return buffer
+
+
+def recent_records(count, seconds_ago=90, **kwargs):
+    """Generated traffic records, one millisecond apart, starting a little while ago"""
+    start = datetime.utcnow() - timedelta(seconds=seconds_ago)
+    records = generate_traffic_records(count, **kwargs)
+    for index, record in enumerate(records):
+        record['timestamp'] = (start + timedelta(milliseconds=index)).isoformat()
+    return records
+
+
+def recent_traffic(client, headers):
+    response = client.get('/api/analysis/recent-traffic', headers=headers, query_string={'minutes': 5, 'top': 100})
+    assert response.status_code == 200
+    body = response.get_json()
+    # Tied counts may be ranked in either order
+    for ranking in ('top_sources', 'top_anomalous_sources', 'top_destination_ports'):
+        body[ranking] = sorted(body[ranking], key=lambda entry: sorted(entry.items()))
+    return body
+
+
+def test_buffer_answers_like_sql(client, auth_headers, buffer_env, monkeypatch):
+    records = recent_records(600, anomaly_rate=0.2, ip_cardinality=20)
+    # IPv6 sources are ranked alongside IPv4 ones
+    for record in records[::7]:
+        record['source_ip'] = f"2001:db8::{int(record['source_ip'].rsplit('.', 1)[1]) + 1:x}"
+    response = client.post('/api/analysis/network-traffic', json=records, headers=auth_headers)
+    assert response.status_code == 200
+
+    from_buffer = recent_traffic(client, auth_headers)
+    monkeypatch.setenv('RECENT_TRAFFIC_BUFFER', 'false')
+    from_sql = recent_traffic(client, auth_headers)
+
+    assert (from_buffer.pop('source'), from_sql.pop('source')) == ('buffer', 'database')
+    assert from_buffer['total'] == 600 and from_buffer['anomalous'] > 0
+    assert any(':' in entry['ip'] for entry in from_buffer['top_sources'])
+    assert from_buffer == from_sql
+
+
+def test_windows_the_buffer_does_not_hold_fall_back_to_sql(client, auth_headers, buffer_env):
+    assert client.post('/api/analysis/network-traffic', json=recent_records(400),
+                       headers=auth_headers).status_code == 200
+    assert recent_traffic(client, auth_headers)['source'] == 'buffer'
+
+    # A buffer created after the window started may have missed some of its records
+    started_at = buffer_env.started_at
+    buffer_env.started_at = np.datetime64(datetime.utcnow() - timedelta(minutes=1), 'us')
+    assert recent_traffic(client, auth_headers)['source'] == 'database'
+    buffer_env.started_at = started_at
+
+    # Overwriting records inside the window makes it incomplete too
+    assert client.post('/api/analysis/network-traffic', json=recent_records(800, seconds_ago=60),
+                       headers=auth_headers).status_code == 200
+    body = recent_traffic(client, auth_headers)
+    assert body['source'] == 'database' and body['total'] == 1200
+
+    stats = client.get('/api/analysis/traffic-buffer-stats', headers=auth_headers).get_json()
+    assert (stats['records'], stats['window_hits'], stats['window_misses']) == (1000, 1, 2)
+
+
+def test_rolled_back_traffic_is_not_buffered(app, buffer_env):
+    ingest_traffic(recent_records(100))
+    db.session.rollback()
+    assert buffer_env.stats()['records'] == 0
+
+    ingest_traffic(recent_records(100))
+    db.session.commit()
+    assert buffer_env.stats()['records'] == 100
+
+
+@pytest.mark.parametrize('address', ['10.1.2.3', '0.0.0.1', '255.255.255.255', '2001:db8::1', '::1', 'fe80::1:2:3:4'])
+def test_addresses_round_trip(address):
+    assert unpack_address(*pack_address(address)) == address
+
+
+def test_unparseable_addresses_are_counted(buffer_env):
+    records = recent_records(10)
+    records[0]['source_ip'] = 'not-an-address'
+    records[1]['destination_ip'] = None
+    rows = [dict(record, timestamp=datetime.fromisoformat(record['timestamp']), is_anomalous=False,
+                 anomaly_score=0.0) for record in records]
+
+    packed = buffer_env.pack(rows)
+
+    assert pack_address('not-an-address') is None and unpack_address(0, 0) is None
+    assert packed['source_ip'][0].tolist() == [0, 0] and packed['destination_ip'][1].tolist() == [0, 0]
+    assert buffer_env.stats()['unparsed_addresses'] == 2